@@ -38,9 +38,8 @@ def _is_reserved_port(ofproto, port_no):
 
 def _link_is_up(dpset_, dp, port_no):
     try:
-        state = dpset_.get_port(dp.id, port_no).state
-        return not (state & dp.ofproto.OFPPS_LINK_DOWN)
-    except ryu_exc.PortNotFound:
+        return dpset_.get_port_table(dp.id).is_live(port_no)
+    except KeyError:
         return False
 
 
@@ -249,11 +248,21 @@ class PortSet(app_manager.RyuApp):
             self.logger.debug('dp disconnection ev:%s', ev)
 
         dpid = ev.dp.id
-        ports = set(port.port_no for port in ev.ports)
+        ports = set(ev.port_table.physical)
         ports.update(port.port_no for port in self.nw.get_ports(dpid))
         for port_no in ports:
             self._port_handler(dpid, port_no, enter_leave)
 
+    @handler.set_ev_cls(dpset.EventDPResumed)
+    def dp_resumed_handler(self, ev):
+        self.send_event_to_observers(ev)
+        dp = ev.dp
+        for port in ev.deleted:
+            self._port_handler(dp.id, port.port_no, False)
+        for port in ev.added + ev.modified:
+            self._port_handler(dp.id, port.port_no,
+                               not (port.state & dp.ofproto.OFPPS_LINK_DOWN))
+
     @handler.set_ev_cls(dpset.EventPortAdd)
     def port_add_handler(self, ev):
         self._port_handler(ev.dp.id, ev.port.port_no, True)
@@ -395,25 +404,29 @@ class GRETunnel(app_manager.RyuApp):
 
         self.port_set = PortSet(**kwargs)
         map(lambda ev_cls: self.port_set.register_observer(ev_cls, self.name),
-            [dpset.EventDP, PortSet.EventTunnelKeyDel, PortSet.EventVMPort,
-            PortSet.EventTunnelPort, ofp_event.EventOFPPacketIn])
+            [dpset.EventDP, dpset.EventDPResumed, PortSet.EventTunnelKeyDel,
+             PortSet.EventVMPort, PortSet.EventTunnelPort,
+             ofp_event.EventOFPPacketIn])
 
     # TODO: track active vm/tunnel ports
 
+    @staticmethod
+    def _enable_nicira_extension(dp):
+        # TODO:XXX error handling
+        dp.send_nxt_set_flow_format(dp.ofproto.NXFF_NXM)
+        flow_mod_table_id = dp.ofproto_parser.NXTFlowModTableId(dp, 1)
+        dp.send_msg(flow_mod_table_id)
+        dp.send_barrier()
+
     @handler.set_ev_handler(dpset.EventDP)
     def dp_handler(self, ev):
         if not ev.enter:
             return
 
         # enable nicira extension
-        # TODO:XXX error handling
         dp = ev.dp
         ofproto = dp.ofproto
-
-        dp.send_nxt_set_flow_format(ofproto.NXFF_NXM)
-        flow_mod_table_id = dp.ofproto_parser.NXTFlowModTableId(dp, 1)
-        dp.send_msg(flow_mod_table_id)
-        dp.send_barrier()
+        self._enable_nicira_extension(dp)
 
         # delete all flows in all tables
         # current controller.handlers takes care of only table = 0
@@ -423,6 +436,14 @@ class GRETunnel(app_manager.RyuApp):
                                None, None)
         dp.send_barrier()
 
+    @handler.set_ev_handler(dpset.EventDPResumed)
+    def dp_resumed_handler(self, ev):
+        # dpset confirmed that the switch kept the flows installed. The
+        # changed ports are notified by PortSet as
+        # EventVMPort/EventTunnelPort.
+        # Only the per-connection setting needs to be done again.
+        self._enable_nicira_extension(ev.dp)
+
     @staticmethod
     def _make_command(table, command):
         return table << 8 | command
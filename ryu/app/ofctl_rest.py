@@ -15,7 +15,11 @@
 
 import logging
 
+import itertools
 import json
+import time
+import gevent
+import gevent.queue
 from webob import Response
 
 from ryu.base import app_manager
@@ -24,7 +28,12 @@ from ryu.controller import dpset
 from ryu.controller.handler import MAIN_DISPATCHER
 from ryu.controller.handler import set_ev_cls
 from ryu.ofproto import ofproto_v1_0
+from ryu.ofproto import ofproto_v1_2
+from ryu.ofproto import ofproto_v1_3
+from ryu.lib import ofctl_utils
 from ryu.lib import ofctl_v1_0
+from ryu.lib import ofctl_v1_2
+from ryu.lib import ofctl_v1_3
 from ryu.app.wsgi import ControllerBase, WSGIApplication
 
 
@@ -41,11 +50,28 @@ LOG = logging.getLogger('ryu.app.ofctl_rest')
 # GET /stats/desc/<dpid>
 #
 # get flows stats of the switch
-# GET /stats/flow/<dpid>
+# GET /stats/flow/<dpid>[?limit=<n>&after_cookie=<cookie>]
+#  With limit, the flows are returned in the order of the cookie, n
+#  flows at most unless the last cookie is shared by more flows. The
+#  next page is requested with after_cookie of the last cookie.
 #
 # get ports stats of the switch
 # GET /stats/port/<dpid>
 #
+# get tables stats of the switch (OpenFlow 1.3)
+# GET /stats/table/<dpid>
+#
+# get groups stats of the switch (OpenFlow 1.3)
+# GET /stats/group/<dpid>
+#
+# get meters stats of the switch (OpenFlow 1.3)
+# GET /stats/meter/<dpid>
+#
+# The stats of several switches are requested in
+# parallel when <dpid> is a comma separated list of dpids or "all".
+# The result is streamed as each switch replies. The switches which
+# don't reply within ?timeout=<seconds> are reported as null.
+#
 ## Update the switch stats
 #
 # add a flow entry
@@ -62,6 +88,16 @@ LOG = logging.getLogger('ryu.app.ofctl_rest')
 #
 
 
+_OFCTL = {ofproto_v1_0.OFP_VERSION: ofctl_v1_0,
+          ofproto_v1_2.OFP_VERSION: ofctl_v1_2,
+          ofproto_v1_3.OFP_VERSION: ofctl_v1_3}
+
+
+def _ofctl(dp, name):
+    """Return the function of the ofctl of the version of dp or None."""
+    return getattr(_OFCTL.get(dp.ofproto.OFP_VERSION), name, None)
+
+
 class StatsController(ControllerBase):
     def __init__(self, req, link, data, **config):
         super(StatsController, self).__init__(req, link, data, **config)
@@ -73,47 +109,135 @@ class StatsController(ControllerBase):
         body = json.dumps(dps)
         return (Response(content_type='application/json', body=body))
 
-    def get_desc_stats(self, req, dpid, **_kwargs):
+    def _fan_out(self, req, dpid, name):
+        """
+        Return the response streaming {dpid: stats} of the datapaths of
+        'all' or the comma separated dpids, or None for a single dpid.
+        """
+        if dpid == 'all':
+            dpids = self.dpset.dps.keys()
+        elif ',' in dpid:
+            try:
+                dpids = [int(d) for d in dpid.split(',') if d]
+            except ValueError:
+                return Response(status=400)
+        else:
+            return None
+        timeout = float(req.GET.get('timeout', ofctl_utils.DEFAULT_TIMEOUT))
+        return Response(content_type='application/json',
+                        app_iter=self._fan_out_iter(dpids, name, timeout))
+
+    def _fan_out_iter(self, dpids, name, timeout):
+        deadline = time.time() + timeout
+        results = gevent.queue.Queue()
+
+        def _get_stats(dp, get_stats):
+            # no timeout of its own; killed at the deadline
+            results.put((dp.id, get_stats(dp, self.waiters, None)))
+
+        threads = []
+        for dpid in set(dpids):
+            dp = self.dpset.get(dpid)
+            if dp is None:
+                continue
+            get_stats = _ofctl(dp, name)
+            if get_stats is None:
+                continue
+            threads.append(gevent.spawn(_get_stats, dp, get_stats))
+
+        answered = set()
+        sep = '{'
+        try:
+            while len(answered) < len(threads):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    dpid, stats = results.get(timeout=remaining)
+                except gevent.queue.Empty:
+                    break
+                answered.add(dpid)
+                yield '%s"%d": %s' % (sep, dpid, json.dumps(stats[str(dpid)]))
+                sep = ', '
+        finally:
+            gevent.killall(threads)
+
+        # timed out, unknown or unsupported
+        for dpid in sorted(set(dpids) - answered):
+            yield '%s"%d": null' % (sep, dpid)
+            sep = ', '
+        if sep == '{':
+            yield sep
+        yield '}'
+
+    def _get_stats(self, req, dpid, name):
+        response = self._fan_out(req, dpid, name)
+        if response is not None:
+            return response
         dp = self.dpset.get(int(dpid))
         if dp is None:
             return Response(status=404)
 
-        if dp.ofproto.OFP_VERSION == ofproto_v1_0.OFP_VERSION:
-            desc = ofctl_v1_0.get_desc_stats(dp, self.waiters)
-        else:
+        get_stats = _ofctl(dp, name)
+        if get_stats is None:
             LOG.debug('Unsupported OF protocol')
             return Response(status=501)
+        stats = get_stats(dp, self.waiters)
 
-        body = json.dumps(desc)
+        body = json.dumps(stats)
         return (Response(content_type='application/json', body=body))
 
+    def get_desc_stats(self, req, dpid, **_kwargs):
+        return self._get_stats(req, dpid, 'get_desc_stats')
+
     def get_flow_stats(self, req, dpid, **_kwargs):
+        response = self._fan_out(req, dpid, 'get_flow_stats')
+        if response is not None:
+            return response
         dp = self.dpset.get(int(dpid))
         if dp is None:
             return Response(status=404)
 
-        if dp.ofproto.OFP_VERSION == ofproto_v1_0.OFP_VERSION:
-            flows = ofctl_v1_0.get_flow_stats(dp, self.waiters)
-        else:
+        ofctl = _OFCTL.get(dp.ofproto.OFP_VERSION)
+        if ofctl is None:
             LOG.debug('Unsupported OF protocol')
             return Response(status=501)
+        try:
+            limit = req.GET.get('limit')
+            if limit is not None:
+                limit = int(limit)
+                if limit < 1:
+                    raise ValueError(limit)
+            after = req.GET.get('after_cookie')
+            if after is not None:
+                after = ofctl_utils.to_int(after)
+            timeout = float(req.GET.get('timeout',
+                                        ofctl_utils.DEFAULT_TIMEOUT))
+        except ValueError:
+            return Response(status=400)
 
-        body = json.dumps(flows)
-        return (Response(content_type='application/json', body=body))
+        # the flows are converted and sent as the replies arrive
+        flows = ofctl_utils.iter_stats(dp, ofctl.flow_stats_request(dp),
+                                       self.waiters, timeout)
+        flows = ofctl_utils.page(flows, lambda stats: stats.cookie,
+                                 after, limit)
+        flows = itertools.imap(ofctl.flow_stats_to_str, flows)
+        body = ofctl_utils.StreamedDict(
+            [(dp.id, ofctl_utils.StreamedList(flows))])
+        return Response(content_type='application/json',
+                        app_iter=ofctl_utils.iter_json(body))
 
     def get_port_stats(self, req, dpid, **_kwargs):
-        dp = self.dpset.get(int(dpid))
-        if dp is None:
-            return Response(status=404)
+        return self._get_stats(req, dpid, 'get_port_stats')
 
-        if dp.ofproto.OFP_VERSION == ofproto_v1_0.OFP_VERSION:
-            ports = ofctl_v1_0.get_port_stats(dp, self.waiters)
-        else:
-            LOG.debug('Unsupported OF protocol')
-            return Response(status=501)
+    def get_table_stats(self, req, dpid, **_kwargs):
+        return self._get_stats(req, dpid, 'get_table_stats')
 
-        body = json.dumps(ports)
-        return (Response(content_type='application/json', body=body))
+    def get_group_stats(self, req, dpid, **_kwargs):
+        return self._get_stats(req, dpid, 'get_group_stats')
+
+    def get_meter_stats(self, req, dpid, **_kwargs):
+        return self._get_stats(req, dpid, 'get_meter_stats')
 
     def mod_flow_entry(self, req, cmd, **_kwargs):
         try:
@@ -136,11 +260,15 @@ class StatsController(ControllerBase):
         else:
             return Response(status=404)
 
-        if dp.ofproto.OFP_VERSION == ofproto_v1_0.OFP_VERSION:
-            ofctl_v1_0.mod_flow_entry(dp, flow, cmd)
-        else:
+        mod_flow_entry = _ofctl(dp, 'mod_flow_entry')
+        if mod_flow_entry is None:
             LOG.debug('Unsupported OF protocol')
             return Response(status=501)
+        try:
+            mod_flow_entry(dp, flow, cmd)
+        except ValueError:
+            LOG.debug('invalid flow entry %s', req.body)
+            return Response(status=400)
 
         return Response(status=200)
 
@@ -149,17 +277,19 @@ class StatsController(ControllerBase):
         if dp is None:
             return Response(status=404)
 
-        if dp.ofproto.OFP_VERSION == ofproto_v1_0.OFP_VERSION:
-            ofctl_v1_0.delete_flow_entry(dp)
-        else:
+        delete_flow_entry = _ofctl(dp, 'delete_flow_entry')
+        if delete_flow_entry is None:
             LOG.debug('Unsupported OF protocol')
             return Response(status=501)
+        delete_flow_entry(dp)
 
         return Response(status=200)
 
 
 class RestStatsApi(app_manager.RyuApp):
-    OFP_VERSIONS = [ofproto_v1_0.OFP_VERSION]
+    OFP_VERSIONS = [ofproto_v1_0.OFP_VERSION,
+                    ofproto_v1_2.OFP_VERSION,
+                    ofproto_v1_3.OFP_VERSION]
     _CONTEXTS = {
         'dpset': dpset.DPSet,
         'wsgi': WSGIApplication
@@ -197,6 +327,13 @@ class RestStatsApi(app_manager.RyuApp):
                        controller=StatsController, action='get_port_stats',
                        conditions=dict(method=['GET']))
 
+        for stats in ('table', 'group', 'meter'):
+            uri = path + '/%s/{dpid}' % stats
+            mapper.connect('stats', uri,
+                           controller=StatsController,
+                           action='get_%s_stats' % stats,
+                           conditions=dict(method=['GET']))
+
         uri = path + '/flowentry/{cmd}'
         mapper.connect('stats', uri,
                        controller=StatsController, action='mod_flow_entry',
@@ -218,7 +355,11 @@ class RestStatsApi(app_manager.RyuApp):
         lock, msgs = self.waiters[dp.id][msg.xid]
         msgs.append(msg)
 
-        if msg.flags & dp.ofproto.OFPSF_REPLY_MORE:
+        if dp.ofproto.OFP_VERSION == ofproto_v1_3.OFP_VERSION:
+            reply_more = dp.ofproto.OFPMPF_REPLY_MORE
+        else:
+            reply_more = dp.ofproto.OFPSF_REPLY_MORE
+        if msg.flags & reply_more:
             return
         del self.waiters[dp.id][msg.xid]
         lock.set()
@@ -234,3 +375,20 @@ class RestStatsApi(app_manager.RyuApp):
     @set_ev_cls(ofp_event.EventOFPPortStatsReply, MAIN_DISPATCHER)
     def port_stats_reply_handler(self, ev):
         self.stats_reply_handler(ev)
+
+    @set_ev_cls(ofp_event.EventOFPTableStatsReply, MAIN_DISPATCHER)
+    def table_stats_reply_handler(self, ev):
+        self.stats_reply_handler(ev)
+
+    @set_ev_cls(ofp_event.EventOFPGroupStatsReply, MAIN_DISPATCHER)
+    def group_stats_reply_handler(self, ev):
+        self.stats_reply_handler(ev)
+
+    @set_ev_cls(ofp_event.EventOFPMeterStatsReply, MAIN_DISPATCHER)
+    def meter_stats_reply_handler(self, ev):
+        self.stats_reply_handler(ev)
+
+    @set_ev_cls(ofp_event.EventOFPStatsReply, MAIN_DISPATCHER)
+    def ofp12_stats_reply_handler(self, ev):
+        # OF1.2 replies all the stats types with OFPStatsReply
+        self.stats_reply_handler(ev)
@@ -28,7 +28,8 @@ from ryu.controller import (conf_switch,
                             dpset,
                             event,
                             handler,
-                            network)
+                            network,
+                            ovsdb_monitor)
 from ryu.lib import dpid as dpid_lib
 from ryu.lib import mac as mac_lib
 from ryu.lib import quantum_ifaces
@@ -171,9 +172,9 @@ class OVSSwitch(object):
             # TODO: for multi-controller
             #       not overwrite controllers, but append this controller
             ovs_bridge.set_controller([self.ctrl_addr])
-            for port in self.ports.values():
-                self.logger.debug('adding port %s', port)
-                self.update_port(port.ofport, port.name, True)
+            self.logger.debug('adding ports %s', self.ports)
+            self.update_ports((port.ofport, port.name)
+                              for port in self.ports.values())
 
     def _update_external_port(self, port, add=True):
         if add:
@@ -241,7 +242,39 @@ class OVSSwitch(object):
             self.network_api.update_mac(network_id, self.dpid, port.ofport,
                                         mac_lib.haddr_to_bin(mac))
 
+    def update_ports(self, ports):
+        """
+        Add the ports at once.
+        :param ports: iterable of (port_no, port_name)
+        """
+        port_cfgs = {}
+        if self.ovs_bridge:
+            # fetch all the interfaces by one query instead of per port.
+            port_cfgs = dict((iface['name'], iface)
+                             for iface in self.ovs_bridge.get_ifaces())
+        for port_no, port_name in ports:
+            self._update_port(port_no, port_name, True,
+                              port_cfgs.get(port_name))
+
     def update_port(self, port_no, port_name, add):
+        port_cfg = None
+        if add and self.ovs_bridge:
+            port_cfg = self.ovs_bridge.get_quantum_ports(port_name)
+        self._update_port(port_no, port_name, add, port_cfg)
+
+    def update_port_cfg(self, port_cfg):
+        """
+        Apply the interface configuration pushed by ovsdb_monitor
+        to the port already known by OpenFlow without querying ovsdb.
+        """
+        port_no = port_cfg['ofport']
+        if (not ovsdb_monitor._ofport_is_valid(port_no) or
+                port_no not in self.ports):
+            # port_add_handler will take care of it
+            return
+        self._update_port(port_no, port_cfg['name'], True, dict(port_cfg))
+
+    def _update_port(self, port_no, port_name, add, port_cfg):
         self.logger.debug('update_port port_no %d %s %s', port_no, port_name,
                           add)
         assert port_name is not None
@@ -251,20 +284,18 @@ class OVSSwitch(object):
             self.ports.pop(port_no, None)
         else:
             new_port = OVSPort(port_no, port_name)
-            if self.ovs_bridge:
-                port_cfg = self.ovs_bridge.get_quantum_ports(port_name)
-                if port_cfg:
-                    if 'ofport' not in port_cfg or not port_cfg['ofport']:
-                        port_cfg['ofport'] = port_no
-                    elif port_cfg['ofport'] != port_no:
-                        self.logger.warn('inconsistent port_no: %d port_cfg '
-                                         '%s', port_no, port_cfg)
-                        return
-                    if port_cfg['name'] != port_name:
-                        self.logger.warn('inconsistent port_name: %s '
-                                         'port_cfg %s', port_name, port_cfg)
-                        return
-                    new_port.update(port_cfg)
+            if port_cfg:
+                if 'ofport' not in port_cfg or not port_cfg['ofport']:
+                    port_cfg['ofport'] = port_no
+                elif port_cfg['ofport'] != port_no:
+                    self.logger.warn('inconsistent port_no: %d port_cfg '
+                                     '%s', port_no, port_cfg)
+                    return
+                if port_cfg['name'] != port_name:
+                    self.logger.warn('inconsistent port_name: %s '
+                                     'port_cfg %s', port_name, port_cfg)
+                    return
+                new_port.update(port_cfg)
 
             self.ports[port_no] = new_port
             iface_id = new_port.ext_ids.get('iface-id')
@@ -315,6 +346,7 @@ class QuantumAdapter(app_manager.RyuApp):
     _CONTEXTS = {
         'conf_switch': conf_switch.ConfSwitchSet,
         'network': network.Network,
+        'ovsdb_monitor': ovsdb_monitor.OVSDBMonitor,
         'quantum_ifaces': quantum_ifaces.QuantumIfaces,
     }
 
@@ -357,8 +389,8 @@ class QuantumAdapter(app_manager.RyuApp):
             return
 
         if ev.enter:
-            for port in ev.ports:
-                ovs_switch.update_port(port.port_no, port.name, True)
+            ovs_switch.update_ports((port.port_no, name) for name, port
+                                    in ev.port_table.by_name.iteritems())
         else:
             # When dp leaving, we don't delete ports because OF connection
             # can be disconnected for some reason.
@@ -378,6 +410,19 @@ class QuantumAdapter(app_manager.RyuApp):
         name = port.name.rstrip('\0')
         self._port_handler(ev.dp.id, port.port_no, name, False)
 
+    def _iface_handler(self, ev):
+        ovs_switch = self._get_ovs_switch(ev.dpid, False)
+        if ovs_switch:
+            ovs_switch.update_port_cfg(ev.iface)
+
+    @handler.set_ev_cls(ovsdb_monitor.EventOFPortAssigned)
+    def ofport_assigned_handler(self, ev):
+        self._iface_handler(ev)
+
+    @handler.set_ev_cls(ovsdb_monitor.EventExternalIdsChanged)
+    def external_ids_changed_handler(self, ev):
+        self._iface_handler(ev)
+
     def _conf_switch_set_ovsdb_addr(self, dpid, value):
         ovs_switch = self._get_ovs_switch(dpid)
         ovs_switch.set_ovsdb_addr(dpid, value)
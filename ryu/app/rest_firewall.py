@@ -29,6 +29,7 @@ from ryu.controller.handler import set_ev_cls
 from ryu.exception import OFPUnknownVersion
 from ryu.lib import mac
 from ryu.lib import dpid as dpid_lib
+from ryu.lib import ofctl_utils
 from ryu.lib import ofctl_v1_0
 from ryu.lib import ofctl_v1_2
 from ryu.ofproto import ether
@@ -60,8 +61,11 @@ LOG = logging.getLogger('ryu.app.firewall')
 ## about Firewall rules
 #
 # get rules of the firewall switches
-# GET /firewall/rules/{switch-id}
+# GET /firewall/rules/{switch-id}[?limit=<n>&after_cookie=<ruleID>]
 #  {switch-id} is 'all' or switchID
+#  With limit, n rules at most of each switch are returned in the order
+#  of ruleID. The next page is requested with after_cookie of the last
+#  ruleID.
 #
 # set a rule to the firewall switches
 # POST /firewall/rules/{switch-id}
@@ -319,13 +323,26 @@ class FirewallController(ControllerBase):
         except ValueError, message:
             return Response(status=400, body=str(message))
 
-        msgs = {}
-        for f_ofs in dps.values():
-            rules = f_ofs.ctl.get_rules(self.waiters)
-            msgs.update(rules)
-
-        body = json.dumps(msgs)
-        return Response(content_type='application/json', body=body)
+        try:
+            limit = req.GET.get('limit')
+            if limit is not None:
+                limit = int(limit)
+                if limit < 1:
+                    raise ValueError(limit)
+            after = req.GET.get('after_cookie')
+            if after is not None:
+                after = ofctl_utils.to_int(after)
+        except ValueError:
+            return Response(status=400, body='Invalid page parameter.')
+
+        # the rules are streamed as the flow stats arrive
+        msgs = ofctl_utils.StreamedDict(
+            (f_ofs.ctl.switch_id(),
+             ofctl_utils.StreamedDict(
+                 f_ofs.ctl.iter_rules(self.waiters, after, limit)))
+            for f_ofs in dps.values())
+        return Response(content_type='application/json',
+                        app_iter=ofctl_utils.iter_json(msgs))
 
     # POST /firewall/rules/{switchid}
     def set_rule(self, req, switchid, **_kwargs):
@@ -391,20 +408,22 @@ class FirewallOfctl(object):
 
         self.ofctl = self._OFCTL[version]
 
-    def get_status(self, waiters):
-        msgs = self.ofctl.get_flow_stats(self.dp, waiters)
+    def switch_id(self):
+        return '%s: %s' % (REST_SWITCHID, dpid_lib.dpid_to_str(self.dp.id))
+
+    def iter_flow_stats(self, waiters):
+        return ofctl_utils.iter_stats(
+            self.dp, self.ofctl.flow_stats_request(self.dp), waiters)
 
+    def get_status(self, waiters):
         status = REST_STATUS_ENABLE
-        if str(self.dp.id) in msgs:
-            flow_stats = msgs[str(self.dp.id)]
-            for flow_stat in flow_stats:
-                if flow_stat['priority'] == STATUS_FLOW_PRIORITY:
-                    status = REST_STATUS_DISABLE
+        for flow_stat in self.iter_flow_stats(waiters):
+            if flow_stat.priority == STATUS_FLOW_PRIORITY:
+                status = REST_STATUS_DISABLE
+                break
 
         msg = {REST_STATUS: status}
-        switch_id = '%s: %s' % (REST_SWITCHID,
-                                dpid_lib.dpid_to_str(self.dp.id))
-        return {switch_id: msg}
+        return {self.switch_id(): msg}
 
     def set_disable_flow(self):
         cookie = 0
@@ -419,9 +438,7 @@ class FirewallOfctl(object):
 
         msg = {'result': 'success',
                'details': 'firewall stopped.'}
-        switch_id = '%s: %s' % (REST_SWITCHID,
-                                dpid_lib.dpid_to_str(self.dp.id))
-        return {switch_id: msg}
+        return {self.switch_id(): msg}
 
     def set_enable_flow(self):
         cookie = 0
@@ -436,9 +453,7 @@ class FirewallOfctl(object):
 
         msg = {'result': 'success',
                'details': 'firewall running.'}
-        switch_id = '%s: %s' % (REST_SWITCHID,
-                                dpid_lib.dpid_to_str(self.dp.id))
-        return {switch_id: msg}
+        return {self.switch_id(): msg}
 
     def set_arp_flow(self):
         cookie = 0
@@ -473,25 +488,28 @@ class FirewallOfctl(object):
         msg = {'result': 'success',
                'details': 'Rule added. : rule_id=%d' % cookie}
 
-        switch_id = '%s: %s' % (REST_SWITCHID,
-                                dpid_lib.dpid_to_str(self.dp.id))
-        return {switch_id: msg}
+        return {self.switch_id(): msg}
+
+    def iter_rules(self, waiters, after=None, limit=None):
+        """
+        Yield (ruleID, rule) of the rules, which are paged by ruleID,
+        i.e. the cookie, as ofctl_utils.page.
+        """
+        flow_stats = (flow_stat
+                      for flow_stat in self.iter_flow_stats(waiters)
+                      if (flow_stat.priority != STATUS_FLOW_PRIORITY
+                          and flow_stat.priority != ARP_FLOW_PRIORITY))
+        flow_stats = ofctl_utils.page(flow_stats,
+                                      lambda flow_stat: flow_stat.cookie,
+                                      after, limit)
+        for flow_stat in flow_stats:
+            flow = self.ofctl.flow_stats_to_str(flow_stat)
+            for rule in self._to_rest_rule(flow).iteritems():
+                yield rule
 
     def get_rules(self, waiters):
-        rules = {}
-        msgs = self.ofctl.get_flow_stats(self.dp, waiters)
-
-        if str(self.dp.id) in msgs:
-            flow_stats = msgs[str(self.dp.id)]
-            for flow_stat in flow_stats:
-                if (flow_stat[REST_PRIORITY] != STATUS_FLOW_PRIORITY
-                        and flow_stat[REST_PRIORITY] != ARP_FLOW_PRIORITY):
-                    rule = self._to_rest_rule(flow_stat)
-                    rules.update(rule)
-
-        switch_id = '%s: %s' % (REST_SWITCHID,
-                                dpid_lib.dpid_to_str(self.dp.id))
-        return {switch_id: rules}
+        rules = dict(self.iter_rules(waiters))
+        return {self.switch_id(): rules}
 
     def delete_rule(self, rest, waiters):
         try:
@@ -504,20 +522,18 @@ class FirewallOfctl(object):
 
         delete_list = []
 
-        msgs = self.ofctl.get_flow_stats(self.dp, waiters)
-        if str(self.dp.id) in msgs:
-            flow_stats = msgs[str(self.dp.id)]
-            for flow_stat in flow_stats:
-                cookie = flow_stat[REST_COOKIE]
-                priority = flow_stat[REST_PRIORITY]
-
-                if (priority != STATUS_FLOW_PRIORITY
-                        and priority != ARP_FLOW_PRIORITY):
-                    if rule_id == REST_ALL or rule_id == cookie:
-                        match = Match.to_del_openflow(flow_stat[REST_MATCH])
-                        delete_list.append([cookie, priority, match])
-                    if rule_id == cookie:
-                        break
+        for flow_stat in self.iter_flow_stats(waiters):
+            cookie = flow_stat.cookie
+            priority = flow_stat.priority
+
+            if (priority != STATUS_FLOW_PRIORITY
+                    and priority != ARP_FLOW_PRIORITY):
+                if rule_id == REST_ALL or rule_id == cookie:
+                    flow = self.ofctl.flow_stats_to_str(flow_stat)
+                    match = Match.to_del_openflow(flow[REST_MATCH])
+                    delete_list.append([cookie, priority, match])
+                if rule_id == cookie:
+                    break
 
         if len(delete_list) == 0:
             msg_details = 'Rule is not exist.'
@@ -537,9 +553,7 @@ class FirewallOfctl(object):
             msg = {'result': 'success',
                    'details': msg_details}
 
-        switch_id = '%s: %s' % (REST_SWITCHID,
-                                dpid_lib.dpid_to_str(self.dp.id))
-        return {switch_id: msg}
+        return {self.switch_id(): msg}
 
     def _to_of_flow(self, cookie, priority, match, actions):
         flow = {'cookie': cookie,
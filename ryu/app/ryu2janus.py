@@ -15,11 +15,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import errno
 import logging
+import socket
 import struct
+import time
 import httplib
 import json
 
+import gevent
+import gevent.queue
+from oslo.config import cfg
+
 from ryu.base import app_manager
 from ryu.controller import mac_to_port
 from ryu.controller import ofp_event
@@ -27,11 +34,168 @@ from ryu.controller.handler import MAIN_DISPATCHER, CONFIG_DISPATCHER
 from ryu.controller.handler import set_ev_cls
 from ryu.ofproto import ofproto_v1_0
 from ryu.lib.mac import haddr_to_str, ipaddr_to_str
+from ryu.lib import event_export
 from janus.network.of_controller.janus_of_consts import JANEVENTS, JANPORTREASONS
 from janus.network.of_controller.event_contents import EventContents
 
 LOG = logging.getLogger('ryu.app.ryu2janus')
 
+CONF = cfg.CONF
+CONF.register_opts([
+    cfg.StrOpt('janus-host', default='127.0.0.1', help='Janus address'),
+    cfg.IntOpt('janus-port', default=8090, help='Janus port'),
+    cfg.FloatOpt('janus-timeout', default=10.0,
+                 help='seconds to wait for Janus to answer a request'),
+    cfg.IntOpt('janus-workers', default=1,
+               help='connections forwarding the events to Janus. The '
+               'events are in order only with 1'),
+    cfg.IntOpt('janus-queue-size', default=10000,
+               help='events waiting to be forwarded, above which new '
+               'events are dropped'),
+    cfg.IntOpt('janus-batch-size', default=1,
+               help='max events of the same kind sent in one request as a '
+               'list. 1 sends each event as is'),
+    cfg.FloatOpt('janus-batch-latency', default=0,
+                 help='seconds to wait for more events to fill a batch'),
+    cfg.StrOpt('janus-event-format', default='json',
+               help='json, or binary for the compact records of '
+               'ryu.lib.event_export')
+])
+
+
+def _join_json(bodies):
+    return '[%s]' % ', '.join(bodies)
+
+
+class JanusForwarder(object):
+    """
+    Forward the events to Janus from worker greenlets, so that the event
+    handlers don't wait for Janus.
+
+    Each worker keeps its HTTP connection open, and sends the consecutive
+    events of the same method and url as one request, up to batch_size,
+    with the bodies joined by join, a JSON list by default.
+    When the queue is full, the events are dropped and counted.
+    """
+    def __init__(self, host, port, workers=1, queue_size=10000,
+                 batch_size=1, batch_latency=0, join=_join_json,
+                 timeout=10.0):
+        super(JanusForwarder, self).__init__()
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.join = join
+        self.batch_size = batch_size
+        self.batch_latency = batch_latency
+        self.queue = gevent.queue.Queue(queue_size)
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self.threads = [gevent.spawn(self._serve) for _i in range(workers)]
+
+    def send(self, method, url, body=None, headers=None):
+        try:
+            self.queue.put_nowait((method, url, body, headers))
+        except gevent.queue.Full:
+            self.dropped += 1
+            # log at 1, 2, 4, 8... drops not to flood the log
+            if not self.dropped & (self.dropped - 1):
+                LOG.warn('Janus is behind, dropped %d events', self.dropped)
+
+    def _get_batch(self):
+        batch = [self.queue.get()]
+        deadline = time.time() + self.batch_latency
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.time()
+            try:
+                batch.append(self.queue.get(block=timeout > 0,
+                                            timeout=timeout))
+            except gevent.queue.Empty:
+                break
+        return batch
+
+    def _serve(self):
+        conn = None
+        while True:
+            batch = self._get_batch()
+            while batch:
+                method, url, body, headers = batch[0]
+                bodies = []
+                while (batch and batch[0][0] == method and
+                       batch[0][1] == url):
+                    bodies.append(batch.pop(0)[2])
+
+                try:
+                    if len(bodies) > 1:
+                        body = self.join(bodies)
+                    conn = self._request(conn, method, url, body, headers)
+                    self.sent += len(bodies)
+                except (socket.error, httplib.HTTPException), e:
+                    self.failed += len(bodies)
+                    LOG.error('failed to forward %d events to %s: %s',
+                              len(bodies), url, e)
+                    self._close(conn)
+                    conn = None
+                except Exception:
+                    # A bad event mustn't kill the worker
+                    self.failed += len(bodies)
+                    LOG.exception('failed to forward %d events to %s',
+                                  len(bodies), url)
+                    self._close(conn)
+                    conn = None
+
+    @staticmethod
+    def _close(conn):
+        if conn is not None:
+            conn.close()
+
+    def _connect(self):
+        return httplib.HTTPConnection(self.host, self.port,
+                                      timeout=self.timeout)
+
+    # Whether e means that Janus had closed the kept connection, so that
+    #   the request didn't reach it. A timeout doesn't, as Janus may have
+    #   taken the events
+    @staticmethod
+    def _is_stale(e):
+        if isinstance(e, httplib.BadStatusLine):
+            return True
+        return (isinstance(e, socket.error) and
+                not isinstance(e, socket.timeout) and
+                getattr(e, 'errno', None) in (errno.ECONNRESET, errno.EPIPE))
+
+    # Returns the connection to keep for the next request
+    def _request(self, conn, method, url, body, headers):
+        # The kept connection may have been closed by Janus, so retry once
+        #   on a new connection
+        for retry in (conn is not None, False):
+            if conn is None:
+                conn = self._connect()
+            try:
+                conn.request(method, url, body, headers or {})
+                res = conn.getresponse()
+                data = res.read()
+            except (socket.error, httplib.HTTPException), e:
+                conn.close()
+                conn = None
+                if retry and self._is_stale(e):
+                    continue
+                raise
+            break
+
+        if res.will_close:
+            conn.close()
+            conn = None
+        if res.status not in (httplib.OK,
+                              httplib.CREATED,
+                              httplib.ACCEPTED,
+                              httplib.NO_CONTENT):
+            raise httplib.HTTPException(
+                res, 'code %d reason %s' % (res.status, res.reason),
+                res.getheaders(), data)
+        return conn
+
+
 class Ryu2JanusForwarding(app_manager.RyuApp):
     OFP_VERSIONS = [ofproto_v1_0.OFP_VERSION]
 
@@ -40,25 +204,25 @@ class Ryu2JanusForwarding(app_manager.RyuApp):
         self.mac_to_port = {}
 
         # Janus address
-        self.host = '127.0.0.1'
-        self.port = 8090
+        self.host = CONF.janus_host
+        self.port = CONF.janus_port
         self.url_prefix = '/v1/network'
 
-    def _forward2Controller(self, method, url, body=None, headers=None):
-        conn = httplib.HTTPConnection(self.host, self.port)
-        conn.request(method, url, body, headers)
-        res = conn.getresponse()
-        print "\n"
-        if res.status in (httplib.OK,
-                          httplib.CREATED,
-                          httplib.ACCEPTED,
-                          httplib.NO_CONTENT):
-            return res
-
-        raise httplib.HTTPException(
-            res, 'code %d reason %s' % (res.status, res.reason),
-            res.getheaders(), res.read())
+        # The binary records skip EventContents and the formatting of the
+        #   addresses, which are most of the cost of a packet-in
+        self.binary = CONF.janus_event_format == 'binary'
+        if self.binary:
+            join = event_export.join
+            self.binary_header = {'Content-Type': event_export.CONTENT_TYPE}
+        else:
+            join = _join_json
+        self.forwarder = JanusForwarder(
+            self.host, self.port, CONF.janus_workers, CONF.janus_queue_size,
+            CONF.janus_batch_size, CONF.janus_batch_latency, join,
+            CONF.janus_timeout)
 
+    def _forward2Controller(self, method, url, body=None, headers=None):
+        self.forwarder.send(method, url, body, headers)
 
     @set_ev_cls(ofp_event.EventOFPPortStatus, MAIN_DISPATCHER)
     def _port_status_handler(self, ev):
@@ -85,10 +249,16 @@ class Ryu2JanusForwarding(app_manager.RyuApp):
             raise
 
         port_status_url = '/of_event/%s' % JANEVENTS.JAN_EV_PORTSTATUS
+        url = self.url_prefix + port_status_url
+        if self.binary:
+            body = event_export.encode_port_status(msg.datapath.id, reason,
+                                                   port_no)
+            self._forward2Controller(method, url, body, self.binary_header)
+            return
+
         body = "{'datapath_id': %s, 'reason': %s, 'port': %s}" % (msg.datapath.id, reason_id, port_no)
         header = {"Content-Type": "application/json"}
 
-        url = self.url_prefix + port_status_url
         LOG.info("FORWARDING PORT STATUS TO JANUS: body = %s", body)
         self._forward2Controller(method, url, body, header)
 
@@ -99,6 +269,15 @@ class Ryu2JanusForwarding(app_manager.RyuApp):
         datapath = msg.datapath
         ofproto = datapath.ofproto
 
+        packet_in_url = '/of_event/%s' % JANEVENTS.JAN_EV_PACKETIN
+        url = self.url_prefix + packet_in_url
+        method = 'POST'
+        if self.binary:
+            body = event_export.encode_packet_in(datapath.id, msg.buffer_id,
+                                                 msg.in_port, msg.data)
+            self._forward2Controller(method, url, body, self.binary_header)
+            return
+
         contents = EventContents()
         contents.set_dpid(datapath.id)
         contents.set_buff_id(msg.buffer_id)
@@ -122,13 +301,10 @@ class Ryu2JanusForwarding(app_manager.RyuApp):
             contents.set_arp_tha(haddr_to_str(THA))
             contents.set_arp_tpa(ipaddr_to_str(TPA))
 
-        packet_in_url = '/of_event/%s' % JANEVENTS.JAN_EV_PACKETIN
-        method = 'POST'
         #body = "{'datapath_id': %s, 'buffer_id': %s, 'in_port': %s, 'dl_src': '%s', 'dl_dst': '%s'}" % (datapath.id, msg.buffer_id, in_port, haddr_to_str(src), haddr_to_str(dst))
         body = json.dumps(contents.getContents())
         header = {"Content-Type": "application/json"}
 
-        url = self.url_prefix + packet_in_url
         LOG.info("FORWARDING PACKET TO JANUS: body = %s", body)
         self._forward2Controller(method, url, body, header)
 
@@ -139,11 +315,16 @@ class Ryu2JanusForwarding(app_manager.RyuApp):
         ports = msg.ports
 
         features_reply_url = '/of_event/%s' % JANEVENTS.JAN_EV_FEATURESREPLY
+        url = self.url_prefix + features_reply_url
         method = 'PUT'
+        if self.binary:
+            body = event_export.encode_features_reply(dpid, ports.keys())
+            self._forward2Controller(method, url, body, self.binary_header)
+            return
+
         body = json.dumps({'datapath_id': dpid, 'ports': ports.keys()})
         header = {"Content-Type": "application/json"}
 
-        url = self.url_prefix + features_reply_url
         LOG.info("FORWARDING FEATURES REPLY TO JANUS: body = %s", body)
         self._forward2Controller(method, url, body, header)
 
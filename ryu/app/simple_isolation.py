@@ -17,6 +17,8 @@
 import logging
 import struct
 
+from oslo.config import cfg
+
 from ryu.app.rest_nw_id import NW_ID_UNKNOWN, NW_ID_EXTERNAL
 from ryu.base import app_manager
 from ryu.exception import MacAddressDuplicated
@@ -30,10 +32,26 @@ from ryu.controller.handler import MAIN_DISPATCHER
 from ryu.controller.handler import CONFIG_DISPATCHER
 from ryu.controller.handler import set_ev_cls
 from ryu.ofproto import nx_match
+from ryu.ofproto import ofproto_v1_0
 from ryu.lib.mac import haddr_to_str
 from ryu.lib import mac
 
 
+CONF = cfg.CONF
+CONF.register_opts([
+    cfg.BoolOpt('proactive-flood', default=False,
+                help='install the broadcast/multicast flows of each '
+                     'network in advance instead of flooding the packets '
+                     'in packet-in. The source mac addresses of the '
+                     'flooded packets are then learned from unicast only')
+])
+
+# the flood flows match the multicast bit of dl_dst,
+# over the learned unicast flows
+FLOOD_FLOW_PRIORITY = ofproto_v1_0.OFP_DEFAULT_PRIORITY + 1
+_MULTICAST_BIT = '\x01' + '\x00' * 5
+
+
 class SimpleIsolation(app_manager.RyuApp):
     _CONTEXTS = {
         'network': network.Network,
@@ -50,14 +68,31 @@ class SimpleIsolation(app_manager.RyuApp):
 
     @set_ev_cls(ofp_event.EventOFPSwitchFeatures, CONFIG_DISPATCHER)
     def switch_features_handler(self, ev):
-        msg = ev.msg
-        datapath = msg.datapath
+        self.mac2port.dpid_add(ev.msg.datapath_id)
+        self.nw.add_datapath(ev.msg)
 
+    @set_ev_cls(dpset.EventDP)
+    def dp_handler(self, ev):
+        if not ev.enter:
+            return
+
+        # new datapath, or the datapath was gone longer than the resync
+        # grace period. Start with empty flow table.
+        datapath = ev.dp
         datapath.send_delete_all_flows()
         datapath.send_barrier()
-
-        self.mac2port.dpid_add(ev.msg.datapath_id)
-        self.nw.add_datapath(ev.msg)
+        self._program_flood_flows(datapath)
+
+    @set_ev_cls(dpset.EventDPResumed)
+    def dp_resumed_handler(self, ev):
+        # dpset confirmed that the switch kept the installed flows. Only
+        # the ports which were changed during the disconnection need to
+        # be handled.
+        datapath = ev.dp
+        for port in ev.deleted:
+            self._port_del(datapath, port.port_no)
+        if ev.added:
+            self._port_add(datapath, [port.port_no for port in ev.added])
 
     @staticmethod
     def _modflow_and_send_packet(msg, src, dst, actions):
@@ -112,6 +147,68 @@ class SimpleIsolation(app_manager.RyuApp):
             actions.append(datapath.ofproto_parser.OFPActionOutput(port_no))
         self._modflow_and_send_packet(msg, src, dst, actions)
 
+    #
+    # proactive flood flows: for each port of a network, broadcast and
+    # multicast packets from the port are output to the other ports of
+    # the network and the external ports by a flow.
+    # Packets from the external ports still come to packet-in, as the
+    # network is known by the source mac address.
+    #
+
+    @staticmethod
+    def _flood_rule(port_no):
+        rule = nx_match.ClsRule()
+        rule.set_in_port(port_no)
+        rule.set_dl_dst_masked(_MULTICAST_BIT, _MULTICAST_BIT)
+        return rule
+
+    def _program_flood_flows(self, datapath, nw_ids=None):
+        """(Re)install the flood flows of nw_ids or all the networks."""
+        if not CONF.proactive_flood:
+            return
+        dpid = datapath.id
+        if nw_ids is None:
+            nw_ids = set(port.network_id for port in self.nw.get_ports(dpid))
+        for nw_id in nw_ids:
+            if nw_id in (None, NW_ID_UNKNOWN, NW_ID_EXTERNAL):
+                continue
+            for port_no in self.nw.get_network_ports(dpid, nw_id):
+                actions = [datapath.ofproto_parser.OFPActionOutput(out_port)
+                           for out_port in self.nw.filter_ports(
+                               dpid, port_no, nw_id, NW_ID_EXTERNAL)]
+                datapath.send_flow_mod(
+                    rule=self._flood_rule(port_no), cookie=0,
+                    command=datapath.ofproto.OFPFC_ADD,
+                    idle_timeout=0, hard_timeout=0,
+                    priority=FLOOD_FLOW_PRIORITY,
+                    buffer_id=0xffffffff, out_port=datapath.ofproto.OFPP_NONE,
+                    actions=actions)
+
+    def _delete_flood_flow(self, datapath, port_no):
+        datapath.send_flow_mod(
+            rule=self._flood_rule(port_no), cookie=0,
+            command=datapath.ofproto.OFPFC_DELETE_STRICT,
+            idle_timeout=0, hard_timeout=0, priority=FLOOD_FLOW_PRIORITY,
+            out_port=datapath.ofproto.OFPP_NONE)
+
+    @set_ev_cls(network.EventNetworkPort)
+    def network_port_handler(self, ev):
+        if not CONF.proactive_flood:
+            return
+        datapath = self.dpset.get(ev.dpid)
+        if datapath is None:
+            return
+
+        # the external ports are in the flood sets of all the networks
+        nw_ids = None
+        if ev.network_id != NW_ID_EXTERNAL:
+            nw_ids = [ev.network_id]
+        if not ev.add_del:
+            nw_id = self.nw.dpids.get_network_safe(ev.dpid, ev.port_no)
+            if nw_id in (NW_ID_UNKNOWN, NW_ID_EXTERNAL):
+                self._delete_flood_flow(datapath, ev.port_no)
+        self._program_flood_flows(datapath, nw_ids)
+
     def _learned_mac_or_flood_to_nw_id(self, msg, src, dst,
                                        dst_nw_id, out_port):
         if out_port is not None:
@@ -264,7 +361,7 @@ class SimpleIsolation(app_manager.RyuApp):
             self._drop_packet(msg)
             # self.logger.debug("Unknown port_nw_id")
 
-    def _port_add(self, ev):
+    def _port_add(self, datapath, port_nos):
         #
         # delete flows entries that matches with
         # dl_dst == broadcast/multicast
@@ -274,23 +371,19 @@ class SimpleIsolation(app_manager.RyuApp):
         # Openflow v1.0 doesn't support masked match of dl_dst,
         # so delete all flow entries. It's inefficient, though.
         #
-        msg = ev.msg
-        datapath = msg.datapath
-
         datapath.send_delete_all_flows()
         datapath.send_barrier()
-        self.nw.port_added(datapath, msg.desc.port_no)
+        for port_no in port_nos:
+            self.nw.port_added(datapath, port_no)
+        self._program_flood_flows(datapath)
 
-    def _port_del(self, ev):
+    def _port_del(self, datapath, port_no):
         # free mac addresses associated to this VM port,
         # and delete related flow entries for later reuse of mac address
 
         dps_needs_barrier = set()
 
-        msg = ev.msg
-        datapath = msg.datapath
         datapath_id = datapath.id
-        port_no = msg.desc.port_no
 
         rule = nx_match.ClsRule()
         rule.set_in_port(port_no)
@@ -309,6 +402,8 @@ class SimpleIsolation(app_manager.RyuApp):
         else:
             if port_nw_id in (NW_ID_UNKNOWN, NW_ID_EXTERNAL):
                 datapath.send_barrier()
+                # the flood flows to the port were deleted above
+                self._program_flood_flows(datapath)
                 return
 
         for mac_ in self.mac2port.mac_list(datapath_id, port_no):
@@ -333,6 +428,7 @@ class SimpleIsolation(app_manager.RyuApp):
 
         for dp in dps_needs_barrier:
             dp.send_barrier()
+        self._program_flood_flows(datapath)
 
     @set_ev_cls(ofp_event.EventOFPPortStatus, MAIN_DISPATCHER)
     def port_status_handler(self, ev):
@@ -341,8 +437,8 @@ class SimpleIsolation(app_manager.RyuApp):
         ofproto = msg.datapath.ofproto
 
         if reason == ofproto.OFPPR_ADD:
-            self._port_add(ev)
+            self._port_add(msg.datapath, [msg.desc.port_no])
         elif reason == ofproto.OFPPR_DELETE:
-            self._port_del(ev)
+            self._port_del(msg.datapath, msg.desc.port_no)
         else:
             assert reason == ofproto.OFPPR_MODIFY
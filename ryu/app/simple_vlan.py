@@ -95,8 +95,8 @@ class SimpleVLAN(app_manager.RyuApp):
                          idle_timeout=0, hard_timeout=0,
                          priority=self._PRIORITY_CATCHALL,
                          actions=[])
-        for port in ev.ports:
-            self._port_add(dp, port.port_no)
+        for port_no in ev.port_table.physical:
+            self._port_add(dp, port_no)
 
     # There is no ordering between those events
     #   port creation: PortAdd event
@@ -0,0 +1,423 @@
+# Copyright (C) 2013 Nippon Telegraph and Telephone Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Traffic statistics aggregator.
+
+The port stats, and the flow stats of OpenFlow 1.0 datapaths, of all the
+datapaths are polled every --stats-interval seconds. The requests to a
+datapath are sent back to back before waiting for the replies, and at
+most --stats-concurrency datapaths are polled at once. The interface
+counters sFlow agents send, which ryu.controller.xflow_collector
+publishes when it is loaded, are merged in as well.
+
+The last --stats-history samples of each port, sFlow interface and flow
+are kept in ring buffers, and the REST API answers from them without
+sending anything to the switches.
+"""
+
+import heapq
+import json
+import logging
+import time
+
+import gevent
+import gevent.event
+import gevent.pool
+from oslo.config import cfg
+from webob import Response
+
+import ryu.exception as ryu_exc
+from ryu.app.wsgi import ControllerBase, WSGIApplication
+from ryu.base import app_manager
+from ryu.controller import dpset
+from ryu.controller import ofp_event
+from ryu.controller import xflow_collector
+from ryu.controller.handler import MAIN_DISPATCHER
+from ryu.controller.handler import set_ev_cls
+from ryu.lib import ofctl_v1_0
+from ryu.lib import timeseries
+from ryu.ofproto import ofproto_v1_0
+from ryu.ofproto import ofproto_v1_2
+from ryu.ofproto import ofproto_v1_3
+
+
+LOG = logging.getLogger('ryu.app.stats_aggregator')
+
+CONF = cfg.CONF
+CONF.register_opts([
+    cfg.FloatOpt('stats-interval', default=10,
+                 help='seconds between the stats polls of a datapath'),
+    cfg.IntOpt('stats-concurrency', default=16,
+               help='max number of datapaths polled at once'),
+    cfg.FloatOpt('stats-timeout', default=5,
+                 help='seconds to wait for the stats replies'),
+    cfg.IntOpt('stats-history', default=60,
+               help='number of samples kept per port and flow'),
+    cfg.BoolOpt('stats-poll-flows', default=True,
+                help='poll the flow stats of OpenFlow 1.0 datapaths too')
+])
+
+# REST API
+#
+# get the rates of the ports of the switch
+# GET /stats/traffic/port/<dpid>
+#
+# get the rates and the samples of the port
+# GET /stats/traffic/port/<dpid>/<port>
+#
+# get the top ports of all the switches and sFlow agents
+# GET /stats/traffic/top?n=<n>&by=<field>
+#
+# get the top flows of all the switches by bytes
+# GET /stats/traffic/flows/top?n=<n>
+#
+# get the rates of the interfaces sFlow agents report
+# GET /stats/traffic/sflow
+#
+# The rates are per second over the last two samples, or over the samples
+# of the last <window> seconds if ?window=<window> is given.
+# The utilization is the bits per second divided by the port speed.
+
+PORT_FIELDS = ('rx_bytes', 'tx_bytes', 'rx_packets', 'tx_packets',
+               'rx_dropped', 'tx_dropped')
+FLOW_FIELDS = ('byte_count', 'packet_count')
+
+# OFPSF_REPLY_MORE of OF1.0/1.2 and OFPMPF_REPLY_MORE of OF1.3
+_REPLY_MORE = 1 << 0
+
+_OFPPF_SPEEDS = (
+    ('OFPPF_10MB_HD', 10 ** 7),
+    ('OFPPF_10MB_FD', 10 ** 7),
+    ('OFPPF_100MB_HD', 10 ** 8),
+    ('OFPPF_100MB_FD', 10 ** 8),
+    ('OFPPF_1GB_HD', 10 ** 9),
+    ('OFPPF_1GB_FD', 10 ** 9),
+    ('OFPPF_10GB_FD', 10 ** 10),
+    ('OFPPF_40GB_FD', 4 * 10 ** 10),
+    ('OFPPF_100GB_FD', 10 ** 11),
+    ('OFPPF_1TB_FD', 10 ** 12),
+)
+
+
+def port_speed(ofproto, port):
+    """Return the current speed of the port in bits per second or None."""
+    curr_speed = getattr(port, 'curr_speed', None)
+    if curr_speed:
+        # kbps
+        return curr_speed * 1000
+    speed = None
+    for name, bps in _OFPPF_SPEEDS:
+        bit = getattr(ofproto, name, None)
+        if bit is not None and port.curr & bit:
+            speed = bps
+    return speed
+
+
+def _port_rates(series, speed, window):
+    rates = dict((field, series.rate(field, window)) for field in PORT_FIELDS)
+    entry = {'rates': rates,
+             'speed': speed,
+             'samples': len(series),
+             'last_time': series.last_time}
+    for direction in ('rx', 'tx'):
+        rate = rates[direction + '_bytes']
+        utilization = None
+        if rate is not None and speed:
+            utilization = rate * 8 / speed
+        entry[direction + '_utilization'] = utilization
+    return entry
+
+
+class StatsAggregator(app_manager.RyuApp):
+    OFP_VERSIONS = [ofproto_v1_0.OFP_VERSION,
+                    ofproto_v1_2.OFP_VERSION,
+                    ofproto_v1_3.OFP_VERSION]
+    _CONTEXTS = {
+        'dpset': dpset.DPSet,
+        'wsgi': WSGIApplication
+    }
+
+    def __init__(self, *args, **kwargs):
+        super(StatsAggregator, self).__init__(*args, **kwargs)
+        self.dpset = kwargs['dpset']
+        self.waiters = {}           # (dpid, xid) -> (AsyncResult, msgs)
+        self.port_series = {}       # (dpid, port_no) -> CounterSeries
+        self.flow_series = {}       # dpid -> {key: (flow, CounterSeries)}
+        self.sflow_series = {}      # (agent, ifIndex) -> CounterSeries
+        self.sflow_speeds = {}      # (agent, ifIndex) -> ifSpeed
+
+        wsgi = kwargs['wsgi']
+        wsgi.registory['TrafficController'] = {'aggregator': self}
+        mapper = wsgi.mapper
+        path = '/stats/traffic'
+        for uri, action in ((path + '/top', 'top_ports'),
+                            (path + '/flows/top', 'top_flows'),
+                            (path + '/sflow', 'sflow_interfaces'),
+                            (path + '/port/{dpid}', 'ports'),
+                            (path + '/port/{dpid}/{port}', 'port')):
+            mapper.connect('traffic', uri,
+                           controller=TrafficController, action=action,
+                           conditions=dict(method=['GET']))
+
+        self.poll_thread = gevent.spawn(self._poll_loop)
+
+    def close(self):
+        self.poll_thread.kill()
+        super(StatsAggregator, self).close()
+
+    def _poll_loop(self):
+        pool = gevent.pool.Pool(CONF.stats_concurrency)
+        while True:
+            start = time.time()
+            for _dpid, dp in self.dpset.get_all():
+                pool.spawn(self._poll, dp)
+            pool.join()
+            gevent.sleep(max(0, CONF.stats_interval - (time.time() - start)))
+
+    def _requests(self, dp):
+        ofproto = dp.ofproto
+        parser = dp.ofproto_parser
+        if ofproto.OFP_VERSION == ofproto_v1_0.OFP_VERSION:
+            requests = [('port', parser.OFPPortStatsRequest(
+                dp, 0, ofproto.OFPP_NONE))]
+            if CONF.stats_poll_flows:
+                match = parser.OFPMatch(ofproto.OFPFW_ALL,
+                                        0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+                requests.append(('flow', parser.OFPFlowStatsRequest(
+                    dp, 0, match, 0xff, ofproto.OFPP_NONE)))
+        elif ofproto.OFP_VERSION == ofproto_v1_2.OFP_VERSION:
+            requests = [('port', parser.OFPPortStatsRequest(
+                dp, ofproto.OFPP_ANY))]
+        else:
+            requests = [('port', parser.OFPPortStatsRequest(
+                dp, 0, ofproto.OFPP_ANY))]
+        return requests
+
+    def _poll(self, dp):
+        pending = []
+        for kind, req in self._requests(dp):
+            dp.set_xid(req)
+            result = gevent.event.AsyncResult()
+            msgs = []
+            self.waiters[(dp.id, req.xid)] = (result, msgs)
+            pending.append((kind, req.xid, result, msgs))
+            dp.send_msg(req)
+
+        for kind, xid, result, msgs in pending:
+            try:
+                now = result.get(timeout=CONF.stats_timeout)
+            except gevent.Timeout:
+                LOG.debug('stats: no %s stats reply from %016x', kind, dp.id)
+                continue
+            finally:
+                self.waiters.pop((dp.id, xid), None)
+            if kind == 'port':
+                self.update_ports(dp, msgs, now)
+            else:
+                self.update_flows(dp, msgs, now)
+
+    def update_ports(self, dp, msgs, now):
+        ofproto_max = dp.ofproto.OFPP_MAX
+        for msg in msgs:
+            for stats in msg.body:
+                if stats.port_no > ofproto_max:
+                    continue
+                key = (dp.id, stats.port_no)
+                series = self.port_series.get(key)
+                if series is None:
+                    series = timeseries.CounterSeries(PORT_FIELDS,
+                                                      CONF.stats_history)
+                    self.port_series[key] = series
+                series.append(now, [getattr(stats, field)
+                                    for field in PORT_FIELDS])
+
+    def update_flows(self, dp, msgs, now):
+        old = self.flow_series.get(dp.id, {})
+        flows = {}
+        for msg in msgs:
+            for stats in msg.body:
+                match = ofctl_v1_0.match_to_str(stats.match)
+                key = (json.dumps(match, sort_keys=True),
+                       stats.priority, stats.cookie)
+                entry = old.get(key)
+                if entry is None:
+                    flow = {'dpid': dp.id,
+                            'match': match,
+                            'priority': stats.priority,
+                            'cookie': stats.cookie,
+                            'actions': ofctl_v1_0.actions_to_str(
+                                stats.actions)}
+                    entry = (flow, timeseries.CounterSeries(
+                        FLOW_FIELDS, CONF.stats_history))
+                entry[1].append(now, [stats.byte_count, stats.packet_count])
+                flows[key] = entry
+        # the flows gone are dropped
+        self.flow_series[dp.id] = flows
+
+    def _stats_reply_handler(self, ev):
+        msg = ev.msg
+        waiter = self.waiters.get((msg.datapath.id, msg.xid))
+        if waiter is None:
+            return
+        result, msgs = waiter
+        msgs.append(msg)
+        if msg.flags & _REPLY_MORE:
+            return
+        result.set(time.time())
+
+    @set_ev_cls(ofp_event.EventOFPPortStatsReply, MAIN_DISPATCHER)
+    def port_stats_reply_handler(self, ev):
+        self._stats_reply_handler(ev)
+
+    @set_ev_cls(ofp_event.EventOFPFlowStatsReply, MAIN_DISPATCHER)
+    def flow_stats_reply_handler(self, ev):
+        self._stats_reply_handler(ev)
+
+    @set_ev_cls(ofp_event.EventOFPStatsReply, MAIN_DISPATCHER)
+    def stats_reply_handler(self, ev):
+        # OF1.2 replies all the stats types with OFPStatsReply
+        if ev.msg.type == ofproto_v1_2.OFPST_PORT:
+            self._stats_reply_handler(ev)
+
+    @set_ev_cls(dpset.EventDP)
+    def dp_handler(self, ev):
+        if ev.enter:
+            return
+        dpid = ev.dp.id
+        for key in [key for key in self.port_series if key[0] == dpid]:
+            del self.port_series[key]
+        self.flow_series.pop(dpid, None)
+
+    @set_ev_cls(xflow_collector.EventInterfaceCounters)
+    def interface_counters_handler(self, ev):
+        now = time.time()
+        agent = ev.dpid if ev.dpid is not None else ev.exporter
+        for counters in ev.counters:
+            key = (agent, counters.ifIndex)
+            series = self.sflow_series.get(key)
+            if series is None:
+                series = timeseries.CounterSeries(PORT_FIELDS,
+                                                  CONF.stats_history)
+                self.sflow_series[key] = series
+            series.append(now, [
+                counters.ifInOctets, counters.ifOutOctets,
+                counters.ifInUcastPkts + counters.ifInMulticastPkts +
+                counters.ifInBroadcastPkts,
+                counters.ifOutUcastPkts + counters.ifOutMulticastPkts +
+                counters.ifOutBroadcastPkts,
+                counters.ifInDiscards, counters.ifOutDiscards])
+            self.sflow_speeds[key] = counters.ifSpeed
+
+    def _speed(self, dpid, port_no):
+        dp = self.dpset.get(dpid)
+        if dp is None:
+            return None
+        try:
+            port = self.dpset.get_port(dpid, port_no)
+        except ryu_exc.PortNotFound:
+            return None
+        return port_speed(dp.ofproto, port)
+
+    def port_rates(self, dpid, window=None):
+        """Return the dict of port_no -> rates of the ports of dpid."""
+        return dict((port_no, _port_rates(series,
+                                          self._speed(dpid, port_no), window))
+                    for (dpid_, port_no), series in self.port_series.items()
+                    if dpid_ == dpid)
+
+    def sflow_rates(self, window=None):
+        """Return the list of the rates of the sFlow interfaces."""
+        rates = []
+        for (agent, if_index), series in self.sflow_series.items():
+            entry = _port_rates(series, self.sflow_speeds.get(
+                (agent, if_index)), window)
+            entry.update({'agent': agent, 'if_index': if_index})
+            rates.append(entry)
+        return rates
+
+    def top_ports(self, n, by='tx_bytes', window=None):
+        """
+        Return the n ports and sFlow interfaces of the largest rate of
+        the field by.
+        """
+        entries = self.sflow_rates(window)
+        for (dpid, port_no), series in self.port_series.items():
+            entry = _port_rates(series, self._speed(dpid, port_no), window)
+            entry.update({'dpid': dpid, 'port_no': port_no})
+            entries.append(entry)
+        return heapq.nlargest(n, entries,
+                              key=lambda entry: entry['rates'][by] or 0)
+
+    def top_flows(self, n, window=None):
+        """Return the n flows of the largest byte rate."""
+        entries = []
+        for flows in self.flow_series.values():
+            for flow, series in flows.values():
+                entry = dict(flow)
+                entry['rates'] = dict((field, series.rate(field, window))
+                                      for field in FLOW_FIELDS)
+                entries.append(entry)
+        return heapq.nlargest(
+            n, entries, key=lambda entry: entry['rates']['byte_count'] or 0)
+
+
+class TrafficController(ControllerBase):
+    def __init__(self, req, link, data, **config):
+        super(TrafficController, self).__init__(req, link, data, **config)
+        self.aggregator = data['aggregator']
+
+    def _window(self, req):
+        window = req.GET.get('window')
+        if window is None:
+            # the last two samples
+            return 0
+        return float(window)
+
+    def _response(self, body):
+        return Response(content_type='application/json',
+                        body=json.dumps(body))
+
+    def ports(self, req, dpid, **_kwargs):
+        dpid = int(dpid)
+        if self.aggregator.dpset.get(dpid) is None:
+            return Response(status=404)
+        rates = self.aggregator.port_rates(dpid, self._window(req))
+        return self._response({str(dpid): rates})
+
+    def port(self, req, dpid, port, **_kwargs):
+        series = self.aggregator.port_series.get((int(dpid), int(port)))
+        if series is None:
+            return Response(status=404)
+        entry = _port_rates(series,
+                            self.aggregator._speed(int(dpid), int(port)),
+                            self._window(req))
+        entry['history'] = series.samples()
+        return self._response(entry)
+
+    def top_ports(self, req, **_kwargs):
+        n = int(req.GET.get('n', 10))
+        by = req.GET.get('by', 'tx_bytes')
+        if by not in PORT_FIELDS:
+            return Response(status=400)
+        return self._response(self.aggregator.top_ports(n, by,
+                                                        self._window(req)))
+
+    def top_flows(self, req, **_kwargs):
+        n = int(req.GET.get('n', 10))
+        return self._response(self.aggregator.top_flows(n, self._window(req)))
+
+    def sflow_interfaces(self, req, **_kwargs):
+        return self._response(self.aggregator.sflow_rates(self._window(req)))
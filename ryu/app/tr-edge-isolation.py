@@ -24,7 +24,7 @@ from ryu.app.rest_nw_id import NW_ID_UNKNOWN, NW_ID_EXTERNAL
 from ryu.app.rest_nw_id import NW_ID_PXE_CTRL, NW_ID_PXE, NW_ID_MGMT_CTRL, NW_ID_MGMT
 from ryu.base import app_manager
 from ryu.exception import MacAddressDuplicated, MacAddressNotFound
-from ryu.exception import PortUnknown
+from ryu.exception import PortUnknown, FlowVisorError
 from ryu.controller import dpset
 from ryu.controller import mac_to_network
 from ryu.controller import mac_to_port
@@ -64,6 +64,14 @@ class SimpleIsolation(app_manager.RyuApp):
         self.fv_cli = kwargs['fv_cli']
         self.port_bond = kwargs['port_bond']
         self.api_db = kwargs['api_db']
+        # The bonds belong to networks, and changes of the bonds discard
+        #   the flood sets cached by self.nw
+        self.port_bond.setNetworkObjHandle(self.nw)
+
+        if api_db.FLAGS.api_db_restore:
+            # Warm restart from the state saved by the API calls
+            self.api_db.restore(self.nw, self.mac2net, self.port_bond,
+                                self.fv_cli)
 
     @set_ev_cls(ofp_event.EventOFPSwitchFeatures, CONFIG_DISPATCHER)
     def switch_features_handler(self, ev):
@@ -115,8 +123,9 @@ class SimpleIsolation(app_manager.RyuApp):
             return []
 
         if out_bond_id:
-            # Choose output port based on round-robin
-            out_port = self.port_bond.get_out_port(out_bond_id)
+            # Choose output port by the hash of the flow
+            out_port = self.port_bond.get_out_port(
+                out_bond_id, port_bond.flow_key(msg.data))
 
             orig_in_port = msg.in_port
             # Prevent potential loopbacks if downstream ports not bonded in switch
@@ -167,28 +176,53 @@ class SimpleIsolation(app_manager.RyuApp):
         datapath.send_packet_out(msg.buffer_id, msg.in_port, actions)
 
     # Given an input port, datapath ID, and network ID, return
-    #   a list of valid output ports
-    def _get_all_out_ports(self, dpid, in_port, nw_id, allow_other_nw_id=None):
+    #   the output ports which don't belong in a bond, and the bonds
+    #   to output to
+    def _get_flood_set(self, dpid, in_port, nw_id, allow_other_nw_id=None):
         in_bond_id = self.port_bond.get_bond_id(dpid, in_port)
         # Retrieve all output ports regardless of bond
-        out_port_list = set(self.nw.filter_ports(dpid, in_port, nw_id, allow_other_nw_id))
+        out_ports = set(self.nw.filter_ports(dpid, in_port, nw_id,
+                                             allow_other_nw_id))
 
         # Remove all ports that belong in a bond
         bond_list = self.port_bond.list_bonds(dpid, nw_id)
         if allow_other_nw_id:
             bond_list.extend(self.port_bond.list_bonds(dpid, allow_other_nw_id))
 
+        out_bonds = []
         for bond_id in bond_list:
-            bond_ports = set(self.port_bond.ports_in_bond(bond_id))
-            out_port_list -= bond_ports
+            out_ports -= set(self.port_bond.ports_in_bond(bond_id))
 
-            # Re-add one port for each bond (Except source bond, if source port is bonded)
+            # Except source bond, if source port is bonded
             if in_bond_id != bond_id:
-                out_port = self.port_bond.get_out_port(bond_id)
-                if out_port:
-                    out_port_list.add(out_port)
+                out_bonds.append(bond_id)
+
+        return tuple(out_ports), tuple(out_bonds)
 
-        return list(out_port_list)
+    # Given an input port, datapath ID, and network ID, return
+    #   a list of valid output ports
+    # The port of each bond is picked by the flow key if given
+    # The flood set is cached until the ports or the bonds of the
+    #   datapath change
+    def _get_all_out_ports(self, dpid, in_port, nw_id, allow_other_nw_id=None,
+                           key=None):
+        cache = self.nw.get_flood_cache(dpid)
+        cache_key = ('bonds', in_port, nw_id, allow_other_nw_id)
+        flood_set = cache.get(cache_key)
+        if flood_set is None:
+            flood_set = self._get_flood_set(dpid, in_port, nw_id,
+                                            allow_other_nw_id)
+            cache[cache_key] = flood_set
+        out_ports, out_bonds = flood_set
+
+        out_port_list = list(out_ports)
+        # Add one port for each bond
+        for bond_id in out_bonds:
+            out_port = self.port_bond.get_out_port(bond_id, key)
+            if out_port:
+                out_port_list.append(out_port)
+
+        return out_port_list
 
     def _flood_to_nw_id(self, msg, src, dst, nw_id):
         LOG.info("flood to nw id %s", nw_id)
@@ -200,8 +234,9 @@ class SimpleIsolation(app_manager.RyuApp):
                   haddr_to_str(src), haddr_to_str(dst),
                   self.nw.dpids.get(datapath.id, {}).items())
 
+        key = port_bond.flow_key(msg.data)
         out_port_list = self._get_all_out_ports(datapath.id, msg.in_port,
-                                                    nw_id, NW_ID_EXTERNAL)
+                                                    nw_id, NW_ID_EXTERNAL, key)
         LOG.debug("out port list %s", out_port_list)
 
         for port_no in out_port_list:
@@ -340,28 +375,28 @@ class SimpleIsolation(app_manager.RyuApp):
                 #   packets from reaching non-source switches before rules can be properly
                 #   installed on them, which will trigger duplicate rules to be isntalled.
                 # Need to install mac for all EXTERNAL ports throughout network
-                for (dpid, port) in self.nw.list_ports(NW_ID_EXTERNAL):
-                    if (dpid == datapath.id):
+                external = [(dpid, port) for (dpid, port)
+                            in self.nw.list_ports(NW_ID_EXTERNAL)
+                            if dpid != datapath.id]
+
+                # Then install rule on source switch
+                # Each step adds its flowspaces in one FlowVisor call
+                for flowspaces in (external, [(datapath.id, msg.in_port)]):
+                    try:
+                        ids = self.fv_cli.addFlowSpaces(
+                            sliceName, [(dpid, port, haddr_to_str(src))
+                                        for (dpid, port) in flowspaces])
+                    except FlowVisorError, e:
+                        # Error, how to handle?
+                        LOG.debug("Error while installing FlowSpace for "
+                                  "slice %s: (%s, %s): %s", sliceName,
+                                  flowspaces, haddr_to_str(src), e)
                         continue
 
-                    ret = self.fv_cli.addFlowSpace(sliceName, dpid, port, haddr_to_str(src))
-                    if (ret.find("success") == -1):
-                        # Error, how to handle?
-                        LOG.debug("Error while installing FlowSpace for slice %s: (%s, %s, %s)",\
-                                    sliceName, dpid, str(port), haddr_to_str(src))
-                    else:
-                        self.fv_cli.addFlowSpaceID(dpid, port, src, int(ret[9:]))
-                        self.api_db.addFlowSpaceID(hex(dpid), port, haddr_to_str(src), int(ret[9:]))
-
-                # Now install rule on source switch
-                ret = self.fv_cli.addFlowSpace(sliceName, datapath.id, msg.in_port, haddr_to_str(src))
-                if (ret.find("success") == -1):
-                    # Error, how to handle?
-                    LOG.debug("Error while installing FlowSpace for slice %s: (%s, %s, %s)",\
-                                sliceName, dpid, str(port), haddr_to_str(src))
-                else:
-                    self.fv_cli.addFlowSpaceID(datapath.id, msg.in_port, src, int(ret[9:]))
-                    self.api_db.addFlowSpaceID(hex(datapath.id), msg.in_port, haddr_to_str(src), int(ret[9:]))
+                    for (dpid, port), id in zip(flowspaces, ids):
+                        self.fv_cli.addFlowSpaceID(dpid, port, src, id)
+                        self.api_db.addFlowSpaceID(hex(dpid), port,
+                                                   haddr_to_str(src), id)
 
             self._drop_packet(msg)
             return
@@ -567,10 +602,13 @@ class SimpleIsolation(app_manager.RyuApp):
 
         actions = []
         if broadcast or out_port is None:
-            out_port_list = self._get_all_out_ports(datapath.id, in_port, NW_ID_PXE_CTRL)
+            key = port_bond.flow_key(msg.data)
+            out_port_list = self._get_all_out_ports(
+                datapath.id, in_port, NW_ID_PXE_CTRL, key=key)
 
             if src_nw_id == NW_ID_PXE_CTRL:
-                out_port_list.extend(self._get_all_out_ports(datapath.id, in_port, NW_ID_PXE))
+                out_port_list.extend(self._get_all_out_ports(
+                    datapath.id, in_port, NW_ID_PXE, key=key))
 
             for port in out_port_list:
                 actions.append(datapath.ofproto_parser.OFPActionOutput(port))
@@ -159,13 +159,14 @@ class TunnelDP(object):
                              dpid_lib.dpid_to_str(remote_dpid),
                              self.tunnel_ip, remote_ip)
             # recreate tunnel ports.
-            for tp in list(self.tunnels.values()):
-                if tp.remote_dpid is None:
-                    # TODO:XXX
-                    continue
-
-                self._del_tunnel_port(tp.port_no, tp.local_ip, tp.remote_ip)
-
+            # TODO:XXX tunnel ports whose remote_dpid is unknown
+            tps = [tp for tp in self.tunnels.values()
+                   if tp.remote_dpid is not None]
+            with self.ovs_bridge.transaction():
+                for tp in tps:
+                    self._del_tunnel_port(tp.port_no, tp.local_ip,
+                                          tp.remote_ip)
+            for tp in tps:
                 new_tp = self._add_tunnel_port(tp.remote_dpid, tp.remote_ip)
                 self._api_update(new_tp.ofport, tp.remote_dpid)
             return
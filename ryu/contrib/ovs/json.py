@@ -12,6 +12,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from __future__ import absolute_import
+
+import json
 import re
 import StringIO
 import sys
@@ -584,3 +587,168 @@ class Parser(object):
             return self.stack.pop()
         else:
             return self.error
+
+
+def _reject_constant(name):
+    raise ValueError("invalid keyword '%s'" % name)
+
+
+class FastParser(object):
+    """Drop-in replacement of Parser for streams of JSON objects or arrays,
+    such as JSON-RPC.
+
+    feed() only looks for the end of the top-level value, and finish()
+    decodes the framed text at once by the standard json module, which has
+    a C accelerator.  Input which the fast path can't handle is passed to
+    Parser so that the result and error messages are the same."""
+
+    __struct_re = re.compile(r'[][{}"]')
+    __escape_re = re.compile(r'["\\]')
+    __string_re = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+    __string_tail_re = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+    __non_bracket_re = re.compile(r'[^][{}]+')
+    __pair_re = re.compile(r'\{\}|\[\]')
+
+    def __init__(self):
+        self.chunks = []
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.done = False
+        self.fallback = None
+
+    def feed(self, s):
+        if self.fallback is not None:
+            return self.fallback.feed(s)
+        if self.done or not s:
+            return 0
+
+        i = 0
+        n = len(s)
+        if not self.chunks:
+            i = n - len(s.lstrip(' \t\n\r'))
+            if i == n:
+                return n
+            if s[i] not in '{[':
+                self.fallback = Parser()
+                return i + self.fallback.feed(s[i:])
+        start = i
+
+        if self.escape:
+            self.escape = False
+            i += 1
+        if self.in_string:
+            i = self.__skip_string_tail(s, i)
+        if not self.in_string and not self.__skip(s[i:]):
+            i = self.__scan(s, i)
+        else:
+            i = n
+
+        self.chunks.append(s[start:i])
+        return i
+
+    def __skip_string_tail(self, s, i):
+        m = self.__string_tail_re.match(s, i)
+        if m is not None:
+            self.in_string = False
+            return m.end()
+        self.__set_escape(s[i:])
+        return len(s)
+
+    def __set_escape(self, tail):
+        # Whether the chunk ends in the middle of an escape sequence.
+        backslashes = len(tail) - len(tail.rstrip('\\'))
+        self.escape = backslashes % 2 == 1
+
+    def __skip(self, s):
+        # Consume whole s at once if the top-level value can't end in it,
+        # which is the case but for the last chunk of a large message.
+        # Strings are removed first as they may contain brackets.
+        stripped = self.__string_re.sub('', s)
+        quote = stripped.find('"')
+        if quote >= 0:
+            # a string continues to the next chunk
+            stripped = stripped[:quote]
+        # Cancel out the matching brackets.  What remains are the closing
+        # brackets which lower the depth and the opening ones left open.
+        brackets = self.__non_bracket_re.sub('', stripped)
+        count = 1
+        while count:
+            brackets, count = self.__pair_re.subn('', brackets)
+        closes = brackets.count('}') + brackets.count(']')
+        if self.depth - closes <= 0:
+            return False
+
+        self.depth += len(brackets) - 2 * closes
+        if quote >= 0:
+            self.in_string = True
+            self.__set_escape(s)
+        return True
+
+    def __scan(self, s, i):
+        n = len(s)
+        depth = self.depth
+        in_string = self.in_string
+        while True:
+            if in_string:
+                m = self.__escape_re.search(s, i)
+                if m is None:
+                    i = n
+                    break
+                i = m.end()
+                if m.group() == '\\':
+                    i += 1
+                    if i > n:
+                        i = n
+                        self.escape = True
+                        break
+                else:
+                    in_string = False
+            else:
+                m = self.__struct_re.search(s, i)
+                if m is None:
+                    i = n
+                    break
+                i = m.end()
+                c = m.group()
+                if c == '"':
+                    in_string = True
+                elif c in '{[':
+                    depth += 1
+                else:
+                    depth -= 1
+                    if depth == 0:
+                        self.done = True
+                        break
+
+        self.depth = depth
+        self.in_string = in_string
+        return i
+
+    def is_done(self):
+        if self.fallback is not None:
+            return self.fallback.is_done()
+        return self.done
+
+    def finish(self):
+        if self.fallback is not None:
+            return self.fallback.finish()
+
+        s = ''.join(self.chunks)
+        self.chunks = []
+        if self.done:
+            try:
+                return json.loads(s, parse_constant=_reject_constant)
+            except ValueError:
+                pass
+
+        # let Parser report the error
+        p = Parser()
+        p.feed(s)
+        return p.finish()
+
+
+def to_string_fast(obj):
+    """Same as to_string() without pretty printing and key sorting,
+    encoded by the standard json module."""
+    return json.dumps(obj, separators=(',', ':'))
@@ -26,6 +26,10 @@ import ovs.vlog
 EOF = ovs.util.EOF
 vlog = ovs.vlog.Vlog("jsonrpc")
 
+# Frame and decode messages by ovs.json.FastParser and encode them by the
+# standard json module.  Set to False to use the pure Python codec.
+FAST_CODEC = True
+
 
 class Message(object):
     T_REQUEST = 0               # Request.
@@ -226,7 +230,9 @@ class Connection(object):
         return self.received_bytes
 
     def __log_msg(self, title, msg):
-        vlog.dbg("%s: %s %s" % (self.name, title, msg))
+        # formatting a large message costs as much as parsing it
+        if vlog.is_enabled("dbg"):
+            vlog.dbg("%s: %s %s" % (self.name, title, msg))
 
     def send(self, msg):
         if self.status:
@@ -235,7 +241,10 @@ class Connection(object):
         self.__log_msg("send", msg)
 
         was_empty = len(self.output) == 0
-        self.output += ovs.json.to_string(msg.to_json())
+        if FAST_CODEC:
+            self.output += ovs.json.to_string_fast(msg.to_json())
+        else:
+            self.output += ovs.json.to_string(msg.to_json())
         if was_empty:
             self.run()
         return self.status
@@ -278,7 +287,10 @@ class Connection(object):
                     self.received_bytes += len(data)
             else:
                 if self.parser is None:
-                    self.parser = ovs.json.Parser()
+                    if FAST_CODEC:
+                        self.parser = ovs.json.FastParser()
+                    else:
+                        self.parser = ovs.json.Parser()
                 self.input = self.input[self.parser.feed(self.input):]
                 if self.parser.is_done():
                     msg = self.__process_msg()
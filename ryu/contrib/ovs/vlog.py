@@ -72,6 +72,18 @@ class Vlog:
             if level >= f_level:
                 logging.getLogger(f).log(level, message, **kwargs)
 
+    def is_enabled(self, level):
+        """Returns True if a message at 'level' would be logged, so that
+        callers can skip building expensive messages."""
+        if not Vlog.__inited:
+            return False
+
+        level = LEVELS.get(level.lower(), logging.DEBUG)
+        for f_level in Vlog.__mfl[self.name].itervalues():
+            if level >= LEVELS.get(f_level, logging.CRITICAL):
+                return True
+        return False
+
     def emer(self, message, **kwargs):
         self.__log("EMER", message, **kwargs)
 
@@ -16,374 +16,448 @@
 # limitations under the License.
 
 import logging
+import time
+import gevent
+import gevent.event
 import gflags
-import migrate.changeset
+
+try:
+    from gevent.lock import Semaphore
+except ImportError:
+    from gevent.coros import Semaphore  # gevent < 1.0
+
+try:
+    from gevent.threadpool import ThreadPool
+except ImportError:
+    ThreadPool = None   # gevent < 1.0: the batches are written in the hub
 
 from ryu.exception import NetworkNotFound, NetworkAlreadyExist
 from ryu.exception import PortAlreadyExist, PortNotFound
 from ryu.exception import MacAddressDuplicated, MacAddressNotFound
 from ryu.exception import BondPortAlreadyBonded, BondAlreadyExist, BondPortNotFound, BondNotFound
 from ryu.exception import FlowSpaceIDAlreadyExist, NetworkAlreadyAssigned
+from ryu.exception import RyuException
 from ryu.app.rest_nw_id import NW_ID_EXTERNAL
-from sqlalchemy.ext.sqlsoup import SqlSoup
-from sqlalchemy import create_engine, MetaData
-from sqlalchemy import Table, Column, Integer, String
-from sqlalchemy import and_
-import sqlalchemy.exc as sqlexc
+from ryu.lib.mac import haddr_to_bin
+from ryu.controller import api_db_store
 
 LOG = logging.getLogger('ryu.controller.api_db')
 
 FLAGS = gflags.FLAGS
+gflags.DEFINE_enum('api_db_store', 'sql', ['sql', 'log'],
+                   'Where the API calls are saved: the SQL database of '
+                   'api_db_url, or the local files in api_db_path')
 gflags.DEFINE_string('api_db_url', 'mysql://root:iheartdatabases@'+ \
                         'localhost/ryu?charset=utf8', 'Ryu Database URL')
+gflags.DEFINE_string('api_db_path', '/var/lib/ryu/api_db',
+                     'Directory of the log and snapshot of the local store')
+gflags.DEFINE_enum('api_db_fsync', api_db_store.FSYNC_ALWAYS,
+                   api_db_store.FSYNC_POLICIES,
+                   'When the local store syncs its log to the disk: '
+                   'after each write, at most once per '
+                   'api_db_fsync_interval, or never')
+gflags.DEFINE_float('api_db_fsync_interval', 1.0,
+                    'Seconds between syncs of the local store')
+gflags.DEFINE_integer('api_db_compact_size', 16 * 1024 * 1024,
+                      'Bytes of log after which the local store writes '
+                      'a new snapshot')
+gflags.DEFINE_float('api_db_flush_interval', 0.05,
+                    'Seconds to gather API calls before writing them')
+gflags.DEFINE_integer('api_db_batch_size', 1000,
+                      'Max rows written in a database transaction')
+gflags.DEFINE_integer('api_db_max_pending', 100000,
+                      'Max rows waiting to be written before API calls '
+                      'wait for the database')
+gflags.DEFINE_float('api_db_retry_interval', 1.0,
+                    'Seconds to wait before retrying a failed write')
+gflags.DEFINE_boolean('api_db_restore', False,
+                      'Warm restart: rebuild the state of the controller '
+                      'from the database at start up')
+
+
+# The dpids are saved as hex strings: without the leading zeros by the
+#   port and bond calls, e.g. '1', or '' for 0, and as hex(dpid), e.g.
+#   '0x1L', by the flowspace calls
+def _dpid_to_int(dpid):
+    return int(dpid.rstrip('L') or '0', 16)
+
 
 # Save API calls that may affect the state of the controller
 # Can be re-loaded if controller crashes
+#
+# The database is mirrored in memory, which serves the getters and the
+# checks of the API calls. The changed rows are journaled and written
+# behind in batched transactions by a worker thread, so that the API
+# calls don't block the hub on the database driver.
+# Call flush() to wait until the journal is written.
+#
+# The database is a store of api_db_store: SQLStore for a SQL database
+# such as MySQL, or LogStore for the local files, which needs no database
+# server.
 class API_DB(object):
     def __init__(self):
-        # Create any tables that don't already exist
-        self.createTables()
-
-        self.db = SqlSoup(FLAGS.api_db_url)
-        self.db_nets = self.db.networks
-        self.db_ports = self.db.ports
-        self.db_macs = self.db.macs
-        self.db_bonds = self.db.bonds
-        self.db_flowspace = self.db.flowspace
-        self.db_net2slice = self.db.delegated_nets
-
-    def createTables(self):
-        engine = create_engine(FLAGS.api_db_url)
-        data = MetaData(bind=engine)
-        data.reflect()
-        existing_tables = data.tables.keys()
-
-        # Dictionary for database description
-        # Format: {Table object /w primary Column: [list of extra Column objects]}
-        db_schema = {
-            Table('networks', data,
-                    Column('network_id', String(255), primary_key=True), keep_existing=True) :
-                [],
-
-            Table('ports', data,
-                    Column('id', Integer, primary_key=True, autoincrement=True), keep_existing=True) :
-                [   Column('port_num', Integer),
-                    Column('datapath_id', String(255)),
-                    Column('network_id', String(255)),
-                    Column('bond_id', String(255))  ],
-
-            Table('macs', data,
-                    Column('mac_address', String(255), primary_key=True), keep_existing=True) :
-                [   Column('network_id', String(255))   ],
-
-            Table('bonds', data,
-                    Column('bond_id', String(255), primary_key=True), keep_existing=True) :
-                [   Column('datapath_id', String(255)),
-                    Column('network_id', String(255))   ],
-
-            Table('flowspace', data,
-                    Column('id', Integer, primary_key=True), keep_existing=True) :
-                [   Column('datapath_id', String(255)),
-                    Column('port_num', Integer),
-                    Column('mac_address', String(255))  ],
-
-            Table('delegated_nets', data,
-                    Column('network_id', String(255), primary_key=True), keep_existing=True) :
-                [   Column('slice', String(255))    ],
-        }
-
-        for tab, colList in db_schema.items():
-            # Create table if it doesn't exist
-            if tab.name not in existing_tables:
-                tab.create()
-
-            # Check columns and update if necessary
-            for col in colList:
-                if col.name not in tab.c.keys():
-                    col.create(tab, populate_default=True)
-
-    def checkConnection(self):
-        try:
-            # Do a simple query
-            self.db.execute("show databases")
-        except sqlexc.OperationalError:
-            # Connection was interrupted for some reason, try restarting session
-            self.db.session.close()
-            self.db.session.rollback()
-
-            # Try simple query again
-            self.db.execute("show databases")
-        except:
-            # Unknown exception, raise
-            raise
+        if FLAGS.api_db_store == 'log':
+            self.store = api_db_store.LogStore(
+                FLAGS.api_db_path, FLAGS.api_db_fsync,
+                FLAGS.api_db_fsync_interval, FLAGS.api_db_compact_size)
+        else:
+            self.store = api_db_store.SQLStore(FLAGS.api_db_url)
+
+        # In-memory mirror of the tables
+        self.networks = set()   # network_id
+        self.ports = {}         # (dpid, port_num) -> [network_id, bond_id]
+        self.macs = {}          # mac -> network_id
+        self.bonds = {}         # bond_id -> (dpid, network_id)
+        self.flowspace = {}     # id -> (dpid, port_num, mac)
+        self.net2slice = {}     # network_id -> slice
+        self.loadTables()
+
+        # Journal of the rows to write: (table, key) -> row, or None to
+        #   delete the row. Only the last change of a row is written, and
+        #   the rows are independent, so they can be written in any order.
+        self.pending = {}
+        self._dirty = gevent.event.Event()
+        self._lock = Semaphore()
+        self._writer = ThreadPool(1) if ThreadPool is not None else None
+        self._flusher = gevent.spawn(self._flush_loop)
+
+    # Loads the tables of the store into the mirror
+    def loadTables(self):
+        start = time.time()
+
+        for table, key, row in self.store.load():
+            if table == 'networks':
+                self.networks.add(key)
+            elif table == 'ports':
+                dpid, port_num = key
+                self.ports[(dpid, port_num)] = [row['network_id'],
+                                                row['bond_id']]
+            elif table == 'macs':
+                self.macs[key] = row['network_id']
+            elif table == 'bonds':
+                self.bonds[key] = (row['datapath_id'], row['network_id'])
+            elif table == 'flowspace':
+                self.flowspace[key] = (row['datapath_id'], row['port_num'],
+                                       row['mac_address'])
+            elif table == 'delegated_nets':
+                self.net2slice[key] = row['slice']
+
+        LOG.info('loaded %d networks, %d ports, %d macs, %d bonds and '
+                 '%d flowspaces in %.3f seconds', len(self.networks),
+                 len(self.ports), len(self.macs), len(self.bonds),
+                 len(self.flowspace), time.time() - start)
+
+    # Rebuilds the state of the controller from the mirror in one pass,
+    #   for a warm restart, instead of replaying the API calls
+    # The objects not given are skipped
+    # Returns the seconds taken
+    def restore(self, nw=None, mac2net=None, port_bond=None, fv_cli=None):
+        start = time.time()
+
+        if nw:
+            for network_id in self.networks:
+                nw.update_network(network_id)
+            for (dpid, port_num), (network_id, _bond) in self.ports.items():
+                try:
+                    nw.update_port(network_id, _dpid_to_int(dpid), port_num)
+                except RyuException, e:
+                    LOG.warn('port (%s, %s) not restored: %s',
+                             dpid, port_num, e)
+
+        if mac2net:
+            mac2net.add_macs((haddr_to_bin(mac), network_id)
+                             for mac, network_id in self.macs.iteritems())
+
+        if port_bond:
+            for bond_id, (dpid, network_id) in self.bonds.items():
+                port_bond.create_bond(_dpid_to_int(dpid), network_id, bond_id)
+            for (dpid, port_num), (_nw, bond_id) in self.ports.items():
+                if bond_id not in self.bonds:
+                    continue
+                try:
+                    port_bond.add_port(bond_id, port_num)
+                except RyuException, e:
+                    LOG.warn('port (%s, %s) of bond %s not restored: %s',
+                             dpid, port_num, bond_id, e)
+
+        if fv_cli:
+            for id, (dpid, port_num, mac) in self.flowspace.items():
+                fv_cli.addFlowSpaceID(_dpid_to_int(dpid), port_num,
+                                      haddr_to_bin(mac), id)
+            for network_id, sliceName in self.net2slice.items():
+                fv_cli.slice2nw_add(sliceName, network_id)
+
+        elapsed = time.time() - start
+        LOG.info('restored %d networks, %d ports, %d macs, %d bonds and '
+                 '%d flowspaces in %.3f seconds', len(self.networks),
+                 len(self.ports), len(self.macs), len(self.bonds),
+                 len(self.flowspace), elapsed)
+        return elapsed
+
+    ###########################################################################
+    # Functions for writing the journal behind
+    ###########################################################################
+    def _journal(self, table, key, row=None):
+        self.pending[(table, key)] = row
+        self._dirty.set()
+
+        if len(self.pending) >= FLAGS.api_db_max_pending:
+            # The database doesn't keep up, wait for it
+            # The mirror is already changed, so the API call mustn't fail
+            #   when the database is down: the row stays in the journal,
+            #   which _flush_loop retries, and the journal grows past
+            #   api_db_max_pending until the database is back
+            try:
+                self.flush()
+            except Exception, e:
+                LOG.warn('database down with %d rows pending: %s',
+                         len(self.pending), e)
+
+    def _journal_port(self, key):
+        network_id, bond_id = self.ports[key]
+        self._journal('ports', key, {'network_id': network_id,
+                                     'bond_id': bond_id})
+
+    def _flush_loop(self):
+        while True:
+            self._dirty.wait()
+            self._dirty.clear()
+            # Gather a burst of API calls into the batch
+            gevent.sleep(FLAGS.api_db_flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                LOG.exception('failed to write %d rows to the database',
+                              len(self.pending))
+                self._dirty.set()
+                gevent.sleep(FLAGS.api_db_retry_interval)
+
+    def flush(self):
+        """Write the journal to the database and wait for it."""
+        with self._lock:
+            while self.pending:
+                batch = []
+                while self.pending and len(batch) < FLAGS.api_db_batch_size:
+                    batch.append(self.pending.popitem())
+                try:
+                    if self._writer is not None:
+                        self._writer.apply(self.store.write, (batch,))
+                    else:
+                        self.store.write(batch)
+                except:
+                    # Put the batch back unless the rows changed since
+                    for key, row in batch:
+                        if key not in self.pending:
+                            self.pending[key] = row
+                    raise
+
+    def close(self):
+        self._flusher.kill()
+        self.flush()
+        self.store.close()
 
     ###########################################################################
     # Functions for retrieving database contents
     ###########################################################################
     def getNetworks(self):
-        self.checkConnection()
-        net_list = []
-        for net in self.db_nets.all():
-            net_list.append(net.network_id)
-
-        return net_list
+        return list(self.networks)
 
     def getPorts(self):
-        self.checkConnection()
         port_list = []
-        for port in self.db_ports.all():
-            port_list.append((port.network_id, port.datapath_id, port.port_num, port.bond_id))
+        for (dpid, port_num), (network_id, bond_id) in self.ports.items():
+            port_list.append((network_id, dpid, port_num, bond_id))
 
         return port_list
 
     def getMACs(self):
-        self.checkConnection()
         mac_list = []
-        for mac in self.db_macs.all():
-            mac_list.append((mac.network_id, mac.mac_address))
+        for mac, network_id in self.macs.items():
+            mac_list.append((network_id, mac))
 
         return mac_list
 
     def getBonds(self):
-        self.checkConnection()
         bond_list = []
-        for bond in self.db_bonds.all():
-            bond_list.append((bond.bond_id, bond.datapath_id, bond.network_id))
+        for bond_id, (dpid, network_id) in self.bonds.items():
+            bond_list.append((bond_id, dpid, network_id))
 
         return bond_list
 
     def getFlowSpace(self):
-        self.checkConnection()
         flowspace_list = []
-        for flowspace in self.db_flowspace.all():
-            flowspace_list.append((flowspace.id, flowspace.datapath_id, flowspace.port_num, flowspace.mac_address))
+        for id, (dpid, port_num, mac) in self.flowspace.items():
+            flowspace_list.append((id, dpid, port_num, mac))
 
         return flowspace_list
 
     def getDelegatedNets(self):
-        self.checkConnection()
-        net2slice_list = []
-        for net2slice in self.db_net2slice.all():
-            net2slice_list.append((net2slice.network_id, net2slice.slice))
-
-        return net2slice_list
+        return self.net2slice.items()
 
     ###########################################################################
     # Functions for storing API calls into the database
     ###########################################################################
     def createNetwork(self, network_id, update=False):
-        self.checkConnection()
-        if not self.db_nets.get(network_id):
-            self.db_nets.insert(network_id=network_id)
+        if network_id not in self.networks:
+            self.networks.add(network_id)
+            self._journal('networks', network_id, {})
         else:
             if not update:
                 raise NetworkAlreadyExist(network_id=network_id)
 
-        self.db.commit()
-
     def updateNetwork(self, network_id):
         self.createNetwork(network_id, True)
 
     def deleteNetwork(self, network_id):
-        self.checkConnection()
-        entry = self.db_nets.get(network_id)
-        if entry:
-            self.db.delete(entry)
+        if network_id in self.networks:
+            self.networks.remove(network_id)
+            self._journal('networks', network_id)
         else:
             raise NetworkNotFound(network_id=network_id)
 
-        self.db.commit()
-
     def addMAC(self, network_id, mac):
-        self.checkConnection()
-        entry = self.db_macs.get(mac)
         # Check for existing entry
-        if not entry:
-            self.db_macs.insert(network_id=network_id, mac_address=mac)
-        else:
-            if entry.network_id == network_id or network_id == NW_ID_EXTERNAL:
+        if mac in self.macs:
+            old_network_id = self.macs[mac]
+            if old_network_id == network_id or network_id == NW_ID_EXTERNAL:
                 # If old network and new network the same, do nothing
                 # Or if trying to change an existing net association to NW_ID_EXTERNAL, do nothing
                 return
-            elif entry.network_id == NW_ID_EXTERNAL:
-                # Allow changing from NW_ID_EXTERNAL to a known network UUID
-                entry.network_id = network_id
-            else:
+            elif old_network_id != NW_ID_EXTERNAL:
                 raise MacAddressDuplicated(mac=mac)
+            # Allow changing from NW_ID_EXTERNAL to a known network UUID
 
-        try:
-            self.db.commit()
-        except sqlexc.IntegrityError:
-            # Most likely due to race condition between setting DB change
-            # and packet arriving at next switch triggering a DB read
-            self.db.session.rollback()
+        self.macs[mac] = network_id
+        self._journal('macs', mac, {'network_id': network_id})
 
     def delMAC(self, mac):
-        self.checkConnection()
-        entry = self.db_macs.get(mac)
-        if entry:
-            self.db.delete(entry)
+        if mac in self.macs:
+            del self.macs[mac]
+            self._journal('macs', mac)
         else:
             raise MacAddressNotFound(mac=mac)
 
-        self.db.commit()
-
     def createPort(self, network_id, dpid, port_num, update=False):
-        self.checkConnection()
         # Check for existing entry
         dpid = dpid.lstrip('0')
-        params = and_(self.db_ports.datapath_id==dpid,
-                        self.db_ports.port_num==port_num)
-        old_entry = self.db_ports.filter(params).first()
+        key = (dpid, int(port_num))
+        port = self.ports.get(key)
 
-        if not old_entry:
+        if not port:
             # If updating but didn't locate existing entry, raise exception?
             # For now, just insert the entry and return success
-            self.db_ports.insert(network_id=network_id,
-                                    datapath_id=dpid, port_num=port_num)
+            self.ports[key] = [network_id, None]
         else:
             if update:
-                old_entry.network_id = network_id
+                port[0] = network_id
             else:
                 # Entry already exists for (dpid,port) <=> network
                 raise PortAlreadyExist(network_id=network_id,
                                         dpid=dpid, port=port_num)
 
-        self.db.commit()
+        self._journal_port(key)
 
     def updatePort(self, network_id, dpid, port_num):
         self.createPort(network_id, dpid, port_num, True)
 
     def deletePort(self, network_id, dpid, port_num):
-        self.checkConnection()
         dpid = dpid.lstrip('0')
-        params = and_(self.db_ports.datapath_id==dpid,
-                        self.db_ports.port_num==port_num)
-        entry = self.db_ports.filter(params).first()
+        key = (dpid, int(port_num))
 
-        if entry:
-            self.db.delete(entry)
+        if key in self.ports:
+            del self.ports[key]
+            self._journal('ports', key)
         else:
             raise PortNotFound(network_id=network_id,
                                 dpid=dpid, port=port_num)
 
-        self.db.commit()
-
     def createBond(self, bond_id, dpid, network_id):
-        self.checkConnection()
         # Check for existing entry
         dpid = dpid.lstrip('0')
-        if not self.db_bonds.get(bond_id):
-            self.db_bonds.insert(bond_id=bond_id, datapath_id=dpid, network_id=network_id)
+        if bond_id not in self.bonds:
+            self.bonds[bond_id] = (dpid, network_id)
+            self._journal('bonds', bond_id, {'datapath_id': dpid,
+                                             'network_id': network_id})
         else:
             raise BondAlreadyExist(bond_id=bond_id)
 
-        self.db.commit()
-
     def deleteBond(self, bond_id):
-        self.checkConnection()
-        entry = self.db_bonds.get(bond_id)
-
-        if entry:
-            self.db.delete(entry)
-        else:
-            # Do nothing
-            pass
+        if bond_id in self.bonds:
+            del self.bonds[bond_id]
+            self._journal('bonds', bond_id)
 
         # Delete any ports currently bonded to the bond_id
-        for port in self.db_ports.all():
-            if port.bond_id == bond_id:
-                port.bond_id = None
-
-        self.db.commit()
+        for key, port in self.ports.items():
+            if port[1] == bond_id:
+                port[1] = None
+                self._journal_port(key)
 
     def addPort_bond(self, bond_id, port_num):
-        self.checkConnection()
-        bondEntry = self.db_bonds.get(bond_id)
-        if bondEntry:
-            dpid = bondEntry.datapath_id
-            network_id = bondEntry.network_id
+        if bond_id in self.bonds:
+            dpid, network_id = self.bonds[bond_id]
         else:
             raise BondNotFound(bond_id=bond_id)
 
-        params = and_(self.db_ports.datapath_id==dpid,
-                        self.db_ports.network_id==network_id,
-                        self.db_ports.port_num==port_num)
-        entry = self.db_ports.filter(params).first()
+        key = (dpid, int(port_num))
+        port = self.ports.get(key)
 
-        if entry:
+        if port and port[0] == network_id:
             # Check for existing entry
-            old_bond_id = entry.bond_id
+            old_bond_id = port[1]
             if not old_bond_id:
-                entry.bond_id = bond_id
+                port[1] = bond_id
             else:
                 raise BondPortAlreadyBonded(port=port_num, bond_id=old_bond_id)
         else:
             raise PortNotFound(network_id=network_id,
                                 dpid=dpid, port=port_num)
 
-        self.db.commit()
+        self._journal_port(key)
 
     def deletePort_bond(self, bond_id, port_num):
-        self.checkConnection()
-        bondEntry = self.db_bonds.get(bond_id)
-        if bondEntry:
-            dpid = bondEntry.datapath_id
+        if bond_id in self.bonds:
+            dpid = self.bonds[bond_id][0]
         else:
             raise BondNotFound(bond_id=bond_id)
 
-        params = and_(self.db_ports.datapath_id==dpid,
-                        self.db_ports.port_num==port_num,
-                        self.db_ports.bond_id==bond_id)
-        entry = self.db_ports.filter(params).first()
+        key = (dpid, int(port_num))
+        port = self.ports.get(key)
 
-        if entry:
-            entry.bond_id = None
+        if port and port[1] == bond_id:
+            port[1] = None
         else:
             raise BondPortNotFound(port=port_num, bond_id=bond_id)
 
-        self.db.commit()
+        self._journal_port(key)
 
     def addFlowSpaceID(self, dpid, port_num, mac, id):
-        self.checkConnection()
-        entry = self.db_flowspace.get(id)
-        if not entry:
-            self.db_flowspace.insert(id=id, datapath_id=dpid, port_num=port_num, mac_address=mac)
+        if id not in self.flowspace:
+            self.flowspace[id] = (dpid, port_num, mac)
+            self._journal('flowspace', id, {'datapath_id': dpid,
+                                            'port_num': port_num,
+                                            'mac_address': mac})
         else:
             raise FlowSpaceIDAlreadyExist(flowspace_id=id)
 
-        self.db.commit()
-
     def delFlowSpaceID(self, id):
-        self.checkConnection()
-        entry = self.db_flowspace.get(id)
-        if entry:
-            self.db.delete(entry)
+        if id in self.flowspace:
+            del self.flowspace[id]
+            self._journal('flowspace', id)
         else:
             # Not found, raise exception?
             pass
 
-        self.db.commit()
-
     def assignNetToSlice(self, sliceName, network_id):
-        self.checkConnection()
-        entry = self.db_net2slice.get(network_id)
-        if not entry:
-            self.db_net2slice.insert(network_id=network_id, slice=sliceName)
+        if network_id not in self.net2slice:
+            self.net2slice[network_id] = sliceName
+            self._journal('delegated_nets', network_id, {'slice': sliceName})
         else:
-            raise NetworkAlreadyAssigned(network_id=network_id, sliceName=entry.slice)
-
-        self.db.commit()
+            raise NetworkAlreadyAssigned(network_id=network_id,
+                                         sliceName=self.net2slice[network_id])
 
     def removeNetFromSlice(self, network_id):
-        self.checkConnection()
-        entry = self.db_net2slice.get(network_id)
-        if entry:
-            self.db.delete(entry)
+        if network_id in self.net2slice:
+            del self.net2slice[network_id]
+            self._journal('delegated_nets', network_id)
         else:
             # Not found, raise exception?
             pass
-
-        self.db.commit()
-
-
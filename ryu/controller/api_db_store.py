@@ -0,0 +1,390 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2012, The SAVI Project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import errno
+import json
+import logging
+import os
+import time
+
+try:
+    import migrate.changeset
+    from sqlalchemy.ext.sqlsoup import SqlSoup
+    from sqlalchemy import create_engine, MetaData
+    from sqlalchemy import Table, Column, Integer, String
+    from sqlalchemy import and_
+    import sqlalchemy.exc as sqlexc
+except ImportError:
+    SqlSoup = None  # only LogStore is available
+
+LOG = logging.getLogger('ryu.controller.api_db_store')
+
+FSYNC_ALWAYS = 'always'
+FSYNC_INTERVAL = 'interval'
+FSYNC_NEVER = 'never'
+FSYNC_POLICIES = (FSYNC_ALWAYS, FSYNC_INTERVAL, FSYNC_NEVER)
+
+
+# Storage backend of API_DB
+#
+# A row is a dict of the columns other than the key columns, and the key
+#   is the value of the key column, or a tuple of them for ports
+# The methods are called from the writer thread of API_DB, one at a time
+class Store(object):
+    # Returns an iterable of (table, key, row) of all the rows
+    def load(self):
+        raise NotImplementedError()
+
+    # Writes the batch of ((table, key), row) atomically. row is None to
+    #   delete the row
+    def write(self, batch):
+        raise NotImplementedError()
+
+    def close(self):
+        pass
+
+
+# Keeps the tables in a SQL database through SqlSoup, e.g. MySQL
+class SQLStore(Store):
+    def __init__(self, url):
+        super(SQLStore, self).__init__()
+        if SqlSoup is None:
+            raise ImportError('SQLStore needs SQLAlchemy and '
+                              'sqlalchemy-migrate')
+
+        self.url = url
+        # Create any tables that don't already exist
+        self.createTables()
+
+        self.db = SqlSoup(url)
+        self.db_nets = self.db.networks
+        self.db_ports = self.db.ports
+        self.db_macs = self.db.macs
+        self.db_bonds = self.db.bonds
+        self.db_flowspace = self.db.flowspace
+        self.db_net2slice = self.db.delegated_nets
+
+    def createTables(self):
+        engine = create_engine(self.url)
+        data = MetaData(bind=engine)
+        data.reflect()
+        existing_tables = data.tables.keys()
+
+        # Dictionary for database description
+        # Format: {Table object /w primary Column:
+        #          [list of extra Column objects]}
+        db_schema = {
+            Table('networks', data,
+                  Column('network_id', String(255), primary_key=True),
+                  keep_existing=True):
+            [],
+
+            Table('ports', data,
+                  Column('id', Integer, primary_key=True, autoincrement=True),
+                  keep_existing=True):
+            [Column('port_num', Integer),
+             Column('datapath_id', String(255)),
+             Column('network_id', String(255)),
+             Column('bond_id', String(255))],
+
+            Table('macs', data,
+                  Column('mac_address', String(255), primary_key=True),
+                  keep_existing=True):
+            [Column('network_id', String(255))],
+
+            Table('bonds', data,
+                  Column('bond_id', String(255), primary_key=True),
+                  keep_existing=True):
+            [Column('datapath_id', String(255)),
+             Column('network_id', String(255))],
+
+            Table('flowspace', data,
+                  Column('id', Integer, primary_key=True),
+                  keep_existing=True):
+            [Column('datapath_id', String(255)),
+             Column('port_num', Integer),
+             Column('mac_address', String(255))],
+
+            Table('delegated_nets', data,
+                  Column('network_id', String(255), primary_key=True),
+                  keep_existing=True):
+            [Column('slice', String(255))],
+        }
+
+        for tab, colList in db_schema.items():
+            # Create table if it doesn't exist
+            if tab.name not in existing_tables:
+                tab.create()
+
+            # Check columns and update if necessary
+            for col in colList:
+                if col.name not in tab.c.keys():
+                    col.create(tab, populate_default=True)
+
+    def checkConnection(self):
+        try:
+            # Do a simple query, which any database understands
+            self.db.execute("SELECT 1")
+        except sqlexc.OperationalError:
+            # Connection was interrupted for some reason, try restarting
+            #   session
+            self.db.session.close()
+            self.db.session.rollback()
+
+            # Try simple query again
+            self.db.execute("SELECT 1")
+        except:
+            # Unknown exception, raise
+            raise
+
+    # Reads the tables with raw column queries, without building an ORM
+    #   object for each row
+    def load(self):
+        self.checkConnection()
+        query = self.db.execute
+
+        for (network_id,) in query('SELECT network_id FROM networks'):
+            yield 'networks', network_id, {}
+        for dpid, port_num, network_id, bond_id in query(
+                'SELECT datapath_id, port_num, network_id, bond_id '
+                'FROM ports'):
+            yield 'ports', (dpid, port_num), {'network_id': network_id,
+                                              'bond_id': bond_id}
+        for mac, network_id in query(
+                'SELECT mac_address, network_id FROM macs'):
+            yield 'macs', mac, {'network_id': network_id}
+        for bond_id, dpid, network_id in query(
+                'SELECT bond_id, datapath_id, network_id FROM bonds'):
+            yield 'bonds', bond_id, {'datapath_id': dpid,
+                                     'network_id': network_id}
+        for id, dpid, port_num, mac in query(
+                'SELECT id, datapath_id, port_num, mac_address '
+                'FROM flowspace'):
+            yield 'flowspace', id, {'datapath_id': dpid,
+                                    'port_num': port_num,
+                                    'mac_address': mac}
+        for network_id, sliceName in query(
+                'SELECT network_id, slice FROM delegated_nets'):
+            yield 'delegated_nets', network_id, {'slice': sliceName}
+
+    def write(self, batch):
+        self.checkConnection()
+        try:
+            for (table, key), row in batch:
+                getattr(self, '_write_' + table)(key, row)
+            self.db.commit()
+        except:
+            self.db.session.rollback()
+            raise
+
+    def close(self):
+        self.db.session.close()
+
+    def _write_row(self, db_table, entry, key_columns, row):
+        if row is None:
+            if entry:
+                self.db.delete(entry)
+        elif entry:
+            for name, value in row.items():
+                setattr(entry, name, value)
+        else:
+            columns = dict(key_columns)
+            columns.update(row)
+            db_table.insert(**columns)
+
+    def _write_networks(self, network_id, row):
+        self._write_row(self.db_nets, self.db_nets.get(network_id),
+                        {'network_id': network_id}, row)
+
+    def _write_ports(self, key, row):
+        dpid, port_num = key
+        params = and_(self.db_ports.datapath_id == dpid,
+                      self.db_ports.port_num == port_num)
+        self._write_row(self.db_ports, self.db_ports.filter(params).first(),
+                        {'datapath_id': dpid, 'port_num': port_num}, row)
+
+    def _write_macs(self, mac, row):
+        self._write_row(self.db_macs, self.db_macs.get(mac),
+                        {'mac_address': mac}, row)
+
+    def _write_bonds(self, bond_id, row):
+        self._write_row(self.db_bonds, self.db_bonds.get(bond_id),
+                        {'bond_id': bond_id}, row)
+
+    def _write_flowspace(self, id, row):
+        self._write_row(self.db_flowspace, self.db_flowspace.get(id),
+                        {'id': id}, row)
+
+    def _write_delegated_nets(self, network_id, row):
+        self._write_row(self.db_net2slice, self.db_net2slice.get(network_id),
+                        {'network_id': network_id}, row)
+
+
+# Keeps the tables in local files, without a database server
+#
+# <path>/log is an append-only log with a line of JSON per batch:
+#   [[table, key, row], ...]. A batch is written with a single write(), so
+#   a crash can only leave the last line torn, which is dropped on load.
+# <path>/snapshot has a line of [table, key, row] per row. When the log
+#   grows larger than compact_size and the snapshot, the rows are written
+#   to a new snapshot, which replaces the old one, and the log is emptied.
+# fsync is the policy of syncing the log to the disk:
+#   'always' after each batch, 'interval' at most once in fsync_interval
+#   seconds, or 'never', leaving it to the OS.
+class LogStore(Store):
+    LOG_FILE = 'log'
+    SNAPSHOT_FILE = 'snapshot'
+
+    def __init__(self, path, fsync=FSYNC_ALWAYS, fsync_interval=1.0,
+                 compact_size=16 * 1024 * 1024):
+        super(LogStore, self).__init__()
+        assert fsync in FSYNC_POLICIES
+        self.path = path
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.compact_size = compact_size
+        self.log_path = os.path.join(path, self.LOG_FILE)
+        self.snapshot_path = os.path.join(path, self.SNAPSHOT_FILE)
+
+        try:
+            os.makedirs(path)
+        except OSError, e:
+            if e.errno != errno.EEXIST:
+                raise
+
+        self.rows = {}      # (table, key) -> row
+        self.snapshot_size = self._read_snapshot()
+        self.log_size = self._read_log()
+        self.log = open(self.log_path, 'ab')
+        self.synced = time.time()
+
+    @staticmethod
+    def _key(table, key):
+        # JSON has no tuples
+        if isinstance(key, list):
+            key = tuple(key)
+        return (table, key)
+
+    def _read_snapshot(self):
+        try:
+            f = open(self.snapshot_path, 'rb')
+        except IOError, e:
+            if e.errno != errno.ENOENT:
+                raise
+            return 0
+
+        with f:
+            for line in f:
+                table, key, row = json.loads(line)
+                self.rows[self._key(table, key)] = row
+        return os.path.getsize(self.snapshot_path)
+
+    def _read_log(self):
+        try:
+            f = open(self.log_path, 'r+b')
+        except IOError, e:
+            if e.errno != errno.ENOENT:
+                raise
+            return 0
+
+        with f:
+            size = 0
+            for line in iter(f.readline, ''):
+                try:
+                    if not line.endswith('\n'):
+                        raise ValueError('no newline')
+                    batch = json.loads(line)
+                except ValueError:
+                    LOG.warn('dropped the torn tail of %s at %d',
+                             self.log_path, size)
+                    f.truncate(size)
+                    break
+                for table, key, row in batch:
+                    key = self._key(table, key)
+                    if row is None:
+                        self.rows.pop(key, None)
+                    else:
+                        self.rows[key] = row
+                size += len(line)
+            return size
+
+    def load(self):
+        for (table, key), row in self.rows.iteritems():
+            yield table, key, row
+
+    def write(self, batch):
+        for key, row in batch:
+            if row is None:
+                self.rows.pop(key, None)
+            else:
+                self.rows[key] = row
+
+        data = json.dumps([[table, key, row]
+                           for (table, key), row in batch]) + '\n'
+        self.log.write(data)
+        self.log.flush()
+        self.log_size += len(data)
+        self._sync()
+
+        if (self.log_size > self.compact_size and
+                self.log_size > self.snapshot_size):
+            self.compact()
+
+    def _sync(self, force=False):
+        now = time.time()
+        if (force or self.fsync == FSYNC_ALWAYS or
+                (self.fsync == FSYNC_INTERVAL and
+                 now - self.synced >= self.fsync_interval)):
+            os.fsync(self.log.fileno())
+            self.synced = now
+
+    def _sync_dir(self):
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    # Writes the rows to a new snapshot and empties the log
+    # If it crashes before the log is emptied, the log is replayed on the
+    #   new snapshot, which leaves the same rows
+    def compact(self):
+        start = time.time()
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            for (table, key), row in self.rows.iteritems():
+                f.write(json.dumps([table, key, row]) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+        os.rename(tmp_path, self.snapshot_path)
+        self._sync_dir()
+
+        self.log.close()
+        self.log = open(self.log_path, 'wb')
+        self._sync(True)
+        LOG.info('compacted %d bytes of log into a snapshot of %d rows '
+                 '(%d bytes) in %.3f seconds', self.log_size, len(self.rows),
+                 size, time.time() - start)
+        self.snapshot_size = size
+        self.log_size = 0
+
+    def close(self):
+        if not self.log.closed:
+            if self.fsync != FSYNC_NEVER:
+                self._sync(True)
+            self.log.close()
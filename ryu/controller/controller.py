@@ -17,6 +17,8 @@
 import contextlib
 from oslo.config import cfg
 import logging
+import os
+import time
 import gevent
 import traceback
 import random
@@ -39,6 +41,7 @@ from ryu.ofproto import nx_match
 
 from ryu.controller import handler
 from ryu.controller import ofp_event
+from ryu.lib import ofp_capture
 
 LOG = logging.getLogger('ryu.controller.controller')
 
@@ -51,7 +54,10 @@ CONF.register_cli_opts([
                help='openflow ssl listen port'),
     cfg.StrOpt('ctl-privkey', default=None, help='controller private key'),
     cfg.StrOpt('ctl-cert', default=None, help='controller certificate'),
-    cfg.StrOpt('ca-certs', default=None, help='CA certificates')
+    cfg.StrOpt('ca-certs', default=None, help='CA certificates'),
+    cfg.StrOpt('ofp-capture-dir', default=None,
+               help='directory to capture the OpenFlow messages of each '
+               'connection to, for replaying them later')
 ])
 
 
@@ -132,10 +138,24 @@ class Datapath(object):
         self.ports = None
         self.flow_format = ofproto_v1_0.NXFF_OPENFLOW10
         self.ofp_brick = ryu.base.app_manager.lookup_service_brick('ofp_event')
+        self.capture = None
         self.set_state(handler.HANDSHAKE_DISPATCHER)
 
     def close(self):
         self.set_state(handler.DEAD_DISPATCHER)
+        if self.capture is not None:
+            self.capture.close()
+            self.capture = None
+
+    def _open_capture(self):
+        host, port = self.address[:2]
+        name = '%s_%d_%s.ofcap' % (host, port,
+                                   time.strftime('%Y%m%d-%H%M%S'))
+        path = os.path.join(CONF.ofp_capture_dir, name)
+        try:
+            self.capture = ofp_capture.CaptureWriter(path)
+        except IOError as e:
+            LOG.error('failed to open capture file %s: %s', path, e)
 
     def set_state(self, state):
         self.state = state
@@ -166,6 +186,8 @@ class Datapath(object):
                 if len(buf) < required_len:
                     break
 
+                if self.capture is not None:
+                    self.capture.write(ofp_capture.RECV, buf[:required_len])
                 msg = ofproto_parser.msg(self,
                                          version, msg_type, msg_len, xid, buf)
                 #LOG.debug('queue msg %s cls %s', msg, msg.__class__)
@@ -195,6 +217,8 @@ class Datapath(object):
         try:
             while self.is_active:
                 buf = self.send_q.get()
+                if self.capture is not None:
+                    self.capture.write(ofp_capture.SEND, buf)
                 self.socket.sendall(buf)
         finally:
             self.send_q = None
@@ -218,6 +242,8 @@ class Datapath(object):
         self.send(msg.buf)
 
     def serve(self):
+        if CONF.ofp_capture_dir:
+            self._open_capture()
         send_thr = gevent.spawn(self._send_loop)
 
         # send hello message immediately
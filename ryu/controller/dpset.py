@@ -14,7 +14,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import gevent
 import logging
+from oslo.config import cfg
 
 from ryu.base import app_manager
 from ryu.controller import event
@@ -22,12 +24,24 @@ from ryu.controller import dp_type
 from ryu.controller import handler
 from ryu.controller import ofp_event
 from ryu.controller.handler import set_ev_cls
+from ryu.ofproto import ofproto_v1_0
+from ryu.ofproto import ofproto_v1_2
 import ryu.exception as ryu_exc
 
 LOG = logging.getLogger('ryu.controller.dpset')
 
 DPSET_EV_DISPATCHER = "dpset"
 
+CONF = cfg.CONF
+CONF.register_opts([
+    cfg.IntOpt('dpset-resync-grace-period', default=0,
+               help='seconds to keep the state of a disconnected datapath '
+               'for fast resync on reconnection. 0 disables it')
+])
+
+# seconds to wait for the flow count of a reconnected datapath
+FLOW_CHECK_TIMEOUT = 5
+
 
 class EventDPBase(event.EventBase):
     def __init__(self, dp):
@@ -36,13 +50,38 @@ class EventDPBase(event.EventBase):
 
 
 class EventDP(EventDPBase):
-    def __init__(self, dp, enter_leave):
+    def __init__(self, dp, enter_leave, port_table=None, generation=None):
         # enter_leave
         # True: dp entered
         # False: dp leaving
         super(EventDP, self).__init__(dp)
         self.enter = enter_leave
-        self.ports = []  # port list when enter or leave
+        self.generation = generation
+        if port_table is None:
+            port_table = PortTable(dp.ofproto)
+        # snapshot of the ports when enter or leave. It is shared among
+        # all the observers, so it must not be modified.
+        self.port_table = port_table
+        self.ports = port_table.values()  # port list when enter or leave
+
+
+class EventDPResumed(EventDPBase):
+    """
+    The datapath reconnected within the resync grace period and still
+    has flows, i.e. they survived the disconnection.
+    EventDP isn't generated for this reconnection, the datapath is
+    regarded as being connected continuously. Only the ports changed
+    while it was disconnected are told.
+    """
+    def __init__(self, dp, generation, port_table, added, deleted,
+                 modified):
+        super(EventDPResumed, self).__init__(dp)
+        # same as the one of EventDP(enter) of the previous connection
+        self.generation = generation
+        self.port_table = port_table
+        self.added = added  # port list
+        self.deleted = deleted  # port list
+        self.modified = modified  # port list
 
 
 class EventPortBase(EventDPBase):
@@ -66,18 +105,152 @@ class EventPortModify(EventPortBase):
         super(EventPortModify, self).__init__(dp, new_port)
 
 
-class PortState(dict):
-    def __init__(self):
-        super(PortState, self).__init__()
+class PortTable(object):
+    """
+    Immutable snapshot of the ports of a datapath.
 
-    def add(self, port_no, port):
-        self[port_no] = port
+    Updates don't modify the table in place, but return a new table with
+    the version number incremented, so that a table can be handed to
+    many observers without copying. The derived views (by_name, live,
+    down, reserved and physical) are computed on the first access and
+    then cached for the lifetime of the table.
+    """
 
-    def remove(self, port_no):
-        del self[port_no]
+    def __init__(self, ofproto, ports=None, version=0):
+        super(PortTable, self).__init__()
+        self.ofproto = ofproto
+        self.version = version
+        self._ports = dict((port.port_no, port) for port in ports or [])
+        self._views = None
+
+    def __len__(self):
+        return len(self._ports)
+
+    def __iter__(self):
+        return iter(self._ports)
+
+    def __contains__(self, port_no):
+        return port_no in self._ports
+
+    def __getitem__(self, port_no):
+        return self._ports[port_no]
+
+    def get(self, port_no, default=None):
+        return self._ports.get(port_no, default)
+
+    def keys(self):
+        return self._ports.keys()
+
+    def values(self):
+        return self._ports.values()
+
+    def items(self):
+        return self._ports.items()
+
+    def _new(self, ports):
+        table = PortTable(self.ofproto, version=self.version + 1)
+        table._ports = ports
+        return table
+
+    def add(self, port):
+        ports = self._ports.copy()
+        ports[port.port_no] = port
+        return self._new(ports)
+
+    modify = add
 
-    def modify(self, port_no, port):
-        self[port_no] = port
+    def remove(self, port_no):
+        ports = self._ports.copy()
+        del ports[port_no]
+        return self._new(ports)
+
+    def update(self, ports):
+        """Return a new table which has all the given ports at once"""
+        new_ports = self._ports.copy()
+        new_ports.update((port.port_no, port) for port in ports)
+        return self._new(new_ports)
+
+    def _get_views(self):
+        if self._views is None:
+            by_name = {}
+            live = set()
+            reserved = set()
+            for port_no, port in self._ports.iteritems():
+                # ofp_phy_port::name is zero-padded
+                by_name[port.name.rstrip('\x00')] = port
+                if port_no > self.ofproto.OFPP_MAX:
+                    reserved.add(port_no)
+                if not port.state & self.ofproto.OFPPS_LINK_DOWN:
+                    live.add(port_no)
+            port_nos = frozenset(self._ports)
+            self._views = {
+                'by_name': by_name,
+                'live': frozenset(live),
+                'down': port_nos - live,
+                'reserved': frozenset(reserved),
+                'physical': port_nos - reserved,
+            }
+        return self._views
+
+    @property
+    def by_name(self):
+        return self._get_views()['by_name']
+
+    @property
+    def live(self):
+        return self._get_views()['live']
+
+    @property
+    def down(self):
+        return self._get_views()['down']
+
+    @property
+    def reserved(self):
+        return self._get_views()['reserved']
+
+    @property
+    def physical(self):
+        return self._get_views()['physical']
+
+    def is_live(self, port_no):
+        return port_no in self.live
+
+
+class _ResyncCache(object):
+    """State of a disconnected datapath kept during the grace period"""
+    def __init__(self, dp, port_table, generation):
+        super(_ResyncCache, self).__init__()
+        self.dp = dp
+        self.port_table = port_table
+        self.generation = generation
+        self.timer = None
+        # ports and xid of the flow count request of the reconnection
+        self.ports = None
+        self.xid = None
+
+
+def _flow_count_request(dp):
+    """Return the aggregate stats request of all the flows of dp"""
+    ofproto = dp.ofproto
+    parser = dp.ofproto_parser
+    if ofproto.OFP_VERSION == ofproto_v1_0.OFP_VERSION:
+        match = parser.OFPMatch(ofproto.OFPFW_ALL,
+                                0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+        return parser.OFPAggregateStatsRequest(dp, 0, match, 0xff,
+                                               ofproto.OFPP_NONE)
+    if ofproto.OFP_VERSION == ofproto_v1_2.OFP_VERSION:
+        return parser.OFPAggregateStatsRequest(
+            dp, ofproto.OFPTT_ALL, ofproto.OFPP_ANY, ofproto.OFPG_ANY,
+            0, 0, parser.OFPMatch())
+    return parser.OFPAggregateStatsRequest(
+        dp, 0, ofproto.OFPTT_ALL, ofproto.OFPP_ANY, ofproto.OFPG_ANY,
+        0, 0, parser.OFPMatch())
+
+
+def _flow_count(body):
+    if not isinstance(body, list):
+        body = [body]
+    return sum(stats.flow_count for stats in body)
 
 
 # this depends on controller::Datapath and dispatchers in handler
@@ -91,7 +264,17 @@ class DPSet(app_manager.RyuApp):
         self.dp_types = {}
 
         self.dps = {}   # datapath_id => class Datapath
-        self.port_state = {}  # datapath_id => ports
+        self.port_state = {}  # datapath_id => PortTable
+
+        # datapath_id => ports collected from port desc replies (OF1.3).
+        # EventDP is deferred until all the ports are known.
+        self._port_desc_pending = {}
+
+        self.generations = {}  # datapath_id => generation
+        self._resync_cache = {}  # datapath_id => _ResyncCache
+        # datapath_id => _ResyncCache of a reconnected datapath of which
+        # the flow count is awaited
+        self._resync_check = {}
 
     def register(self, dp):
         assert dp.id is not None
@@ -102,22 +285,130 @@ class DPSet(app_manager.RyuApp):
             dp.dp_type = dp_type_
 
         self.dps[dp.id] = dp
-        self.port_state[dp.id] = PortState()
-        ev = EventDP(dp, True)
-        for port in dp.ports.values():
-            self._port_added(dp, port)
-            ev.ports.append(port)
-        self.send_event_to_observers(ev)
+        self.port_state[dp.id] = PortTable(dp.ofproto)
+        if dp.ports is None:
+            # OF1.3 features reply doesn't carry ports.
+            self._port_desc_pending[dp.id] = []
+            dp.send_msg(dp.ofproto_parser.OFPPortDescStatsRequest(dp, 0))
+            return
+        self._ports_added(dp, dp.ports.values())
+
+    def _ports_added(self, dp, ports):
+        cache = self._resync_cache.pop(dp.id, None)
+        if cache is not None:
+            cache.timer.kill(block=False)
+            if cache.port_table.ofproto == dp.ofproto:
+                self._check_flows(dp, cache, ports)
+                return
+            # OpenFlow version was changed. Start over as a new datapath.
+            self.send_event_to_observers(EventDP(cache.dp, False,
+                                                 cache.port_table,
+                                                 cache.generation))
+        self._enter(dp, ports)
+
+    def _enter(self, dp, ports):
+        port_table = self.port_state[dp.id].update(ports)
+        self.port_state[dp.id] = port_table
+        generation = self.generations.get(dp.id, 0) + 1
+        self.generations[dp.id] = generation
+        self.send_event_to_observers(EventDP(dp, True, port_table,
+                                             generation))
+
+    def _check_flows(self, dp, cache, ports):
+        """
+        Resume the datapath only if its flows survived the disconnection,
+        i.e. the switch itself didn't restart. Otherwise the apps have to
+        program it again, so it starts over as a new datapath.
+        """
+        req = _flow_count_request(dp)
+        dp.set_xid(req)
+        cache.ports = ports
+        cache.xid = req.xid
+        cache.timer = gevent.spawn_later(FLOW_CHECK_TIMEOUT,
+                                         self._flow_check_expired, dp, cache)
+        self._resync_check[dp.id] = cache
+        dp.send_msg(req)
+
+    def _flow_count_reply(self, msg):
+        dp = msg.datapath
+        cache = self._resync_check.get(dp.id)
+        if cache is None or cache.xid != msg.xid:
+            return
+        del self._resync_check[dp.id]
+        cache.timer.kill(block=False)
+        if _flow_count(msg.body) > 0:
+            self._resume(dp, cache, cache.ports)
+        else:
+            LOG.info('DPSET: datapath %s lost its flows, start over', dp.id)
+            self._start_over(dp, cache)
+
+    def _flow_check_expired(self, dp, cache):
+        if self._resync_check.get(dp.id) is not cache:
+            return
+        del self._resync_check[dp.id]
+        LOG.info('DPSET: no flow count of datapath %s, start over', dp.id)
+        self._start_over(dp, cache)
+
+    def _start_over(self, dp, cache):
+        self.send_event_to_observers(EventDP(cache.dp, False,
+                                             cache.port_table,
+                                             cache.generation))
+        self._enter(dp, cache.ports)
+
+    def _resume(self, dp, cache, ports):
+        old_table = cache.port_table
+        port_table = PortTable(dp.ofproto, ports, old_table.version + 1)
+        self.port_state[dp.id] = port_table
+
+        added = []
+        modified = []
+        for port in ports:
+            old_port = old_table.get(port.port_no)
+            if old_port is None:
+                added.append(port)
+            elif old_port != port:
+                modified.append(port)
+        deleted = [port for port_no, port in old_table.items()
+                   if port_no not in port_table]
+
+        LOG.debug('DPSET: resume datapath %s generation %d '
+                  '(added %d, deleted %d, modified %d)', dp.id,
+                  cache.generation, len(added), len(deleted), len(modified))
+        self.send_event_to_observers(
+            EventDPResumed(dp, cache.generation, port_table,
+                           added, deleted, modified))
+
+    def _resync_expired(self, dpid, cache):
+        if self._resync_cache.get(dpid) is not cache:
+            return
+        del self._resync_cache[dpid]
+        LOG.debug('DPSET: resync grace period expired %s', dpid)
+        self.send_event_to_observers(EventDP(cache.dp, False,
+                                             cache.port_table,
+                                             cache.generation))
 
     def unregister(self, dp):
         # Now datapath is already dead, so port status change event doesn't
         # interfere us.
-        ev = EventDP(dp, False)
-        for port in self.port_state.get(dp.id, {}).values():
-            self._port_deleted(dp, port)
-            ev.ports.append(port)
-
-        self.send_event_to_observers(ev)
+        cache = self._resync_check.pop(dp.id, None)
+        if cache is not None:
+            # disconnected again before the flow count came. The previous
+            # connection is still the one kept.
+            cache.timer.kill(block=False)
+            self._keep(dp.id, cache)
+        elif self._port_desc_pending.pop(dp.id, None) is not None:
+            # EventDP(enter) wasn't sent yet
+            pass
+        elif CONF.dpset_resync_grace_period > 0 and dp.id in self.dps:
+            # EventDP(leave) is deferred until the grace period expires
+            self._keep(dp.id, _ResyncCache(dp, self.port_state[dp.id],
+                                           self.generations.get(dp.id)))
+        else:
+            port_table = self.port_state.get(dp.id)
+            if port_table is None:
+                port_table = PortTable(dp.ofproto)
+            self.send_event_to_observers(
+                EventDP(dp, False, port_table, self.generations.get(dp.id)))
 
         if dp.id in self.dps:
             del self.dps[dp.id]
@@ -125,6 +416,11 @@ class DPSet(app_manager.RyuApp):
             assert dp.id not in self.dp_types
             self.dp_types[dp.id] = getattr(dp, 'dp_type', dp_type.UNKNOWN)
 
+    def _keep(self, dpid, cache):
+        cache.timer = gevent.spawn_later(CONF.dpset_resync_grace_period,
+                                         self._resync_expired, dpid, cache)
+        self._resync_cache[dpid] = cache
+
     def set_type(self, dp_id, dp_type_=dp_type.UNKNOWN):
         if dp_id in self.dps:
             dp = self.dps[dp_id]
@@ -140,10 +436,15 @@ class DPSet(app_manager.RyuApp):
         return self.dps.items()
 
     def _port_added(self, datapath, port):
-        self.port_state[datapath.id].add(port.port_no, port)
+        self.port_state[datapath.id] = self.port_state[datapath.id].add(port)
 
     def _port_deleted(self, datapath, port):
-        self.port_state[datapath.id].remove(port.port_no)
+        self.port_state[datapath.id] = self.port_state[datapath.id].remove(
+            port.port_no)
+
+    def _port_modified(self, datapath, port):
+        self.port_state[datapath.id] = self.port_state[datapath.id].modify(
+            port)
 
     @set_ev_cls(ofp_event.EventOFPStateChange,
                 [handler.MAIN_DISPATCHER, handler.DEAD_DISPATCHER])
@@ -161,7 +462,44 @@ class DPSet(app_manager.RyuApp):
     def switch_features_handler(self, ev):
         msg = ev.msg
         datapath = msg.datapath
-        datapath.ports = msg.ports
+        # OF1.3 doesn't have ports. They are fetched by port desc request
+        # once the datapath is registered.
+        datapath.ports = getattr(msg, 'ports', None)
+
+    @set_ev_cls(ofp_event.EventOFPMultipartReply, handler.MAIN_DISPATCHER)
+    def multipart_reply_handler(self, ev):
+        msg = ev.msg
+        datapath = msg.datapath
+        ofproto = datapath.ofproto
+        if msg.type == ofproto.OFPMP_AGGREGATE:
+            self._flow_count_reply(msg)
+            return
+        if msg.type != ofproto.OFPMP_PORT_DESC:
+            return
+        ports = self._port_desc_pending.get(datapath.id)
+        if ports is None:
+            return
+        ports.extend(msg.body)
+        if msg.flags & ofproto.OFPMPF_REPLY_MORE:
+            return
+
+        del self._port_desc_pending[datapath.id]
+        LOG.debug('DPSET: port desc received. '
+                  '(datapath id = %s, number of ports = %d)',
+                  datapath.id, len(ports))
+        self._ports_added(datapath, ports)
+
+    @set_ev_cls(ofp_event.EventOFPAggregateStatsReply,
+                handler.MAIN_DISPATCHER)
+    def aggregate_stats_reply_handler(self, ev):
+        self._flow_count_reply(ev.msg)
+
+    @set_ev_cls(ofp_event.EventOFPStatsReply, handler.MAIN_DISPATCHER)
+    def stats_reply_handler(self, ev):
+        # OF1.2 replies all the stats types with OFPStatsReply
+        msg = ev.msg
+        if msg.type == ofproto_v1_2.OFPST_AGGREGATE:
+            self._flow_count_reply(msg)
 
     @set_ev_cls(ofp_event.EventOFPPortStatus, handler.MAIN_DISPATCHER)
     def port_status_handler(self, ev):
@@ -188,7 +526,7 @@ class DPSet(app_manager.RyuApp):
             LOG.debug('DPSET: A port was modified.' +
                       '(datapath id = %s, port number = %s)',
                       datapath.id, port.port_no)
-            self.port_state[datapath.id].modify(port.port_no, port)
+            self._port_modified(datapath, port)
             self.send_event_to_observers(EventPortModify(datapath, port))
 
     def get_port(self, dpid, port_no):
@@ -200,3 +538,17 @@ class DPSet(app_manager.RyuApp):
 
     def get_ports(self, dpid):
         return self.port_state[dpid].values()
+
+    def get_generation(self, dpid):
+        """
+        Return the generation of the datapath. It is incremented when
+        the datapath connects without being resumed from the resync cache.
+        """
+        return self.generations.get(dpid)
+
+    def get_port_table(self, dpid):
+        """
+        Return the current PortTable of the datapath.
+        KeyError is raised if the datapath isn't registered.
+        """
+        return self.port_state[dpid]
@@ -15,103 +15,255 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import base64
+import errno
+import httplib
 import logging
+import socket
+import ssl
+import xmlrpclib
+
 import gflags
-import sys
 
-from ryu.exception import NetworkNotFound, NetworkAlreadyExist
-from ryu.exception import PortAlreadyExist, PortNotFound, PortUnknown
-from ryu.app.rest_nw_id import NW_ID_UNKNOWN, NW_ID_EXTERNAL
-from subprocess import Popen, PIPE, STDOUT
+try:
+    from gevent.lock import BoundedSemaphore
+except ImportError:
+    from gevent.coros import BoundedSemaphore  # gevent < 1.0
+
+from ryu.exception import FlowVisorError
 
 LOG = logging.getLogger('ryu.controller.flowvisor_cli')
 
 FLAGS = gflags.FLAGS
+gflags.DEFINE_string('fv_api_host', 'localhost', 'FlowVisor API host')
 gflags.DEFINE_string('fv_api_port', '8080', 'FlowVisor API port number')
+gflags.DEFINE_string('fv_api_user', 'fvadmin', 'FlowVisor API user')
 gflags.DEFINE_string('fv_pass_file', '/usr/local/etc/flowvisor/passFile',
                                         'FlowVisor control password file')
+gflags.DEFINE_integer('fv_api_connections', 4,
+                      'Max connections kept open to the FlowVisor API')
+gflags.DEFINE_float('fv_api_timeout', 10.0,
+                    'Seconds to wait for a FlowVisor API call')
 gflags.DEFINE_string('fv_slice_default_pass', 'supersecret',
                       'FlowVisor non-admin slice default password')
 gflags.DEFINE_string('fv_default_slice', 'fvadmin',
                       'FlowVisor default slice name')
 
+FLOWSPACE_PRIORITY = 100    # Priority of 100 picked randomly...
+FLOWSPACE_PERMISSION = 4    # write
+
+
+# Keep-alive HTTPS connections to the FlowVisor API, shared by the callers
+# The sockets are cooperative as ryu-manager monkey patches them
+class _ConnectionPool(object):
+    def __init__(self, host, port, size, timeout):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.conns = []
+        self.sem = BoundedSemaphore(size)
+
+    def _connect(self):
+        kwargs = {}
+        if hasattr(ssl, '_create_unverified_context'):
+            # FlowVisor has a self signed certificate, which fvctl didn't
+            #   verify either
+            kwargs['context'] = ssl._create_unverified_context()
+        return httplib.HTTPSConnection(self.host, self.port,
+                                       timeout=self.timeout, **kwargs)
+
+    # Whether e means that the server had closed the kept connection, so
+    #   that the request didn't reach it. A timeout doesn't, as the
+    #   server may have applied the request
+    @staticmethod
+    def _is_stale(e):
+        if isinstance(e, httplib.BadStatusLine):
+            return True
+        return (isinstance(e, socket.error) and
+                not isinstance(e, socket.timeout) and
+                getattr(e, 'errno', None) in (errno.ECONNRESET, errno.EPIPE))
+
+    # Returns (status, body) of the response
+    # The requests aren't idempotent, e.g. adding flowspaces, so a request
+    #   is only retried when a kept connection turns out to be closed
+    #   before any response
+    def post(self, url, body, headers):
+        with self.sem:
+            while True:
+                reused = bool(self.conns)
+                conn = self.conns.pop() if reused else self._connect()
+                try:
+                    conn.request('POST', url, body, headers)
+                    res = conn.getresponse()
+                except (socket.error, httplib.HTTPException), e:
+                    conn.close()
+                    if reused and self._is_stale(e):
+                        continue
+                    raise
+
+                try:
+                    data = res.read()
+                except:
+                    conn.close()
+                    raise
+                if res.will_close:
+                    conn.close()
+                else:
+                    self.conns.append(conn)
+                return res.status, data
+
+
+# Client of the XML-RPC API of FlowVisor, which fvctl is a front end of
+# The calls raise FlowVisorError on failure
 class FlowVisor_CLI(object):
+    URL = '/xmlrpc'
+
     def __init__(self):
         self.flowspace_ids = {} # Dictionary of {(dpid, port, mac) : flowspace_id}
+        self.flowspaces = {}    # Dictionary of {id : (dpid, port, mac)}
+        self.dpid_index = {}    # Dictionary of {dpid : set([ids])}
+        self.port_index = {}    # Dictionary of {(dpid, port) : set([ids])}
+        self.mac_index = {}     # Dictionary of {mac : set([ids])}
         self.slice2network = {} # Dictionary of {sliceName : [network_ids]}
-        self.cmdPrefix = "fvctl --url=https://localhost:" + FLAGS.fv_api_port + \
-                                       " --passwd-file=" + FLAGS.fv_pass_file + " "
         self.defaultSlice = FLAGS.fv_default_slice
-        self.is64bit = (sys.maxsize > 2**32)
+        self.pool = _ConnectionPool(FLAGS.fv_api_host, int(FLAGS.fv_api_port),
+                                    FLAGS.fv_api_connections,
+                                    FLAGS.fv_api_timeout)
+        self.passwd = None
+
+    def _headers(self):
+        if self.passwd is None:
+            with open(FLAGS.fv_pass_file) as f:
+                self.passwd = f.read().strip()
+        auth = base64.b64encode('%s:%s' % (FLAGS.fv_api_user, self.passwd))
+        return {'Content-Type': 'text/xml',
+                'Authorization': 'Basic ' + auth}
+
+    def _call(self, method, *params):
+        method = 'api.' + method
+        try:
+            status, data = self.pool.post(
+                self.URL, xmlrpclib.dumps(params, method), self._headers())
+            if status != httplib.OK:
+                raise FlowVisorError(method=method, error='HTTP %d' % status)
+            return xmlrpclib.loads(data)[0][0]
+        except (socket.error, httplib.HTTPException, IOError,
+                xmlrpclib.Error), e:
+            raise FlowVisorError(method=method, error=e)
 
     def listSlices(self):
-        cmdLine = "listSlices"
-        p = Popen(self.cmdPrefix + cmdLine, shell=True, stdin=PIPE, stdout=PIPE, stderr=STDOUT)
-        out, err = p.communicate()
-        return out
+        return self._call('listSlices')
 
     def listFlowSpace(self):
-        cmdLine = "listFlowSpace"
-        p = Popen(self.cmdPrefix + cmdLine, shell=True, stdin=PIPE, stdout=PIPE, stderr=STDOUT)
-        out, err = p.communicate()
-        return out
+        return self._call('listFlowSpace')
 
     def createSlice(self, sliceName, ip, port):
         # Use a garbage email address...
-        cmdLine = "createSlice " + sliceName + " tcp:" + ip + ":" + port + " blek@blek.ca"
-        p = Popen(self.cmdPrefix + cmdLine, shell=True, stdin=PIPE, stdout=PIPE, stderr=STDOUT)
-        out, err = p.communicate(FLAGS.fv_slice_default_pass)
-        return out[14:]
+        return self._call('createSlice', sliceName,
+                          FLAGS.fv_slice_default_pass,
+                          'tcp:%s:%s' % (ip, port), 'blek@blek.ca')
 
     def deleteSlice(self, sliceName):
-        cmdLine = "deleteSlice " + sliceName
-        p = Popen(self.cmdPrefix + cmdLine, shell=True, stdin=PIPE, stdout=PIPE, stderr=STDOUT)
-        out, err = p.communicate()
-        return out
+        return self._call('deleteSlice', sliceName)
 
+    # Adds the flowspaces of the list of (dpid, port, srcMAC) to the slice
+    #   in one call, and returns the list of their flowspace IDs
     # srcMAC is to be specified in hexadecimal notation and byte-separated by colons
+    def addFlowSpaces(self, sliceName, flowspaces):
+        changes = []
+        for dpid, port, srcMAC in flowspaces:
+            changes.append({
+                'operation': 'ADD',
+                'priority': str(FLOWSPACE_PRIORITY),
+                'dpid': '%x' % dpid,
+                'match': 'in_port=%s,dl_src=%s' % (port, srcMAC),
+                'actions': 'Slice:%s=%d' % (sliceName,
+                                            FLOWSPACE_PERMISSION)})
+        if not changes:
+            return []
+        return [int(id) for id in self._call('changeFlowSpace', changes)]
+
+    # Returns the flowspace ID
     def addFlowSpace(self, sliceName, dpid, port, srcMAC):
-        # Priority of 100 picked randomly...
-        if (self.is64bit):
-            dpid_hex = hex(dpid)[2:]
-        else:
-            dpid_hex = hex(dpid)[2:-1]
+        return self.addFlowSpaces(sliceName, [(dpid, port, srcMAC)])[0]
 
-        cmdLine = "addFlowSpace " + dpid_hex + " 100 in_port=" + str(port) + ",dl_src=" + srcMAC + " Slice:" + sliceName + "=4"
-        p = Popen(self.cmdPrefix + cmdLine, shell=True, stdin=PIPE, stdout=PIPE, stderr=STDOUT)
-        out, err = p.communicate()
-        return out
+    # Removes the flowspaces of the IDs in one call
+    def removeFlowSpaces(self, flowspace_ids):
+        changes = [{'operation': 'REMOVE', 'id': str(id)}
+                   for id in flowspace_ids]
+        if changes:
+            self._call('changeFlowSpace', changes)
 
     def removeFlowSpace(self, flowspace_id):
-        cmdLine = "removeFlowSpace " + str(flowspace_id)
-        p = Popen(self.cmdPrefix + cmdLine, shell=True, stdin=PIPE, stdout=PIPE, stderr=STDOUT)
-        out, err = p.communicate()
-        return out
+        self.removeFlowSpaces([flowspace_id])
 
     # ==================================================================
     # The functions below are helper functions that are not CLIs
     # ==================================================================
 
+    def _index(self, index, key, flowspace_id, add):
+        if add:
+            index.setdefault(key, set()).add(flowspace_id)
+        else:
+            ids = index[key]
+            ids.discard(flowspace_id)
+            if not ids:
+                del index[key]
+
+    def _index_flowspace(self, flowspace_id, add):
+        dpid, port, mac = self.flowspaces[flowspace_id]
+        self._index(self.dpid_index, dpid, flowspace_id, add)
+        self._index(self.port_index, (dpid, port), flowspace_id, add)
+        self._index(self.mac_index, mac, flowspace_id, add)
+
     def addFlowSpaceID(self, dpid, port, mac, flowspace_id):
+        old_id = self.flowspace_ids.get((dpid, port, mac))
+        if old_id is not None:
+            self.delFlowSpaceID(old_id)
+        self.delFlowSpaceID(flowspace_id)
+
         self.flowspace_ids[(dpid, port, mac)] = flowspace_id
+        self.flowspaces[flowspace_id] = (dpid, port, mac)
+        self._index_flowspace(flowspace_id, True)
 
     def delFlowSpaceID(self, flowspace_id):
-        for tuple, id in self.flowspace_ids.items():
-            if id == flowspace_id:
-                del self.flowspace_ids[tuple]
+        if flowspace_id in self.flowspaces:
+            self._index_flowspace(flowspace_id, False)
+            del self.flowspace_ids[self.flowspaces.pop(flowspace_id)]
 
     # Returns a list of FlowSpace IDs whose tuple matches the input parameters
     # Use 'None' as a wildcard
     def getFlowSpaceIDs(self, dpid=None, port=None, mac=None):
+        # Look up the smallest index which applies, and check the rest
+        candidates = []
+        if dpid is not None:
+            if port is not None:
+                candidates.append(self.port_index.get((dpid, port), ()))
+            else:
+                candidates.append(self.dpid_index.get(dpid, ()))
+        if mac is not None:
+            candidates.append(self.mac_index.get(mac, ()))
+        if candidates:
+            ids = min(candidates, key=len)
+        else:
+            ids = self.flowspaces
+
         idList = []
+        for id in ids:
+            fs_dpid, fs_port, fs_mac = self.flowspaces[id]
+            if ((dpid is None or dpid == fs_dpid) and
+                    (port is None or port == fs_port) and
+                    (mac is None or mac == fs_mac)):
+                idList.append(id)
 
-        for tuple, id in self.flowspace_ids.items():
-            dpid_match = (dpid is None) or (dpid in tuple)
-            port_match = (port is None) or (port in tuple)
-            mac_match = (mac is None) or (mac in tuple)
+        return idList
 
-            if (dpid_match and port_match and mac_match):
-                idList.append(id)
+    # Deletes the FlowSpace IDs matching the input parameters, e.g. all the
+    #   ones of a datapath, and returns them
+    def delFlowSpaceIDs(self, dpid=None, port=None, mac=None):
+        idList = self.getFlowSpaceIDs(dpid, port, mac)
+        for id in idList:
+            self.delFlowSpaceID(id)
 
         return idList
 
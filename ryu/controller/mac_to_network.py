@@ -54,6 +54,10 @@ class MacToNetwork(object):
 
         raise MacAddressDuplicated(mac=mac)
 
+    def add_macs(self, macs):
+        """Add (mac, nw_id) pairs as is, e.g. restored from api_db."""
+        self.mac_to_net.update(macs)
+
     def del_mac(self, mac):
         del self.mac_to_net[mac]
     
@@ -143,26 +143,61 @@ class Port(object):
 
 
 class DPIDs(dict):
-    """dpid -> port_no -> Port(port_no, network_id, mac_address)"""
+    """dpid -> port_no -> Port(port_no, network_id, mac_address)
+
+    The port numbers are also indexed by (dpid, network_id), and the
+    flood sets computed from the index are cached per dpid until a port
+    of the dpid changes or invalidate_flood_ports() is called.
+    The network_id of a Port must be changed with _set_network().
+    """
     def __init__(self, f, nw_id_unknown):
         super(DPIDs, self).__init__()
         self.send_event = f
         self.nw_id_unknown = nw_id_unknown
+        self.network_ports = {}     # (dpid, network_id) -> frozenset(port_no)
+        self.flood_cache = {}       # dpid -> key -> flood set
+
+    def _index_add(self, dpid, port):
+        key = (dpid, port.network_id)
+        self.network_ports[key] = (self.network_ports.get(key, frozenset()) |
+                                   frozenset([port.port_no]))
+        self.invalidate_flood_ports(dpid)
+
+    def _index_remove(self, dpid, port):
+        key = (dpid, port.network_id)
+        ports = (self.network_ports.get(key, frozenset()) -
+                 frozenset([port.port_no]))
+        if ports:
+            self.network_ports[key] = ports
+        else:
+            self.network_ports.pop(key, None)
+        self.invalidate_flood_ports(dpid)
+
+    def _set_network(self, dpid, port, network_id):
+        if port.network_id == network_id:
+            return
+        self._index_remove(dpid, port)
+        port.network_id = network_id
+        self._index_add(dpid, port)
 
     def setdefault_dpid(self, dpid):
         return self.setdefault(dpid, {})
 
     def _setdefault_network(self, dpid, port_no, default_network_id):
         dp = self.setdefault_dpid(dpid)
-        return dp.setdefault(port_no, Port(port_no=port_no,
-                                           network_id=default_network_id))
+        port = dp.get(port_no)
+        if port is None:
+            port = Port(port_no=port_no, network_id=default_network_id)
+            dp[port_no] = port
+            self._index_add(dpid, port)
+        return port
 
     def setdefault_network(self, dpid, port_no):
         self._setdefault_network(dpid, port_no, self.nw_id_unknown)
 
     def update_port(self, dpid, port_no, network_id):
         port = self._setdefault_network(dpid, port_no, network_id)
-        port.network_id = network_id
+        self._set_network(dpid, port, network_id)
 
     def remove_port(self, dpid, port_no):
         try:
@@ -174,20 +209,50 @@ class DPIDs(dict):
                                                 port.network_id,
                                                 port.mac_address,
                                                 False))
-            self[dpid].pop(port_no, None)
+            port = self[dpid].pop(port_no, None)
         except KeyError:
             raise PortNotFound(dpid=dpid, port=port_no, network_id=None)
+        if port is not None:
+            self._index_remove(dpid, port)
 
     def get_ports(self, dpid, network_id=None, mac_address=None):
         if network_id is None:
             return self.get(dpid, {}).values()
+        dp = self.get(dpid, {})
+        ports = [dp[port_no]
+                 for port_no in self.get_network_ports(dpid, network_id)]
         if mac_address is None:
-            return [p for p in self.get(dpid, {}).values()
-                    if p.network_id == network_id]
+            return ports
 
         # live-migration: There can be two ports that have same mac address.
-        return [p for p in self.get(dpid, {}).values()
-                if p.network_id == network_id and p.mac_address == mac_address]
+        return [p for p in ports if p.mac_address == mac_address]
+
+    def get_network_ports(self, dpid, network_id):
+        return self.network_ports.get((dpid, network_id), frozenset())
+
+    def get_flood_ports(self, dpid, in_port, network_id,
+                        allow_network_id=None):
+        """
+        Return the tuple of the port numbers of network_id or
+        allow_network_id except in_port.
+        """
+        cache = self.flood_cache.setdefault(dpid, {})
+        key = (in_port, network_id, allow_network_id)
+        ports = cache.get(key)
+        if ports is None:
+            ports = self.get_network_ports(dpid, network_id)
+            if allow_network_id is not None:
+                ports = ports | self.get_network_ports(dpid,
+                                                       allow_network_id)
+            ports = tuple(sorted(ports - frozenset([in_port])))
+            cache[key] = ports
+        return ports
+
+    def invalidate_flood_ports(self, dpid=None):
+        if dpid is None:
+            self.flood_cache.clear()
+        else:
+            self.flood_cache.pop(dpid, None)
 
     def get_port(self, dpid, port_no):
         try:
@@ -220,7 +285,7 @@ class DPIDs(dict):
                 port.network_id == self.nw_id_unknown):
             raise PortNotFound(network_id=network_id, dpid=dpid, port=port_no)
 
-        port.network_id = network_id
+        self._set_network(dpid, port, network_id)
         port.mac_address = mac_address
         if port.network_id and port.mac_address:
             self.send_event(EventMacAddress(
@@ -470,20 +535,26 @@ class Network(app_manager.RyuApp):
 
     def filter_ports(self, dpid, in_port, nw_id, allow_nw_id_external=None):
         assert nw_id != self.nw_id_unknown
-        ret = []
-
-        for port in self.get_ports(dpid):
-            nw_id_ = port.network_id
-            if port.port_no == in_port:
-                continue
-
-            if nw_id_ == nw_id:
-                ret.append(port.port_no)
-            elif (allow_nw_id_external is not None and
-                  nw_id_ == allow_nw_id_external):
-                ret.append(port.port_no)
-
-        return ret
+        return list(self.dpids.get_flood_ports(dpid, in_port, nw_id,
+                                               allow_nw_id_external))
+
+    def get_network_ports(self, dpid, network_id):
+        """Return the frozenset of the port numbers of network_id."""
+        return self.dpids.get_network_ports(dpid, network_id)
+
+    def get_external_ports(self, dpid):
+        return self.dpids.get_network_ports(dpid, NW_ID_EXTERNAL)
+
+    def get_flood_cache(self, dpid):
+        """
+        Return the dict for the flood sets of dpid derived by the apps,
+        which is discarded when the flood sets of dpid change.
+        """
+        return self.dpids.flood_cache.setdefault(dpid, {})
+
+    def invalidate_flood_ports(self, dpid=None):
+        """Discard the cached flood sets, e.g. when the bonds change."""
+        self.dpids.invalidate_flood_ports(dpid)
 
     def add_mac(self, net_id, mac):
         assert self.mac2net is not None
@@ -0,0 +1,260 @@
+# Copyright (C) 2013 Nippon Telegraph and Telephone Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Watch the interfaces of OVS bridges by OVSDB monitor and publish the
+changes as events instead of letting each application poll the database.
+"""
+
+import gevent
+import logging
+
+from oslo.config import cfg
+
+import ovs.poller
+from ovs.db import idl
+
+from ryu.app import conf_switch_key as cs_key
+from ryu.base import app_manager
+from ryu.controller import conf_switch
+from ryu.controller import event
+from ryu.controller import handler
+from ryu.lib import dpid as dpid_lib
+from ryu.lib.ovs import vsctl
+from ryu.lib.ovs import vswitch_idl
+
+
+LOG = logging.getLogger(__name__)
+
+CONF = cfg.CONF
+CONF.register_opts([
+    cfg.FloatOpt('ovsdb-monitor-debounce', default=0.1,
+                 help='seconds to wait for further OVSDB updates before '
+                 'publishing the changes as events'),
+    cfg.IntOpt('ovsdb-monitor-retry-interval', default=5,
+               help='seconds to wait before reconnecting a failed '
+               'OVSDB monitor')
+])
+
+
+class EventInterfaceBase(event.EventBase):
+    """
+    iface is a dict of 'name', 'ofport', 'type', 'external_ids' and
+    'options' in the same form as OVSBridge.get_ifaces() returns.
+    """
+    def __init__(self, dpid, iface):
+        super(EventInterfaceBase, self).__init__()
+        self.dpid = dpid
+        self.iface = iface
+
+    def __str__(self):
+        return '%s<%s, %s>' % (self.__class__.__name__,
+                               dpid_lib.dpid_to_str(self.dpid),
+                               self.iface['name'])
+
+
+class EventInterfaceAdd(EventInterfaceBase):
+    pass
+
+
+class EventInterfaceDelete(EventInterfaceBase):
+    pass
+
+
+class EventOFPortAssigned(EventInterfaceBase):
+    pass
+
+
+class EventExternalIdsChanged(EventInterfaceBase):
+    def __init__(self, dpid, iface, old_external_ids):
+        super(EventExternalIdsChanged, self).__init__(dpid, iface)
+        self.old_external_ids = old_external_ids
+
+
+def _ofport_is_valid(ofport):
+    return ofport != [] and ofport > 0
+
+
+def diff_ifaces(dpid, old, new):
+    """
+    Compare two snapshots of interfaces, name -> iface dict, and return
+    the list of events describing the changes.
+    Every interface appears at most once in each kind of event no matter
+    how many updates the database sent in between.
+    """
+    events = []
+    for name, iface in old.iteritems():
+        if name not in new:
+            events.append(EventInterfaceDelete(dpid, iface))
+
+    for name, iface in new.iteritems():
+        old_iface = old.get(name)
+        if old_iface is None:
+            events.append(EventInterfaceAdd(dpid, iface))
+            old_ofport = []
+        else:
+            old_ofport = old_iface['ofport']
+            # the external ids of an interface without ofport come with
+            # EventOFPortAssigned once it gets one
+            if (_ofport_is_valid(iface['ofport']) and
+                    old_iface['external_ids'] != iface['external_ids']):
+                events.append(EventExternalIdsChanged(
+                    dpid, iface, old_iface['external_ids']))
+
+        if (_ofport_is_valid(iface['ofport']) and
+                iface['ofport'] != old_ofport):
+            events.append(EventOFPortAssigned(dpid, iface))
+
+    return events
+
+
+class _MonitorSession(object):
+    _COLUMNS = {
+        vswitch_idl.OVSREC_TABLE_BRIDGE: [
+            vswitch_idl.OVSREC_BRIDGE_COL_DATAPATH_ID,
+            vswitch_idl.OVSREC_BRIDGE_COL_PORTS],
+        vswitch_idl.OVSREC_TABLE_PORT: [
+            vswitch_idl.OVSREC_PORT_COL_INTERFACES],
+        vswitch_idl.OVSREC_TABLE_INTERFACE: [
+            vswitch_idl.OVSREC_INTERFACE_COL_NAME,
+            vswitch_idl.OVSREC_INTERFACE_COL_OFPORT,
+            vswitch_idl.OVSREC_INTERFACE_COL_TYPE,
+            vswitch_idl.OVSREC_INTERFACE_COL_EXTERNAL_IDS,
+            vswitch_idl.OVSREC_INTERFACE_COL_OPTIONS],
+    }
+
+    def __init__(self, monitor, dpid, remote):
+        super(_MonitorSession, self).__init__()
+        self.monitor = monitor
+        self.dpid = dpid
+        self.remote = remote
+        self.ifaces = {}        # name -> iface dict
+        self.thread = gevent.spawn(self._run_loop)
+
+    def close(self):
+        self.thread.kill(block=False)
+
+    def _create_idl(self):
+        schema_json = vsctl.get_schema_json(self.remote,
+                                            vswitch_idl.OVSREC_DB_NAME)
+        schema_helper = idl.SchemaHelper(None, schema_json)
+        for table, columns in self._COLUMNS.items():
+            schema_helper.register_columns(table, columns)
+        return idl.Idl(self.remote, schema_helper)
+
+    def _run_loop(self):
+        while True:
+            try:
+                idl_ = self._create_idl()
+            except Exception as e:
+                LOG.error('ovsdb monitor %s %s: %s',
+                          dpid_lib.dpid_to_str(self.dpid), self.remote, e)
+                gevent.sleep(CONF.ovsdb_monitor_retry_interval)
+                continue
+
+            try:
+                self._monitor(idl_)
+            except Exception as e:
+                LOG.exception('ovsdb monitor %s %s: %s',
+                              dpid_lib.dpid_to_str(self.dpid), self.remote, e)
+            finally:
+                idl_.close()
+            gevent.sleep(CONF.ovsdb_monitor_retry_interval)
+
+    def _monitor(self, idl_):
+        # Idl reconnects by itself and replaces the replica at once
+        # when the monitor reply arrives, so diffing the snapshots
+        # stays correct across reconnections.
+        seqno = idl_.change_seqno
+        while True:
+            idl_.run()
+            if idl_.change_seqno != seqno:
+                # let a burst of updates settle and report it as one diff
+                gevent.sleep(CONF.ovsdb_monitor_debounce)
+                while idl_.run():
+                    pass
+                seqno = idl_.change_seqno
+                self._publish(self._get_ifaces(idl_))
+
+            poller = ovs.poller.Poller()
+            idl_.wait(poller)
+            poller.block()
+
+    def _get_ifaces(self, idl_):
+        dpid_str = dpid_lib.dpid_to_str(self.dpid)
+        ifaces = {}
+        for br in idl_.tables[vswitch_idl.OVSREC_TABLE_BRIDGE].rows.values():
+            if (not br.datapath_id or
+                    br.datapath_id[0].strip('"') != dpid_str):
+                continue
+            for port in br.ports:
+                for iface in port.interfaces:
+                    ifaces[iface.name] = vsctl.iface_to_dict(iface)
+        return ifaces
+
+    def _publish(self, ifaces):
+        events = diff_ifaces(self.dpid, self.ifaces, ifaces)
+        self.ifaces = ifaces
+        for ev in events:
+            LOG.debug('ovsdb monitor %s', ev)
+            self.monitor.send_event_to_observers(ev)
+
+
+class OVSDBMonitor(app_manager.RyuApp):
+    """
+    Keep an OVSDB monitor session for each switch whose ovsdb address is
+    known via conf_switch, and publish the changes of its interfaces as
+    Event{InterfaceAdd, InterfaceDelete, OFPortAssigned,
+    ExternalIdsChanged}.
+    """
+    def __init__(self):
+        super(OVSDBMonitor, self).__init__()
+        self.name = 'ovsdb_monitor'
+        self.sessions = {}      # dpid -> _MonitorSession
+
+    def add_switch(self, dpid, ovsdb_addr):
+        session = self.sessions.get(dpid)
+        if session is not None:
+            if session.remote == ovsdb_addr:
+                return
+            session.close()
+        self.sessions[dpid] = _MonitorSession(self, dpid, ovsdb_addr)
+
+    def del_switch(self, dpid):
+        session = self.sessions.pop(dpid, None)
+        if session is not None:
+            session.close()
+
+    def get_ifaces(self, dpid):
+        """
+        Return the last published interfaces of the switch,
+        name -> iface dict.
+        """
+        return self.sessions[dpid].ifaces
+
+    def close(self):
+        for session in self.sessions.values():
+            session.close()
+        self.sessions.clear()
+
+    @handler.set_ev_cls(conf_switch.EventConfSwitchSet)
+    def conf_switch_set_handler(self, ev):
+        if ev.key == cs_key.OVSDB_ADDR:
+            self.add_switch(ev.dpid, ev.value)
+
+    @handler.set_ev_cls(conf_switch.EventConfSwitchDel)
+    def conf_switch_del_handler(self, ev):
+        if ev.key == cs_key.OVSDB_ADDR:
+            self.del_switch(ev.dpid)
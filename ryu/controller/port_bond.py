@@ -15,12 +15,57 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import hashlib
 import logging
+import math
+import struct
+from oslo.config import cfg
+
 from ryu.exception import BondAlreadyExist, BondNotFound, BondNetworkMismatch, BondPortNotFound, BondPortAlreadyBonded
 from ryu.exception import PortNotFound, PortUnknown
 
 LOG = logging.getLogger('ryu.controller.port_bond')
 
+CONF = cfg.CONF
+CONF.register_opts([
+    cfg.StrOpt('bond-hash', default='l2',
+               help='packet headers hashed to pick the port of a bond for '
+               'a flow: l2 (mac addresses), l3 (and ipv4 addresses) or '
+               'l4 (and tcp/udp ports)')
+])
+
+_ETH_TYPE_IP = 0x0800
+_ETH_TYPE_VLAN = 0x8100
+_IP_PROTO_TCP = 6
+_IP_PROTO_UDP = 17
+
+
+# Returns the tuple of the headers of the packet data to hash for the
+#   flow, by the level of CONF.bond_hash if not given
+def flow_key(data, level=None):
+    level = level or CONF.bond_hash
+    dst, src, eth_type = struct.unpack_from('!6s6sH', buffer(data), 0)
+    key = (src, dst)
+    if level == 'l2':
+        return key
+
+    offset = 14
+    if eth_type == _ETH_TYPE_VLAN and len(data) >= 18:
+        eth_type, = struct.unpack_from('!H', buffer(data), 16)
+        offset = 18
+    if eth_type != _ETH_TYPE_IP or len(data) < offset + 20:
+        return key
+
+    ver_ihl, frag, proto, nw_src, nw_dst = struct.unpack_from(
+        '!B5xH1xB2x4s4s', buffer(data), offset)
+    key += (nw_src, nw_dst)
+    offset += (ver_ihl & 0xf) * 4
+    # Only the first fragment has the ports
+    if (level == 'l4' and proto in (_IP_PROTO_TCP, _IP_PROTO_UDP) and
+            not frag & 0x1fff and len(data) >= offset + 4):
+        key += (proto,) + struct.unpack_from('!HH', buffer(data), offset)
+    return key
+
 # Similar to Network class, PortBond stores a list of (dpid, port) pairs
 #   to indiate which ports are bonded together. All ports need to belong
 #   to the same switch.
@@ -36,6 +81,7 @@ class PortBond(object):
         self.portCount = {} # Key = bond_id, Value = # Ports in bond
         self.nextPortIdx = {} # Key = bond_id, Value = Index for the list
                               #  returned by self.bonds
+        self.weights = {}  # Key = bond_id, Value = {port: weight}
         self.globalID = 0 # Global incremental counter
         self.nw = nw
         self.bond2net = {} # Key = bond_id, Value = Network UUID
@@ -45,9 +91,41 @@ class PortBond(object):
     def setNetworkObjHandle(self, nw):
         self.nw = nw
 
-    # Returns next output port for a given bond, or None if bond is empty
-    # Currently implements a simple round-robin
-    def get_out_port(self, bond_id):
+    # Discards the flood sets of the switch cached by the Network object,
+    #   which depend on the bonds
+    # Returns nothing
+    def _bonds_changed(self, dpid):
+        if self.nw:
+            self.nw.invalidate_flood_ports(dpid)
+
+    # Returns the output port of a given bond for the flow of key, e.g.
+    #   flow_key(msg.data), or None if bond is empty
+    # The port is picked by weighted rendezvous hashing, so a flow always
+    #   goes out the same port, the flows are spread by the weights, and
+    #   removing a port only moves the flows of that port
+    # Without key, falls back to a simple round-robin
+    def get_out_port(self, bond_id, key=None):
+        if key is None:
+            return self._get_next_port(bond_id)
+
+        weights = self.weights[bond_id]
+        key = repr(key)
+        port = None
+        best = None
+        for p in self.bonds[bond_id]:
+            weight = weights[p]
+            if weight <= 0:
+                continue
+            h = int(hashlib.md5('%d:%s' % (p, key)).hexdigest()[:8], 16)
+            # -weight / ln(u) for u uniform in (0, 1)
+            score = -weight / math.log((h + 1) / float((1 << 32) + 1))
+            if best is None or score > best:
+                port = p
+                best = score
+
+        return port
+
+    def _get_next_port(self, bond_id):
         port = None
         if self.portCount[bond_id] > 0:
             self.nextPortIdx[bond_id] = (self.nextPortIdx[bond_id] + 1) % self.portCount[bond_id]
@@ -75,8 +153,10 @@ class PortBond(object):
         self.bonds[bond_id] = []
         self.portCount[bond_id] = 0
         self.nextPortIdx[bond_id] = 0
+        self.weights[bond_id] = {}
         if self.nw:
             self.bond2net[bond_id] = network_id
+        self._bonds_changed(dpid)
 
         return bond_id
 
@@ -84,17 +164,21 @@ class PortBond(object):
     # Returns nothing
     def delete_bond(self, bond_id):
         if bond_id in self.bonds:
+            self._bonds_changed(self.bond2dpid[bond_id])
             del self.bond2dpid[bond_id]
             del self.bonds[bond_id]
             del self.portCount[bond_id]
             del self.nextPortIdx[bond_id]
+            del self.weights[bond_id]
 
             if self.nw and bond_id in self.bond2net:
                 del self.bond2net[bond_id]
 
     # Registers a port as part of a bond
+    # weight is the share of the flows of the bond for the port, relative
+    #   to the other ports. A port of weight 0 gets no flows
     # Returns nothing on success; Raises exception on error
-    def add_port(self, bond_id, port):
+    def add_port(self, bond_id, port, weight=1):
         if bond_id in self.bonds:
             dpid = self.bond2dpid[bond_id]
 
@@ -114,11 +198,13 @@ class PortBond(object):
                 if bond != bond_id and port in self.bonds[bond]:
                     raise BondPortAlreadyBonded(port=port, bond_id=bond)
 
+            self.weights[bond_id][port] = weight
             if port not in self.bonds[bond_id]:
                 self.bonds[bond_id].append(port)
                 self.portCount[bond_id] += 1
                 if self.portCount[bond_id] == 1:
                     self.nextPortIdx[bond_id] = 0
+                self._bonds_changed(dpid)
         else:
             raise BondNotFound(bond_id=bond_id)
 
@@ -128,14 +214,25 @@ class PortBond(object):
         if bond_id in self.bonds:
             try:
                 self.bonds[bond_id].remove(port)
+                del self.weights[bond_id][port]
                 self.portCount[bond_id] -= 1
                 if self.nextPortIdx[bond_id] == self.portCount[bond_id]:
                     self.nextPortIdx[bond_id] -= 1
+                self._bonds_changed(self.bond2dpid[bond_id])
             except ValueError:
                 raise BondPortNotFound(port=port, bond_id=bond_id)
         else:
             raise BondNotFound(bond_id=bond_id)
 
+    # Changes the weight of a port in a bond
+    # Returns nothing on success; Raises exception on error
+    def set_weight(self, bond_id, port, weight):
+        if bond_id not in self.bonds:
+            raise BondNotFound(bond_id=bond_id)
+        if port not in self.weights[bond_id]:
+            raise BondPortNotFound(port=port, bond_id=bond_id)
+        self.weights[bond_id][port] = weight
+
     # Returns bond_id given a (dpid, port) pair
     # Function doubles as an "is_port_bonded" boolean function
     #   Returns None if port is not bonded
@@ -0,0 +1,272 @@
+# Copyright (C) 2013 Nippon Telegraph and Telephone Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Collect NetFlow v5/v9 and sFlow v5 exports and publish the top talkers
+of each exporter port periodically.
+
+The records of a datagram are parsed into columns at once and summed up
+into a table of (exporter, port, source, destination) -> bytes, packets,
+which is turned into events and cleared every interval.
+"""
+
+import heapq
+import logging
+import socket
+import struct
+
+import gevent
+from gevent import socket as gsocket
+from oslo.config import cfg
+
+from ryu.base import app_manager
+from ryu.controller import event
+from ryu.lib import dpid as dpid_lib
+from ryu.lib.xflow import netflow
+from ryu.lib.xflow import sflow
+
+
+LOG = logging.getLogger(__name__)
+
+CONF = cfg.CONF
+CONF.register_opts([
+    cfg.StrOpt('xflow-listen-host', default='',
+               help='address to receive NetFlow and sFlow exports on'),
+    cfg.IntOpt('netflow-listen-port', default=2055,
+               help='udp port to receive NetFlow exports on, 0 to disable'),
+    cfg.IntOpt('sflow-listen-port', default=6343,
+               help='udp port to receive sFlow exports on, 0 to disable'),
+    cfg.FloatOpt('xflow-interval', default=10,
+                 help='seconds to aggregate the flows over'),
+    cfg.IntOpt('xflow-top-n', default=10,
+               help='number of top talkers to publish per port')
+])
+
+_SFLOW_HEADER_PROTOCOL_ETHERNET = 1
+_ETH_TYPE_IP = 0x0800
+_ETH_TYPE_8021Q = 0x8100
+_SAMPLING_INTERVAL_MASK = 0x3fff
+
+
+class EventTopTalkers(event.EventBase):
+    """
+    The top talkers seen at a port of an exporter in the last interval.
+    dpid is None unless the exporter is registered with register_exporter.
+    talkers is the list of (src, dst, bytes, packets) in the descending
+    order of bytes, where src and dst are IPv4 addresses as int.
+    """
+    def __init__(self, exporter, dpid, port, interval, talkers):
+        super(EventTopTalkers, self).__init__()
+        self.exporter = exporter
+        self.dpid = dpid
+        self.port = port
+        self.interval = interval
+        self.talkers = talkers
+
+    def __str__(self):
+        dpid = self.dpid
+        if dpid is not None:
+            dpid = dpid_lib.dpid_to_str(dpid)
+        return 'EventTopTalkers<%s, %s, %s, %d talkers>' % (
+            self.exporter, dpid, self.port, len(self.talkers))
+
+
+class EventInterfaceCounters(event.EventBase):
+    """
+    The interface counters an sFlow agent sent.
+    counters is the list of sFlowV5GenericInterfaceCounters.
+    """
+    def __init__(self, exporter, dpid, counters):
+        super(EventInterfaceCounters, self).__init__()
+        self.exporter = exporter
+        self.dpid = dpid
+        self.counters = counters
+
+
+class FlowTable(object):
+    """
+    Sum of bytes and packets per (exporter, port, src, dst) fed by the
+    columns of the parsed exports.
+    """
+    def __init__(self):
+        super(FlowTable, self).__init__()
+        self.bytes = {}
+        self.packets = {}
+        self.flows = 0
+
+    def add(self, exporter, ports, srcs, dsts, bytes_, packets, scale=1):
+        table_bytes = self.bytes
+        table_packets = self.packets
+        for key in zip(ports, srcs, dsts, bytes_, packets):
+            b, p = key[3] * scale, key[4] * scale
+            key = (exporter,) + key[:3]
+            table_bytes[key] = table_bytes.get(key, 0) + b
+            table_packets[key] = table_packets.get(key, 0) + p
+        self.flows += len(srcs)
+
+    def top_talkers(self, n):
+        """
+        Return the dict of (exporter, port) -> the n largest
+        (src, dst, bytes, packets).
+        """
+        ports = {}
+        packets = self.packets
+        for key, b in self.bytes.iteritems():
+            exporter, port, src, dst = key
+            ports.setdefault((exporter, port), []).append(
+                (src, dst, b, packets[key]))
+        return dict((key, heapq.nlargest(n, talkers,
+                                         key=lambda talker: talker[2]))
+                    for key, talkers in ports.iteritems())
+
+
+def _ipv4_addrs(header):
+    """Return (src, dst) of an ethernet frame header or None."""
+    offset = 12
+    if len(header) < offset + 2:
+        return None
+    ethertype, = struct.unpack_from('!H', header, offset)
+    if ethertype == _ETH_TYPE_8021Q:
+        offset += 4
+        if len(header) < offset + 2:
+            return None
+        ethertype, = struct.unpack_from('!H', header, offset)
+    offset += 2
+    if ethertype != _ETH_TYPE_IP or len(header) < offset + 20:
+        return None
+    return struct.unpack_from('!II', header, offset + 12)
+
+
+class XFlowCollector(app_manager.RyuApp):
+    """
+    Receive NetFlow v5/v9 exports on --netflow-listen-port and sFlow v5
+    exports on --sflow-listen-port, and publish EventTopTalkers for each
+    exporter port every --xflow-interval seconds. The generic interface
+    counters of sFlow are published as EventInterfaceCounters as they
+    arrive.
+    """
+    _EVENTS = [EventTopTalkers, EventInterfaceCounters]
+
+    def __init__(self, *args, **kwargs):
+        super(XFlowCollector, self).__init__(*args, **kwargs)
+        self.name = 'xflow_collector'
+        self.exporters = {}     # exporter address -> dpid
+        self.templates = {}     # (address, source_id) -> NetFlow v9 templates
+        self.table = FlowTable()
+        self.sockets = []
+        self.collector_threads = []
+        for port, handler in ((CONF.netflow_listen_port, self._netflow),
+                              (CONF.sflow_listen_port, self._sflow)):
+            if not port:
+                continue
+            sock = gsocket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 22)
+            sock.bind((CONF.xflow_listen_host, port))
+            self.sockets.append(sock)
+            self.collector_threads.append(
+                gevent.spawn(self._recv_loop, sock, handler))
+        self.collector_threads.append(gevent.spawn(self._publish_loop))
+
+    def close(self):
+        gevent.killall(self.collector_threads)
+        for sock in self.sockets:
+            sock.close()
+
+    def register_exporter(self, address, dpid):
+        """Tell which datapath exports from address."""
+        self.exporters[address] = dpid
+
+    def _recv_loop(self, sock, handler):
+        while True:
+            buf, (address, _port) = sock.recvfrom(65535)
+            try:
+                handler(address, buf)
+            except (struct.error, IndexError, KeyError) as e:
+                LOG.debug('malformed export from %s: %s', address, e)
+
+    def _netflow(self, address, buf):
+        version, = struct.unpack_from('!H', buf)
+        if version == netflow.NETFLOW_V5:
+            msg, columns = netflow.NetFlowV5.parse_columns(buf)
+            scale = msg.sampling_interval & _SAMPLING_INTERVAL_MASK or 1
+            self.table.add(address, columns['input'], columns['srcaddr'],
+                           columns['dstaddr'], columns['doctets'],
+                           columns['dpkts'], scale)
+        elif version == netflow.NETFLOW_V9:
+            source_id, = struct.unpack_from('!I', buf, 16)
+            templates = self.templates.setdefault((address, source_id), {})
+            msg = netflow.NetFlowV9.parser(buf, templates)
+            for flowset in msg.flowsets:
+                columns = flowset.columns
+                try:
+                    self.table.add(address, columns['input_snmp'],
+                                   columns['ipv4_src_addr'],
+                                   columns['ipv4_dst_addr'],
+                                   columns['in_bytes'], columns['in_pkts'])
+                except KeyError:
+                    # not an IPv4 flow template
+                    pass
+        else:
+            LOG.debug('unsupported NetFlow version %d from %s',
+                      version, address)
+
+    def _sflow(self, address, buf):
+        msg, columns = sflow.sFlowV5.parse_flow_columns(buf)
+        if columns is None:
+            return
+        counters = [record.counter_data
+                    for sample in msg.samples
+                    for record in sample.sample.counters_records
+                    if record.counter_data_format == 1]
+        if counters:
+            self.send_event_to_observers(EventInterfaceCounters(
+                address, self.exporters.get(address), counters))
+
+        ports = []
+        srcs = []
+        dsts = []
+        bytes_ = []
+        packets = []
+        for (input_if, rate, protocol, frame_length, header) in zip(
+                columns['input_if'], columns['sampling_rate'],
+                columns['header_protocol'], columns['frame_length'],
+                columns['header']):
+            if protocol != _SFLOW_HEADER_PROTOCOL_ETHERNET:
+                continue
+            addrs = _ipv4_addrs(header)
+            if addrs is None:
+                continue
+            ports.append(input_if)
+            srcs.append(addrs[0])
+            dsts.append(addrs[1])
+            # a sample stands for sampling_rate packets
+            bytes_.append(frame_length * rate)
+            packets.append(rate)
+        self.table.add(address, ports, srcs, dsts, bytes_, packets)
+
+    def _publish_loop(self):
+        while True:
+            gevent.sleep(CONF.xflow_interval)
+            self.publish()
+
+    def publish(self):
+        table, self.table = self.table, FlowTable()
+        LOG.debug('xflow collector: %d flows in the last interval',
+                  table.flows)
+        for (exporter, port), talkers in table.top_talkers(
+                CONF.xflow_top_n).iteritems():
+            ev = EventTopTalkers(exporter, self.exporters.get(exporter),
+                                 port, CONF.xflow_interval, talkers)
+            self.send_event_to_observers(ev)
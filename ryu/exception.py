@@ -39,6 +39,10 @@ class OFPMalformedMessage(RyuException):
     message = 'malformed message'
 
 
+class OFPStatsTimeout(RyuException):
+    message = 'timed out after %(replies)d stats replies of datapath %(dpid)s'
+
+
 class NetworkNotFound(RyuException):
     message = 'no such network id %(network_id)s'
 
@@ -87,3 +91,6 @@ class FlowSpaceIDAlreadyExist(RyuException):
 class NetworkAlreadyAssigned(RyuException):
     message = 'Network ID %(network_id)s already assigned to slice %(sliceName)s'
 
+
+class FlowVisorError(RyuException):
+    message = 'FlowVisor %(method)s failed: %(error)s'
@@ -0,0 +1,197 @@
+# Copyright (C) 2013 Nippon Telegraph and Telephone Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compact binary records of the OpenFlow events exported to external
+controllers, e.g. by ryu2janus, and the decoder for the receivers.
+
+A record is a header of (length of the record including the header,
+version, event) followed by the fields of the event, in network byte
+order:
+
+- EVENT_PACKET_IN: datapath_id (Q), buffer_id (I), in_port (H), the
+  ethernet header of the packet (dl_dst, dl_src, eth_type), and the ARP
+  header if eth_type is ARP.
+- EVENT_PORT_STATUS: datapath_id (Q), reason (B), port (H).
+- EVENT_FEATURES_REPLY: datapath_id (Q), the number of ports (H) and
+  the ports (H each).
+
+The records of a batch are concatenated. The addresses are left as the
+bytes of the packet; format them with ryu.lib.mac.haddr_to_str and
+ipaddr_to_str when needed.
+
+This module only depends on the standard library, so that the receivers
+can use it without the rest of ryu.
+"""
+
+import struct
+
+VERSION = 1
+
+EVENT_PACKET_IN = 1
+EVENT_PORT_STATUS = 2
+EVENT_FEATURES_REPLY = 3
+
+CONTENT_TYPE = 'application/octet-stream'
+
+_ETH_TYPE_ARP = 0x0806
+_ETH_HEADER_LEN = 14
+_ARP_LEN = 28
+
+_HEADER = struct.Struct('!HBB')
+_PACKET_IN = struct.Struct('!HBBQIH')
+_PORT_STATUS = struct.Struct('!HBBQBH')
+_FEATURES_REPLY = struct.Struct('!HBBQH')
+_ETH = struct.Struct('!6s6sH')
+_ARP = struct.Struct('!HHBBH6s4s6s4s')
+
+_ARP_FIELDS = ('arp_htype', 'arp_ptype', 'arp_hlen', 'arp_plen', 'arp_oper',
+               'arp_sha', 'arp_spa', 'arp_tha', 'arp_tpa')
+
+
+class DecodeError(Exception):
+    pass
+
+
+def encode_packet_in(dpid, buffer_id, in_port, data):
+    """Encode a packet-in of the packet data."""
+    length = _ETH_HEADER_LEN
+    if (data[12:14] == '\x08\x06' and
+            len(data) >= _ETH_HEADER_LEN + _ARP_LEN):
+        length += _ARP_LEN
+    # the headers are copied as is from the packet, padded if it is
+    # shorter than an Ethernet header
+    return _PACKET_IN.pack(_PACKET_IN.size + length, VERSION,
+                           EVENT_PACKET_IN, dpid, buffer_id,
+                           in_port) + data[:length].ljust(length, '\0')
+
+
+def encode_port_status(dpid, reason, port_no):
+    return _PORT_STATUS.pack(_PORT_STATUS.size, VERSION, EVENT_PORT_STATUS,
+                             dpid, reason, port_no)
+
+
+def encode_features_reply(dpid, ports):
+    ports = list(ports)
+    return _FEATURES_REPLY.pack(
+        _FEATURES_REPLY.size + 2 * len(ports), VERSION,
+        EVENT_FEATURES_REPLY, dpid, len(ports)) + \
+        struct.pack('!%dH' % len(ports), *ports)
+
+
+def join(records):
+    """Batch the records into a body."""
+    return ''.join(records)
+
+
+def _decode_packet_in(buf, offset, end):
+    (_length, _version, event, dpid, buffer_id,
+     in_port) = _PACKET_IN.unpack_from(buf, offset)
+    offset += _PACKET_IN.size
+    dl_dst, dl_src, eth_type = _ETH.unpack_from(buf, offset)
+    event = {'event': event, 'datapath_id': dpid, 'buffer_id': buffer_id,
+             'in_port': in_port, 'dl_dst': dl_dst, 'dl_src': dl_src,
+             'eth_type': eth_type}
+    offset += _ETH.size
+    if eth_type == _ETH_TYPE_ARP and end - offset >= _ARP.size:
+        event.update(zip(_ARP_FIELDS, _ARP.unpack_from(buf, offset)))
+    return event
+
+
+def _decode_port_status(buf, offset, end):
+    (_length, _version, event, dpid, reason,
+     port_no) = _PORT_STATUS.unpack_from(buf, offset)
+    return {'event': event, 'datapath_id': dpid, 'reason': reason,
+            'port': port_no}
+
+
+def _decode_features_reply(buf, offset, end):
+    (_length, _version, event, dpid,
+     n_ports) = _FEATURES_REPLY.unpack_from(buf, offset)
+    if end - offset < _FEATURES_REPLY.size + 2 * n_ports:
+        raise DecodeError('short record of event %d' % event)
+    ports = struct.unpack_from('!%dH' % n_ports, buf,
+                               offset + _FEATURES_REPLY.size)
+    return {'event': event, 'datapath_id': dpid, 'ports': list(ports)}
+
+
+_DECODERS = {
+    EVENT_PACKET_IN: (_decode_packet_in, _PACKET_IN.size + _ETH.size),
+    EVENT_PORT_STATUS: (_decode_port_status, _PORT_STATUS.size),
+    EVENT_FEATURES_REPLY: (_decode_features_reply, _FEATURES_REPLY.size),
+}
+
+
+def _decode(buf, offset, end):
+    _length, version, event = _HEADER.unpack_from(buf, offset)
+    if version != VERSION:
+        raise DecodeError('unknown version %d' % version)
+    decoder = _DECODERS.get(event)
+    if decoder is None:
+        raise DecodeError('unknown event %d' % event)
+    func, min_len = decoder
+    if end - offset < min_len:
+        raise DecodeError('short record of event %d' % event)
+    return func(buf, offset, end)
+
+
+def iter_decode(buf):
+    """
+    Yield the events of the records in buf as dicts. buf has to hold
+    whole records; use Decoder for a stream.
+    """
+    offset = 0
+    size = len(buf)
+    while offset < size:
+        if size - offset < _HEADER.size:
+            raise DecodeError('truncated record')
+        length = _HEADER.unpack_from(buf, offset)[0]
+        end = offset + length
+        if length < _HEADER.size or end > size:
+            raise DecodeError('truncated record')
+        yield _decode(buf, offset, end)
+        offset = end
+
+
+def decode(buf):
+    return list(iter_decode(buf))
+
+
+class Decoder(object):
+    """
+    Decode the records of a stream, e.g. read from a socket, which can
+    be split anywhere.
+    """
+    def __init__(self):
+        super(Decoder, self).__init__()
+        self.buf = ''
+
+    def feed(self, data):
+        """Return the events of the records completed by data."""
+        buf = self.buf + data
+        offset = 0
+        size = len(buf)
+        events = []
+        while size - offset >= _HEADER.size:
+            length = _HEADER.unpack_from(buf, offset)[0]
+            if length < _HEADER.size:
+                raise DecodeError('bad record length %d' % length)
+            end = offset + length
+            if end > size:
+                break
+            events.append(_decode(buf, offset, end))
+            offset = end
+        self.buf = buf[offset:]
+        return events
@@ -0,0 +1,274 @@
+# Copyright (C) 2013 Nippon Telegraph and Telephone Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+The parts of ofctl_v1_x which don't depend on the OpenFlow version.
+"""
+
+import heapq
+import json
+import logging
+import socket
+import struct
+
+import gevent
+import gevent.event
+import gevent.queue
+
+from ryu.exception import OFPStatsTimeout
+
+LOG = logging.getLogger('ryu.lib.ofctl_utils')
+
+DEFAULT_TIMEOUT = 1.0
+
+# iter_json yields the JSON text in pieces of about this many bytes
+JSON_CHUNK_SIZE = 64 * 1024
+
+
+def send_stats_request(dp, stats, waiters, msgs, timeout=DEFAULT_TIMEOUT):
+    """
+    Send the stats request and wait for the replies up to timeout
+    seconds, or until the caller is killed if timeout is None.
+    The replies are appended to msgs by the stats reply handler of the
+    app, which sets the AsyncResult of waiters[dp.id][xid] on the last one.
+    """
+    dp.set_xid(stats)
+    waiters_per_dp = waiters.setdefault(dp.id, {})
+    lock = gevent.event.AsyncResult()
+    waiters_per_dp[stats.xid] = (lock, msgs)
+    dp.send_msg(stats)
+
+    try:
+        lock.get(timeout=timeout)
+    except gevent.Timeout:
+        pass
+    finally:
+        waiters_per_dp.pop(stats.xid, None)
+
+
+class _Replies(gevent.queue.Queue):
+    """The msgs of a waiter of iter_stats, which queues the replies."""
+    def append(self, msg):
+        self.put(msg)
+
+
+def iter_stats(dp, stats, waiters, timeout=DEFAULT_TIMEOUT):
+    """
+    Send the stats request and yield the stats in the body of the
+    replies as each reply arrives, so that the replies aren't kept
+    until the last one like send_stats_request does. The request is sent
+    when the iteration starts. timeout applies to each reply.
+
+    If no reply arrives in time, nothing is yielded, like
+    send_stats_request. If the replies stop coming before the last one,
+    OFPStatsTimeout is raised, so that the stats yielded so far aren't
+    taken as all of them, e.g. a streamed response is cut off.
+    """
+    dp.set_xid(stats)
+    waiters_per_dp = waiters.setdefault(dp.id, {})
+    lock = gevent.event.AsyncResult()
+    replies = _Replies()
+    # the handler sets lock after appending the last reply
+    lock.rawlink(lambda _lock: replies.put(None))
+    waiters_per_dp[stats.xid] = (lock, replies)
+    dp.send_msg(stats)
+
+    try:
+        count = 0
+        while True:
+            try:
+                msg = replies.get(timeout=timeout)
+            except gevent.queue.Empty:
+                if not count:
+                    LOG.warn('no stats reply of datapath %s', dp.id)
+                    break
+                LOG.warn('timed out after %d stats replies of datapath %s',
+                         count, dp.id)
+                raise OFPStatsTimeout(replies=count, dpid=dp.id)
+            if msg is None:
+                break
+            count += 1
+            for s in msg.body:
+                yield s
+    finally:
+        waiters_per_dp.pop(stats.xid, None)
+
+
+def page(entries, key, after=None, limit=None):
+    """
+    Yield the entries whose key is greater than after, the cursor which
+    is the key of the last entry of the previous page.
+
+    With limit, only the limit entries of the smallest keys are kept, in
+    the order of the key, while the entries are consumed. The entries of
+    the same key aren't split across pages, so a page can have more
+    entries than limit if the last key is shared.
+    """
+    if after is not None:
+        entries = (entry for entry in entries if key(entry) > after)
+    if limit is None:
+        for entry in entries:
+            yield entry
+        return
+    assert limit > 0
+
+    groups = {}
+    keys = []   # heap of -key of the groups
+    count = 0
+    for entry in entries:
+        k = key(entry)
+        group = groups.get(k)
+        if group is not None:
+            group.append(entry)
+            count += 1
+            continue
+        if count >= limit and k > -keys[0]:
+            continue
+        groups[k] = [entry]
+        heapq.heappush(keys, -k)
+        count += 1
+        # drop the groups of the largest keys not needed for the page
+        while count - len(groups[-keys[0]]) >= limit:
+            count -= len(groups.pop(-heapq.heappop(keys)))
+
+    for k in sorted(groups):
+        for entry in groups[k]:
+            yield entry
+
+
+class StreamedList(object):
+    """An iterable which iter_json encodes as a JSON array."""
+    def __init__(self, items):
+        super(StreamedList, self).__init__()
+        self.items = items
+
+    def __iter__(self):
+        return iter(self.items)
+
+
+class StreamedDict(object):
+    """An iterable of (key, value) which iter_json encodes as an object."""
+    def __init__(self, items):
+        super(StreamedDict, self).__init__()
+        self.items = items
+
+    def __iter__(self):
+        return iter(self.items)
+
+
+def _encode(obj):
+    if isinstance(obj, StreamedList):
+        yield '['
+        sep = ''
+        for item in obj:
+            yield sep
+            for piece in _encode(item):
+                yield piece
+            sep = ', '
+        yield ']'
+    elif isinstance(obj, StreamedDict):
+        yield '{'
+        sep = ''
+        for key, value in obj:
+            if not isinstance(key, basestring):
+                key = str(key)
+            yield '%s%s: ' % (sep, json.dumps(key))
+            for piece in _encode(value):
+                yield piece
+            sep = ', '
+        yield '}'
+    else:
+        yield json.dumps(obj)
+
+
+def iter_json(obj, chunk_size=JSON_CHUNK_SIZE):
+    """
+    Encode obj as JSON like json.dumps, but yield the text in chunks
+    for Response(app_iter=...). StreamedList and StreamedDict in obj are
+    consumed lazily, and the other threads run between chunks.
+    """
+    buf = []
+    size = 0
+    for piece in _encode(obj):
+        buf.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield ''.join(buf)
+            buf = []
+            size = 0
+            gevent.sleep(0)
+    if buf:
+        yield ''.join(buf)
+
+
+class Converter(object):
+    """
+    Convert a dict of the REST API, e.g. the match of a flow entry, by
+    the table of key -> function(value, attrs, *args).
+
+    The list of the functions for a set of keys is looked up once and
+    cached, so a dict of a known shape is converted without going
+    through the keys of the table. Unknown keys are ignored.
+    """
+    _MAX_CACHE = 1024
+
+    def __init__(self, table):
+        super(Converter, self).__init__()
+        self.table = table
+        self.cache = {}
+
+    def compile(self, keys):
+        keys = frozenset(keys)
+        funcs = self.cache.get(keys)
+        if funcs is None:
+            funcs = []
+            for key in sorted(keys):
+                if key in self.table:
+                    funcs.append((key, self.table[key]))
+                else:
+                    LOG.debug('unknown key %s', key)
+            if len(self.cache) >= self._MAX_CACHE:
+                self.cache.clear()
+            self.cache[keys] = funcs
+        return funcs
+
+    def __call__(self, attrs, *args):
+        for key, func in self.compile(attrs):
+            func(attrs[key], attrs, *args)
+
+
+def to_ipv4_masked(value):
+    """'10.0.0.0/8' -> (ip, netmask) as int"""
+    ip_mask = value.split('/')
+    ip = struct.unpack('!I', socket.inet_aton(ip_mask[0]))[0]
+    mask = 32
+    if len(ip_mask) == 2:
+        mask = int(ip_mask[1])
+    netmask = (0xffffffff << (32 - mask)) & 0xffffffff
+    return ip, netmask
+
+
+def ipv4_masked_to_str(ip, netmask=None):
+    value = socket.inet_ntoa(struct.pack('!I', ip))
+    if netmask and netmask != 0xffffffff:
+        value += '/%d' % bin(netmask).count('1')
+    return value
+
+
+def to_int(value):
+    """int of a number, or a string in decimal or 0x-prefixed hex"""
+    if isinstance(value, basestring):
+        return int(value, 0)
+    return int(value)
@@ -16,40 +16,55 @@
 import struct
 import socket
 import logging
-import gevent
 
 from ryu.ofproto import ofproto_v1_0
+from ryu.lib import ofctl_utils
 from ryu.lib.mac import haddr_to_bin, haddr_to_str
+from ryu.lib.ofctl_utils import DEFAULT_TIMEOUT, send_stats_request
 
 
 LOG = logging.getLogger('ryu.lib.ofctl_v1_0')
 
-DEFAULT_TIMEOUT = 1.0   # TODO:XXX
+
+def _to_output(parser, a):
+    return parser.OFPActionOutput(int(a.get('port', ofproto_v1_0.OFPP_NONE)))
+
+
+_ACTIONS = {
+    'OUTPUT': _to_output,
+    'SET_VLAN_VID': lambda parser, a: parser.OFPActionVlanVid(
+        int(a.get('vlan_vid', 0xffff))),
+    'SET_VLAN_PCP': lambda parser, a: parser.OFPActionVlanPcp(
+        int(a.get('vlan_pcp', 0))),
+    'STRIP_VLAN': lambda parser, a: parser.OFPActionStripVlan(),
+    'SET_DL_SRC': lambda parser, a: parser.OFPActionSetDlSrc(
+        haddr_to_bin(a.get('dl_src'))),
+    'SET_DL_DST': lambda parser, a: parser.OFPActionSetDlDst(
+        haddr_to_bin(a.get('dl_dst'))),
+}
+
+_ACTIONS_TO_STR = {
+    ofproto_v1_0.OFPAT_OUTPUT: lambda a: 'OUTPUT:' + str(a.port),
+    ofproto_v1_0.OFPAT_SET_VLAN_VID:
+    lambda a: 'SET_VLAN_VID:' + str(a.vlan_vid),
+    ofproto_v1_0.OFPAT_SET_VLAN_PCP:
+    lambda a: 'SET_VLAN_PCP:' + str(a.vlan_pcp),
+    ofproto_v1_0.OFPAT_STRIP_VLAN: lambda a: 'STRIP_VLAN',
+    ofproto_v1_0.OFPAT_SET_DL_SRC:
+    lambda a: 'SET_DL_SRC:' + haddr_to_str(a.dl_addr),
+    ofproto_v1_0.OFPAT_SET_DL_DST:
+    lambda a: 'SET_DL_DST:' + haddr_to_str(a.dl_addr),
+}
 
 
 def to_actions(dp, acts):
     actions = []
     for a in acts:
-        action_type = a.get('type')
-        if action_type == 'OUTPUT':
-            out_port = int(a.get('port', ofproto_v1_0.OFPP_NONE))
-            actions.append(dp.ofproto_parser.OFPActionOutput(out_port))
-        elif action_type == 'SET_VLAN_VID':
-            vlan_vid = int(a.get('vlan_vid', 0xffff))
-            actions.append(dp.ofproto_parser.OFPActionVlanVid(vlan_vid))
-        elif action_type == 'SET_VLAN_PCP':
-            vlan_pcp = int(a.get('vlan_pcp', 0))
-            actions.append(dp.ofproto_parser.OFPActionVlanPcp(vlan_pcp))
-        elif action_type == 'STRIP_VLAN':
-            actions.append(dp.ofproto_parser.OFPActionStripVlan())
-        elif action_type == 'SET_DL_SRC':
-            dl_src = haddr_to_bin(a.get('dl_src'))
-            actions.append(dp.ofproto_parser.OFPActionSetDlSrc(dl_src))
-        elif action_type == 'SET_DL_DST':
-            dl_dst = haddr_to_bin(a.get('dl_dst'))
-            actions.append(dp.ofproto_parser.OFPActionSetDlDst(dl_dst))
-        else:
+        to_action = _ACTIONS.get(a.get('type'))
+        if to_action is None:
             LOG.debug('Unknown action type')
+            continue
+        actions.append(to_action(dp.ofproto_parser, a))
 
     return actions
 
@@ -57,101 +72,61 @@ def to_actions(dp, acts):
 def actions_to_str(acts):
     actions = []
     for a in acts:
-        action_type = a.cls_action_type
-
-        if action_type == ofproto_v1_0.OFPAT_OUTPUT:
-            buf = 'OUTPUT:' + str(a.port)
-        elif action_type == ofproto_v1_0.OFPAT_SET_VLAN_VID:
-            buf = 'SET_VLAN_VID:' + str(a.vlan_vid)
-        elif action_type == ofproto_v1_0.OFPAT_SET_VLAN_PCP:
-            buf = 'SET_VLAN_PCP:' + str(a.vlan_pcp)
-        elif action_type == ofproto_v1_0.OFPAT_STRIP_VLAN:
-            buf = 'STRIP_VLAN'
-        elif action_type == ofproto_v1_0.OFPAT_SET_DL_SRC:
-            buf = 'SET_DL_SRC:' + haddr_to_str(a.dl_addr)
-        elif action_type == ofproto_v1_0.OFPAT_SET_DL_DST:
-            buf = 'SET_DL_DST:' + haddr_to_str(a.dl_addr)
-        else:
-            buf = 'UNKNOWN'
-        actions.append(buf)
+        to_str = _ACTIONS_TO_STR.get(a.cls_action_type)
+        actions.append(to_str(a) if to_str else 'UNKNOWN')
 
     return actions
 
 
+def _field(name, convert, wildcard):
+    def _set(value, _attrs, fields):
+        fields[name] = convert(value)
+        fields['wildcards'] &= ~wildcard
+    return _set
+
+
+def _nw_addr(name, shift, wildcard_mask):
+    def _set(value, _attrs, fields):
+        ip = value.split('/')
+        fields[name] = struct.unpack('!I', socket.inet_aton(ip[0]))[0]
+        mask = 32
+        if len(ip) == 2:
+            mask = int(ip[1])
+            assert 0 < mask <= 32
+        fields['wildcards'] &= (32 - mask) << shift | ~wildcard_mask
+    return _set
+
+
+_MATCH = ofctl_utils.Converter({
+    'in_port': _field('in_port', int, ofproto_v1_0.OFPFW_IN_PORT),
+    'dl_src': _field('dl_src', haddr_to_bin, ofproto_v1_0.OFPFW_DL_SRC),
+    'dl_dst': _field('dl_dst', haddr_to_bin, ofproto_v1_0.OFPFW_DL_DST),
+    'dl_vlan': _field('dl_vlan', int, ofproto_v1_0.OFPFW_DL_VLAN),
+    'dl_vlan_pcp': _field('dl_vlan_pcp', int,
+                          ofproto_v1_0.OFPFW_DL_VLAN_PCP),
+    'dl_type': _field('dl_type', int, ofproto_v1_0.OFPFW_DL_TYPE),
+    'nw_tos': _field('nw_tos', int, ofproto_v1_0.OFPFW_NW_TOS),
+    'nw_proto': _field('nw_proto', int, ofproto_v1_0.OFPFW_NW_PROTO),
+    'nw_src': _nw_addr('nw_src', ofproto_v1_0.OFPFW_NW_SRC_SHIFT,
+                       ofproto_v1_0.OFPFW_NW_SRC_MASK),
+    'nw_dst': _nw_addr('nw_dst', ofproto_v1_0.OFPFW_NW_DST_SHIFT,
+                       ofproto_v1_0.OFPFW_NW_DST_MASK),
+    'tp_src': _field('tp_src', int, ofproto_v1_0.OFPFW_TP_SRC),
+    'tp_dst': _field('tp_dst', int, ofproto_v1_0.OFPFW_TP_DST),
+})
+
+_MATCH_FIELDS = ('in_port', 'dl_src', 'dl_dst', 'dl_vlan', 'dl_vlan_pcp',
+                 'dl_type', 'nw_tos', 'nw_proto', 'nw_src', 'nw_dst',
+                 'tp_src', 'tp_dst')
+
+
 def to_match(dp, attrs):
-    ofp = dp.ofproto
-
-    wildcards = ofp.OFPFW_ALL
-    in_port = 0
-    dl_src = 0
-    dl_dst = 0
-    dl_vlan = 0
-    dl_vlan_pcp = 0
-    dl_type = 0
-    nw_tos = 0
-    nw_proto = 0
-    nw_src = 0
-    nw_dst = 0
-    tp_src = 0
-    tp_dst = 0
-
-    for key, value in attrs.items():
-        if key == 'in_port':
-            in_port = int(value)
-            wildcards &= ~ofp.OFPFW_IN_PORT
-        elif key == 'dl_src':
-            dl_src = haddr_to_bin(value)
-            wildcards &= ~ofp.OFPFW_DL_SRC
-        elif key == 'dl_dst':
-            dl_dst = haddr_to_bin(value)
-            wildcards &= ~ofp.OFPFW_DL_DST
-        elif key == 'dl_vlan':
-            dl_vlan = int(value)
-            wildcards &= ~ofp.OFPFW_DL_VLAN
-        elif key == 'dl_vlan_pcp':
-            dl_vlan_pcp = int(value)
-            wildcards &= ~ofp.OFPFW_DL_VLAN_PCP
-        elif key == 'dl_type':
-            dl_type = int(value)
-            wildcards &= ~ofp.OFPFW_DL_TYPE
-        elif key == 'nw_tos':
-            nw_tos = int(value)
-            wildcards &= ~ofp.OFPFW_NW_TOS
-        elif key == 'nw_proto':
-            nw_proto = int(value)
-            wildcards &= ~ofp.OFPFW_NW_PROTO
-        elif key == 'nw_src':
-            ip = value.split('/')
-            nw_src = struct.unpack('!I', socket.inet_aton(ip[0]))[0]
-            mask = 32
-            if len(ip) == 2:
-                mask = int(ip[1])
-                assert 0 < mask <= 32
-            v = (32 - mask) << ofp.OFPFW_NW_SRC_SHIFT | \
-                ~ofp.OFPFW_NW_SRC_MASK
-            wildcards &= v
-        elif key == 'nw_dst':
-            ip = value.split('/')
-            nw_dst = struct.unpack('!I', socket.inet_aton(ip[0]))[0]
-            mask = 32
-            if len(ip) == 2:
-                mask = int(ip[1])
-                assert 0 < mask <= 32
-            v = (32 - mask) << ofp.OFPFW_NW_DST_SHIFT | \
-                ~ofp.OFPFW_NW_DST_MASK
-            wildcards &= v
-        elif key == 'tp_src':
-            tp_src = int(value)
-            wildcards &= ~ofp.OFPFW_TP_SRC
-        elif key == 'tp_dst':
-            tp_dst = int(value)
-            wildcards &= ~ofp.OFPFW_TP_DST
-        else:
-            LOG.debug("unknown match name %s, %s, %d", key, value, len(key))
+    fields = dict.fromkeys(_MATCH_FIELDS, 0)
+    fields['wildcards'] = dp.ofproto.OFPFW_ALL
+    _MATCH(attrs, fields)
 
     match = dp.ofproto_parser.OFPMatch(
-        wildcards, in_port, dl_src, dl_dst, dl_vlan, dl_vlan_pcp,
-        dl_type, nw_tos, nw_proto, nw_src, nw_dst, tp_src, tp_dst)
+        fields['wildcards'], *[fields[name] for name in _MATCH_FIELDS])
 
     return match
 
@@ -192,23 +167,10 @@ def nw_dst_to_str(wildcards, addr):
     return ip
 
 
-def send_stats_request(dp, stats, waiters, msgs):
-    dp.set_xid(stats)
-    waiters_per_dp = waiters.setdefault(dp.id, {})
-    lock = gevent.event.AsyncResult()
-    waiters_per_dp[stats.xid] = (lock, msgs)
-    dp.send_msg(stats)
-
-    try:
-        lock.get(timeout=DEFAULT_TIMEOUT)
-    except gevent.Timeout:
-        del waiters_per_dp[stats.xid]
-
-
-def get_desc_stats(dp, waiters):
+def get_desc_stats(dp, waiters, timeout=DEFAULT_TIMEOUT):
     stats = dp.ofproto_parser.OFPDescStatsRequest(dp, 0)
     msgs = []
-    send_stats_request(dp, stats, waiters, msgs)
+    send_stats_request(dp, stats, waiters, msgs, timeout)
 
     for msg in msgs:
         stats = msg.body
@@ -221,41 +183,45 @@ def get_desc_stats(dp, waiters):
     return desc
 
 
-def get_flow_stats(dp, waiters):
+def flow_stats_request(dp):
     match = dp.ofproto_parser.OFPMatch(
         dp.ofproto.OFPFW_ALL, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0)
-    stats = dp.ofproto_parser.OFPFlowStatsRequest(
+    return dp.ofproto_parser.OFPFlowStatsRequest(
         dp, 0, match, 0xff, dp.ofproto.OFPP_NONE)
+
+
+def flow_stats_to_str(stats):
+    return {'priority': stats.priority,
+            'cookie': stats.cookie,
+            'idle_timeout': stats.idle_timeout,
+            'hard_timeout': stats.hard_timeout,
+            'actions': actions_to_str(stats.actions),
+            'match': match_to_str(stats.match),
+            'byte_count': stats.byte_count,
+            'duration_sec': stats.duration_sec,
+            'duration_nsec': stats.duration_nsec,
+            'packet_count': stats.packet_count,
+            'table_id': stats.table_id}
+
+
+def get_flow_stats(dp, waiters, timeout=DEFAULT_TIMEOUT):
+    stats = flow_stats_request(dp)
     msgs = []
-    send_stats_request(dp, stats, waiters, msgs)
+    send_stats_request(dp, stats, waiters, msgs, timeout)
 
     flows = []
     for msg in msgs:
         for stats in msg.body:
-            actions = actions_to_str(stats.actions)
-            match = match_to_str(stats.match)
-
-            s = {'priority': stats.priority,
-                 'cookie': stats.cookie,
-                 'idle_timeout': stats.idle_timeout,
-                 'hard_timeout': stats.hard_timeout,
-                 'actions': actions,
-                 'match': match,
-                 'byte_count': stats.byte_count,
-                 'duration_sec': stats.duration_sec,
-                 'duration_nsec': stats.duration_nsec,
-                 'packet_count': stats.packet_count,
-                 'table_id': stats.table_id}
-            flows.append(s)
+            flows.append(flow_stats_to_str(stats))
     flows = {str(dp.id): flows}
     return flows
 
 
-def get_port_stats(dp, waiters):
+def get_port_stats(dp, waiters, timeout=DEFAULT_TIMEOUT):
     stats = dp.ofproto_parser.OFPPortStatsRequest(
         dp, 0, dp.ofproto.OFPP_NONE)
     msgs = []
-    send_stats_request(dp, stats, waiters, msgs)
+    send_stats_request(dp, stats, waiters, msgs, timeout)
 
     ports = []
     for msg in msgs:
@@ -16,18 +16,17 @@
 import struct
 import socket
 import logging
-import gevent
 
 from ryu.ofproto import inet
 from ryu.ofproto import ofproto_v1_2
 from ryu.ofproto import ofproto_v1_2_parser
 from ryu.lib import mac
+from ryu.lib import ofctl_utils
+from ryu.lib.ofctl_utils import DEFAULT_TIMEOUT, send_stats_request
 
 
 LOG = logging.getLogger('ryu.lib.ofctl_v1_2')
 
-DEFAULT_TIMEOUT = 1.0
-
 
 def to_actions(dp, acts):
     inst = []
@@ -62,69 +61,46 @@ def actions_to_str(instructions):
     return actions
 
 
-def to_match(dp, attrs):
-    match = dp.ofproto_parser.OFPMatch()
-
-    convert = {'in_port': int,
-               'dl_src': mac.haddr_to_bin,
-               'dl_dst': mac.haddr_to_bin,
-               'dl_type': int,
-               'dl_vlan': int,
-               'nw_src': to_match_ip,
-               'nw_dst': to_match_ip,
-               'nw_proto': int,
-               'tp_src': int,
-               'tp_dst': int}
-
-    match_append = {'in_port': match.set_in_port,
-                    'dl_src': match.set_dl_src,
-                    'dl_dst': match.set_dl_dst,
-                    'dl_type': match.set_dl_type,
-                    'dl_vlan': match.set_vlan_vid,
-                    'nw_src': match.set_ipv4_src_masked,
-                    'nw_dst': match.set_ipv4_dst_masked,
-                    'nw_proto': match.set_ip_proto,
-                    'tp_src': to_match_tpsrc,
-                    'tp_dst': to_match_tpdst}
-
-    for key, value in attrs.items():
-        if key in convert:
-            value = convert[key](value)
-        if key in match_append:
-            if key == 'nw_src' or key == 'nw_dst':
-                # IP address
-                ip = value[0]
-                mask = value[1]
-                match_append[key](ip, mask)
-            elif key == 'tp_src' or key == 'tp_dst':
-                # tp_src/dst
-                match = match_append[key](value, match, attrs)
-            else:
-                # others
-                match_append[key](value)
+def _setter(convert, set_):
+    def _set(value, _attrs, match):
+        getattr(match, set_)(convert(value))
+    return _set
 
-    return match
 
+def _ipv4(set_masked):
+    def _set(value, _attrs, match):
+        getattr(match, set_masked)(*to_match_ip(value))
+    return _set
 
-def to_match_tpsrc(value, match, rest):
-    match_append = {inet.IPPROTO_TCP: match.set_tcp_src,
-                    inet.IPPROTO_UDP: match.set_udp_src}
 
-    nw_proto = rest.get('nw_proto', 0)
-    if nw_proto in match_append:
-        match_append[nw_proto](value)
+def _tp(tcp, udp):
+    sets = {inet.IPPROTO_TCP: tcp,
+            inet.IPPROTO_UDP: udp}
 
-    return match
+    def _set(value, attrs, match):
+        set_ = sets.get(attrs.get('nw_proto', 0))
+        if set_ is not None:
+            getattr(match, set_)(int(value))
+    return _set
 
 
-def to_match_tpdst(value, match, rest):
-    match_append = {inet.IPPROTO_TCP: match.set_tcp_dst,
-                    inet.IPPROTO_UDP: match.set_udp_dst}
+_MATCH = ofctl_utils.Converter({
+    'in_port': _setter(int, 'set_in_port'),
+    'dl_src': _setter(mac.haddr_to_bin, 'set_dl_src'),
+    'dl_dst': _setter(mac.haddr_to_bin, 'set_dl_dst'),
+    'dl_type': _setter(int, 'set_dl_type'),
+    'dl_vlan': _setter(int, 'set_vlan_vid'),
+    'nw_src': _ipv4('set_ipv4_src_masked'),
+    'nw_dst': _ipv4('set_ipv4_dst_masked'),
+    'nw_proto': _setter(int, 'set_ip_proto'),
+    'tp_src': _tp('set_tcp_src', 'set_udp_src'),
+    'tp_dst': _tp('set_tcp_dst', 'set_udp_dst'),
+})
 
-    nw_proto = rest.get('nw_proto', 0)
-    if nw_proto in match_append:
-        match_append[nw_proto](value)
 
+def to_match(dp, attrs):
+    match = dp.ofproto_parser.OFPMatch()
+    _MATCH(attrs, match)
     return match
 
 
@@ -184,20 +160,7 @@ def match_ip_to_str(value, mask):
     return ip + netmask
 
 
-def send_stats_request(dp, stats, waiters, msgs):
-    dp.set_xid(stats)
-    waiters_per_dp = waiters.setdefault(dp.id, {})
-    lock = gevent.event.AsyncResult()
-    waiters_per_dp[stats.xid] = (lock, msgs)
-    dp.send_msg(stats)
-
-    try:
-        lock.get(timeout=DEFAULT_TIMEOUT)
-    except gevent.Timeout:
-        del waiters_per_dp[stats.xid]
-
-
-def get_flow_stats(dp, waiters):
+def flow_stats_request(dp):
     table_id = 0
     out_port = dp.ofproto.OFPP_ANY
     out_group = dp.ofproto.OFPG_ANY
@@ -205,30 +168,33 @@ def get_flow_stats(dp, waiters):
     cookie_mask = 0
     match = dp.ofproto_parser.OFPMatch()
 
-    stats = dp.ofproto_parser.OFPFlowStatsRequest(
+    return dp.ofproto_parser.OFPFlowStatsRequest(
         dp, table_id, out_port, out_group, cookie, cookie_mask, match)
 
+
+def flow_stats_to_str(stats):
+    return {'priority': stats.priority,
+            'cookie': stats.cookie,
+            'idle_timeout': stats.idle_timeout,
+            'hard_timeout': stats.hard_timeout,
+            'actions': actions_to_str(stats.instructions),
+            'match': match_to_str(stats.match),
+            'byte_count': stats.byte_count,
+            'duration_sec': stats.duration_sec,
+            'duration_nsec': stats.duration_nsec,
+            'packet_count': stats.packet_count,
+            'table_id': stats.table_id}
+
+
+def get_flow_stats(dp, waiters, timeout=DEFAULT_TIMEOUT):
+    stats = flow_stats_request(dp)
     msgs = []
-    send_stats_request(dp, stats, waiters, msgs)
+    send_stats_request(dp, stats, waiters, msgs, timeout)
 
     flows = []
     for msg in msgs:
         for stats in msg.body:
-            actions = actions_to_str(stats.instructions)
-            match = match_to_str(stats.match)
-
-            s = {'priority': stats.priority,
-                 'cookie': stats.cookie,
-                 'idle_timeout': stats.idle_timeout,
-                 'hard_timeout': stats.hard_timeout,
-                 'actions': actions,
-                 'match': match,
-                 'byte_count': stats.byte_count,
-                 'duration_sec': stats.duration_sec,
-                 'duration_nsec': stats.duration_nsec,
-                 'packet_count': stats.packet_count,
-                 'table_id': stats.table_id}
-            flows.append(s)
+            flows.append(flow_stats_to_str(stats))
     flows = {str(dp.id): flows}
 
     return flows
@@ -0,0 +1,442 @@
+# Copyright (C) 2013 Nippon Telegraph and Telephone Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+
+from ryu.ofproto import inet
+from ryu.ofproto import ofproto_v1_3
+from ryu.ofproto import ofproto_v1_3_parser
+from ryu.lib import mac
+from ryu.lib import ofctl_utils
+from ryu.lib.ofctl_utils import DEFAULT_TIMEOUT, send_stats_request
+
+
+LOG = logging.getLogger('ryu.lib.ofctl_v1_3')
+
+
+def _action(cls, *args):
+    """action of the REST API -> cls(a[arg] or the default, ...)"""
+    def _to_action(a):
+        return cls(*[ofctl_utils.to_int(a.get(name, default))
+                     for name, default in args])
+    return _to_action
+
+
+def _set_field(a):
+    name = a.get('field')
+    if name not in _FIELDS:
+        raise ValueError('unknown field %s' % name)
+    header, convert, _to_str = _FIELDS[name]
+    field = ofproto_v1_3_parser.OFPMatchField.make(header,
+                                                   convert(a.get('value')))
+    return ofproto_v1_3_parser.OFPActionSetField(field)
+
+
+def _set_field_to_str(a):
+    key_to_str = _HEADERS.get(a.field.header)
+    if key_to_str is None:
+        # a field without a match key of the REST API, e.g. ARP or IPv6
+        value = a.field.value
+        if isinstance(value, str):
+            value = '0x' + value.encode('hex')
+        return 'SET_FIELD:{0x%08x:%s}' % (a.field.header, value)
+    key, to_str = key_to_str
+    return 'SET_FIELD:{%s:%s}' % (key, to_str(a.field.value, None))
+
+
+_ACTIONS = {
+    'OUTPUT': _action(ofproto_v1_3_parser.OFPActionOutput,
+                      ('port', ofproto_v1_3.OFPP_ANY),
+                      ('max_len', ofproto_v1_3.OFPCML_NO_BUFFER)),
+    'COPY_TTL_OUT': _action(ofproto_v1_3_parser.OFPActionCopyTtlOut),
+    'COPY_TTL_IN': _action(ofproto_v1_3_parser.OFPActionCopyTtlIn),
+    'SET_MPLS_TTL': _action(ofproto_v1_3_parser.OFPActionSetMplsTtl,
+                            ('mpls_ttl', 0)),
+    'DEC_MPLS_TTL': _action(ofproto_v1_3_parser.OFPActionDecMplsTtl),
+    'PUSH_VLAN': _action(ofproto_v1_3_parser.OFPActionPushVlan,
+                         ('ethertype', 0x8100)),
+    'POP_VLAN': _action(ofproto_v1_3_parser.OFPActionPopVlan),
+    'PUSH_MPLS': _action(ofproto_v1_3_parser.OFPActionPushMpls,
+                         ('ethertype', 0x8847)),
+    'POP_MPLS': _action(ofproto_v1_3_parser.OFPActionPopMpls,
+                        ('ethertype', 0x0800)),
+    'SET_QUEUE': _action(ofproto_v1_3_parser.OFPActionSetQueue,
+                         ('queue_id', 0)),
+    'GROUP': _action(ofproto_v1_3_parser.OFPActionGroup,
+                     ('group_id', 0)),
+    'SET_NW_TTL': _action(ofproto_v1_3_parser.OFPActionSetNwTtl,
+                          ('nw_ttl', 0)),
+    'DEC_NW_TTL': _action(ofproto_v1_3_parser.OFPActionDecNwTtl),
+    'SET_FIELD': _set_field,
+}
+
+_ACTIONS_TO_STR = {
+    ofproto_v1_3.OFPAT_OUTPUT: lambda a: 'OUTPUT:%d' % a.port,
+    ofproto_v1_3.OFPAT_COPY_TTL_OUT: lambda a: 'COPY_TTL_OUT',
+    ofproto_v1_3.OFPAT_COPY_TTL_IN: lambda a: 'COPY_TTL_IN',
+    ofproto_v1_3.OFPAT_SET_MPLS_TTL: lambda a: 'SET_MPLS_TTL:%d' % a.mpls_ttl,
+    ofproto_v1_3.OFPAT_DEC_MPLS_TTL: lambda a: 'DEC_MPLS_TTL',
+    ofproto_v1_3.OFPAT_PUSH_VLAN: lambda a: 'PUSH_VLAN:0x%04x' % a.ethertype,
+    ofproto_v1_3.OFPAT_POP_VLAN: lambda a: 'POP_VLAN',
+    ofproto_v1_3.OFPAT_PUSH_MPLS: lambda a: 'PUSH_MPLS:0x%04x' % a.ethertype,
+    ofproto_v1_3.OFPAT_POP_MPLS: lambda a: 'POP_MPLS:0x%04x' % a.ethertype,
+    ofproto_v1_3.OFPAT_SET_QUEUE: lambda a: 'SET_QUEUE:%d' % a.queue_id,
+    ofproto_v1_3.OFPAT_GROUP: lambda a: 'GROUP:%d' % a.group_id,
+    ofproto_v1_3.OFPAT_SET_NW_TTL: lambda a: 'SET_NW_TTL:%d' % a.nw_ttl,
+    ofproto_v1_3.OFPAT_DEC_NW_TTL: lambda a: 'DEC_NW_TTL',
+    ofproto_v1_3.OFPAT_SET_FIELD: _set_field_to_str,
+}
+
+
+def to_actions(dp, acts):
+    """
+    Return the instructions of the actions of the REST API.
+    GOTO_TABLE and WRITE_METADATA become the instructions of their own,
+    and the others are applied in the order.
+    """
+    parser = dp.ofproto_parser
+    inst = []
+    actions = []
+    for a in acts:
+        action_type = a.get('type')
+        to_action = _ACTIONS.get(action_type)
+        if to_action is not None:
+            actions.append(to_action(a))
+        elif action_type == 'GOTO_TABLE':
+            table_id = ofctl_utils.to_int(a.get('table_id'))
+            inst.append(parser.OFPInstructionGotoTable(table_id))
+        elif action_type == 'WRITE_METADATA':
+            metadata = ofctl_utils.to_int(a.get('metadata'))
+            metadata_mask = ofctl_utils.to_int(
+                a.get('metadata_mask', ofproto_v1_3_parser.UINT64_MAX))
+            inst.append(parser.OFPInstructionWriteMetadata(metadata,
+                                                           metadata_mask))
+        else:
+            LOG.debug('Unknown action type: %s', action_type)
+
+    if actions:
+        inst.insert(0, parser.OFPInstructionActions(
+            ofproto_v1_3.OFPIT_APPLY_ACTIONS, actions))
+    return inst
+
+
+def actions_to_str(instructions):
+    actions = []
+    for instruction in instructions:
+        if isinstance(instruction, ofproto_v1_3_parser.OFPInstructionActions):
+            for a in instruction.actions:
+                to_str = _ACTIONS_TO_STR.get(a.cls_action_type)
+                actions.append(to_str(a) if to_str else 'UNKNOWN')
+        elif isinstance(instruction,
+                        ofproto_v1_3_parser.OFPInstructionGotoTable):
+            actions.append('GOTO_TABLE:%d' % instruction.table_id)
+        elif isinstance(instruction,
+                        ofproto_v1_3_parser.OFPInstructionWriteMetadata):
+            actions.append('WRITE_METADATA:0x%x/0x%x' % (
+                instruction.metadata, instruction.metadata_mask))
+        else:
+            actions.append('UNKNOWN')
+    return actions
+
+
+def _int_to_str(value, mask):
+    if mask is None:
+        return value
+    return '0x%x/0x%x' % (value, mask)
+
+
+def _haddr_to_str(value, mask):
+    if mask is None:
+        return mac.haddr_to_str(value)
+    return '%s/%s' % (mac.haddr_to_str(value), mac.haddr_to_str(mask))
+
+
+# match key of the REST API -> (header, converter, to_str)
+_FIELDS = {
+    'in_port': (ofproto_v1_3.OXM_OF_IN_PORT, ofctl_utils.to_int,
+                _int_to_str),
+    'metadata': (ofproto_v1_3.OXM_OF_METADATA, ofctl_utils.to_int,
+                 _int_to_str),
+    'dl_src': (ofproto_v1_3.OXM_OF_ETH_SRC, mac.haddr_to_bin,
+               _haddr_to_str),
+    'dl_dst': (ofproto_v1_3.OXM_OF_ETH_DST, mac.haddr_to_bin,
+               _haddr_to_str),
+    'dl_type': (ofproto_v1_3.OXM_OF_ETH_TYPE, ofctl_utils.to_int,
+                _int_to_str),
+    'dl_vlan': (ofproto_v1_3.OXM_OF_VLAN_VID, ofctl_utils.to_int,
+                _int_to_str),
+    'dl_vlan_pcp': (ofproto_v1_3.OXM_OF_VLAN_PCP, ofctl_utils.to_int,
+                    _int_to_str),
+    'ip_dscp': (ofproto_v1_3.OXM_OF_IP_DSCP, ofctl_utils.to_int,
+                _int_to_str),
+    'nw_proto': (ofproto_v1_3.OXM_OF_IP_PROTO, ofctl_utils.to_int,
+                 _int_to_str),
+    'nw_src': (ofproto_v1_3.OXM_OF_IPV4_SRC,
+               lambda value: ofctl_utils.to_ipv4_masked(value)[0],
+               ofctl_utils.ipv4_masked_to_str),
+    'nw_dst': (ofproto_v1_3.OXM_OF_IPV4_DST,
+               lambda value: ofctl_utils.to_ipv4_masked(value)[0],
+               ofctl_utils.ipv4_masked_to_str),
+    'tp_src': (ofproto_v1_3.OXM_OF_TCP_SRC, ofctl_utils.to_int,
+               _int_to_str),
+    'tp_dst': (ofproto_v1_3.OXM_OF_TCP_DST, ofctl_utils.to_int,
+               _int_to_str),
+    'mpls_label': (ofproto_v1_3.OXM_OF_MPLS_LABEL, ofctl_utils.to_int,
+                   _int_to_str),
+    'tunnel_id': (ofproto_v1_3.OXM_OF_TUNNEL_ID, ofctl_utils.to_int,
+                  _int_to_str),
+}
+
+# header of a match field -> (match key of the REST API, to_str)
+_HEADERS = dict((header, (key, to_str))
+                for key, (header, _convert, to_str) in _FIELDS.items())
+_HEADERS.update({
+    ofproto_v1_3.OXM_OF_METADATA_W: ('metadata', _int_to_str),
+    ofproto_v1_3.OXM_OF_ETH_SRC_W: ('dl_src', _haddr_to_str),
+    ofproto_v1_3.OXM_OF_ETH_DST_W: ('dl_dst', _haddr_to_str),
+    ofproto_v1_3.OXM_OF_VLAN_VID_W: ('dl_vlan', _int_to_str),
+    ofproto_v1_3.OXM_OF_IPV4_SRC_W: ('nw_src',
+                                     ofctl_utils.ipv4_masked_to_str),
+    ofproto_v1_3.OXM_OF_IPV4_DST_W: ('nw_dst',
+                                     ofctl_utils.ipv4_masked_to_str),
+    ofproto_v1_3.OXM_OF_UDP_SRC: ('tp_src', _int_to_str),
+    ofproto_v1_3.OXM_OF_UDP_DST: ('tp_dst', _int_to_str),
+    ofproto_v1_3.OXM_OF_SCTP_SRC: ('tp_src', _int_to_str),
+    ofproto_v1_3.OXM_OF_SCTP_DST: ('tp_dst', _int_to_str),
+    ofproto_v1_3.OXM_OF_TUNNEL_ID_W: ('tunnel_id', _int_to_str),
+})
+
+
+def _masked(convert, set_masked):
+    """'value' or 'value/mask' -> match.set_masked(value, mask)"""
+    def _set(value, _attrs, match):
+        value_mask = str(value).split('/')
+        if len(value_mask) == 2:
+            getattr(match, set_masked)(convert(value_mask[0]),
+                                       convert(value_mask[1]))
+        else:
+            getattr(match, set_masked[:-len('_masked')])(convert(value))
+    return _set
+
+
+def _setter(convert, set_):
+    def _set(value, _attrs, match):
+        getattr(match, set_)(convert(value))
+    return _set
+
+
+def _ipv4(set_masked):
+    def _set(value, _attrs, match):
+        getattr(match, set_masked)(*ofctl_utils.to_ipv4_masked(value))
+    return _set
+
+
+def _tp(tcp, udp, sctp):
+    sets = {inet.IPPROTO_TCP: tcp,
+            inet.IPPROTO_UDP: udp,
+            inet.IPPROTO_SCTP: sctp}
+
+    def _set(value, attrs, match):
+        set_ = sets.get(ofctl_utils.to_int(attrs.get('nw_proto', 0)))
+        if set_ is not None:
+            getattr(match, set_)(ofctl_utils.to_int(value))
+    return _set
+
+
+_MATCH = ofctl_utils.Converter({
+    'in_port': _setter(ofctl_utils.to_int, 'set_in_port'),
+    'metadata': _masked(ofctl_utils.to_int, 'set_metadata_masked'),
+    'dl_src': _masked(mac.haddr_to_bin, 'set_dl_src_masked'),
+    'dl_dst': _masked(mac.haddr_to_bin, 'set_dl_dst_masked'),
+    'dl_type': _setter(ofctl_utils.to_int, 'set_dl_type'),
+    'dl_vlan': _setter(ofctl_utils.to_int, 'set_vlan_vid'),
+    'dl_vlan_pcp': _setter(ofctl_utils.to_int, 'set_vlan_pcp'),
+    'ip_dscp': _setter(ofctl_utils.to_int, 'set_ip_dscp'),
+    'nw_proto': _setter(ofctl_utils.to_int, 'set_ip_proto'),
+    'nw_src': _ipv4('set_ipv4_src_masked'),
+    'nw_dst': _ipv4('set_ipv4_dst_masked'),
+    'tp_src': _tp('set_tcp_src', 'set_udp_src', 'set_sctp_src'),
+    'tp_dst': _tp('set_tcp_dst', 'set_udp_dst', 'set_sctp_dst'),
+    'mpls_label': _setter(ofctl_utils.to_int, 'set_mpls_label'),
+    'tunnel_id': _masked(ofctl_utils.to_int, 'set_tunnel_id_masked'),
+})
+
+
+def to_match(dp, attrs):
+    match = dp.ofproto_parser.OFPMatch()
+    _MATCH(attrs, match)
+    return match
+
+
+def match_to_str(ofmatch):
+    match = {}
+    for field in ofmatch.fields:
+        key_to_str = _HEADERS.get(field.header)
+        if key_to_str is None:
+            continue
+        key, to_str = key_to_str
+        match.setdefault(key, to_str(field.value,
+                                     getattr(field, 'mask', None)))
+    return match
+
+
+def get_desc_stats(dp, waiters, timeout=DEFAULT_TIMEOUT):
+    stats = dp.ofproto_parser.OFPDescStatsRequest(dp, 0)
+    msgs = []
+    send_stats_request(dp, stats, waiters, msgs, timeout)
+
+    s = {}
+    for msg in msgs:
+        stats = msg.body
+        s = {'mfr_desc': stats.mfr_desc,
+             'hw_desc': stats.hw_desc,
+             'sw_desc': stats.sw_desc,
+             'serial_num': stats.serial_num,
+             'dp_desc': stats.dp_desc}
+    desc = {str(dp.id): s}
+    return desc
+
+
+def flow_stats_request(dp):
+    return dp.ofproto_parser.OFPFlowStatsRequest(
+        dp, 0, dp.ofproto.OFPTT_ALL, dp.ofproto.OFPP_ANY,
+        dp.ofproto.OFPG_ANY, 0, 0, dp.ofproto_parser.OFPMatch())
+
+
+def flow_stats_to_str(stats):
+    return {'priority': stats.priority,
+            'cookie': stats.cookie,
+            'idle_timeout': stats.idle_timeout,
+            'hard_timeout': stats.hard_timeout,
+            'flags': stats.flags,
+            'actions': actions_to_str(stats.instructions),
+            'match': match_to_str(stats.match),
+            'byte_count': stats.byte_count,
+            'duration_sec': stats.duration_sec,
+            'duration_nsec': stats.duration_nsec,
+            'packet_count': stats.packet_count,
+            'table_id': stats.table_id}
+
+
+def get_flow_stats(dp, waiters, timeout=DEFAULT_TIMEOUT):
+    stats = flow_stats_request(dp)
+    msgs = []
+    send_stats_request(dp, stats, waiters, msgs, timeout)
+
+    flows = []
+    for msg in msgs:
+        for stats in msg.body:
+            flows.append(flow_stats_to_str(stats))
+    flows = {str(dp.id): flows}
+    return flows
+
+
+def get_port_stats(dp, waiters, timeout=DEFAULT_TIMEOUT):
+    stats = dp.ofproto_parser.OFPPortStatsRequest(
+        dp, 0, dp.ofproto.OFPP_ANY)
+    msgs = []
+    send_stats_request(dp, stats, waiters, msgs, timeout)
+
+    ports = []
+    for msg in msgs:
+        for stats in msg.body:
+            ports.append(stats._asdict())
+    ports = {str(dp.id): ports}
+    return ports
+
+
+def get_table_stats(dp, waiters, timeout=DEFAULT_TIMEOUT):
+    stats = dp.ofproto_parser.OFPTableStatsRequest(dp, 0)
+    msgs = []
+    send_stats_request(dp, stats, waiters, msgs, timeout)
+
+    tables = []
+    for msg in msgs:
+        for stats in msg.body:
+            tables.append(stats._asdict())
+    tables = {str(dp.id): tables}
+    return tables
+
+
+def get_group_stats(dp, waiters, timeout=DEFAULT_TIMEOUT):
+    stats = dp.ofproto_parser.OFPGroupStatsRequest(
+        dp, 0, dp.ofproto.OFPG_ALL)
+    msgs = []
+    send_stats_request(dp, stats, waiters, msgs, timeout)
+
+    groups = []
+    for msg in msgs:
+        for stats in msg.body:
+            s = stats._asdict()
+            del s['length']
+            groups.append(s)
+    groups = {str(dp.id): groups}
+    return groups
+
+
+def get_meter_stats(dp, waiters, timeout=DEFAULT_TIMEOUT):
+    stats = dp.ofproto_parser.OFPMeterStatsRequest(
+        dp, 0, dp.ofproto.OFPM_ALL)
+    msgs = []
+    send_stats_request(dp, stats, waiters, msgs, timeout)
+
+    meters = []
+    for msg in msgs:
+        for stats in msg.body:
+            bands = [{'packet_band_count': band.packet_band_count,
+                      'byte_band_count': band.byte_band_count}
+                     for band in stats.band_stats]
+            s = {'meter_id': stats.meter_id,
+                 'flow_count': stats.flow_count,
+                 'packet_in_count': stats.packet_in_count,
+                 'byte_in_count': stats.byte_in_count,
+                 'duration_sec': stats.duration_sec,
+                 'duration_nsec': stats.duration_nsec,
+                 'band_stats': bands}
+            meters.append(s)
+    meters = {str(dp.id): meters}
+    return meters
+
+
+def mod_flow_entry(dp, flow, cmd):
+    cookie = int(flow.get('cookie', 0))
+    cookie_mask = int(flow.get('cookie_mask', 0))
+    table_id = int(flow.get('table_id', 0))
+    idle_timeout = int(flow.get('idle_timeout', 0))
+    hard_timeout = int(flow.get('hard_timeout', 0))
+    priority = int(flow.get('priority', dp.ofproto.OFP_DEFAULT_PRIORITY))
+    buffer_id = int(flow.get('buffer_id', dp.ofproto.OFP_NO_BUFFER))
+    out_port = int(flow.get('out_port', dp.ofproto.OFPP_ANY))
+    out_group = int(flow.get('out_group', dp.ofproto.OFPG_ANY))
+    flags = int(flow.get('flags', 0))
+    match = to_match(dp, flow.get('match', {}))
+    inst = to_actions(dp, flow.get('actions', []))
+
+    flow_mod = dp.ofproto_parser.OFPFlowMod(
+        dp, cookie, cookie_mask, table_id, cmd, idle_timeout,
+        hard_timeout, priority, buffer_id, out_port, out_group,
+        flags, match, inst)
+
+    dp.send_msg(flow_mod)
+
+
+def delete_flow_entry(dp):
+    flow_mod = dp.ofproto_parser.OFPFlowMod(
+        dp, 0, 0, dp.ofproto.OFPTT_ALL, dp.ofproto.OFPFC_DELETE, 0, 0,
+        dp.ofproto.OFP_DEFAULT_PRIORITY, dp.ofproto.OFP_NO_BUFFER,
+        dp.ofproto.OFPP_ANY, dp.ofproto.OFPG_ANY, 0,
+        dp.ofproto_parser.OFPMatch(), [])
+
+    dp.send_msg(flow_mod)
@@ -0,0 +1,99 @@
+# Copyright (C) 2013 Nippon Telegraph and Telephone Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Capture file of the OpenFlow messages of a connection.
+
+The file is append-only: a file header followed by records of
+  timestamp (double, seconds since epoch)
+  direction (uint8, RECV: switch to controller, SEND: controller to switch)
+  length (uint32)
+  raw OpenFlow message of the length
+all in network byte order.
+"""
+
+import struct
+import time
+
+
+MAGIC = 'RYUOFCAP'
+FORMAT_VERSION = 1
+
+RECV = 0
+SEND = 1
+
+_FILE_HEADER_PACK_STR = '!8sI'
+_FILE_HEADER_SIZE = struct.calcsize(_FILE_HEADER_PACK_STR)
+_RECORD_PACK_STR = '!dBI'
+_RECORD_SIZE = struct.calcsize(_RECORD_PACK_STR)
+
+
+class CaptureWriter(object):
+    def __init__(self, path):
+        super(CaptureWriter, self).__init__()
+        self.path = path
+        self.file = open(path, 'ab')
+        if self.file.tell() == 0:
+            self.file.write(struct.pack(_FILE_HEADER_PACK_STR,
+                                        MAGIC, FORMAT_VERSION))
+
+    def write(self, direction, buf, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        self.file.write(struct.pack(_RECORD_PACK_STR,
+                                    timestamp, direction, len(buf)))
+        self.file.write(buf)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class CaptureReader(object):
+    """
+    Iterate over (timestamp, direction, buf) of the records.
+    A truncated record at the end, which a writer killed on the way
+    leaves, is ignored.
+    """
+    def __init__(self, path):
+        super(CaptureReader, self).__init__()
+        self.path = path
+        self.file = open(path, 'rb')
+        header = self.file.read(_FILE_HEADER_SIZE)
+        if len(header) < _FILE_HEADER_SIZE:
+            raise ValueError('%s: not an OpenFlow capture file' % path)
+        magic, version = struct.unpack(_FILE_HEADER_PACK_STR, header)
+        if magic != MAGIC:
+            raise ValueError('%s: not an OpenFlow capture file' % path)
+        if version != FORMAT_VERSION:
+            raise ValueError('%s: unsupported capture format version %d' %
+                             (path, version))
+
+    def __iter__(self):
+        while True:
+            record = self.file.read(_RECORD_SIZE)
+            if len(record) < _RECORD_SIZE:
+                return
+            timestamp, direction, length = struct.unpack(_RECORD_PACK_STR,
+                                                         record)
+            buf = self.file.read(length)
+            if len(buf) < length:
+                return
+            yield timestamp, direction, buf
+
+    def close(self):
+        self.file.close()
@@ -18,6 +18,7 @@
 slimmed down version of OVSBridge in quantum agent
 """
 
+import contextlib
 import functools
 from oslo.config import cfg
 import logging
@@ -34,6 +35,10 @@ CONF.register_opts([
 ])
 
 
+# ovsdb sessions shared by all the OVSBridge instances
+_IDL_POOL = ovs_vsctl.VSCtlIdlPool()
+
+
 class OVSBridgeNotFound(ryu_exc.RyuException):
     message = 'no bridge for datapath_id %(datapath_id)s'
 
@@ -91,15 +96,48 @@ class OVSBridge(object):
     def __init__(self, datapath_id, ovsdb_addr, timeout=None, exception=None):
         super(OVSBridge, self).__init__()
         self.datapath_id = datapath_id
-        self.vsctl = ovs_vsctl.VSCtl(ovsdb_addr)
+        self.vsctl = ovs_vsctl.VSCtl(ovsdb_addr, _IDL_POOL)
         self.timeout = timeout or CONF.ovsdb_timeout
         self.exception = exception
 
         self.br_name = None
+        self._batch = None      # list of commands queued by transaction()
 
     def run_command(self, commands):
+        if self._batch is not None:
+            self._batch.extend(commands)
+            return
+        self._run_query(commands)
+
+    def _run_query(self, commands):
         self.vsctl.run_command(commands, self.timeout, self.exception)
 
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Queue the modifications made in the block and commit them in a
+        single ovsdb transaction when leaving the block.
+        The queries in the block are run immediately, so they don't see
+        the queued modifications.
+
+        with ovs_bridge.transaction():
+            ovs_bridge.set_db_attribute(...)
+            ovs_bridge.del_port(...)
+        """
+        if self._batch is not None:
+            # nested. The outermost one commits.
+            yield
+            return
+
+        self._batch = []
+        try:
+            yield
+            commands = self._batch
+        finally:
+            self._batch = None
+        if commands:
+            self.run_command(commands)
+
     def init(self):
         if self.br_name is None:
             self.br_name = self._get_bridge_name()
@@ -110,7 +148,7 @@ class OVSBridge(object):
             'find',
             ('Bridge',
              'datapath_id=%s' % dpid_lib.dpid_to_str(self.datapath_id)))
-        self.run_command([command])
+        self._run_query([command])
         result = command.result
         if len(result) == 0 or len(result) > 1:
             raise OVSBridgeNotFound(
@@ -119,7 +157,7 @@ class OVSBridge(object):
 
     def get_controller(self):
         command = ovs_vsctl.VSCtlCommand('get-controller', [self.br_name])
-        self.run_command([command])
+        self._run_query([command])
         return command.result[0]
 
     def set_controller(self, controllers):
@@ -142,7 +180,7 @@ class OVSBridge(object):
 
     def db_get_val(self, table, record, column):
         command = ovs_vsctl.VSCtlCommand('get', (table, record, column))
-        self.run_command([command])
+        self._run_query([command])
         assert len(command.result) == 1
         return command.result[0]
 
@@ -166,7 +204,7 @@ class OVSBridge(object):
 
     def get_port_name_list(self):
         command = ovs_vsctl.VSCtlCommand('list-ports', (self.br_name, ))
-        self.run_command([command])
+        self._run_query([command])
         return command.result
 
     def add_tunnel_port(self, name, tunnel_type, local_ip, remote_ip,
@@ -188,71 +226,81 @@ class OVSBridge(object):
         command = ovs_vsctl.VSCtlCommand('del-port', (self.br_name, port_name))
         self.run_command([command])
 
+    def get_ifaces(self, port_name=None):
+        """
+        Return the interfaces of this bridge by a single query.
+        Each interface is a dict of 'name', 'ofport', 'type',
+        'external_ids' and 'options'. 'ofport' is [] when it isn't
+        assigned yet.
+        """
+        command = ovs_vsctl.VSCtlCommand(
+            'list-ifaces-verbose', [dpid_lib.dpid_to_str(self.datapath_id)])
+        if port_name is not None:
+            command.args.append(port_name)
+        self._run_query([command])
+        return command.result
+
     def _get_ports(self, get_port):
         ports = []
-        port_names = self.get_port_name_list()
-        for name in port_names:
-            if self.get_ofport(name) < 0:
+        for iface in self.get_ifaces():
+            if iface['name'] == self.br_name:
                 continue
-            port = get_port(name)
+            ofport = iface['ofport']
+            if ofport == [] or ofport < 0:
+                continue
+            port = get_port(iface)
             if port:
                 ports.append(port)
 
         return ports
 
-    def _vifport(self, name, external_ids):
-        ofport = self.get_ofport(name)
-        return VifPort(name, ofport, external_ids['iface-id'],
-                       external_ids['attached-mac'], self)
-
-    def _get_vif_port(self, name):
-        external_ids = self.db_get_map('Interface', name, 'external_ids')
+    def _get_vif_port(self, iface):
+        external_ids = iface['external_ids']
         if 'iface-id' in external_ids and 'attached-mac' in external_ids:
-            return self._vifport(name, external_ids)
+            return VifPort(iface['name'], iface['ofport'],
+                           external_ids['iface-id'],
+                           external_ids['attached-mac'], self)
 
     def get_vif_ports(self):
         'returns a VIF object for each VIF port'
         return self._get_ports(self._get_vif_port)
 
-    def _get_external_port(self, name):
+    def _get_external_port(self, iface):
         # exclude vif ports
-        external_ids = self.db_get_map('Interface', name, 'external_ids')
-        if external_ids:
+        if iface['external_ids']:
             return
 
         # exclude tunnel ports
-        options = self.db_get_map('Interface', name, 'options')
-        if 'remote_ip' in options:
+        if 'remote_ip' in iface['options']:
             return
 
-        ofport = self.get_ofport(name)
-        return VifPort(name, ofport, None, None, self)
+        return VifPort(iface['name'], iface['ofport'], None, None, self)
 
     def get_external_ports(self):
         return self._get_ports(self._get_external_port)
 
-    def get_tunnel_port(self, name, tunnel_type='gre'):
-        type_ = self.db_get_val('Interface', name, 'type')
-        if type_ != tunnel_type:
+    @staticmethod
+    def _get_tunnel_port(iface, tunnel_type):
+        if iface['type'] != tunnel_type:
             return
 
-        options = self.db_get_map('Interface', name, 'options')
+        options = iface['options']
         if 'local_ip' in options and 'remote_ip' in options:
-            ofport = self.get_ofport(name)
-            return TunnelPort(name, ofport, tunnel_type,
+            return TunnelPort(iface['name'], iface['ofport'], tunnel_type,
                               options['local_ip'], options['remote_ip'])
 
+    def get_tunnel_port(self, name, tunnel_type='gre'):
+        for iface in self.get_ifaces(name):
+            return self._get_tunnel_port(iface, tunnel_type)
+
     def get_tunnel_ports(self, tunnel_type='gre'):
-        get_tunnel_port = functools.partial(self.get_tunnel_port,
+        get_tunnel_port = functools.partial(self._get_tunnel_port,
                                             tunnel_type=tunnel_type)
         return self._get_ports(get_tunnel_port)
 
     def get_quantum_ports(self, port_name):
         LOG.debug('port_name %s', port_name)
-        command = ovs_vsctl.VSCtlCommand(
-            'list-ifaces-verbose',
-            [dpid_lib.dpid_to_str(self.datapath_id), port_name])
-        self.run_command([command])
-        if command.result:
-            return command.result[0]
+        ifaces = self.get_ifaces(port_name)
+        if ifaces:
+            return ifaces[0]
         return None
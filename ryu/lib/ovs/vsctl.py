@@ -15,6 +15,7 @@
 # limitations under the License.
 
 
+import contextlib
 import gevent
 import itertools
 import logging
@@ -33,6 +34,11 @@ from ovs.db import idl
 
 from ryu.lib.ovs import vswitch_idl
 
+try:
+    from gevent.lock import Semaphore
+except ImportError:
+    from gevent.coros import Semaphore  # gevent < 1.0
+
 LOG = logging.getLogger(__name__)       # use ovs.vlog?
 
 
@@ -762,6 +768,103 @@ class VSCtlCommand(object):
         return option in self.options
 
 
+def iface_to_dict(iface_cfg):
+    _ATTRIBUTE = ['name', 'ofport', 'type', 'external_ids', 'options']
+    attr = dict((key, getattr(iface_cfg, key)) for key in _ATTRIBUTE)
+
+    if attr['ofport']:
+        attr['ofport'] = attr['ofport'][0]
+    return attr
+
+
+def get_schema_json(remote, database):
+    LOG.debug('remote %s', remote)
+    error, stream_ = stream.Stream.open_block(stream.Stream.open(remote))
+    if error:
+        vsctl_fatal('error %s' % os.strerror(error))
+    rpc = jsonrpc.Connection(stream_)
+    request = jsonrpc.Message.create_request('get_schema', [database])
+    error, reply = rpc.transact_block(request)
+    rpc.close()
+
+    if error:
+        vsctl_fatal(os.strerror(error))
+    elif reply.error:
+        vsctl_fatal('error %s' % reply.error)
+    return reply.result
+
+
+class _IdlSession(object):
+    """
+    IDL which replicates the whole database of a remote.
+    The monitor stream is kept alive by a background greenlet so that the
+    replica is kept up to date incrementally.
+    """
+    def __init__(self, remote, schema_json):
+        super(_IdlSession, self).__init__()
+        schema_helper = idl.SchemaHelper(None, schema_json)
+        schema_helper.register_all()
+        self.idl = idl.Idl(remote, schema_helper)
+        self.lock = Semaphore()
+        self.thread = gevent.spawn(self._run_loop)
+
+    def _run_loop(self):
+        while True:
+            with self.lock:
+                self.idl.run()
+            poller = ovs.poller.Poller()
+            self.idl.wait(poller)
+            poller.block()
+
+    def close(self):
+        self.thread.kill()
+        self.idl.close()
+
+
+class VSCtlIdlPool(object):
+    """
+    Pool of long-lived IDL sessions and database schemas keyed by remote.
+    VSCtl with a pool runs commands against the replica of the session
+    instead of connecting and downloading the database each time.
+    """
+    def __init__(self):
+        super(VSCtlIdlPool, self).__init__()
+        self.schema_jsons = {}  # remote -> schema json
+        self._sessions = {}  # remote -> _IdlSession
+
+    @contextlib.contextmanager
+    def session(self, remote, schema_json):
+        session = self._sessions.get(remote)
+        if session is None:
+            LOG.debug('new idl session remote %s', remote)
+            session = _IdlSession(remote, schema_json)
+            self._sessions[remote] = session
+
+        with session.lock:
+            try:
+                yield session.idl
+            except Exception:
+                # e.g. vsctl_fatal(). The session is still usable.
+                if session.idl.txn:
+                    session.idl.txn.abort()
+                raise
+            except:
+                # e.g. gevent.Timeout. The session might be in the middle
+                # of protocol processing. Start over with a new one.
+                self.close(remote)
+                raise
+
+    def close(self, remote=None):
+        if remote is None:
+            remotes = self._sessions.keys()
+        else:
+            remotes = [remote]
+        for remote_ in remotes:
+            session = self._sessions.pop(remote_, None)
+            if session is not None:
+                session.close()
+
+
 class VSCtl(object):
     def _reset(self):
         self.schema_helper = None
@@ -770,9 +873,10 @@ class VSCtl(object):
         self.wait_for_reload = True
         self.dry_run = False
 
-    def __init__(self, remote):
+    def __init__(self, remote, idl_pool=None):
         super(VSCtl, self).__init__()
         self.remote = remote
+        self.idl_pool = idl_pool
 
         self.schema_json = None
         self.schema = None
@@ -783,26 +887,17 @@ class VSCtl(object):
         self.dry_run = False
 
     def _rpc_get_schema_json(self, database):
-        LOG.debug('remote %s', self.remote)
-        error, stream_ = stream.Stream.open_block(
-            stream.Stream.open(self.remote))
-        if error:
-            vsctl_fatal('error %s' % os.strerror(error))
-        rpc = jsonrpc.Connection(stream_)
-        request = jsonrpc.Message.create_request('get_schema', [database])
-        error, reply = rpc.transact_block(request)
-        rpc.close()
-
-        if error:
-            vsctl_fatal(os.strerror(error))
-        elif reply.error:
-            vsctl_fatal('error %s' % reply.error)
-        return reply.result
+        return get_schema_json(self.remote, database)
 
     def _init_schema_helper(self):
+        if self.schema_json is None and self.idl_pool is not None:
+            self.schema_json = self.idl_pool.schema_jsons.get(self.remote)
         if self.schema_json is None:
             self.schema_json = self._rpc_get_schema_json(
                 vswitch_idl.OVSREC_DB_NAME)
+            if self.idl_pool is not None:
+                self.idl_pool.schema_jsons[self.remote] = self.schema_json
+        if self.schema is None:
             schema_helper = idl.SchemaHelper(None, self.schema_json)
             schema_helper.register_all()
             self.schema = schema_helper.get_idl_schema()
@@ -918,11 +1013,25 @@ class VSCtl(object):
         self._init_schema_helper()
         self._run_prerequisites(commands)
 
-        idl_ = idl.Idl(self.remote, self.schema_helper)
-        seqno = idl_.change_seqno
-        while True:
-            self._idl_wait(idl_, seqno)
+        if self.idl_pool is None:
+            idl_ = idl.Idl(self.remote, self.schema_helper)
+            try:
+                self._do_transact(idl_, commands)
+            finally:
+                idl_.close()
+        else:
+            with self.idl_pool.session(self.remote, self.schema_json) as idl_:
+                self._do_transact(idl_, commands)
+
+    def _do_transact(self, idl_, commands):
+        if idl_.has_ever_connected():
+            # process the updates which have arrived so far
+            while idl_.run():
+                pass
+        else:
+            self._idl_wait(idl_, idl_.change_seqno)
 
+        while True:
             seqno = idl_.change_seqno
             if self._do_vsctl(idl_, commands):
                 break
@@ -933,7 +1042,7 @@ class VSCtl(object):
             # TODO:XXX
             # ovsdb_symbol_table_destroy(symtab)
 
-        idl_.close()
+            self._idl_wait(idl_, seqno)
 
     def _run_command(self, commands):
         """
@@ -1286,15 +1395,6 @@ class VSCtl(object):
              vswitch_idl.OVSREC_INTERFACE_COL_OPTIONS,
              vswitch_idl.OVSREC_INTERFACE_COL_OFPORT])
 
-    @staticmethod
-    def _iface_to_dict(iface_cfg):
-        _ATTRIBUTE = ['name', 'ofport', 'type', 'external_ids', 'options']
-        attr = dict((key, getattr(iface_cfg, key)) for key in _ATTRIBUTE)
-
-        if attr['ofport']:
-            attr['ofport'] = attr['ofport'][0]
-        return attr
-
     def _list_ifaces_verbose(self, ctx, datapath_id, port_name):
         ctx.populate_cache()
 
@@ -1304,14 +1404,14 @@ class VSCtl(object):
         iface_cfgs = []
         if port_name is None:
             for vsctl_port in br.ports:
-                iface_cfgs.extend(self._iface_to_dict(vsctl_iface.iface_cfg)
+                iface_cfgs.extend(iface_to_dict(vsctl_iface.iface_cfg)
                                   for vsctl_iface in vsctl_port.ifaces)
         else:
             # When port is created, ofport column might be None.
             # So try with port name if it happended
             for vsctl_port in br.ports:
                 iface_cfgs.extend(
-                    self._iface_to_dict(vsctl_iface.iface_cfg)
+                    iface_to_dict(vsctl_iface.iface_cfg)
                     for vsctl_iface in vsctl_port.ifaces
                     if (vsctl_iface.iface_cfg.name == port_name))
 
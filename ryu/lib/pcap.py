@@ -0,0 +1,339 @@
+# Copyright (C) 2013 Nippon Telegraph and Telephone Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Reader and writers of pcap and pcapng capture files.
+
+Reader iterates over (timestamp, bytes) of the packets in either format,
+mapping the file into memory instead of reading it record by record.
+Writer and NgWriter buffer the records and write them to the file in
+batches, so that dumping packet-ins doesn't block the caller on every
+packet.
+
+e.g.
+  reader = pcap.Reader('trace.pcap')
+  for timestamp, pkt in reader.packets():
+      ...
+
+  writer = pcap.Writer('packet_in.pcap')
+  writer.write(msg.data)
+  ...
+  writer.close()
+"""
+
+import mmap
+import os
+import struct
+import time
+
+from ryu.lib.packet import packet
+
+
+LINKTYPE_ETHERNET = 1
+
+# pcap
+PCAP_MAGIC = 0xa1b2c3d4
+PCAP_MAGIC_NSEC = 0xa1b23c4d
+PCAP_VERSION_MAJOR = 2
+PCAP_VERSION_MINOR = 4
+_PCAP_HEADER_PACK_STR = 'IHHiIII'   # without the byte order
+_PCAP_RECORD_PACK_STR = 'IIII'
+
+# pcapng
+PCAPNG_BLOCK_SHB = 0x0a0d0d0a       # section header block
+PCAPNG_BLOCK_IDB = 0x00000001       # interface description block
+PCAPNG_BLOCK_SPB = 0x00000003       # simple packet block
+PCAPNG_BLOCK_EPB = 0x00000006       # enhanced packet block
+PCAPNG_BYTE_ORDER_MAGIC = 0x1a2b3c4d
+PCAPNG_OPT_ENDOFOPT = 0
+PCAPNG_OPT_IF_TSRESOL = 9
+_PCAPNG_BLOCK_HEADER_PACK_STR = 'II'
+_PCAPNG_SHB_PACK_STR = 'IIIHHq'
+_PCAPNG_IDB_PACK_STR = 'IIHHI'
+_PCAPNG_EPB_PACK_STR = 'IIIIIII'
+_PCAPNG_OPT_PACK_STR = 'HH'
+
+
+def _align4(length):
+    return (length + 3) & ~3
+
+
+def _structs(byte_order, *pack_strs):
+    return [struct.Struct(byte_order + pack_str) for pack_str in pack_strs]
+
+
+class Reader(object):
+    """
+    Iterate over (timestamp, bytes) of the packets of a pcap or pcapng
+    file. timestamp is in seconds since epoch, or None for the simple
+    packet blocks of pcapng which have no timestamp.
+    f is a path or a file object. Regular files are mapped into memory,
+    others like pipes are read as a whole.
+    """
+
+    def __init__(self, f):
+        super(Reader, self).__init__()
+        if isinstance(f, basestring):
+            f = open(f, 'rb')
+        self.file = f
+        self.buf = self._map(f)
+        if len(self.buf) < 4:
+            raise ValueError('not a pcap or pcapng file')
+
+        magic = self.buf[:4]
+        if struct.unpack('<I', magic)[0] == PCAPNG_BLOCK_SHB:
+            self._records = self._pcapng_records
+            self.format = 'pcapng'
+            return
+
+        for byte_order in ('<', '>'):
+            if struct.unpack(byte_order + 'I', magic)[0] in (PCAP_MAGIC,
+                                                             PCAP_MAGIC_NSEC):
+                break
+        else:
+            raise ValueError('not a pcap or pcapng file')
+        header, = _structs(byte_order, _PCAP_HEADER_PACK_STR)
+        (magic, _major, _minor, _thiszone, _sigfigs, self.snaplen,
+         self.linktype) = header.unpack_from(self.buf)
+        self._byte_order = byte_order
+        self._resolution = 1e9 if magic == PCAP_MAGIC_NSEC else 1e6
+        self._records = self._pcap_records
+        self.format = 'pcap'
+
+    @staticmethod
+    def _map(f):
+        try:
+            fileno = f.fileno()
+            if os.fstat(fileno).st_size > 0:
+                return mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+        except (AttributeError, EnvironmentError, ValueError):
+            pass
+        return f.read()
+
+    def _pcap_records(self):
+        buf = self.buf
+        size = len(buf)
+        record, = _structs(self._byte_order, _PCAP_RECORD_PACK_STR)
+        resolution = self._resolution
+        offset = struct.calcsize(_PCAP_HEADER_PACK_STR)
+        while offset + record.size <= size:
+            sec, frac, caplen, _len = record.unpack_from(buf, offset)
+            offset += record.size
+            if offset + caplen > size:
+                # truncated by a writer which didn't finish
+                break
+            yield sec + frac / resolution, buf[offset:offset + caplen]
+            offset += caplen
+
+    def _pcapng_records(self):
+        buf = self.buf
+        size = len(buf)
+        offset = 0
+        interfaces = []     # (linktype, resolution) of the section
+        block_header = None
+        while offset + 8 <= size:
+            block_type = struct.unpack_from('<I', buf, offset)[0]
+            if block_type == PCAPNG_BLOCK_SHB:
+                # the byte order may differ section by section
+                bom = struct.unpack_from('<I', buf, offset + 8)[0]
+                byte_order = '<' if bom == PCAPNG_BYTE_ORDER_MAGIC else '>'
+                block_header, idb, epb, opt = _structs(
+                    byte_order, _PCAPNG_BLOCK_HEADER_PACK_STR,
+                    _PCAPNG_IDB_PACK_STR, _PCAPNG_EPB_PACK_STR,
+                    _PCAPNG_OPT_PACK_STR)
+                interfaces = []
+            elif block_header is None:
+                raise ValueError('pcapng file without section header')
+
+            block_type, block_len = block_header.unpack_from(buf, offset)
+            if block_len < 12 or offset + block_len > size:
+                break
+
+            if block_type == PCAPNG_BLOCK_EPB:
+                (_type, _len, if_id, ts_high, ts_low, caplen,
+                 _origlen) = epb.unpack_from(buf, offset)
+                start = offset + epb.size
+                timestamp = ((ts_high << 32) | ts_low) / interfaces[if_id][1]
+                yield timestamp, buf[start:start + caplen]
+            elif block_type == PCAPNG_BLOCK_SPB:
+                origlen, = struct.unpack_from(byte_order + 'I', buf,
+                                              offset + 8)
+                start = offset + 12
+                caplen = min(origlen, block_len - 16)
+                yield None, buf[start:start + caplen]
+            elif block_type == PCAPNG_BLOCK_IDB:
+                (_type, _len, linktype, _reserved,
+                 _snaplen) = idb.unpack_from(buf, offset)
+                resolution = 1e6
+                opt_offset = offset + idb.size
+                end = offset + block_len - 4
+                while opt_offset + opt.size <= end:
+                    code, length = opt.unpack_from(buf, opt_offset)
+                    if code == PCAPNG_OPT_ENDOFOPT:
+                        break
+                    if code == PCAPNG_OPT_IF_TSRESOL:
+                        tsresol = ord(buf[opt_offset + opt.size])
+                        if tsresol & 0x80:
+                            resolution = float(2 ** (tsresol & 0x7f))
+                        else:
+                            resolution = float(10 ** tsresol)
+                    opt_offset += opt.size + _align4(length)
+                interfaces.append((linktype, resolution))
+
+            offset += block_len
+
+    def __iter__(self):
+        return self._records()
+
+    def packets(self):
+        """
+        Iterate over (timestamp, ryu.lib.packet.packet.Packet).
+        Each packet is parsed only when the iteration reaches it.
+        """
+        for timestamp, buf in self._records():
+            yield timestamp, packet.Packet(buf)
+
+    def close(self):
+        if isinstance(self.buf, mmap.mmap):
+            self.buf.close()
+        self.file.close()
+
+
+class _BufferedWriter(object):
+    def __init__(self, f, snaplen, linktype, buffer_size, flush_interval):
+        super(_BufferedWriter, self).__init__()
+        if isinstance(f, basestring):
+            f = open(f, 'wb')
+        self.file = f
+        self.snaplen = snaplen
+        self.linktype = linktype
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._pending_len = 0
+        self._flushed_at = time.time()
+        self._append(self._file_header())
+
+    def _file_header(self):
+        raise NotImplementedError()
+
+    def _record(self, buf, caplen, timestamp):
+        raise NotImplementedError()
+
+    def _padding(self, caplen):
+        return ''
+
+    def _append(self, buf):
+        self._pending.append(buf)
+        self._pending_len += len(buf)
+
+    def write(self, buf, timestamp=None):
+        """
+        Append a packet. It reaches the file when buffer_size bytes are
+        pending, flush_interval seconds passed since the last flush or
+        flush() is called.
+        """
+        now = time.time()
+        if timestamp is None:
+            timestamp = now
+        caplen = min(len(buf), self.snaplen)
+        self._append(self._record(buf, caplen, timestamp))
+        self._append(str(buf[:caplen]))
+        self._append(self._padding(caplen))
+        if (self._pending_len >= self.buffer_size or
+                now - self._flushed_at >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            self.file.write(''.join(self._pending))
+            self._pending = []
+            self._pending_len = 0
+        self.file.flush()
+        self._flushed_at = time.time()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+class Writer(_BufferedWriter):
+    """
+    pcap writer. Timestamps are recorded in microseconds, or in
+    nanoseconds with nsec=True.
+    """
+
+    def __init__(self, f, snaplen=65535, linktype=LINKTYPE_ETHERNET,
+                 nsec=False, buffer_size=1024 * 1024, flush_interval=1.0):
+        self.nsec = nsec
+        self._header, self._record_header = _structs(
+            '=', _PCAP_HEADER_PACK_STR, _PCAP_RECORD_PACK_STR)
+        super(Writer, self).__init__(f, snaplen, linktype, buffer_size,
+                                     flush_interval)
+
+    def _file_header(self):
+        magic = PCAP_MAGIC_NSEC if self.nsec else PCAP_MAGIC
+        return self._header.pack(magic, PCAP_VERSION_MAJOR,
+                                 PCAP_VERSION_MINOR, 0, 0, self.snaplen,
+                                 self.linktype)
+
+    def _record(self, buf, caplen, timestamp):
+        resolution = 1000000000 if self.nsec else 1000000
+        # a double can't hold nanoseconds since epoch as a whole
+        sec = int(timestamp)
+        carry, frac = divmod(int(round((timestamp - sec) * resolution)),
+                             resolution)
+        sec += carry
+        return self._record_header.pack(sec, frac, caplen, len(buf))
+
+
+class NgWriter(_BufferedWriter):
+    """
+    pcapng writer of a section with an interface. Timestamps are
+    recorded in microseconds.
+    """
+
+    def __init__(self, f, snaplen=65535, linktype=LINKTYPE_ETHERNET,
+                 buffer_size=1024 * 1024, flush_interval=1.0):
+        self._epb, = _structs('=', _PCAPNG_EPB_PACK_STR)
+        super(NgWriter, self).__init__(f, snaplen, linktype, buffer_size,
+                                       flush_interval)
+
+    def _file_header(self):
+        shb, idb, opt = _structs('=', _PCAPNG_SHB_PACK_STR,
+                                 _PCAPNG_IDB_PACK_STR, _PCAPNG_OPT_PACK_STR)
+        # section length is unknown as the file is written in a stream
+        shb_len = shb.size + 4
+        tsresol = opt.pack(PCAPNG_OPT_IF_TSRESOL, 1) + '\x06\x00\x00\x00'
+        end_of_opt = opt.pack(PCAPNG_OPT_ENDOFOPT, 0)
+        idb_len = idb.size + len(tsresol) + len(end_of_opt) + 4
+        return (shb.pack(PCAPNG_BLOCK_SHB, shb_len, PCAPNG_BYTE_ORDER_MAGIC,
+                         1, 0, -1) +
+                struct.pack('=I', shb_len) +
+                idb.pack(PCAPNG_BLOCK_IDB, idb_len, self.linktype, 0,
+                         self.snaplen) +
+                tsresol + end_of_opt + struct.pack('=I', idb_len))
+
+    def _record(self, buf, caplen, timestamp):
+        usec = int(round(timestamp * 1000000))
+        block_len = self._epb.size + _align4(caplen) + 4
+        return self._epb.pack(PCAPNG_BLOCK_EPB, block_len, 0,
+                              usec >> 32, usec & 0xffffffff, caplen,
+                              len(buf))
+
+    def _padding(self, caplen):
+        # and the trailing block length
+        return ('\x00' * (_align4(caplen) - caplen) +
+                struct.pack('=I', self._epb.size + _align4(caplen) + 4))
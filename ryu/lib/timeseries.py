@@ -0,0 +1,105 @@
+# Copyright (C) 2013 Nippon Telegraph and Telephone Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import array
+
+
+class CounterSeries(object):
+    """
+    Ring buffer of the last capacity samples of a set of monotonic
+    counters. The timestamps and each counter are kept in an array('d'),
+    so a series costs 8 bytes per sample and counter.
+    """
+    def __init__(self, fields, capacity):
+        super(CounterSeries, self).__init__()
+        assert capacity >= 2
+        self.fields = tuple(fields)
+        self.capacity = capacity
+        self.times = array.array('d', [0.0]) * capacity
+        self.columns = dict((field, array.array('d', [0.0]) * capacity)
+                            for field in self.fields)
+        self.count = 0      # number of the samples ever appended
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, timestamp, values):
+        """values are in the order of fields."""
+        i = self.count % self.capacity
+        self.times[i] = timestamp
+        columns = self.columns
+        for field, value in zip(self.fields, values):
+            columns[field][i] = value
+        self.count += 1
+
+    def _indexes(self):
+        """Return the indexes of the samples from the oldest."""
+        n = len(self)
+        start = self.count - n
+        return [(start + k) % self.capacity for k in range(n)]
+
+    @property
+    def last_time(self):
+        if not self.count:
+            return None
+        return self.times[(self.count - 1) % self.capacity]
+
+    def latest(self):
+        """Return the dict of field -> the last value or None."""
+        if not self.count:
+            return None
+        i = (self.count - 1) % self.capacity
+        return dict((field, self.columns[field][i]) for field in self.fields)
+
+    def samples(self):
+        """Return the list of (timestamp, dict of field -> value)."""
+        return [(self.times[i],
+                 dict((field, self.columns[field][i])
+                      for field in self.fields))
+                for i in self._indexes()]
+
+    def rate(self, field, window=None):
+        """
+        Return the increase per second of field over the samples of the
+        last window seconds, or all the samples if window is None.
+        A decrease is taken as a reset of the counter, after which the
+        new value is the increase. None is returned until two samples
+        are available.
+        """
+        indexes = self._indexes()
+        if len(indexes) < 2:
+            return None
+        times = self.times
+        if window is not None:
+            since = times[indexes[-1]] - window
+            k = len(indexes) - 2
+            while k > 0 and times[indexes[k - 1]] >= since:
+                k -= 1
+            indexes = indexes[k:]
+        elapsed = times[indexes[-1]] - times[indexes[0]]
+        if elapsed <= 0:
+            return None
+
+        column = self.columns[field]
+        increase = 0.0
+        prev = column[indexes[0]]
+        for i in indexes[1:]:
+            value = column[i]
+            if value >= prev:
+                increase += value - prev
+            else:
+                increase += value
+            prev = value
+        return increase / elapsed
@@ -23,6 +23,15 @@ NETFLOW_V8 = 0x08
 NETFLOW_V9 = 0x09
 
 
+def _unpack_columns(pack_str, fields, count, buf, offset):
+    # one unpack of the records repeated count times, then every
+    # len(fields)-th value makes a column
+    values = struct.unpack_from(pack_str[0] + pack_str[1:] * count,
+                                buf, offset)
+    n = len(fields)
+    return dict((field, values[i::n]) for i, field in enumerate(fields))
+
+
 class NetFlow(object):
     _PACK_STR = '!H'
     _NETFLOW_VERSIONS = {}
@@ -65,6 +74,7 @@ class NetFlowV5(object):
         self.engine_type = engine_type
         self.engine_id = engine_id
         self.sampling_interval = sampling_interval
+        self.flows = flows
 
     @classmethod
     def parser(cls, buf):
@@ -84,10 +94,34 @@ class NetFlowV5(object):
 
         return msg
 
+    @classmethod
+    def parse_columns(cls, buf):
+        """
+        Parse the records at once into columns instead of an object per
+        record. Return the header, whose flows is None, and the dict of
+        NetFlowV5Flow attribute name -> tuple of the values.
+        """
+        (version, count, sys_uptime, unix_secs, unix_nsecs,
+         flow_sequence, engine_type, engine_id, sampling_interval) = \
+            struct.unpack_from(cls._PACK_STR, buf)
+
+        msg = cls(version, count, sys_uptime, unix_secs, unix_nsecs,
+                  flow_sequence, engine_type, engine_id,
+                  sampling_interval)
+        count = min(count,
+                    (len(buf) - cls._MIN_LEN) // NetFlowV5Flow._MIN_LEN)
+        return msg, _unpack_columns(NetFlowV5Flow._PACK_STR,
+                                    NetFlowV5Flow._FIELDS, count,
+                                    buf, cls._MIN_LEN)
+
 
 class NetFlowV5Flow(object):
     _PACK_STR = '!IIIHHIIIIHHxBBBHHBB2x'
     _MIN_LEN = struct.calcsize(_PACK_STR)
+    _FIELDS = ('srcaddr', 'dstaddr', 'nexthop', 'input', 'output',
+               'dpkts', 'doctets', 'first', 'last', 'srcport', 'dstport',
+               'tcp_flags', 'prot', 'tos', 'src_as', 'dst_as', 'src_mask',
+               'dst_mask')
 
     def __init__(self, srcaddr, dstaddr, nexthop, input_, output,
                  dpkts, doctets, first, last, srcport, dstport,
@@ -123,3 +157,158 @@ class NetFlowV5Flow(object):
                   prot, tos, src_as, dst_as, src_mask, dst_mask)
 
         return msg
+
+
+# NetFlow v9 field types, RFC 3954
+NETFLOW_V9_FIELD_TYPES = {
+    1: 'in_bytes',
+    2: 'in_pkts',
+    3: 'flows',
+    4: 'protocol',
+    5: 'src_tos',
+    6: 'tcp_flags',
+    7: 'l4_src_port',
+    8: 'ipv4_src_addr',
+    9: 'src_mask',
+    10: 'input_snmp',
+    11: 'l4_dst_port',
+    12: 'ipv4_dst_addr',
+    13: 'dst_mask',
+    14: 'output_snmp',
+    15: 'ipv4_next_hop',
+    16: 'src_as',
+    17: 'dst_as',
+    21: 'last_switched',
+    22: 'first_switched',
+    23: 'out_bytes',
+    24: 'out_pkts',
+    27: 'ipv6_src_addr',
+    28: 'ipv6_dst_addr',
+    29: 'ipv6_src_mask',
+    30: 'ipv6_dst_mask',
+    31: 'ipv6_flow_label',
+    32: 'icmp_type',
+    56: 'in_src_mac',
+    57: 'out_dst_mac',
+    58: 'src_vlan',
+    59: 'dst_vlan',
+    60: 'ip_protocol_version',
+    61: 'direction',
+    80: 'in_dst_mac',
+    81: 'out_src_mac',
+}
+
+NETFLOW_V9_TEMPLATE_FLOWSET_ID = 0
+NETFLOW_V9_OPTIONS_TEMPLATE_FLOWSET_ID = 1
+NETFLOW_V9_MIN_DATA_FLOWSET_ID = 256
+
+
+class NetFlowV9Template(object):
+    """
+    Template of data records. fields is the list of (field type, length).
+    The values of the lengths 1, 2, 4 and 8 are unpacked as integers,
+    others as strings.
+    """
+    _INT_CODES = {1: 'B', 2: 'H', 4: 'I', 8: 'Q'}
+
+    def __init__(self, template_id, fields):
+        super(NetFlowV9Template, self).__init__()
+        self.template_id = template_id
+        self.fields = fields
+        self.names = tuple(NETFLOW_V9_FIELD_TYPES.get(type_, type_)
+                           for type_, _length in fields)
+        self.pack_str = '!' + ''.join(
+            self._INT_CODES.get(length, '%ds' % length)
+            for _type, length in fields)
+        self.record_len = struct.calcsize(self.pack_str)
+
+
+class NetFlowV9DataFlowSet(object):
+    def __init__(self, template_id, count, columns):
+        super(NetFlowV9DataFlowSet, self).__init__()
+        self.template_id = template_id
+        self.count = count
+        self.columns = columns      # field name -> tuple of the values
+
+
+@NetFlow.register_netflow_version(NETFLOW_V9)
+class NetFlowV9(object):
+    _PACK_STR = '!HHIIII'
+    _MIN_LEN = struct.calcsize(_PACK_STR)
+    _FLOWSET_PACK_STR = '!HH'
+    _FLOWSET_HEADER_LEN = struct.calcsize(_FLOWSET_PACK_STR)
+
+    def __init__(self, version, count, sys_uptime, unix_secs,
+                 package_sequence, source_id, templates=None,
+                 flowsets=None, unknown_template_ids=None):
+        super(NetFlowV9, self).__init__()
+        self.version = version
+        self.count = count
+        self.sys_uptime = sys_uptime
+        self.unix_secs = unix_secs
+        self.package_sequence = package_sequence
+        self.source_id = source_id
+        self.templates = templates
+        self.flowsets = flowsets
+        self.unknown_template_ids = unknown_template_ids
+
+    @classmethod
+    def parser(cls, buf, templates=None):
+        """
+        templates is the dict of template id -> NetFlowV9Template which
+        the exporter sent before. The templates in this packet are added
+        to it, and the data flowsets of the unknown templates are skipped
+        with their ids in unknown_template_ids.
+        """
+        (version, count, sys_uptime, unix_secs, package_sequence,
+         source_id) = struct.unpack_from(cls._PACK_STR, buf)
+        if templates is None:
+            templates = {}
+        msg = cls(version, count, sys_uptime, unix_secs, package_sequence,
+                  source_id, [], [], [])
+
+        offset = cls._MIN_LEN
+        while len(buf) - offset >= cls._FLOWSET_HEADER_LEN:
+            flowset_id, length = struct.unpack_from(cls._FLOWSET_PACK_STR,
+                                                    buf, offset)
+            if length < cls._FLOWSET_HEADER_LEN:
+                break
+            start = offset + cls._FLOWSET_HEADER_LEN
+            end = min(offset + length, len(buf))
+            if flowset_id == NETFLOW_V9_TEMPLATE_FLOWSET_ID:
+                for template in cls._parse_templates(buf, start, end):
+                    templates[template.template_id] = template
+                    msg.templates.append(template)
+            elif flowset_id >= NETFLOW_V9_MIN_DATA_FLOWSET_ID:
+                template = templates.get(flowset_id)
+                if template is None:
+                    msg.unknown_template_ids.append(flowset_id)
+                elif template.record_len > 0:
+                    # the rest shorter than a record is padding
+                    n = (end - start) // template.record_len
+                    msg.flowsets.append(NetFlowV9DataFlowSet(
+                        flowset_id, n,
+                        _unpack_columns(template.pack_str, template.names,
+                                        n, buf, start)))
+            offset += length
+
+        return msg
+
+    @staticmethod
+    def _parse_templates(buf, offset, end):
+        templates = []
+        while end - offset >= 4:
+            template_id, field_count = struct.unpack_from('!HH', buf,
+                                                          offset)
+            offset += 4
+            if template_id < NETFLOW_V9_MIN_DATA_FLOWSET_ID:
+                # padding
+                break
+            if end - offset < field_count * 4:
+                break
+            values = struct.unpack_from('!' + 'HH' * field_count,
+                                        buf, offset)
+            offset += field_count * 4
+            templates.append(NetFlowV9Template(
+                template_id, zip(values[0::2], values[1::2])))
+        return templates
@@ -102,6 +102,82 @@ class sFlowV5(object):
 
         return msg
 
+    _FLOW_COLUMNS = ('source_id_index', 'sampling_rate', 'input_if',
+                     'output_if', 'header_protocol', 'frame_length',
+                     'header')
+
+    @classmethod
+    def parse_flow_columns(cls, buf):
+        """
+        Walk the flow samples with a raw packet header record without
+        building an object per sample and record. Return the header and
+        the dict of
+          'source_id_index', 'sampling_rate', 'input_if', 'output_if',
+          'header_protocol', 'frame_length', 'header'
+        -> list of the values of the flow samples.
+        The samples of the header are only the counter samples, which
+        are few, parsed by sFlowV5Sample.
+        """
+        (version, address_type) = struct.unpack_from(cls._PACK_STR, buf)
+        if address_type == cls._AGENT_IPTYPE_V4:
+            pack_str = cls._PACK_STR_IPV4
+            offset = cls._MIN_LEN_V4
+        elif address_type == cls._AGENT_IPTYPE_V6:
+            pack_str = cls._PACK_STR_IPV6
+            offset = cls._MIN_LEN_V6
+        else:
+            LOG.info("Unknown address_type. sFlowV5.address_type=%d"
+                     % address_type)
+            return None, None
+        (version, address_type, agent_address, sub_agent_id, sequence_number,
+         uptime, samples_num) = struct.unpack_from(pack_str, buf)
+        msg = cls(version, address_type, agent_address, sub_agent_id,
+                  sequence_number, uptime, samples_num, [])
+
+        columns = dict((name, []) for name in cls._FLOW_COLUMNS)
+        size = len(buf)
+        while size - offset >= sFlowV5Sample.MIN_LEN:
+            (sampledata_format, sample_length) = struct.unpack_from(
+                '!II', buf, offset)
+            offset += sFlowV5Sample.MIN_LEN
+            next_sample = offset + sample_length
+            if next_sample > size:
+                break
+            if sampledata_format == 2:
+                msg.samples.append(sFlowV5Sample.parser(
+                    buf, offset - sFlowV5Sample.MIN_LEN))
+            if sampledata_format != 1:
+                # only the flow samples of the standard format
+                offset = next_sample
+                continue
+
+            (_seq, source_id, sampling_rate, _pool, _drops, input_if,
+             output_if, records_num) = struct.unpack_from(
+                sFlowV5FlowSample._PACK_STR, buf, offset)
+            record = offset + struct.calcsize(sFlowV5FlowSample._PACK_STR)
+            for _i in range(records_num):
+                (flowdata_format, flow_data_length) = struct.unpack_from(
+                    '!II', buf, record)
+                record += sFlowV5FlowRecord.MIN_LEN
+                if flowdata_format == 1:
+                    (header_protocol, frame_length, _stripped,
+                     header_size) = struct.unpack_from(
+                        sFlowV5RawPacketHeader._PACK_STR, buf, record)
+                    start = record + struct.calcsize(
+                        sFlowV5RawPacketHeader._PACK_STR)
+                    columns['source_id_index'].append(source_id & 0xffffff)
+                    columns['sampling_rate'].append(sampling_rate)
+                    columns['input_if'].append(input_if)
+                    columns['output_if'].append(output_if)
+                    columns['header_protocol'].append(header_protocol)
+                    columns['frame_length'].append(frame_length)
+                    columns['header'].append(buf[start:start + header_size])
+                    break
+                record += flow_data_length
+            offset = next_sample
+
+        return msg, columns
+
 
 class sFlowV5Sample(object):
     _PACK_STR = '!II'
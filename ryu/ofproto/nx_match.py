@@ -667,10 +667,17 @@ class MFIPTTL(MFField):
 
 @_register_make
 @_set_nxm_headers([ofproto_v1_0.NXM_OF_IP_PROTO])
+@MFField.register_field_header([ofproto_v1_0.NXM_OF_IP_PROTO])
 class MFIPProto(MFField):
+    pack_str = MF_PACK_STRING_8
+
+    def __init__(self, header, value, mask=None):
+        super(MFIPProto, self).__init__(header, MFIPProto.pack_str)
+        self.value = value
+
     @classmethod
     def make(cls, header):
-        return cls(header, MF_PACK_STRING_8)
+        return cls(header, MFIPProto.pack_str)
 
     def put(self, buf, offset, rule):
         return self._put(buf, offset, rule.flow.nw_proto)
@@ -679,10 +686,20 @@ class MFIPProto(MFField):
 @_register_make
 @_set_nxm_headers([ofproto_v1_0.NXM_OF_TCP_SRC, ofproto_v1_0.NXM_OF_TCP_SRC_W,
                    ofproto_v1_0.NXM_OF_UDP_SRC, ofproto_v1_0.NXM_OF_UDP_SRC_W])
+@MFField.register_field_header([ofproto_v1_0.NXM_OF_TCP_SRC,
+                                ofproto_v1_0.NXM_OF_TCP_SRC_W,
+                                ofproto_v1_0.NXM_OF_UDP_SRC,
+                                ofproto_v1_0.NXM_OF_UDP_SRC_W])
 class MFTPSRC(MFField):
+    pack_str = MF_PACK_STRING_BE16
+
+    def __init__(self, header, value, mask=None):
+        super(MFTPSRC, self).__init__(header, MFTPSRC.pack_str)
+        self.value = value
+
     @classmethod
     def make(cls, header):
-        return cls(header, MF_PACK_STRING_BE16)
+        return cls(header, MFTPSRC.pack_str)
 
     def put(self, buf, offset, rule):
         return self.putm(buf, offset, rule.flow.tp_src, rule.wc.tp_src_mask)
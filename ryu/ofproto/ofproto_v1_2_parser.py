@@ -1280,7 +1280,9 @@ class OFPGroupFeaturesStats(object):
         max_groups = stats[2:6]
         actions = stats[6:10]
 
-        return cls(types, capabilities, max_groups, actions)
+        stats = cls(types, capabilities, max_groups, actions)
+        stats.length = ofproto_v1_2.OFP_GROUP_FEATURES_STATS_SIZE
+        return stats
 
 
 @_set_msg_type(ofproto_v1_2.OFPT_QUEUE_GET_CONFIG_REQUEST)
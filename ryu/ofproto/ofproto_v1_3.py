@@ -390,6 +390,14 @@ OFP_FLOW_MOD_SIZE = 56
 assert (calcsize(OFP_FLOW_MOD_PACK_STR) + OFP_HEADER_SIZE ==
         OFP_FLOW_MOD_SIZE)
 
+# Value used in "idle_timeout" and "hard_timeout" to indicate that the
+# entry is permanent, and the default priority of a flow entry.
+OFP_FLOW_PERMANENT = 0
+OFP_DEFAULT_PRIORITY = 0x8000
+
+# Value used in "buffer_id" when the packet is not buffered.
+OFP_NO_BUFFER = 0xffffffff
+
 # enum ofp_flow_mod_command
 OFPFC_ADD = 0    # New flow.
 OFPFC_MODIFY = 1    # Modify all matching flows.
@@ -599,7 +607,7 @@ assert calcsize(OFP_TABLE_STATS_PACK_STR) == OFP_TABLE_STATS_SIZE
 OFP_MAX_TABLE_NAME_LEN = 32
 OFP_MAX_TABLE_NAME_LEN_STR = str(OFP_MAX_TABLE_NAME_LEN)
 OFP_TABLE_FEATURES_PACK_STR = '!HB5x' + OFP_MAX_TABLE_NAME_LEN_STR + \
-                              'c' + 'QQII'
+                              's' + 'QQII'
 OFP_TABLE_FEATURES_SIZE = 64
 assert (calcsize(OFP_TABLE_FEATURES_PACK_STR) ==
         OFP_TABLE_FEATURES_SIZE)
@@ -685,7 +693,7 @@ OFP_BUCKET_COUNTER_SIZE = 16
 assert calcsize(OFP_BUCKET_COUNTER_PACK_STR) == OFP_BUCKET_COUNTER_SIZE
 
 # struct ofp_group_desc_stats
-OFP_GROUP_DESC_STATS_PACK_STR = '!HBBI'
+OFP_GROUP_DESC_STATS_PACK_STR = '!HBxI'
 OFP_GROUP_DESC_STATS_SIZE = 8
 assert calcsize(OFP_GROUP_DESC_STATS_PACK_STR) == OFP_GROUP_DESC_STATS_SIZE
 
@@ -701,7 +709,7 @@ OFPGFC_CHAINING = 1 << 2  # Support chaining groups.
 OFPGFC_CHAINING_CHECKS = 1 << 3  # Check chaining for loops and delete
 
 # struct ofp_meter_multipart_request
-OFP_METER_MULTIPART_REQUEST_PACK_STR = '!I4B'
+OFP_METER_MULTIPART_REQUEST_PACK_STR = '!I4x'
 OFP_METER_MULTIPART_REQUEST_SIZE = 8
 assert (calcsize(OFP_METER_MULTIPART_REQUEST_PACK_STR) ==
         OFP_METER_MULTIPART_REQUEST_SIZE)
@@ -197,7 +197,7 @@ class OFPExperimenter(MsgBase):
         return msg
 
     def _serialize_body(self):
-        msg.pack_into(ofproto_v1_3.OFP_EXPERIMENTER_HEADERPACK_STR,
+        msg_pack_into(ofproto_v1_3.OFP_EXPERIMENTER_HEADER_PACK_STR,
                       self.buf, ofproto_v1_3.OFP_HEADER_SIZE,
                       self.experimenter, self.exp_type)
 
@@ -266,6 +266,11 @@ class OFPSetConfig(MsgBase):
                       self.flags, self.miss_send_len)
 
 
+UINT64_MAX = (1 << 64) - 1
+UINT32_MAX = (1 << 32) - 1
+UINT16_MAX = (1 << 16) - 1
+
+
 class Flow(object):
     def __init__(self):
         self.in_port = 0
@@ -1405,9 +1410,9 @@ class OFPPortStatus(MsgBase):
     def parser(cls, datapath, version, msg_type, msg_len, xid, buf):
         msg = super(OFPPortStatus, cls).parser(datapath, version, msg_type,
                                                msg_len, xid, buf)
-        (msg.reason,) = struct.unpack_from(
+        msg.reason = struct.unpack_from(
             ofproto_v1_3.OFP_PORT_STATUS_PACK_STR, msg.buf,
-            ofproto_v1_3.OFP_HEADER_SIZE)
+            ofproto_v1_3.OFP_HEADER_SIZE)[0]
         msg.desc = OFPPort.parser(msg.buf,
                                   ofproto_v1_3.OFP_PORT_STATUS_DESC_OFFSET)
         return msg
@@ -1701,6 +1706,12 @@ class OFPActionDecMplsTtl(OFPAction):
     def __init__(self):
         super(OFPActionDecMplsTtl, self).__init__()
 
+    @classmethod
+    def parser(cls, buf, offset):
+        (type_, len_) = struct.unpack_from(
+            ofproto_v1_3.OFP_ACTION_HEADER_PACK_STR, buf, offset)
+        return cls()
+
 
 @OFPAction.register_action_type(ofproto_v1_3.OFPAT_SET_NW_TTL,
                                 ofproto_v1_3.OFP_ACTION_NW_TTL_SIZE)
@@ -1728,7 +1739,8 @@ class OFPActionDecNwTtl(OFPAction):
 
     @classmethod
     def parser(cls, buf, offset):
-        msg_pack_into(ofproto_v1_3.OFP_ACTION_HEADER_PACK_STR, buf, offset)
+        (type_, len_) = struct.unpack_from(
+            ofproto_v1_3.OFP_ACTION_HEADER_PACK_STR, buf, offset)
         return cls()
 
 
@@ -1740,7 +1752,8 @@ class OFPActionCopyTtlOut(OFPAction):
 
     @classmethod
     def parser(cls, buf, offset):
-        msg_pack_into(ofproto_v1_3.OFP_ACTION_HEADER_PACK_STR, buf, offset)
+        (type_, len_) = struct.unpack_from(
+            ofproto_v1_3.OFP_ACTION_HEADER_PACK_STR, buf, offset)
         return cls()
 
 
@@ -1752,7 +1765,8 @@ class OFPActionCopyTtlIn(OFPAction):
 
     @classmethod
     def parser(cls, buf, offset):
-        msg_pack_into(ofproto_v1_3.OFP_ACTION_HEADER_PACK_STR, buf, offset)
+        (type_, len_) = struct.unpack_from(
+            ofproto_v1_3.OFP_ACTION_HEADER_PACK_STR, buf, offset)
         return cls()
 
 
@@ -1800,7 +1814,8 @@ class OFPActionPopVlan(OFPAction):
 
     @classmethod
     def parser(cls, buf, offset):
-        msg_pack_into(ofproto_v1_3.OFP_ACTION_HEADER_PACK_STR, buf, offset)
+        (type_, len_) = struct.unpack_from(
+            ofproto_v1_3.OFP_ACTION_HEADER_PACK_STR, buf, offset)
         return cls()
 
 
@@ -1827,7 +1842,7 @@ class OFPActionPopMpls(OFPAction):
 class OFPActionSetField(OFPAction):
     def __init__(self, field):
         super(OFPActionSetField, self).__init__()
-        set.field = field
+        self.field = field
 
     @classmethod
     def parser(cls, buf, offset):
@@ -1879,20 +1894,19 @@ class OFPBucket(object):
 
     @classmethod
     def parser(cls, buf, offset):
-        (msg.len, msg.weigth, msg.watch_port,
-         msg.watch_group) = struct.unpack_from(
-             ofproto_v1_3.OFP_BUCKET_PACK_STR, buf, offset)
+        (len_, weight, watch_port, watch_group) = struct.unpack_from(
+            ofproto_v1_3.OFP_BUCKET_PACK_STR, buf, offset)
 
         length = ofproto_v1_3.OFP_BUCKET_SIZE
         offset += ofproto_v1_3.OFP_BUCKET_SIZE
-        msg.actions = []
-        while length < msg.len:
+        actions = []
+        while length < len_:
             action = OFPAction.parser(buf, offset)
-            msg.actions.append(action)
+            actions.append(action)
             offset += action.len
             length += action.len
 
-        return msg
+        return cls(len_, weight, watch_port, watch_group, actions)
 
     def serialize(self, buf, offset):
         action_offset = offset + ofproto_v1_3.OFP_BUCKET_SIZE
@@ -2176,6 +2190,7 @@ class OFPAggregateStatsRequest(OFPFlowStatsRequestBase):
     def __init__(self, datapath, flags, table_id, out_port, out_group,
                  cookie, cookie_mask, match):
         super(OFPAggregateStatsRequest, self).__init__(datapath,
+                                                       flags,
                                                        table_id,
                                                        out_port,
                                                        out_group,
@@ -2297,9 +2312,8 @@ class OFPGroupStats(collections.namedtuple('OFPGroupStats', (
     def parser(cls, buf, offset):
         group = struct.unpack_from(ofproto_v1_3.OFP_GROUP_STATS_PACK_STR,
                                    buf, offset)
-        stats = cls(*group)
-        stats.length = ofproto_v1_3.OFP_GROUP_STATS_SIZE
-        return stats
+        # length covers the bucket counters following
+        return cls(*group)
 
 
 @_set_stats_type(ofproto_v1_3.OFPMP_GROUP, OFPGroupStats)
@@ -2326,11 +2340,11 @@ class OFPGroupStatsReply(OFPMultipartReply):
 
 class OFPGroupDescStats(object):
     def __init__(self):
-        super(OFPGroupDescStats).__init__()
+        super(OFPGroupDescStats, self).__init__()
         self.length = None
         self.type = None
         self.group_id = None
-        self.ofp_bucket = None
+        self.bucket = None
 
     @classmethod
     def parser(cls, buf, offset):
@@ -2373,7 +2387,11 @@ class OFPGroupFeaturesStats(collections.namedtuple('OFPGroupFeaturesStats', (
     def parser(cls, buf, offset):
         group_features = struct.unpack_from(
             ofproto_v1_3.OFP_GROUP_FEATURES_PACK_STR, buf, offset)
-        stats = cls(*group_features)
+        types = group_features[0]
+        capabilities = group_features[1]
+        max_groups = list(group_features[2:6])
+        actions = list(group_features[6:10])
+        stats = cls(types, capabilities, max_groups, actions)
         stats.length = ofproto_v1_3.OFP_GROUP_FEATURES_SIZE
         return stats
 
@@ -2382,7 +2400,7 @@ class OFPGroupFeaturesStats(collections.namedtuple('OFPGroupFeaturesStats', (
 @_set_msg_type(ofproto_v1_3.OFPT_MULTIPART_REQUEST)
 class OFPGroupFeaturesStatsRequest(OFPMultipartRequest):
     def __init__(self, datapath, flags, port_no):
-        super(OFPGroupFeaturesRequest, self).__init__(datapath, flags)
+        super(OFPGroupFeaturesStatsRequest, self).__init__(datapath, flags)
 
 
 @OFPMultipartReply.register_stats_type()
@@ -2396,7 +2414,7 @@ class OFPGroupFeaturesStatsReply(OFPMultipartReply):
 class OFPMeterBandStats(object):
     def __init__(self, packet_band_count, byte_band_count):
         super(OFPMeterBandStats, self).__init__()
-        self.packet_band_count = packet_bound_count
+        self.packet_band_count = packet_band_count
         self.byte_band_count = byte_band_count
 
     @classmethod
@@ -2427,6 +2445,7 @@ class OFPMeterStats(object):
          meter_stats.byte_in_count, meter_stats.duration_sec,
          meter_stats.duration_nsec) = struct.unpack_from(
              ofproto_v1_3.OFP_METER_STATS_PACK_STR, buf, offset)
+        meter_stats.length = meter_stats.len
         offset += ofproto_v1_3.OFP_METER_STATS_SIZE
 
         meter_stats.band_stats = []
@@ -2570,13 +2589,14 @@ class OFPTableFeaturesStats(object):
         table_features = cls()
         (table_features.length, table_features.table_id,
          table_features.name, table_features.metadata_match,
-         table_features.write, table_features.config,
-         table_features.max_entries, table_features.properties
+         table_features.metadata_write, table_features.config,
+         table_features.max_entries
          ) = struct.unpack_from(ofproto_v1_3.OFP_TABLE_FEATURES_PACK_STR,
                                 buf, offset)
         offset += ofproto_v1_3.OFP_TABLE_FEATURES_SIZE
 
         # TODO: parse ofp_table_feature_prop_header
+        table_features.properties = []
 
         return table_features
 
@@ -2684,6 +2704,7 @@ class OFPQueueProp(OFPQueuePropHeader):
             ofproto_v1_3.OFP_QUEUE_PROP_HEADER_PACK_STR,
             buf, offset)
         cls_ = cls._QUEUE_PROP_PROPERTIES.get(property_)
+        offset += ofproto_v1_3.OFP_QUEUE_PROP_HEADER_SIZE
         return cls_.parser(buf, offset)
 
 
@@ -2697,12 +2718,9 @@ class OFPQueuePropMinRate(OFPQueueProp):
 
     @classmethod
     def parser(cls, buf, offset):
-        msg = super(OFPQueuePropMinRate, cls).parser(cls, buf, offset)
-        offset += ofproto_v1_3.OFP_QUEUE_PROP_MIN_RATE_SIZE
-        (msg.rate,) = struct.unpack_from(
-            ofproto_v1_3.OFP_QUEUE_PROP_MIN_RATE_PACK_STR, buf,
-            offset)
-        return msg
+        (rate,) = struct.unpack_from(
+            ofproto_v1_3.OFP_QUEUE_PROP_MIN_RATE_PACK_STR, buf, offset)
+        return cls(rate)
 
 
 @OFPQueueProp.register_queue_property(
@@ -2710,41 +2728,42 @@ class OFPQueuePropMinRate(OFPQueueProp):
     ofproto_v1_3.OFP_QUEUE_PROP_MAX_RATE_SIZE)
 class OFPQueuePropMaxRate(OFPQueueProp):
     def __init__(self, rate):
-        super(OFPQueuePropMinRate, self).__init__()
+        super(OFPQueuePropMaxRate, self).__init__()
         self.rate = rate
 
     @classmethod
     def parser(cls, buf, offset):
-        msg = super(OFPQueuePropMinRate, cls).parser(cls, buf, offset)
-        offset += ofproto_v1_3.OFP_QUEUE_PROP_MIN_RATE_SIZE
-        (msg.rate,) = struct.unpack_from(
-            ofproto_v1_3.OFP_QUEUE_PROP_MIN_RATE_PACK_STR, buf,
-            offset)
-        return msg
+        (rate,) = struct.unpack_from(
+            ofproto_v1_3.OFP_QUEUE_PROP_MAX_RATE_PACK_STR, buf, offset)
+        return cls(rate)
 
 
 # TODO: add ofp_queue_prop_experimenter
 
 
-class OFPPacketQueue(MsgBase):
-    def __init__(self, datapath):
-        super(OFPPacketQueue, self).__init__(datapath)
+class OFPPacketQueue(object):
+    def __init__(self, queue_id, port, len_, properties):
+        super(OFPPacketQueue, self).__init__()
+        self.queue_id = queue_id
+        self.port = port
+        self.len = len_
+        self.properties = properties
 
     @classmethod
     def parser(cls, buf, offset):
-        (msg.queue_id, msg.port, msg.len) = struct.unpack_from(
+        (queue_id, port, len_) = struct.unpack_from(
             ofproto_v1_3.OFP_PACKET_QUEUE_PACK_STR, buf, offset)
 
         length = ofproto_v1_3.OFP_PACKET_QUEUE_SIZE
         offset += ofproto_v1_3.OFP_PACKET_QUEUE_SIZE
-        msg.properties = []
-        while length < msg.len:
-            properties = OFPQueueProp.parser(buf, offset)
-            msg.properties.append(properties)
-            offset += properties.len
-            length += properties.len
+        properties = []
+        while length < len_:
+            queue_prop = OFPQueueProp.parser(buf, offset)
+            properties.append(queue_prop)
+            offset += queue_prop.len
+            length += queue_prop.len
 
-        return msg
+        return cls(queue_id, port, len_, properties)
 
 
 @_register_parser
@@ -2758,15 +2777,14 @@ class OFPQueueGetConfigReply(MsgBase):
         msg = super(OFPQueueGetConfigReply, cls).parser(datapath, version,
                                                         msg_type,
                                                         msg_len, xid, buf)
-        offset = ofproto_v1_3.OFP_HEADER_SIZE
         (msg.port,) = struct.unpack_from(
             ofproto_v1_3.OFP_QUEUE_GET_CONFIG_REPLY_PACK_STR, msg.buf,
-            offset)
+            ofproto_v1_3.OFP_HEADER_SIZE)
 
         msg.queues = []
-        offset += ofproto_v1_3.OFP_QUEUE_GET_CONFIG_REPLY_SIZE
-        while offset < msg.length:
-            queue = OFPPacketQueue.parser(buf, offset)
+        offset = ofproto_v1_3.OFP_QUEUE_GET_CONFIG_REPLY_SIZE
+        while offset < msg_len:
+            queue = OFPPacketQueue.parser(msg.buf, offset)
             msg.queues.append(queue)
             offset += queue.len
 
@@ -2802,6 +2820,7 @@ class OFPRoleReply(MsgBase):
         (msg.role, msg.generation_id) = struct.unpack_from(
             ofproto_v1_3.OFP_ROLE_REQUEST_PACK_STR, msg.buf,
             ofproto_v1_3.OFP_HEADER_SIZE)
+        return msg
 
 
 @_set_msg_type(ofproto_v1_3.OFPT_GET_ASYNC_REQUEST)
@@ -2821,10 +2840,14 @@ class OFPGetAsyncReply(MsgBase):
         msg = super(OFPGetAsyncReply, cls).parser(datapath, version,
                                                   msg_type, msg_len,
                                                   xid, buf)
-        (msg.packet_in_mask, msg.port_status_mask,
-         msg.flow_removed_mask) = struct.unpack_from(
-             ofproto_v1_3.OFP_ASYNC_CONFIG_PACK_STR, msg.buf,
-             ofproto_v1_3.OFP_HEADER_SIZE)
+        # [master/equal, slave] of each mask
+        masks = struct.unpack_from(
+            ofproto_v1_3.OFP_ASYNC_CONFIG_PACK_STR, msg.buf,
+            ofproto_v1_3.OFP_HEADER_SIZE)
+        msg.packet_in_mask = list(masks[0:2])
+        msg.port_status_mask = list(masks[2:4])
+        msg.flow_removed_mask = list(masks[4:6])
+        return msg
 
 
 @_register_parser
@@ -2838,7 +2861,11 @@ class OFPSetAsync(MsgBase):
         msg = super(OFPSetAsync, cls).parser(datapath, version,
                                              msg_type, msg_len,
                                              xid, buf)
-        (msg.packet_in_mask, msg.port_status_mask,
-         msg.flow_removed_mask) = struct.unpack_from(
-             ofproto_v1_3.OFP_ASYNC_CONFIG_PACK_STR, msg.buf,
-             ofproto_v1_3.OFP_HEADER_SIZE)
+        # [master/equal, slave] of each mask
+        masks = struct.unpack_from(
+            ofproto_v1_3.OFP_ASYNC_CONFIG_PACK_STR, msg.buf,
+            ofproto_v1_3.OFP_HEADER_SIZE)
+        msg.packet_in_mask = list(masks[0:2])
+        msg.port_status_mask = list(masks[2:4])
+        msg.flow_removed_mask = list(masks[4:6])
+        return msg
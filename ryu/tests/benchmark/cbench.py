@@ -0,0 +1,554 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2013 Nippon Telegraph and Telephone Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Controller benchmark in the manner of cbench.
+
+Emulated OpenFlow switches connect to the controller, answer its
+requests and send packet-ins, and the responses (flow-mod or packet-out)
+are counted and timed. The result is printed as JSON.
+
+usage: python -m ryu.tests.benchmark.cbench [OPTIONS] [app ...]
+
+When apps are given, ryu-manager is started with them and its memory
+usage is reported, too. Otherwise the controller at --controller is used.
+Apps which don't answer packet-ins, like topology.switches, should be run
+with --rate. Then echo round trip time and memory under the load are the
+figures to watch.
+e.g.
+  python -m ryu.tests.benchmark.cbench ryu.app.cbench
+  python -m ryu.tests.benchmark.cbench --switches 32 --rate 500 \\
+      ryu.app.simple_switch
+  python -m ryu.tests.benchmark.cbench --rate 1000 ryu.topology.switches
+"""
+
+import collections
+import json
+import logging
+import os
+import random
+import socket
+import struct
+import subprocess
+import sys
+import time
+from distutils import spawn
+from optparse import OptionParser
+
+import gevent
+from gevent import socket as gsocket
+try:
+    from gevent.lock import Semaphore
+except ImportError:
+    from gevent.coros import Semaphore  # gevent < 1.0
+
+import ryu
+from ryu.ofproto import ofproto_v1_0
+from ryu.ofproto import ofproto_v1_3
+
+
+LOG = logging.getLogger('ryu.tests.benchmark.cbench')
+
+OFP_VERSIONS = {
+    '1.0': ofproto_v1_0,
+    '1.3': ofproto_v1_3,
+}
+
+_NO_BUFFER = 0xffffffff
+_HEADER_SIZE = struct.calcsize(ofproto_v1_0.OFP_HEADER_PACK_STR)
+
+# offset of buffer_id in the messages answering a packet-in
+_BUFFER_ID_OFFSET = {
+    ofproto_v1_0.OFP_VERSION: {
+        ofproto_v1_0.OFPT_FLOW_MOD: (_HEADER_SIZE +
+                                     ofproto_v1_0.OFP_MATCH_SIZE +
+                                     struct.calcsize('!QHHHH')),
+        ofproto_v1_0.OFPT_PACKET_OUT: _HEADER_SIZE,
+    },
+    ofproto_v1_3.OFP_VERSION: {
+        ofproto_v1_3.OFPT_FLOW_MOD: (_HEADER_SIZE +
+                                     struct.calcsize('!QQBBHHH')),
+        ofproto_v1_3.OFPT_PACKET_OUT: _HEADER_SIZE,
+    },
+}
+
+
+def _msg_type_names(ofproto):
+    return dict((getattr(ofproto, name), name[len('OFPT_'):])
+                for name in dir(ofproto) if name.startswith('OFPT_'))
+
+
+def _percentiles(samples):
+    """Return the summary of samples in seconds as milliseconds."""
+    if not samples:
+        return None
+    samples = sorted(samples)
+    n = len(samples)
+
+    def _rank(p):
+        return samples[min(n - 1, int(n * p / 100.0))] * 1000
+
+    return {'count': n,
+            'min': samples[0] * 1000,
+            'mean': sum(samples) / n * 1000,
+            'p50': _rank(50),
+            'p90': _rank(90),
+            'p99': _rank(99),
+            'max': samples[-1] * 1000}
+
+
+def _proc_status(pid):
+    """Return VmRSS and VmHWM of the process in KB."""
+    status = {}
+    try:
+        with open('/proc/%d/status' % pid) as f:
+            for line in f:
+                key, _sep, value = line.partition(':')
+                if key in ('VmRSS', 'VmHWM'):
+                    status[key] = int(value.split()[0])
+    except IOError:
+        pass
+    return {'rss_kb': status.get('VmRSS'), 'peak_rss_kb': status.get('VmHWM')}
+
+
+class Stats(object):
+    def __init__(self):
+        super(Stats, self).__init__()
+        self.measuring = False
+        self.packet_in = 0
+        self.answered = 0
+        self.latencies = []
+        self.echo_rtts = []
+        self.handshakes = []
+        self.messages = collections.defaultdict(int)
+        self.errors = []
+
+
+class EmulatedSwitch(object):
+    """
+    Switch which speaks just enough OpenFlow to be a datapath of Ryu:
+    handshake, echo, config/stats/barrier requests, and packet-in
+    generation with a sink for flow-mods and packet-outs.
+    """
+
+    def __init__(self, dpid, ofproto, stats, n_ports=4, n_macs=1000,
+                 rate=0, window=1, echo_interval=1.0):
+        super(EmulatedSwitch, self).__init__()
+        self.dpid = dpid
+        self.ofproto = ofproto
+        self.version = ofproto.OFP_VERSION
+        self.stats = stats
+        self.n_ports = n_ports
+        self.rate = rate            # packet-in/s, 0 for closed loop
+        self.window = window        # outstanding packet-ins of closed loop
+        self.echo_interval = echo_interval
+
+        self.sock = None
+        self.lock = Semaphore()
+        self.threads = []
+        self.xid = 0
+        self.buffer_id = 0
+        self.outstanding = collections.OrderedDict()  # buffer_id -> time
+        self.echoes = {}    # xid -> time
+        self.connected_at = None
+        self.handshaked = False
+
+        # hosts behind this switch
+        self.macs = [struct.pack('!BBI', 0x02, dpid & 0xff, i)
+                     for i in range(1, n_macs + 1)]
+        self._handlers = {
+            ofproto.OFPT_HELLO: lambda msg: None,
+            ofproto.OFPT_ERROR: self._error_handler,
+            ofproto.OFPT_ECHO_REQUEST: self._echo_request_handler,
+            ofproto.OFPT_ECHO_REPLY: self._echo_reply_handler,
+            ofproto.OFPT_FEATURES_REQUEST: self._features_request_handler,
+            ofproto.OFPT_GET_CONFIG_REQUEST: self._get_config_handler,
+            ofproto.OFPT_SET_CONFIG: self._set_config_handler,
+            ofproto.OFPT_BARRIER_REQUEST: self._barrier_handler,
+        }
+        if self.version == ofproto_v1_0.OFP_VERSION:
+            self._handlers[ofproto.OFPT_STATS_REQUEST] = self._stats_handler
+        else:
+            self._handlers[ofproto.OFPT_MULTIPART_REQUEST] = \
+                self._stats_handler
+        for msg_type in _BUFFER_ID_OFFSET[self.version]:
+            self._handlers[msg_type] = self._response_handler
+
+    # sending
+    def _next_xid(self):
+        self.xid = (self.xid + 1) & 0xffffffff
+        return self.xid
+
+    def _send(self, msg_type, body='', xid=None):
+        if xid is None:
+            xid = self._next_xid()
+        header = struct.pack(self.ofproto.OFP_HEADER_PACK_STR, self.version,
+                             msg_type, _HEADER_SIZE + len(body), xid)
+        with self.lock:
+            self.sock.sendall(header + body)
+
+    def _port(self, port_no):
+        hw_addr = struct.pack('!BBI', 0x0a, self.dpid & 0xff, port_no)
+        name = 'eth%d' % port_no
+        if self.version == ofproto_v1_0.OFP_VERSION:
+            return struct.pack(self.ofproto.OFP_PHY_PORT_PACK_STR, port_no,
+                               hw_addr, name, 0, 0, 0, 0, 0, 0)
+        return struct.pack(self.ofproto.OFP_PORT_PACK_STR, port_no,
+                           hw_addr, name, 0, 0, 0, 0, 0, 0, 0, 0)
+
+    def _ports(self):
+        return ''.join(self._port(port_no)
+                       for port_no in range(1, self.n_ports + 1))
+
+    def _frame(self):
+        src, dst = random.sample(self.macs, 2)
+        # ethernet + IPv4/UDP headers, padded to the minimum frame size
+        return (dst + src + '\x08\x00' +
+                '\x45\x00\x00\x2e\x00\x00\x00\x00\x40\x11\x00\x00' +
+                '\x0a\x00\x00\x01\x0a\x00\x00\x02' +
+                '\x00\x35\x00\x35\x00\x1a\x00\x00' + '\x00' * 18)
+
+    def send_packet_in(self):
+        self.buffer_id = (self.buffer_id + 1) & 0x7fffffff
+        buffer_id = self.buffer_id
+        in_port = random.randint(1, self.n_ports)
+        data = self._frame()
+        if self.version == ofproto_v1_0.OFP_VERSION:
+            body = struct.pack(self.ofproto.OFP_PACKET_IN_PACK_STR[:-2],
+                               buffer_id, len(data), in_port,
+                               self.ofproto.OFPR_NO_MATCH)
+        else:
+            body = (struct.pack(self.ofproto.OFP_PACKET_IN_PACK_STR,
+                                buffer_id, len(data),
+                                self.ofproto.OFPR_NO_MATCH, 0, 0) +
+                    struct.pack('!HHII4x', self.ofproto.OFPMT_OXM, 12,
+                                self.ofproto.OXM_OF_IN_PORT, in_port) +
+                    '\x00' * 2)
+        self.outstanding[buffer_id] = time.time()
+        if self.stats.measuring:
+            self.stats.packet_in += 1
+        self._send(self.ofproto.OFPT_PACKET_IN, body + data)
+
+    # handlers
+    def _error_handler(self, msg):
+        error_type, code = struct.unpack_from('!HH', msg, _HEADER_SIZE)
+        self.stats.errors.append('dpid %d: type %d code %d %s' % (
+            self.dpid, error_type, code, msg[_HEADER_SIZE + 4:]))
+
+    def _echo_request_handler(self, msg):
+        _version, _msg_type, _msg_len, xid = struct.unpack_from(
+            '!BBHI', msg)
+        self._send(self.ofproto.OFPT_ECHO_REPLY, msg[_HEADER_SIZE:], xid)
+
+    def _echo_reply_handler(self, msg):
+        xid = struct.unpack_from('!I', msg, 4)[0]
+        sent = self.echoes.pop(xid, None)
+        if sent is not None and self.stats.measuring:
+            self.stats.echo_rtts.append(time.time() - sent)
+
+    def _features_request_handler(self, msg):
+        xid = struct.unpack_from('!I', msg, 4)[0]
+        if self.version == ofproto_v1_0.OFP_VERSION:
+            body = struct.pack(self.ofproto.OFP_SWITCH_FEATURES_PACK_STR,
+                               self.dpid, 256, 1, 0, 0xfff) + self._ports()
+        else:
+            body = struct.pack(self.ofproto.OFP_SWITCH_FEATURES_PACK_STR,
+                               self.dpid, 256, 1, 0, 0, 0)
+        self._send(self.ofproto.OFPT_FEATURES_REPLY, body, xid)
+
+    def _get_config_handler(self, msg):
+        xid = struct.unpack_from('!I', msg, 4)[0]
+        self._send(self.ofproto.OFPT_GET_CONFIG_REPLY,
+                   struct.pack('!HH', 0, 128), xid)
+
+    def _set_config_handler(self, _msg):
+        # Ryu sends this right after the features reply
+        if not self.handshaked:
+            self.handshaked = True
+            self.stats.handshakes.append(time.time() - self.connected_at)
+            self.threads.append(gevent.spawn(self._packet_in_loop))
+            if self.echo_interval:
+                self.threads.append(gevent.spawn(self._echo_loop))
+
+    def _barrier_handler(self, msg):
+        xid = struct.unpack_from('!I', msg, 4)[0]
+        self._send(self.ofproto.OFPT_BARRIER_REPLY, '', xid)
+
+    def _stats_handler(self, msg):
+        xid = struct.unpack_from('!I', msg, 4)[0]
+        stats_type = struct.unpack_from('!H', msg, _HEADER_SIZE)[0]
+        desc = ('ryu', 'cbench', 'emulated switch', str(self.dpid), '')
+        body = ''
+        if self.version == ofproto_v1_0.OFP_VERSION:
+            reply_type = self.ofproto.OFPT_STATS_REPLY
+            header = struct.pack(self.ofproto.OFP_STATS_MSG_PACK_STR,
+                                 stats_type, 0)
+            if stats_type == self.ofproto.OFPST_DESC:
+                body = struct.pack(self.ofproto.OFP_DESC_STATS_PACK_STR,
+                                   *desc)
+        else:
+            reply_type = self.ofproto.OFPT_MULTIPART_REPLY
+            header = struct.pack(self.ofproto.OFP_MULTIPART_REPLY_PACK_STR,
+                                 stats_type, 0)
+            if stats_type == self.ofproto.OFPMP_DESC:
+                body = struct.pack(self.ofproto.OFP_DESC_PACK_STR, *desc)
+            elif stats_type == self.ofproto.OFPMP_PORT_DESC:
+                body = self._ports()
+        self._send(reply_type, header + body, xid)
+
+    def _response_handler(self, msg):
+        offset = _BUFFER_ID_OFFSET[self.version][ord(msg[1])]
+        buffer_id = struct.unpack_from('!I', msg, offset)[0]
+        sent = self.outstanding.pop(buffer_id, None)
+        if sent is None and buffer_id == _NO_BUFFER and self.outstanding:
+            # unbuffered response, assume it answers the oldest one
+            _buffer_id, sent = self.outstanding.popitem(last=False)
+        if sent is None:
+            return
+
+        if self.stats.measuring:
+            self.stats.answered += 1
+            self.stats.latencies.append(time.time() - sent)
+        if not self.rate:
+            self.send_packet_in()
+
+    # loops
+    def _packet_in_loop(self):
+        if not self.rate:
+            for _i in range(self.window):
+                self.send_packet_in()
+            return
+
+        interval = 0.01
+        start = time.time()
+        sent = 0
+        while True:
+            gevent.sleep(interval)
+            due = int((time.time() - start) * self.rate)
+            for _i in range(due - sent):
+                self.send_packet_in()
+            sent = due
+
+    def _echo_loop(self):
+        while True:
+            gevent.sleep(self.echo_interval)
+            xid = self._next_xid()
+            self.echoes[xid] = time.time()
+            self._send(self.ofproto.OFPT_ECHO_REQUEST, '', xid)
+
+    def _recv_loop(self):
+        names = _msg_type_names(self.ofproto)
+        buf = ''
+        while True:
+            data = self.sock.recv(65536)
+            if not data:
+                self.stats.errors.append('dpid %d: disconnected' % self.dpid)
+                break
+            buf += data
+            offset = 0
+            while len(buf) - offset >= _HEADER_SIZE:
+                _version, msg_type, msg_len, _xid = struct.unpack_from(
+                    self.ofproto.OFP_HEADER_PACK_STR, buf, offset)
+                if len(buf) - offset < msg_len:
+                    break
+                msg = buf[offset:offset + msg_len]
+                offset += msg_len
+
+                if self.stats.measuring:
+                    self.stats.messages[names.get(msg_type, msg_type)] += 1
+                handler = self._handlers.get(msg_type)
+                if handler:
+                    handler(msg)
+            buf = buf[offset:]
+
+    def start(self, address):
+        self.sock = gsocket.create_connection(address)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.connected_at = time.time()
+        self._send(self.ofproto.OFPT_HELLO)
+        self.threads.append(gevent.spawn(self._recv_loop))
+
+    def stop(self):
+        gevent.killall(self.threads)
+        if self.sock:
+            self.sock.close()
+
+
+def _ryu_manager():
+    path = os.path.join(os.path.dirname(os.path.dirname(ryu.__file__)),
+                        'bin', 'ryu-manager')
+    if os.path.exists(path):
+        return path
+    return spawn.find_executable('ryu-manager')
+
+
+def _free_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def start_controller(apps, port, log_file):
+    args = [sys.executable, _ryu_manager(),
+            '--ofp-listen-host', '127.0.0.1',
+            '--ofp-tcp-listen-port', str(port),
+            '--wsapi-host', '127.0.0.1', '--wsapi-port', str(_free_port()),
+            '--default-log-level', str(logging.WARNING)] + apps
+    # run the same ryu as this one even if it isn't installed
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        filter(None, [os.path.dirname(os.path.dirname(ryu.__file__)),
+                      env.get('PYTHONPATH')]))
+    proc = subprocess.Popen(args, stdout=log_file, stderr=log_file, env=env)
+
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError('ryu-manager exited with %d' % proc.returncode)
+        try:
+            socket.create_connection(('127.0.0.1', port), 1).close()
+            return proc
+        except socket.error:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError('ryu-manager did not start listening')
+
+
+def run(address, ofproto, n_switches, duration, warmup, controller=None,
+        **switch_kwargs):
+    stats = Stats()
+    switches = [EmulatedSwitch(dpid, ofproto, stats, **switch_kwargs)
+                for dpid in range(1, n_switches + 1)]
+    for switch in switches:
+        switch.start(address)
+
+    result = {}
+    try:
+        gevent.sleep(warmup)
+        if controller is not None:
+            result['controller_before'] = _proc_status(controller.pid)
+        stats.measuring = True
+        per_second = []
+        start = time.time()
+        answered = 0
+        while time.time() - start < duration:
+            gevent.sleep(1)
+            per_second.append(stats.answered - answered)
+            answered = stats.answered
+        elapsed = time.time() - start
+        stats.measuring = False
+        if controller is not None:
+            result['controller'] = _proc_status(controller.pid)
+    finally:
+        for switch in switches:
+            switch.stop()
+
+    result.update({
+        'connected': sum(1 for switch in switches if switch.handshaked),
+        'packet_in': stats.packet_in,
+        'answered': stats.answered,
+        'throughput': {
+            'mean': stats.answered / elapsed,
+            'min': min(per_second) if per_second else 0,
+            'max': max(per_second) if per_second else 0,
+            'per_second': per_second,
+        },
+        'latency_ms': _percentiles(stats.latencies),
+        'echo_rtt_ms': _percentiles(stats.echo_rtts),
+        'handshake_ms': _percentiles(stats.handshakes),
+        'messages': dict(stats.messages),
+        'errors': stats.errors[:10],
+    })
+    return result
+
+
+def main():
+    parser = OptionParser(usage='Usage: %prog [OPTIONS] [app ...]')
+    parser.add_option('-c', '--controller', default='127.0.0.1:6633',
+                      help='controller address when no app is given')
+    parser.add_option('-V', '--ofp-version', default='1.0',
+                      choices=sorted(OFP_VERSIONS.keys()),
+                      help='OpenFlow version of the switches')
+    parser.add_option('-s', '--switches', type='int', default=16,
+                      help='number of emulated switches')
+    parser.add_option('-p', '--ports', type='int', default=4,
+                      help='number of ports per switch')
+    parser.add_option('-M', '--macs', type='int', default=1000,
+                      help='number of hosts per switch')
+    parser.add_option('-r', '--rate', type='float', default=0,
+                      help='packet-in/s per switch. 0 keeps --window '
+                      'packet-ins outstanding as fast as answered')
+    parser.add_option('-w', '--window', type='int', default=1,
+                      help='outstanding packet-ins per switch when --rate 0')
+    parser.add_option('-e', '--echo-interval', type='float', default=1.0,
+                      help='seconds between echo requests of a switch')
+    parser.add_option('-d', '--duration', type='float', default=10,
+                      help='seconds to measure')
+    parser.add_option('-W', '--warmup', type='float', default=2,
+                      help='seconds to wait before measuring')
+    parser.add_option('-o', '--output', default=None,
+                      help='file to write the JSON result to')
+    parser.add_option('-l', '--controller-log', default=os.devnull,
+                      help='log file of the started ryu-manager')
+    options, apps = parser.parse_args()
+
+    controller = None
+    if apps:
+        port = _free_port()
+        address = ('127.0.0.1', port)
+        log_file = open(options.controller_log, 'w')
+        controller = start_controller(apps, port, log_file)
+    else:
+        host, port = options.controller.rsplit(':', 1)
+        address = (host, int(port))
+
+    try:
+        result = run(address, OFP_VERSIONS[options.ofp_version],
+                     options.switches, options.duration, options.warmup,
+                     controller, n_ports=options.ports, n_macs=options.macs,
+                     rate=options.rate, window=options.window,
+                     echo_interval=options.echo_interval)
+    finally:
+        if controller is not None:
+            controller.terminate()
+            controller.wait()
+
+    result['config'] = {
+        'apps': apps,
+        'controller': '%s:%d' % address,
+        'ofp_version': options.ofp_version,
+        'switches': options.switches,
+        'ports': options.ports,
+        'macs': options.macs,
+        'rate': options.rate,
+        'window': options.window,
+        'duration': options.duration,
+    }
+    output = json.dumps(result, indent=2, sort_keys=True)
+    if options.output:
+        with open(options.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print output
+    if result['connected'] != options.switches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
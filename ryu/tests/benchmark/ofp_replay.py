@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2013 Nippon Telegraph and Telephone Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Replay captured OpenFlow connections to a controller.
+
+ryu-manager --ofp-capture-dir DIR writes a capture file per connection.
+Each given capture is played as a switch: the messages the switch sent
+are sent again at the recorded pace scaled by --speed, and what the
+controller sends back is counted. The responses to the replayed
+packet-ins are matched by buffer_id and timed as cbench does. The result
+is printed as JSON.
+
+usage: python -m ryu.tests.benchmark.ofp_replay [OPTIONS] capture ...
+
+When apps are given with --app, ryu-manager is started with them, so two
+versions of an app can be compared against the same traffic.
+e.g.
+  python -m ryu.tests.benchmark.ofp_replay --app ryu.app.simple_switch \\
+      /var/tmp/ofcap/*.ofcap
+  python -m ryu.tests.benchmark.ofp_replay --speed 0 \\
+      --controller 127.0.0.1:6633 /var/tmp/ofcap/*.ofcap
+"""
+
+import collections
+import json
+import os
+import socket
+import struct
+import sys
+import time
+from optparse import OptionParser
+
+import gevent
+from gevent import socket as gsocket
+try:
+    from gevent.lock import Semaphore
+except ImportError:
+    from gevent.coros import Semaphore  # gevent < 1.0
+
+from ryu.lib import ofp_capture
+from ryu.ofproto import ofproto_v1_0
+from ryu.ofproto import ofproto_v1_2
+from ryu.ofproto import ofproto_v1_3
+from ryu.tests.benchmark import cbench
+
+
+_OFPROTO = {
+    ofproto_v1_0.OFP_VERSION: ofproto_v1_0,
+    ofproto_v1_2.OFP_VERSION: ofproto_v1_2,
+    ofproto_v1_3.OFP_VERSION: ofproto_v1_3,
+}
+_MSG_TYPE_NAMES = dict((version, cbench._msg_type_names(ofproto))
+                       for version, ofproto in _OFPROTO.items())
+
+# the header and these message types are the same in all the versions
+_OFPT_PACKET_IN = ofproto_v1_0.OFPT_PACKET_IN
+_OFPT_ECHO_REQUEST = ofproto_v1_0.OFPT_ECHO_REQUEST
+_OFPT_ECHO_REPLY = ofproto_v1_0.OFPT_ECHO_REPLY
+_HEADER_PACK_STR = ofproto_v1_0.OFP_HEADER_PACK_STR
+_HEADER_SIZE = ofproto_v1_0.OFP_HEADER_SIZE
+# v1.2 lays out flow-mod and packet-out as v1.3 does
+_BUFFER_ID_OFFSET = dict(cbench._BUFFER_ID_OFFSET)
+_BUFFER_ID_OFFSET[ofproto_v1_2.OFP_VERSION] = \
+    _BUFFER_ID_OFFSET[ofproto_v1_3.OFP_VERSION]
+
+# bytes sent at once when the messages are already due
+_SEND_CHUNK = 65536
+
+
+class Stats(object):
+    def __init__(self):
+        super(Stats, self).__init__()
+        self.sent = 0
+        self.packet_in = 0
+        self.answered = 0
+        self.latencies = []
+        self.max_lag = 0
+        self.received = collections.defaultdict(int)
+        self.errors = []
+
+
+class ReplayedSwitch(object):
+    """
+    Send the switch side of a capture file to the controller and sink
+    whatever the controller sends except for echo requests, which are
+    answered since the recorded echo replies don't match them.
+    """
+
+    def __init__(self, path, stats):
+        super(ReplayedSwitch, self).__init__()
+        self.path = path
+        self.stats = stats
+        reader = ofp_capture.CaptureReader(path)
+        try:
+            # load everything beforehand not to read the file while timing
+            self.records = [(timestamp, buf) for timestamp, direction, buf
+                            in reader if direction == ofp_capture.RECV]
+        finally:
+            reader.close()
+
+        self.sock = None
+        self.lock = Semaphore()
+        self.threads = []
+        self.play_thread = None
+        self.outstanding = {}   # buffer_id -> time
+        self.done = False
+
+    @property
+    def first_timestamp(self):
+        if not self.records:
+            return None
+        return self.records[0][0]
+
+    def _sendall(self, buf):
+        with self.lock:
+            self.sock.sendall(buf)
+
+    def _track_packet_in(self, buf, now):
+        if ord(buf[1]) != _OFPT_PACKET_IN:
+            return
+        buffer_id = struct.unpack_from('!I', buf, _HEADER_SIZE)[0]
+        self.stats.packet_in += 1
+        if buffer_id != cbench._NO_BUFFER:
+            self.outstanding[buffer_id] = now
+
+    def _play_loop(self, start, origin, speed):
+        try:
+            pending = []
+            pending_len = 0
+            for timestamp, buf in self.records:
+                if speed:
+                    delay = start + (timestamp - origin) / speed - time.time()
+                    if delay > 0:
+                        if pending:
+                            self._sendall(''.join(pending))
+                            pending = []
+                            pending_len = 0
+                        gevent.sleep(delay)
+                    else:
+                        self.stats.max_lag = max(self.stats.max_lag, -delay)
+                self._track_packet_in(buf, time.time())
+                pending.append(buf)
+                pending_len += len(buf)
+                self.stats.sent += 1
+                if pending_len >= _SEND_CHUNK:
+                    self._sendall(''.join(pending))
+                    pending = []
+                    pending_len = 0
+            if pending:
+                self._sendall(''.join(pending))
+        except socket.error as e:
+            self.stats.errors.append('%s: %s' % (self.path, e))
+        finally:
+            self.done = True
+
+    def _response(self, version, msg_type, buf, offset):
+        buffer_id_offset = _BUFFER_ID_OFFSET.get(version, {}).get(msg_type)
+        if buffer_id_offset is None:
+            return
+        buffer_id = struct.unpack_from('!I', buf, offset + buffer_id_offset)[0]
+        sent = self.outstanding.pop(buffer_id, None)
+        if sent is not None:
+            self.stats.answered += 1
+            self.stats.latencies.append(time.time() - sent)
+
+    def _recv_loop(self):
+        buf = ''
+        while True:
+            data = self.sock.recv(65536)
+            if not data:
+                if not self.done:
+                    self.stats.errors.append('%s: disconnected' % self.path)
+                break
+            buf += data
+            offset = 0
+            while len(buf) - offset >= _HEADER_SIZE:
+                version, msg_type, msg_len, xid = struct.unpack_from(
+                    _HEADER_PACK_STR, buf, offset)
+                if len(buf) - offset < msg_len:
+                    break
+                names = _MSG_TYPE_NAMES.get(version, {})
+                name = names.get(msg_type, msg_type)
+                self.stats.received[name] += 1
+                if msg_type == _OFPT_ECHO_REQUEST:
+                    body = buf[offset + _HEADER_SIZE:offset + msg_len]
+                    self._sendall(struct.pack(
+                        _HEADER_PACK_STR, version, _OFPT_ECHO_REPLY,
+                        msg_len, xid) + body)
+                else:
+                    self._response(version, msg_type, buf, offset)
+                offset += msg_len
+            buf = buf[offset:]
+
+    def start(self, address, start, origin, speed):
+        self.sock = gsocket.create_connection(address)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.threads.append(gevent.spawn(self._recv_loop))
+        self.play_thread = gevent.spawn(self._play_loop,
+                                        start, origin, speed)
+        self.threads.append(self.play_thread)
+
+    def stop(self):
+        gevent.killall(self.threads)
+        if self.sock:
+            self.sock.close()
+
+
+def run(address, paths, speed, linger, controller=None):
+    stats = Stats()
+    switches = [ReplayedSwitch(path, stats) for path in paths]
+    timestamps = [switch.first_timestamp for switch in switches
+                  if switch.first_timestamp is not None]
+    if not timestamps:
+        raise ValueError('no message to replay')
+    origin = min(timestamps)
+    recorded = max(switch.records[-1][0] for switch in switches
+                   if switch.records) - origin
+
+    result = {}
+    start = time.time()
+    try:
+        for switch in switches:
+            switch.start(address, start, origin, speed)
+        gevent.joinall([switch.play_thread for switch in switches])
+        elapsed = time.time() - start
+        gevent.sleep(linger)
+        if controller is not None:
+            result['controller'] = cbench._proc_status(controller.pid)
+    finally:
+        for switch in switches:
+            switch.stop()
+
+    result.update({
+        'captures': len(paths),
+        'sent': stats.sent,
+        'recorded_duration': recorded,
+        'duration': elapsed,
+        'rate': stats.sent / elapsed if elapsed else None,
+        'max_lag_ms': stats.max_lag * 1000,
+        'packet_in': stats.packet_in,
+        'answered': stats.answered,
+        'latency_ms': cbench._percentiles(stats.latencies),
+        'received': dict(stats.received),
+        'errors': stats.errors[:10],
+    })
+    return result
+
+
+def main():
+    parser = OptionParser(usage='Usage: %prog [OPTIONS] capture ...')
+    parser.add_option('-c', '--controller', default='127.0.0.1:6633',
+                      help='controller address when no app is given')
+    parser.add_option('-a', '--app', action='append', default=[],
+                      help='app to start ryu-manager with, repeatable')
+    parser.add_option('-x', '--speed', type='float', default=1.0,
+                      help='replay speed relative to the recording, '
+                      '0 for as fast as possible')
+    parser.add_option('-L', '--linger', type='float', default=1.0,
+                      help='seconds to wait for responses after replaying')
+    parser.add_option('-o', '--output', default=None,
+                      help='file to write the JSON result to')
+    parser.add_option('-l', '--controller-log', default=os.devnull,
+                      help='log file of the started ryu-manager')
+    options, paths = parser.parse_args()
+    if not paths:
+        parser.error('no capture file is given')
+
+    controller = None
+    if options.app:
+        port = cbench._free_port()
+        address = ('127.0.0.1', port)
+        log_file = open(options.controller_log, 'w')
+        controller = cbench.start_controller(options.app, port, log_file)
+    else:
+        host, port = options.controller.rsplit(':', 1)
+        address = (host, int(port))
+
+    try:
+        result = run(address, paths, options.speed, options.linger,
+                     controller)
+    finally:
+        if controller is not None:
+            controller.terminate()
+            controller.wait()
+
+    result['config'] = {
+        'apps': options.app,
+        'controller': '%s:%d' % address,
+        'captures': paths,
+        'speed': options.speed,
+    }
+    output = json.dumps(result, indent=2, sort_keys=True)
+    if options.output:
+        with open(options.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print output
+    if result['errors']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
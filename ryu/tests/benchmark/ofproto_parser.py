@@ -0,0 +1,1109 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2013 Nippon Telegraph and Telephone Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Micro benchmark of the OpenFlow message parsers and serializers.
+
+Every message class of ofproto_v1_{0,2,3}_parser which can be parsed or
+serialized has a case named <version>/<parse|serialize>/<class>.
+Flow related messages carry a 5-tuple match and 10 actions, and flow
+stats replies carry 1000 entries.
+
+For each case ns/op and objects/op are reported.  objects/op is the
+number of objects tracked by the garbage collector which one operation
+leaves alive, i.e. the instances, dicts and lists making up the result.
+Python 2 has no allocation counter, so this is a proxy of allocations
+which doesn't count strings and numbers.
+
+The results are compared with a baseline, ofproto_parser_baseline.json
+by default.  ns/op is the median of measurements taken by turns with a
+calibration loop, and is scaled by the median of the latter so that a
+baseline taken on another machine, or while the machine was busier, is
+still meaningful.  Cases slower than the tolerance are measured again,
+each time by a new process, and are reported as regressions only if
+the median of the measurements is still slower, as are cases
+allocating more than the tolerance.  The exit status is then 1.  Cases
+raising an exception are reported as errors, and message classes
+without a case as uncovered.
+
+usage: python -m ryu.tests.benchmark.ofproto_parser [options]
+  e.g. --filter v1.3/parse --save new_baseline.json
+       --runs 3 --save ryu/tests/benchmark/ofproto_parser_baseline.json
+"""
+
+import gc
+import inspect
+import json
+import optparse
+import os
+import re
+import struct
+import subprocess
+import sys
+import time
+
+import ryu.contrib  # for oslo.config
+from ryu.lib import mac
+from ryu.ofproto import nx_match
+from ryu.ofproto import ofproto_parser
+from ryu.ofproto import ofproto_v1_0
+from ryu.ofproto import ofproto_v1_0_parser
+from ryu.ofproto import ofproto_v1_2
+from ryu.ofproto import ofproto_v1_2_parser
+from ryu.ofproto import ofproto_v1_3
+from ryu.ofproto import ofproto_v1_3_parser
+
+
+_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         'ofproto_parser_baseline.json')
+
+_SAMPLES = 3    # measurements of a case, by turns with the calibration
+_RECHECKS = 4   # more measurements of a case slower than the baseline
+
+_MODULE = 'ryu.tests.benchmark.ofproto_parser'
+
+_N_ACTIONS = 10
+_N_FLOW_STATS = 1000
+_N_PORTS = 48
+_FRAME = '\x00' * 128
+
+_HW_ADDR = mac.haddr_to_bin('00:11:22:33:44:55')
+_DL_SRC = mac.haddr_to_bin('00:00:00:00:00:01')
+_DL_DST = mac.haddr_to_bin('00:00:00:00:00:02')
+_NW_SRC = 0x0a000001
+_NW_DST = 0x0a000002
+_IPPROTO_TCP = 6
+_TP_SRC = 34567
+_TP_DST = 80
+_NO_BUFFER = 0xffffffff
+
+
+class _Datapath(object):
+    def __init__(self, ofproto, ofproto_parser_):
+        self.ofproto = ofproto
+        self.ofproto_parser = ofproto_parser_
+
+
+def _msg(ofproto, msg_type, body):
+    length = ofproto.OFP_HEADER_SIZE + len(body)
+    return struct.pack(ofproto.OFP_HEADER_PACK_STR, ofproto.OFP_VERSION,
+                       msg_type, length, 0) + body
+
+
+def _pad(buf):
+    return buf + '\x00' * (-len(buf) % 8)
+
+
+def _stats_msgs(ofproto, msg_type, pack_str, stats_type, more, entries,
+                prefix=''):
+    # split entries into the replies of at most 64KB as switches do
+    max_len = (0xffff - ofproto.OFP_HEADER_SIZE - struct.calcsize(pack_str) -
+               len(prefix))
+    bodies = [[]]
+    length = 0
+    for entry in entries:
+        if bodies[-1] and length + len(entry) > max_len:
+            bodies.append([])
+            length = 0
+        bodies[-1].append(entry)
+        length += len(entry)
+
+    return [_msg(ofproto, msg_type,
+                 struct.pack(pack_str, stats_type,
+                             more if i < len(bodies) - 1 else 0) +
+                 prefix + ''.join(body))
+            for i, body in enumerate(bodies)]
+
+
+def _serialized(obj, *args):
+    # serialize a structure which isn't a message, like a match or
+    # an action, into a string
+    buf = bytearray()
+    obj.serialize(buf, 0, *args)
+    return str(buf)
+
+
+#
+# OpenFlow 1.0
+#
+
+def _v1_0_match():
+    ofp = ofproto_v1_0
+    wildcards = (ofp.OFPFW_ALL & ~(ofp.OFPFW_DL_TYPE | ofp.OFPFW_NW_PROTO |
+                                   ofp.OFPFW_NW_SRC_MASK |
+                                   ofp.OFPFW_NW_DST_MASK |
+                                   ofp.OFPFW_TP_SRC | ofp.OFPFW_TP_DST))
+    return ofproto_v1_0_parser.OFPMatch(
+        wildcards, 0, '\x00' * 6, '\x00' * 6, 0, 0, 0x0800, 0,
+        _IPPROTO_TCP, _NW_SRC, _NW_DST, _TP_SRC, _TP_DST)
+
+
+def _v1_0_actions():
+    p = ofproto_v1_0_parser
+    actions = [p.OFPActionSetDlSrc(_DL_SRC),
+               p.OFPActionSetDlDst(_DL_DST),
+               p.OFPActionSetNwSrc(_NW_SRC),
+               p.OFPActionSetNwDst(_NW_DST),
+               p.OFPActionSetNwTos(0x10),
+               p.OFPActionSetTpSrc(_TP_SRC),
+               p.OFPActionSetTpDst(_TP_DST),
+               p.OFPActionVlanVid(10),
+               p.OFPActionVlanPcp(3),
+               p.OFPActionOutput(1)]
+    assert len(actions) == _N_ACTIONS
+    return actions
+
+
+def _v1_0_cls_rule():
+    rule = nx_match.ClsRule()
+    rule.set_in_port(1)
+    rule.set_dl_type(0x0800)
+    rule.set_nw_proto(_IPPROTO_TCP)
+    rule.set_nw_src(_NW_SRC)
+    rule.set_nw_dst(_NW_DST)
+    # nx_match has no field to put tp_dst yet
+    rule.set_tp_src(_TP_SRC)
+    return rule
+
+
+def _v1_0_actions_bytes():
+    return ''.join(_serialized(a) for a in _v1_0_actions())
+
+
+def _v1_0_stats(stats_type, entries, prefix=''):
+    ofp = ofproto_v1_0
+    return _stats_msgs(ofp, ofp.OFPT_STATS_REPLY, ofp.OFP_STATS_MSG_PACK_STR,
+                       stats_type, ofp.OFPSF_REPLY_MORE, entries, prefix)
+
+
+def _v1_0_flow_stats():
+    ofp = ofproto_v1_0
+    match = _serialized(_v1_0_match())
+    actions = _v1_0_actions_bytes()
+    length = ofp.OFP_FLOW_STATS_SIZE + len(actions)
+    entry = (struct.pack(ofp.OFP_FLOW_STATS_0_PACK_STR, length, 0) + match +
+             struct.pack(ofp.OFP_FLOW_STATS_1_PACK_STR,
+                         10, 0, 0x8000, 0, 0, 0, 100, 6400) + actions)
+    return [entry] * _N_FLOW_STATS
+
+
+def _v1_0_nx_flow_stats():
+    ofp = ofproto_v1_0
+    buf = bytearray()
+    match_len = nx_match.serialize_nxm_match(_v1_0_cls_rule(), buf, 0)
+    match = _pad(str(buf))
+    actions = _v1_0_actions_bytes()
+    length = ofp.NX_FLOW_STATS_SIZE + len(match) + len(actions)
+    entry = (struct.pack(ofp.NX_FLOW_STATS_PACK_STR, length, 0, 10, 0,
+                         0x8000, 0, 0, match_len, 0, 0, 0, 100, 6400) +
+             match + actions)
+    return [entry] * _N_FLOW_STATS
+
+
+def _v1_0_nicira(subtype, body):
+    ofp = ofproto_v1_0
+    return _msg(ofp, ofp.OFPT_VENDOR,
+                struct.pack(ofp.NICIRA_HEADER_PACK_STR, ofp.NX_VENDOR_ID,
+                            subtype) + body)
+
+
+def _v1_0_nx_match():
+    buf = bytearray()
+    match_len = nx_match.serialize_nxm_match(_v1_0_cls_rule(), buf, 0)
+    return match_len, _pad(str(buf))
+
+
+def _v1_0_queues(n):
+    ofp = ofproto_v1_0
+    prop = (struct.pack(ofp.OFP_QUEUE_PROP_HEADER_PACK_STR,
+                        ofp.OFPQT_MIN_RATE, ofp.OFP_QUEUE_PROP_MIN_RATE_SIZE) +
+            struct.pack(ofp.OFP_QUEUE_PROP_MIN_RATE_PACK_STR, 100))
+    return ''.join(struct.pack(ofp.OFP_PACKET_QUEUE_PQCK_STR, i,
+                               ofp.OFP_PACKET_QUEUE_SIZE + len(prop)) + prop
+                   for i in range(n))
+
+
+def _v1_0_parse_msgs():
+    ofp = ofproto_v1_0
+    zeros = lambda size: '\x00' * (size - ofp.OFP_HEADER_SIZE)
+    entry = lambda pack_str: '\x00' * struct.calcsize(pack_str)
+    nx_match_len, nx_match_buf = _v1_0_nx_match()
+    return {
+        'OFPHello': lambda: _msg(ofp, ofp.OFPT_HELLO, ''),
+        'OFPErrorMsg': lambda: _msg(
+            ofp, ofp.OFPT_ERROR,
+            struct.pack(ofp.OFP_ERROR_MSG_PACK_STR, ofp.OFPET_BAD_REQUEST,
+                        ofp.OFPBRC_BAD_TYPE) + '\x00' * 64),
+        'OFPEchoRequest': lambda: _msg(
+            ofp, ofp.OFPT_ECHO_REQUEST, '\x00' * 64),
+        'OFPEchoReply': lambda: _msg(ofp, ofp.OFPT_ECHO_REPLY, '\x00' * 64),
+        'OFPVendor': lambda: _msg(
+            ofp, ofp.OFPT_VENDOR,
+            struct.pack(ofp.OFP_VENDOR_HEADER_PACK_STR, 0) + '\x00' * 64),
+        'OFPSwitchFeatures': lambda: _msg(
+            ofp, ofp.OFPT_FEATURES_REPLY,
+            zeros(ofp.OFP_SWITCH_FEATURES_SIZE) +
+            ''.join(struct.pack(ofp.OFP_PHY_PORT_PACK_STR, i, _HW_ADDR,
+                                'eth%d' % i, 0, 0, 0, 0, 0, 0)
+                    for i in range(1, _N_PORTS + 1))),
+        'OFPGetConfigReply': lambda: _msg(
+            ofp, ofp.OFPT_GET_CONFIG_REPLY, zeros(ofp.OFP_SWITCH_CONFIG_SIZE)),
+        'OFPPacketIn': lambda: _msg(
+            ofp, ofp.OFPT_PACKET_IN,
+            struct.pack(ofp.OFP_PACKET_IN_PACK_STR, _NO_BUFFER, len(_FRAME),
+                        1, 0) + _FRAME),
+        'OFPFlowRemoved': lambda: _msg(
+            ofp, ofp.OFPT_FLOW_REMOVED,
+            _serialized(_v1_0_match()) +
+            zeros(ofp.OFP_FLOW_REMOVED_SIZE - ofp.OFP_MATCH_SIZE)),
+        'OFPPortStatus': lambda: _msg(
+            ofp, ofp.OFPT_PORT_STATUS, zeros(ofp.OFP_PORT_STATUS_SIZE)),
+        'OFPBarrierReply': lambda: _msg(ofp, ofp.OFPT_BARRIER_REPLY, ''),
+        'OFPQueueGetConfigReply': lambda: _msg(
+            ofp, ofp.OFPT_QUEUE_GET_CONFIG_REPLY,
+            zeros(ofp.OFP_QUEUE_GET_CONFIG_REPLY_SIZE) + _v1_0_queues(8)),
+        'OFPDescStatsReply': lambda: _v1_0_stats(
+            ofp.OFPST_DESC, [entry(ofp.OFP_DESC_STATS_PACK_STR)]),
+        'OFPFlowStatsReply': lambda: _v1_0_stats(
+            ofp.OFPST_FLOW, _v1_0_flow_stats()),
+        'OFPAggregateStatsReply': lambda: _v1_0_stats(
+            ofp.OFPST_AGGREGATE,
+            [entry(ofp.OFP_AGGREGATE_STATS_REPLY_PACK_STR)]),
+        'OFPTableStatsReply': lambda: _v1_0_stats(
+            ofp.OFPST_TABLE, [entry(ofp.OFP_TABLE_STATS_PACK_STR)] * 4),
+        'OFPPortStatsReply': lambda: _v1_0_stats(
+            ofp.OFPST_PORT, [entry(ofp.OFP_PORT_STATS_PACK_STR)] * _N_PORTS),
+        'OFPQueueStatsReply': lambda: _v1_0_stats(
+            ofp.OFPST_QUEUE, [entry(ofp.OFP_QUEUE_STATS_PACK_STR)] * 8),
+        'OFPVendorStatsReply': lambda: _v1_0_stats(
+            ofp.OFPST_VENDOR, ['\x00' * 64],
+            struct.pack(ofp.OFP_VENDOR_STATS_MSG_PACK_STR, 0)),
+        'NXFlowStatsReply': lambda: _v1_0_stats(
+            ofp.OFPST_VENDOR, _v1_0_nx_flow_stats(),
+            struct.pack(ofp.OFP_VENDOR_STATS_MSG_PACK_STR, ofp.NX_VENDOR_ID) +
+            struct.pack(ofp.NX_STATS_MSG_PACK_STR, ofp.NXST_FLOW)),
+        'NXTPacketIn': lambda: _v1_0_nicira(
+            ofp.NXT_PACKET_IN,
+            struct.pack(ofp.NX_PACKET_IN_PACK_STR, _NO_BUFFER, len(_FRAME),
+                        0, 0, 0, nx_match_len) + nx_match_buf + '\x00' * 2 +
+            _FRAME),
+        'NXTFlowRemoved': lambda: _v1_0_nicira(
+            ofp.NXT_FLOW_REMOVED,
+            struct.pack(ofp.NX_FLOW_REMOVED_PACK_STR, 0, 0x8000, 0, 10, 0,
+                        0, nx_match_len, 100, 6400) + nx_match_buf),
+        'NXTRoleReply': lambda: _v1_0_nicira(
+            ofp.NXT_ROLE_REPLY,
+            struct.pack(ofp.NX_ROLE_PACK_STR, ofp.NX_ROLE_MASTER)),
+    }
+
+
+def _v1_0_serialize_msgs():
+    ofp = ofproto_v1_0
+    p = ofproto_v1_0_parser
+
+    def _with(cls, **attrs):
+        def _create(dp):
+            msg = cls(dp)
+            for k, v in attrs.items():
+                setattr(msg, k, v)
+            return msg
+        return _create
+
+    def _nx_flow_mod(dp):
+        return p.NXTFlowMod(dp, 0, ofp.OFPFC_ADD, 0, 0, 0x8000, _NO_BUFFER,
+                            ofp.OFPP_NONE, 0, _v1_0_cls_rule(),
+                            _v1_0_actions())
+
+    return {
+        'OFPHello': p.OFPHello,
+        'OFPErrorMsg': _with(p.OFPErrorMsg, type=ofp.OFPET_BAD_REQUEST,
+                             code=ofp.OFPBRC_BAD_TYPE, data='\x00' * 64),
+        'OFPEchoRequest': _with(p.OFPEchoRequest, data='\x00' * 64),
+        'OFPEchoReply': _with(p.OFPEchoReply, data='\x00' * 64),
+        'OFPVendor': _with(p.OFPVendor, vendor=0, data='\x00' * 64),
+        'OFPFeaturesRequest': p.OFPFeaturesRequest,
+        'OFPGetConfigRequest': p.OFPGetConfigRequest,
+        'OFPSetConfig': lambda dp: p.OFPSetConfig(
+            dp, ofp.OFPC_FRAG_NORMAL, 128),
+        'OFPPacketOut': lambda dp: p.OFPPacketOut(
+            dp, _NO_BUFFER, 1, _v1_0_actions(), _FRAME),
+        'OFPFlowMod': lambda dp: p.OFPFlowMod(
+            dp, _v1_0_match(), 0, ofp.OFPFC_ADD, 0, 0, 0x8000, _NO_BUFFER,
+            ofp.OFPP_NONE, 0, _v1_0_actions()),
+        'OFPPortMod': lambda dp: p.OFPPortMod(dp, 1, _HW_ADDR, 0, 0, 0),
+        'OFPBarrierRequest': p.OFPBarrierRequest,
+        'OFPQueueGetConfigRequest': lambda dp: p.OFPQueueGetConfigRequest(
+            dp, 1),
+        'OFPDescStatsRequest': lambda dp: p.OFPDescStatsRequest(dp, 0),
+        'OFPFlowStatsRequest': lambda dp: p.OFPFlowStatsRequest(
+            dp, 0, _v1_0_match(), 0xff, ofp.OFPP_NONE),
+        'OFPAggregateStatsRequest': lambda dp: p.OFPAggregateStatsRequest(
+            dp, 0, _v1_0_match(), 0xff, ofp.OFPP_NONE),
+        'OFPTableStatsRequest': lambda dp: p.OFPTableStatsRequest(dp, 0),
+        'OFPPortStatsRequest': lambda dp: p.OFPPortStatsRequest(
+            dp, 0, ofp.OFPP_NONE),
+        'OFPQueueStatsRequest': lambda dp: p.OFPQueueStatsRequest(
+            dp, 0, ofp.OFPP_ALL, ofp.OFPQ_ALL),
+        'OFPVendorStatsRequest': lambda dp: p.OFPVendorStatsRequest(
+            dp, 0, 0, '\x00' * 64),
+        'NXFlowStatsRequest': lambda dp: p.NXFlowStatsRequest(
+            dp, 0, ofp.OFPP_NONE, 0, 0xff),
+        'NXTFlowMod': _nx_flow_mod,
+        'NXTRoleRequest': lambda dp: p.NXTRoleRequest(dp, ofp.NX_ROLE_MASTER),
+        'NXTFlowModTableId': lambda dp: p.NXTFlowModTableId(dp, 1),
+        'NXTSetFlowFormat': lambda dp: p.NXTSetFlowFormat(
+            dp, ofp.NXFF_NXM),
+        'NXTSetPacketInFormat': lambda dp: p.NXTSetPacketInFormat(
+            dp, ofp.NXPIF_NXM),
+        'NXTFlowAge': p.NXTFlowAge,
+        'NXTSetAsyncConfig': lambda dp: p.NXTSetAsyncConfig(
+            dp, [0, 0], [0, 0], [0, 0]),
+        'NXTSetControllerId': lambda dp: p.NXTSetControllerId(dp, 1),
+    }
+
+
+#
+# OpenFlow 1.2 and 1.3 share most of the structures.
+#
+
+def _oxm_match(p):
+    match = p.OFPMatch()
+    match.set_in_port(1)
+    match.set_dl_type(0x0800)
+    match.set_ip_proto(_IPPROTO_TCP)
+    match.set_ipv4_src(_NW_SRC)
+    match.set_ipv4_dst(_NW_DST)
+    match.set_tcp_src(_TP_SRC)
+    match.set_tcp_dst(_TP_DST)
+    return match
+
+
+def _v1_2_actions():
+    ofp = ofproto_v1_2
+    p = ofproto_v1_2_parser
+    actions = [p.OFPActionPushVlan(0x8100),
+               p.OFPActionSetField(p.OFPMatchField.make(ofp.OXM_OF_VLAN_VID,
+                                                        10)),
+               p.OFPActionSetField(p.OFPMatchField.make(ofp.OXM_OF_ETH_SRC,
+                                                        _DL_SRC)),
+               p.OFPActionSetField(p.OFPMatchField.make(ofp.OXM_OF_ETH_DST,
+                                                        _DL_DST)),
+               p.OFPActionSetField(p.OFPMatchField.make(ofp.OXM_OF_IPV4_SRC,
+                                                        _NW_SRC)),
+               p.OFPActionSetField(p.OFPMatchField.make(ofp.OXM_OF_IPV4_DST,
+                                                        _NW_DST)),
+               p.OFPActionDecNwTtl(),
+               p.OFPActionSetQueue(1),
+               p.OFPActionGroup(1),
+               p.OFPActionOutput(1, 0)]
+    assert len(actions) == _N_ACTIONS
+    return actions
+
+
+def _v1_3_actions():
+    ofp = ofproto_v1_3
+    p = ofproto_v1_3_parser
+    actions = [p.OFPActionPushVlan(0x8100),
+               p.OFPActionSetField(p.OFPMatchField.make(ofp.OXM_OF_VLAN_VID,
+                                                        10)),
+               p.OFPActionSetField(p.OFPMatchField.make(ofp.OXM_OF_ETH_SRC,
+                                                        _DL_SRC)),
+               p.OFPActionSetField(p.OFPMatchField.make(ofp.OXM_OF_ETH_DST,
+                                                        _DL_DST)),
+               p.OFPActionSetField(p.OFPMatchField.make(ofp.OXM_OF_IPV4_SRC,
+                                                        _NW_SRC)),
+               p.OFPActionSetField(p.OFPMatchField.make(ofp.OXM_OF_IPV4_DST,
+                                                        _NW_DST)),
+               p.OFPActionDecNwTtl(),
+               p.OFPActionSetQueue(1),
+               p.OFPActionGroup(1),
+               p.OFPActionOutput(1, 0)]
+    assert len(actions) == _N_ACTIONS
+    return actions
+
+
+def _oxm_instructions(ofp, p, actions):
+    return [p.OFPInstructionActions(ofp.OFPIT_APPLY_ACTIONS, actions)]
+
+
+def _oxm_match_bytes(p):
+    return _pad(_serialized(_oxm_match(p)))
+
+
+def _oxm_flow_stats(ofp, p, actions):
+    match = _oxm_match_bytes(p)
+    insts = ''.join(_serialized(i) for i in
+                    _oxm_instructions(ofp, p, actions))
+    length = (ofp.OFP_FLOW_STATS_SIZE - ofp.OFP_MATCH_SIZE + len(match) +
+              len(insts))
+    if ofp is ofproto_v1_2:
+        head = struct.pack(ofp.OFP_FLOW_STATS_PACK_STR, length, 0,
+                           10, 0, 0x8000, 0, 0, 0, 100, 6400)
+    else:
+        head = struct.pack(ofp.OFP_FLOW_STATS_0_PACK_STR, length, 0,
+                           10, 0, 0x8000, 0, 0, 0, 0, 100, 6400)
+    return [head + match + insts] * _N_FLOW_STATS
+
+
+def _oxm_ports(ofp, n):
+    return ''.join(struct.pack(ofp.OFP_PORT_PACK_STR, i, _HW_ADDR,
+                               'eth%d' % i, 0, 0, 0, 0, 0, 0, 0, 0)
+                   for i in range(1, n + 1))
+
+
+def _oxm_bucket(ofp, p, actions):
+    acts = ''.join(_serialized(a) for a in actions)
+    return struct.pack(ofp.OFP_BUCKET_PACK_STR, ofp.OFP_BUCKET_SIZE +
+                       len(acts), 0, ofp.OFPP_ANY, ofp.OFPG_ANY) + acts
+
+
+def _oxm_queues(ofp, n):
+    prop = (struct.pack(ofp.OFP_QUEUE_PROP_HEADER_PACK_STR,
+                        ofp.OFPQT_MIN_RATE, ofp.OFP_QUEUE_PROP_MIN_RATE_SIZE) +
+            struct.pack(ofp.OFP_QUEUE_PROP_MIN_RATE_PACK_STR, 100))
+    return ''.join(struct.pack(ofp.OFP_PACKET_QUEUE_PACK_STR, i, 1,
+                               ofp.OFP_PACKET_QUEUE_SIZE + len(prop)) + prop
+                   for i in range(n))
+
+
+def _oxm_parse_msgs(ofp, p):
+    zeros = lambda size: '\x00' * (size - ofp.OFP_HEADER_SIZE)
+    msgs = {
+        'OFPHello': lambda: _msg(ofp, ofp.OFPT_HELLO, ''),
+        'OFPErrorMsg': lambda: _msg(
+            ofp, ofp.OFPT_ERROR,
+            struct.pack(ofp.OFP_ERROR_MSG_PACK_STR, ofp.OFPET_BAD_REQUEST,
+                        ofp.OFPBRC_BAD_TYPE) + '\x00' * 64),
+        'OFPEchoRequest': lambda: _msg(
+            ofp, ofp.OFPT_ECHO_REQUEST, '\x00' * 64),
+        'OFPEchoReply': lambda: _msg(ofp, ofp.OFPT_ECHO_REPLY, '\x00' * 64),
+        'OFPExperimenter': lambda: _msg(
+            ofp, ofp.OFPT_EXPERIMENTER,
+            zeros(ofp.OFP_EXPERIMENTER_HEADER_SIZE) + '\x00' * 64),
+        'OFPGetConfigReply': lambda: _msg(
+            ofp, ofp.OFPT_GET_CONFIG_REPLY, zeros(ofp.OFP_SWITCH_CONFIG_SIZE)),
+        'OFPPacketIn': lambda: _msg(
+            ofp, ofp.OFPT_PACKET_IN,
+            zeros(ofp.OFP_PACKET_IN_SIZE - ofp.OFP_MATCH_SIZE) +
+            _oxm_match_bytes(p) + '\x00' * 2 + _FRAME),
+        'OFPFlowRemoved': lambda: _msg(
+            ofp, ofp.OFPT_FLOW_REMOVED,
+            zeros(ofp.OFP_FLOW_REMOVED_SIZE - ofp.OFP_MATCH_SIZE) +
+            _oxm_match_bytes(p)),
+        'OFPPortStatus': lambda: _msg(
+            ofp, ofp.OFPT_PORT_STATUS,
+            zeros(ofp.OFP_PORT_STATUS_DESC_OFFSET) + _oxm_ports(ofp, 1)),
+        'OFPBarrierReply': lambda: _msg(ofp, ofp.OFPT_BARRIER_REPLY, ''),
+        'OFPQueueGetConfigReply': lambda: _msg(
+            ofp, ofp.OFPT_QUEUE_GET_CONFIG_REPLY,
+            zeros(ofp.OFP_QUEUE_GET_CONFIG_REPLY_SIZE) + _oxm_queues(ofp, 8)),
+        'OFPRoleReply': lambda: _msg(
+            ofp, ofp.OFPT_ROLE_REPLY, zeros(ofp.OFP_ROLE_REQUEST_SIZE)),
+    }
+    if ofp is ofproto_v1_2:
+        msgs['OFPSwitchFeatures'] = lambda: _msg(
+            ofp, ofp.OFPT_FEATURES_REPLY,
+            zeros(ofp.OFP_SWITCH_FEATURES_SIZE) + _oxm_ports(ofp, _N_PORTS))
+    else:
+        msgs['OFPSwitchFeatures'] = lambda: _msg(
+            ofp, ofp.OFPT_FEATURES_REPLY, zeros(ofp.OFP_SWITCH_FEATURES_SIZE))
+        msgs['OFPGetAsyncReply'] = lambda: _msg(
+            ofp, ofp.OFPT_GET_ASYNC_REPLY, zeros(ofp.OFP_ASYNC_CONFIG_SIZE))
+        msgs['OFPSetAsync'] = lambda: _msg(
+            ofp, ofp.OFPT_SET_ASYNC, zeros(ofp.OFP_ASYNC_CONFIG_SIZE))
+    return msgs
+
+
+def _v1_2_stats(stats_type, entries):
+    ofp = ofproto_v1_2
+    return _stats_msgs(ofp, ofp.OFPT_STATS_REPLY,
+                       ofp.OFP_STATS_REPLY_PACK_STR, stats_type,
+                       ofp.OFPSF_REPLY_MORE, entries)
+
+
+def _v1_2_parse_msgs():
+    ofp = ofproto_v1_2
+    p = ofproto_v1_2_parser
+    sizeof = struct.calcsize
+    zeros = lambda pack_str: '\x00' * sizeof(pack_str)
+    msgs = _oxm_parse_msgs(ofp, p)
+    bucket = _oxm_bucket(ofp, p, _v1_2_actions())
+    group_desc = struct.pack(
+        ofp.OFP_GROUP_DESC_STATS_PACK_STR,
+        sizeof(ofp.OFP_GROUP_DESC_STATS_PACK_STR) + len(bucket) * 4,
+        ofp.OFPGT_SELECT, 1) + bucket * 4
+    group = struct.pack(
+        ofp.OFP_GROUP_STATS_PACK_STR,
+        sizeof(ofp.OFP_GROUP_STATS_PACK_STR) +
+        sizeof(ofp.OFP_BUCKET_COUNTER_PACK_STR) * 4, 1, 0, 0, 0) + \
+        '\x00' * sizeof(ofp.OFP_BUCKET_COUNTER_PACK_STR) * 4
+    msgs.update({
+        'OFPStatsReply/OFPDescStats': lambda: _v1_2_stats(
+            ofp.OFPST_DESC, [zeros(ofp.OFP_DESC_STATS_PACK_STR)]),
+        'OFPStatsReply/OFPFlowStats': lambda: _v1_2_stats(
+            ofp.OFPST_FLOW, _oxm_flow_stats(ofp, p, _v1_2_actions())),
+        'OFPStatsReply/OFPAggregateStatsReply': lambda: _v1_2_stats(
+            ofp.OFPST_AGGREGATE,
+            [zeros(ofp.OFP_AGGREGATE_STATS_REPLY_PACK_STR)]),
+        'OFPStatsReply/OFPTableStats': lambda: _v1_2_stats(
+            ofp.OFPST_TABLE, [zeros(ofp.OFP_TABLE_STATS_PACK_STR)] * 4),
+        'OFPStatsReply/OFPPortStats': lambda: _v1_2_stats(
+            ofp.OFPST_PORT, [zeros(ofp.OFP_PORT_STATS_PACK_STR)] * _N_PORTS),
+        'OFPStatsReply/OFPQueueStats': lambda: _v1_2_stats(
+            ofp.OFPST_QUEUE, [zeros(ofp.OFP_QUEUE_STATS_PACK_STR)] * 8),
+        'OFPStatsReply/OFPGroupStats': lambda: _v1_2_stats(
+            ofp.OFPST_GROUP, [group] * 8),
+        'OFPStatsReply/OFPGroupDescStats': lambda: _v1_2_stats(
+            ofp.OFPST_GROUP_DESC, [group_desc] * 8),
+        'OFPStatsReply/OFPGroupFeaturesStats': lambda: _v1_2_stats(
+            ofp.OFPST_GROUP_FEATURES,
+            [zeros(ofp.OFP_GROUP_FEATURES_STATS_PACK_STR)]),
+    })
+    return msgs
+
+
+def _v1_3_multipart(stats_type, entries):
+    ofp = ofproto_v1_3
+    return _stats_msgs(ofp, ofp.OFPT_MULTIPART_REPLY,
+                       ofp.OFP_MULTIPART_REPLY_PACK_STR, stats_type,
+                       ofp.OFPMPF_REPLY_MORE, entries)
+
+
+def _v1_3_parse_msgs():
+    ofp = ofproto_v1_3
+    p = ofproto_v1_3_parser
+    msgs = _oxm_parse_msgs(ofp, p)
+    msgs['OFPHello'] = lambda: _msg(
+        ofp, ofp.OFPT_HELLO,
+        struct.pack(ofp.OFP_HELLO_ELEM_VERSIONBITMAP_HEADER_PACK_STR,
+                    ofp.OFPHET_VERSIONBITMAP,
+                    ofp.OFP_HELLO_ELEM_VERSIONBITMAP_HEADER_SIZE + 4) +
+        struct.pack('!I', 1 << ofp.OFP_VERSION))
+    bucket = _oxm_bucket(ofp, p, _v1_3_actions())
+    group_desc = struct.pack(
+        ofp.OFP_GROUP_DESC_STATS_PACK_STR,
+        ofp.OFP_GROUP_DESC_STATS_SIZE + len(bucket) * 4,
+        ofp.OFPGT_SELECT, 1) + bucket * 4
+    group = struct.pack(
+        ofp.OFP_GROUP_STATS_PACK_STR,
+        ofp.OFP_GROUP_STATS_SIZE + ofp.OFP_BUCKET_COUNTER_SIZE * 4,
+        1, 0, 0, 0, 0, 0) + '\x00' * ofp.OFP_BUCKET_COUNTER_SIZE * 4
+    band = struct.pack(ofp.OFP_METER_BAND_DROP_PACK_STR, ofp.OFPMBT_DROP,
+                       ofp.OFP_METER_BAND_DROP_SIZE, 1000, 0)
+    meter_config = struct.pack(
+        ofp.OFP_METER_CONFIG_PACK_STR,
+        ofp.OFP_METER_CONFIG_SIZE + len(band) * 2, 0, 1) + band * 2
+    meter = struct.pack(
+        ofp.OFP_METER_STATS_PACK_STR, 1,
+        ofp.OFP_METER_STATS_SIZE + ofp.OFP_METER_BAND_STATS_SIZE * 2,
+        0, 0, 0, 0, 0) + '\x00' * ofp.OFP_METER_BAND_STATS_SIZE * 2
+    table_features = (struct.pack('!H', ofp.OFP_TABLE_FEATURES_SIZE) +
+                      '\x00' * (ofp.OFP_TABLE_FEATURES_SIZE - 2))
+    msgs.update({
+        'OFPDescStatsReply': lambda: _v1_3_multipart(
+            ofp.OFPMP_DESC, ['\x00' * ofp.OFP_DESC_SIZE]),
+        'OFPFlowStatsReply': lambda: _v1_3_multipart(
+            ofp.OFPMP_FLOW, _oxm_flow_stats(ofp, p, _v1_3_actions())),
+        'OFPAggregateStatsReply': lambda: _v1_3_multipart(
+            ofp.OFPMP_AGGREGATE,
+            ['\x00' * ofp.OFP_AGGREGATE_STATS_REPLY_SIZE]),
+        'OFPTableStatsReply': lambda: _v1_3_multipart(
+            ofp.OFPMP_TABLE, ['\x00' * ofp.OFP_TABLE_STATS_SIZE] * 4),
+        'OFPPortStatsReply': lambda: _v1_3_multipart(
+            ofp.OFPMP_PORT_STATS,
+            ['\x00' * ofp.OFP_PORT_STATS_SIZE] * _N_PORTS),
+        'OFPQueueStatsReply': lambda: _v1_3_multipart(
+            ofp.OFPMP_QUEUE, ['\x00' * ofp.OFP_QUEUE_STATS_SIZE] * 8),
+        'OFPGroupStatsReply': lambda: _v1_3_multipart(
+            ofp.OFPMP_GROUP, [group] * 8),
+        'OFPGroupDescStatsReply': lambda: _v1_3_multipart(
+            ofp.OFPMP_GROUP_DESC, [group_desc] * 8),
+        'OFPGroupFeaturesStatsReply': lambda: _v1_3_multipart(
+            ofp.OFPMP_GROUP_FEATURES, ['\x00' * ofp.OFP_GROUP_FEATURES_SIZE]),
+        'OFPMeterStatsReply': lambda: _v1_3_multipart(
+            ofp.OFPMP_METER, [meter] * 8),
+        'OFPMeterConfigStatsReply': lambda: _v1_3_multipart(
+            ofp.OFPMP_METER_CONFIG, [meter_config] * 8),
+        'OFPMeterFeaturesStatsReply': lambda: _v1_3_multipart(
+            ofp.OFPMP_METER_FEATURES, ['\x00' * ofp.OFP_METER_FEATURES_SIZE]),
+        'OFPTableFeaturesStatsReply': lambda: _v1_3_multipart(
+            ofp.OFPMP_TABLE_FEATURES, [table_features] * 4),
+        'OFPPortDescStatsReply': lambda: _v1_3_multipart(
+            ofp.OFPMP_PORT_DESC, [_oxm_ports(ofp, 1)] * _N_PORTS),
+    })
+    return msgs
+
+
+def _oxm_serialize_msgs(ofp, p, actions):
+    def _with(cls, **attrs):
+        def _create(dp):
+            msg = cls(dp)
+            for k, v in attrs.items():
+                setattr(msg, k, v)
+            return msg
+        return _create
+
+    def _flow_mod(dp):
+        return p.OFPFlowMod(dp, 0, 0, 0, ofp.OFPFC_ADD, 0, 0, 0x8000,
+                            _NO_BUFFER, ofp.OFPP_ANY, ofp.OFPG_ANY, 0,
+                            _oxm_match(p),
+                            _oxm_instructions(ofp, p, actions()))
+
+    def _group_mod(dp):
+        buckets = [p.OFPBucket(0, 1, ofp.OFPP_ANY, ofp.OFPG_ANY, actions())
+                   for i in range(4)]
+        return p.OFPGroupMod(dp, ofp.OFPGC_ADD, ofp.OFPGT_SELECT, 1, buckets)
+
+    return {
+        'OFPHello': p.OFPHello,
+        'OFPEchoRequest': _with(p.OFPEchoRequest, data='\x00' * 64),
+        'OFPEchoReply': _with(p.OFPEchoReply, data='\x00' * 64),
+        'OFPErrorMsg': _with(p.OFPErrorMsg, type=ofp.OFPET_BAD_REQUEST,
+                             code=ofp.OFPBRC_BAD_TYPE, data='\x00' * 64),
+        'OFPFeaturesRequest': p.OFPFeaturesRequest,
+        'OFPGetConfigRequest': p.OFPGetConfigRequest,
+        'OFPSetConfig': lambda dp: p.OFPSetConfig(
+            dp, ofp.OFPC_FRAG_NORMAL, 128),
+        'OFPPacketOut': lambda dp: p.OFPPacketOut(
+            dp, _NO_BUFFER, 1, actions(), _FRAME),
+        'OFPFlowMod': _flow_mod,
+        'OFPGroupMod': _group_mod,
+        'OFPPortMod': lambda dp: p.OFPPortMod(dp, 1, _HW_ADDR, 0, 0, 0),
+        'OFPTableMod': lambda dp: p.OFPTableMod(dp, 0, 0),
+        'OFPBarrierRequest': p.OFPBarrierRequest,
+        'OFPQueueGetConfigRequest': lambda dp: p.OFPQueueGetConfigRequest(
+            dp, ofp.OFPP_ANY),
+        'OFPRoleRequest': lambda dp: p.OFPRoleRequest(
+            dp, ofp.OFPCR_ROLE_MASTER, 0),
+    }
+
+
+def _v1_2_serialize_msgs():
+    ofp = ofproto_v1_2
+    p = ofproto_v1_2_parser
+    msgs = _oxm_serialize_msgs(ofp, p, _v1_2_actions)
+    msgs.update({
+        'OFPExperimenter': _with_experimenter(p.OFPExperimenter),
+        'OFPDescStatsRequest': p.OFPDescStatsRequest,
+        'OFPFlowStatsRequest': lambda dp: p.OFPFlowStatsRequest(
+            dp, ofp.OFPTT_ALL, ofp.OFPP_ANY, ofp.OFPG_ANY, 0, 0,
+            _oxm_match(p)),
+        'OFPAggregateStatsRequest': lambda dp: p.OFPAggregateStatsRequest(
+            dp, ofp.OFPTT_ALL, ofp.OFPP_ANY, ofp.OFPG_ANY, 0, 0,
+            _oxm_match(p)),
+        'OFPTableStatsRequest': p.OFPTableStatsRequest,
+        'OFPPortStatsRequest': lambda dp: p.OFPPortStatsRequest(
+            dp, ofp.OFPP_ANY),
+        'OFPQueueStatsRequest': lambda dp: p.OFPQueueStatsRequest(
+            dp, ofp.OFPP_ANY, ofp.OFPQ_ALL),
+        'OFPGroupStatsRequest': lambda dp: p.OFPGroupStatsRequest(
+            dp, ofp.OFPG_ALL),
+        'OFPGroupDescStatsRequest': p.OFPGroupDescStatsRequest,
+        'OFPGroupFeaturesStatsRequest': p.OFPGroupFeaturesStatsRequest,
+    })
+    return msgs
+
+
+def _with_experimenter(cls):
+    def _create(dp):
+        msg = cls(dp)
+        msg.experimenter = 0
+        msg.exp_type = 0
+        msg.data = '\x00' * 64
+        return msg
+    return _create
+
+
+def _v1_3_serialize_msgs():
+    ofp = ofproto_v1_3
+    p = ofproto_v1_3_parser
+    msgs = _oxm_serialize_msgs(ofp, p, _v1_3_actions)
+
+    def _experimenter(dp):
+        msg = p.OFPExperimenter(dp, 0, 0)
+        msg.data = '\x00' * 64
+        return msg
+
+    msgs.update({
+        'OFPExperimenter': _experimenter,
+        'OFPDescStatsRequest': lambda dp: p.OFPDescStatsRequest(dp, 0),
+        'OFPFlowStatsRequest': lambda dp: p.OFPFlowStatsRequest(
+            dp, 0, ofp.OFPTT_ALL, ofp.OFPP_ANY, ofp.OFPG_ANY, 0, 0,
+            _oxm_match(p)),
+        'OFPAggregateStatsRequest': lambda dp: p.OFPAggregateStatsRequest(
+            dp, 0, ofp.OFPTT_ALL, ofp.OFPP_ANY, ofp.OFPG_ANY, 0, 0,
+            _oxm_match(p)),
+        'OFPTableStatsRequest': lambda dp: p.OFPTableStatsRequest(dp, 0),
+        'OFPPortStatsRequest': lambda dp: p.OFPPortStatsRequest(
+            dp, 0, ofp.OFPP_ANY),
+        'OFPQueueStatsRequest': lambda dp: p.OFPQueueStatsRequest(
+            dp, 0, ofp.OFPP_ANY, ofp.OFPQ_ALL),
+        'OFPGroupStatsRequest': lambda dp: p.OFPGroupStatsRequest(
+            dp, 0, ofp.OFPG_ALL),
+        'OFPGroupDescStatsRequest': lambda dp: p.OFPGroupDescStatsRequest(
+            dp, 0, ofp.OFPG_ALL),
+        'OFPGroupFeaturesStatsRequest':
+        lambda dp: p.OFPGroupFeaturesStatsRequest(dp, 0, 0),
+        'OFPMeterStatsRequest': lambda dp: p.OFPMeterStatsRequest(
+            dp, 0, ofp.OFPM_ALL),
+        'OFPMeterConfigStatsRequest':
+        lambda dp: p.OFPMeterConfigStatsRequest(dp, 0, ofp.OFPM_ALL),
+        'OFPMeterFeaturesStatsRequest':
+        lambda dp: p.OFPMeterFeaturesStatsRequest(dp, 0, 0),
+        'OFPTableFeaturesStatsRequest':
+        lambda dp: p.OFPTableFeaturesStatsRequest(
+            dp, 0, ofp.OFP_TABLE_FEATURES_SIZE, 0, 'table0', 0, 0, 0, 0,
+            []),
+        'OFPPortDescStatsRequest': lambda dp: p.OFPPortDescStatsRequest(
+            dp, 0),
+        'OFPGetAsyncRequest': p.OFPGetAsyncRequest,
+    })
+    return msgs
+
+
+#
+# cases
+#
+
+_VERSIONS = [
+    ('v1.0', ofproto_v1_0, ofproto_v1_0_parser,
+     _v1_0_parse_msgs, _v1_0_serialize_msgs),
+    ('v1.2', ofproto_v1_2, ofproto_v1_2_parser,
+     _v1_2_parse_msgs, _v1_2_serialize_msgs),
+    ('v1.3', ofproto_v1_3, ofproto_v1_3_parser,
+     _v1_3_parse_msgs, _v1_3_serialize_msgs),
+]
+
+
+def _parse_op(dp, build):
+    # build returns a message or the list of the replies of
+    # a multipart message
+    def _setup():
+        bufs = build()
+        if isinstance(bufs, str):
+            bufs = [bufs]
+        msgs = [ofproto_parser.header(buf) + (buf,) for buf in bufs]
+        return lambda: [ofproto_parser.msg(dp, *args) for args in msgs]
+    return _setup
+
+
+def _serialize_op(dp, create):
+    def _op():
+        msg = create(dp)
+        msg.serialize()
+        return msg
+    return lambda: _op
+
+
+def _cls_rule_op():
+    rule = _v1_0_cls_rule()
+
+    def _op():
+        buf = bytearray()
+        nx_match.serialize_nxm_match(rule, buf, 0)
+        return buf
+    return _op
+
+
+def cases():
+    """Return the list of (name, setup) of all the cases.
+    setup() prepares the input and returns the operation to measure."""
+    result = []
+    for version, ofp, p, parse_msgs, serialize_msgs in _VERSIONS:
+        dp = _Datapath(ofp, p)
+        for name, build in sorted(parse_msgs().items()):
+            result.append(('%s/parse/%s' % (version, name),
+                           _parse_op(dp, build)))
+        for name, create in sorted(serialize_msgs().items()):
+            result.append(('%s/serialize/%s' % (version, name),
+                           _serialize_op(dp, create)))
+    result.append(('v1.0/serialize/ClsRule', _cls_rule_op))
+    return result
+
+
+def _msg_classes(p):
+    # the concrete message classes which are sent or received,
+    # the base classes of other messages are excluded.
+    classes = [cls for _name, cls in inspect.getmembers(p, inspect.isclass)
+               if (cls.__module__ == p.__name__ and
+                   issubclass(cls, ofproto_parser.MsgBase) and
+                   getattr(cls, 'cls_msg_type', None) is not None)]
+    return set(cls.__name__ for cls in classes
+               if not any(c is not cls and issubclass(c, cls)
+                          for c in classes))
+
+
+def uncovered(names):
+    """Return the message classes which no case in names measures."""
+    covered = set(name.split('/', 2)[0] + '/' +
+                  name.split('/', 2)[2].split('/')[0] for name in names)
+    result = []
+    for version, ofp, p, _parse_msgs, _serialize_msgs in _VERSIONS:
+        for cls_name in sorted(_msg_classes(p)):
+            if '%s/%s' % (version, cls_name) not in covered:
+                result.append('%s/%s' % (version, cls_name))
+    return result
+
+
+#
+# measurement
+#
+
+def _timeit(op, number):
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.time()
+        for _i in xrange(number):
+            op()
+        return time.time() - start
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def measure_time(op, min_time=0.2, repeat=3):
+    """Return the best ns/op of repeat runs, each at least min_time
+    seconds long."""
+    number = 1
+    while True:
+        elapsed = _timeit(op, number)
+        if elapsed >= min_time:
+            break
+        number *= max(2, min(10, int(min_time / max(elapsed, 1e-6)) + 1))
+    best = elapsed
+    for _i in range(repeat - 1):
+        best = min(best, _timeit(op, number))
+    return best * 1e9 / number
+
+
+def measure_objects(op, number=10):
+    """Return the number of gc tracked objects one op leaves alive."""
+    results = []
+    gc.collect()
+    before = len(gc.get_objects())
+    for _i in xrange(number):
+        results.append(op())
+    gc.collect()
+    after = len(gc.get_objects())
+    return float(after - before) / number
+
+
+class _CalibrationEntry(object):
+    def __init__(self, type_, len_, value):
+        super(_CalibrationEntry, self).__init__()
+        self.type = type_
+        self.len = len_
+        self.value = value
+
+
+def _calibration_op():
+    # unpack into instances like the parsers do, a bare unpack loop
+    # doesn't follow their speed from process to process
+    data = struct.pack('!HHI', 1, 2, 3) * 64
+
+    def _op():
+        result = []
+        for i in xrange(0, len(data), 8):
+            type_, len_, value = struct.unpack_from('!HHI', data, i)
+            result.append(_CalibrationEntry(type_, len_, value))
+        return result
+    return _op
+
+
+def _median_by(values, key):
+    values = sorted(values, key=key)
+    return values[len(values) // 2]
+
+
+def _median(values):
+    return _median_by(values, None)
+
+
+def measure_scaled(op, min_time=0.2, samples=_SAMPLES):
+    """Return the median ns/op of op and the one of the calibration
+    loop, measured by turns."""
+    # on a shared machine a single measurement of either can be off by
+    # half, while the cases and the calibration drift together
+    calibration_op = _calibration_op()
+    times = []
+    calibrations = []
+    for _i in range(samples):
+        times.append(measure_time(op, min_time, 1))
+        calibrations.append(measure_time(calibration_op, min_time, 1))
+    return _median(times), _median(calibrations)
+
+
+def measure_apart(name, min_time=0.2):
+    """Return (ns_per_op, calibration_ns) of a case measured by a new
+    process."""
+    # the state a long run leaves skews some cases for the rest of it,
+    # a new process doesn't carry it
+    output = subprocess.check_output(
+        [sys.executable, '-m', _MODULE, '-q', '-b', '', '-m', str(min_time),
+         '-f', '^%s$' % re.escape(name)])
+    result = json.loads(output)['results'][name]
+    return result['ns_per_op'], result['calibration_ns']
+
+
+def compare(results, baseline, tolerance, remeasure=None,
+            rechecks=_RECHECKS):
+    """
+    Return the list of regressions against baseline.
+
+    The speed of a shared machine drifts, so a case slower than the
+    tolerance is measured up to rechecks times more by remeasure(name),
+    which returns measure_apart() of it, a round over all such cases at
+    a time.  It is a regression only if the median of its ratios to the
+    baseline is still beyond the tolerance.
+    """
+    names = [name for name in results if name in baseline['results']]
+
+    def _ratio(name, ns_per_op, calibration_ns):
+        base = baseline['results'][name]
+        return (ns_per_op * base['calibration_ns'] /
+                (base['ns_per_op'] * calibration_ns))
+
+    def _slow(ratios):
+        return len([r for r in ratios if r > 1 + tolerance])
+
+    ratios = dict((name, [_ratio(name, results[name]['ns_per_op'],
+                                 results[name]['calibration_ns'])])
+                  for name in names)
+    majority = (1 + rechecks) // 2 + 1
+    slow = sorted(name for name in ratios if _slow(ratios[name]))
+    for _i in range(rechecks if remeasure is not None else 0):
+        # stop at the majority, either way the median is known
+        slow = [name for name in slow
+                if majority > _slow(ratios[name]) and
+                majority > len(ratios[name]) - _slow(ratios[name])]
+        for name in slow:
+            ratios[name].append(_ratio(name, *remeasure(name)))
+
+    regressions = []
+    for name in sorted(ratios):
+        result = results[name]
+        base = baseline['results'][name]
+        ns_ratio = _median(ratios[name])
+        if ns_ratio > 1 + tolerance:
+            regressions.append('%s: %.0f%% slower than baseline, median of '
+                               '%d measurements'
+                               % (name, (ns_ratio - 1) * 100,
+                                  len(ratios[name])))
+        if result['objects_per_op'] > base['objects_per_op'] * (1 + tolerance):
+            regressions.append('%s: %.1f objects/op, baseline %.1f'
+                               % (name, result['objects_per_op'],
+                                  base['objects_per_op']))
+    return regressions
+
+
+def run(filter_=None, min_time=0.2, baseline=None, tolerance=0.25,
+        verbose=False, runs=1):
+    names = []
+    ops = []
+    results = {}
+    errors = {}
+    for name, setup in cases():
+        names.append(name)
+        if filter_ is not None and not re.search(filter_, name):
+            continue
+        try:
+            op = setup()
+            op()
+        except Exception as e:
+            errors[name] = '%s: %s' % (e.__class__.__name__, e)
+            continue
+        ops.append((name, op))
+        # the speed of a shared machine drifts within minutes, so a case
+        # is scaled by the calibration measured next to it
+        ns_per_op, calibration_ns = measure_scaled(op, min_time)
+        results[name] = {'ns_per_op': ns_per_op,
+                         'calibration_ns': calibration_ns,
+                         'objects_per_op': measure_objects(op)}
+        if verbose:
+            print >> sys.stderr, '%-60s %12.0f ns/op %8.1f objects/op' % (
+                name, results[name]['ns_per_op'],
+                results[name]['objects_per_op'])
+
+    # every case again after the others, and the median of its ratios
+    # to the calibration is kept
+    samples = dict((name, [(result['ns_per_op'], result['calibration_ns'])])
+                   for name, result in results.items())
+    for _i in range(runs - 1):
+        for name, op in ops:
+            samples[name].append(measure_scaled(op, min_time))
+    for name, result in results.items():
+        ns_per_op, calibration_ns = _median_by(
+            samples[name], lambda sample: sample[0] / sample[1])
+        result.update(ns_per_op=ns_per_op, calibration_ns=calibration_ns)
+
+    report = {
+        'python': sys.version.split()[0],
+        'results': results,
+        'errors': errors,
+        'uncovered': uncovered(names),
+    }
+    if baseline is not None:
+        report['regressions'] = compare(
+            results, baseline, tolerance,
+            lambda name: measure_apart(name, min_time))
+    return report
+
+
+def main():
+    parser = optparse.OptionParser(
+        usage='%prog [options]',
+        description='benchmark the OpenFlow message parsers/serializers')
+    parser.add_option('-b', '--baseline', default=_BASELINE,
+                      help='baseline to compare with (default %default), '
+                      'empty not to compare')
+    parser.add_option('-s', '--save', default=None,
+                      help='save the results as a baseline to this file')
+    parser.add_option('-t', '--tolerance', type='float', default=0.25,
+                      help='allowed ratio of slowdown and of objects '
+                      'increase (default %default)')
+    parser.add_option('-f', '--filter', default=None,
+                      help='regular expression of the case names to run')
+    parser.add_option('-m', '--min-time', type='float', default=0.2,
+                      help='seconds each measurement runs at least '
+                      '(default %default)')
+    parser.add_option('-r', '--runs', type='int', default=1,
+                      help='runs over the cases whose median is kept, e.g. '
+                      'to save a baseline (default %default)')
+    parser.add_option('-q', '--quiet', action='store_true', default=False,
+                      help="don't print the progress to stderr")
+    options, _args = parser.parse_args()
+
+    baseline = None
+    if options.baseline and os.path.exists(options.baseline):
+        with open(options.baseline) as f:
+            baseline = json.load(f)
+
+    report = run(options.filter, options.min_time, baseline,
+                 options.tolerance, not options.quiet, options.runs)
+    if options.save:
+        with open(options.save, 'w') as f:
+            json.dump({'python': report['python'],
+                       'results': report['results']},
+                      f, indent=1, sort_keys=True)
+            f.write('\n')
+    print json.dumps(report, indent=1, sort_keys=True)
+    return 1 if report.get('regressions') else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
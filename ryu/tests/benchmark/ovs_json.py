@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2013 Nippon Telegraph and Telephone Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmark of the codecs of ovs.json with an OVSDB monitor reply.
+
+usage: python -m ryu.tests.benchmark.ovs_json [size in MB (default 10)]
+"""
+
+import sys
+import time
+import uuid
+
+import ryu.contrib  # for ovs
+import ovs.json
+
+
+_RECV_SIZE = 4096   # same as ovs.jsonrpc.Connection.recv()
+
+
+def _interface_row(i):
+    return {'new': {
+        'name': 'tap%08d' % i,
+        'ofport': i + 1,
+        'type': '',
+        'external_ids': ['map', [
+            ['attached-mac', 'fa:16:3e:%02x:%02x:%02x' % (
+                (i >> 16) & 0xff, (i >> 8) & 0xff, i & 0xff)],
+            ['iface-id', str(uuid.uuid4())],
+            ['iface-status', 'active']]],
+        'options': ['map', []],
+        'statistics': ['map', [['rx_bytes', i * 1000],
+                               ['rx_packets', i * 10],
+                               ['tx_bytes', i * 2000],
+                               ['tx_packets', i * 20]]],
+    }}
+
+
+def monitor_reply(size):
+    """Return the text of a monitor reply of the Interface table
+    of about size bytes."""
+    row_size = len(ovs.json.to_string_fast(
+        {str(uuid.uuid4()): _interface_row(0)}))
+    rows = dict((str(uuid.uuid4()), _interface_row(i))
+                for i in range(size / row_size))
+    return ovs.json.to_string_fast({'id': 0, 'error': None,
+                                    'result': {'Interface': rows}})
+
+
+def _parse(parser, s):
+    # feed as ovs.jsonrpc.Connection does
+    for i in range(0, len(s), _RECV_SIZE):
+        parser.feed(s[i:i + _RECV_SIZE])
+    assert parser.is_done()
+    return parser.finish()
+
+
+def _bench(name, func, *args):
+    start = time.time()
+    result = func(*args)
+    print '%-24s %8.3f sec' % (name, time.time() - start)
+    return result
+
+
+def main(size_mb=10):
+    s = monitor_reply(int(size_mb * 1024 * 1024))
+    print 'monitor reply: %d bytes' % len(s)
+
+    obj = _bench('Parser', _parse, ovs.json.Parser(), s)
+    fast_obj = _bench('FastParser', _parse, ovs.json.FastParser(), s)
+    assert obj == fast_obj
+
+    _bench('to_string', ovs.json.to_string, obj)
+    _bench('to_string_fast', ovs.json.to_string_fast, obj)
+
+
+if __name__ == '__main__':
+    main(*[float(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,86 @@
+# Copyright (C) 2013 Nippon Telegraph and Telephone Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+import unittest
+import logging
+from nose.tools import *
+
+from ryu.ofproto import ofproto_v1_3
+from ryu.ofproto import ofproto_v1_3_parser
+
+LOG = logging.getLogger('test_ofctl_rest')
+
+
+class _Datapath(object):
+    id = 1
+    ofproto = ofproto_v1_3
+    ofproto_parser = ofproto_v1_3_parser
+
+    def __init__(self):
+        self.sent = []
+
+    def set_xid(self, msg):
+        msg.xid = len(self.sent) + 1
+
+    def send_msg(self, msg):
+        self.sent.append(msg)
+
+
+class _DPSet(object):
+    def __init__(self, datapath):
+        self.dps = {datapath.id: datapath}
+
+    def get(self, dpid):
+        return self.dps.get(dpid)
+
+
+class _Request(object):
+    def __init__(self, body):
+        self.body = body
+
+
+class Test_StatsController(unittest.TestCase):
+    """ Test case for ofctl_rest.StatsController
+    """
+
+    def setUp(self):
+        # Imported here rather than at the top: this module is loaded
+        #   before nose puts ryu/lib on sys.path, and ryu.contrib has to
+        #   come before it there for the ovs of the other tests
+        import ryu.contrib  # for oslo.config
+        from ryu.app import ofctl_rest
+        self.dp = _Datapath()
+        self.controller = ofctl_rest.StatsController.__new__(
+            ofctl_rest.StatsController)
+        self.controller.dpset = _DPSet(self.dp)
+        self.controller.waiters = {}
+
+    def _add(self, actions):
+        flow = {'dpid': 1, 'match': {'in_port': 1}, 'actions': actions}
+        return self.controller.mod_flow_entry(_Request(repr(flow)), 'add')
+
+    def test_set_field(self):
+        res = self._add([{'type': 'SET_FIELD', 'field': 'dl_vlan',
+                          'value': 10}])
+        eq_(res.status_int, 200)
+        eq_(len(self.dp.sent), 1)
+
+    def test_unknown_field(self):
+        res = self._add([{'type': 'SET_FIELD', 'field': 'arp_op',
+                          'value': 2}])
+        eq_(res.status_int, 400)
+        eq_(self.dp.sent, [])
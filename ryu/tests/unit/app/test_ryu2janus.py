@@ -0,0 +1,183 @@
+# Copyright (C) 2013 Nippon Telegraph and Telephone Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+import errno
+import httplib
+import socket
+import unittest
+import logging
+from nose.tools import *
+from nose.plugins.skip import SkipTest
+
+import gevent
+
+LOG = logging.getLogger('test_ryu2janus')
+
+
+class _Response(object):
+    status = httplib.OK
+    reason = 'OK'
+    will_close = False
+
+    def read(self):
+        return ''
+
+    def getheaders(self):
+        return []
+
+
+class _Connection(object):
+    def __init__(self, requests, error=None):
+        self.requests = requests
+        self.error = error
+        self.closed = False
+
+    def request(self, method, url, body, headers):
+        if isinstance(self.error, Exception):
+            raise self.error
+        self.requests.append((method, url, body))
+
+    def getresponse(self):
+        if isinstance(self.error, list):
+            # raised after the request was sent
+            raise self.error.pop(0)
+        return _Response()
+
+    def close(self):
+        self.closed = True
+
+
+class Test_JanusForwarder(unittest.TestCase):
+    """ Test case for ryu2janus.JanusForwarder
+    """
+
+    def setUp(self):
+        # Imported here rather than at the top: this module is loaded
+        #   before nose puts ryu/lib on sys.path, and ryu.contrib has to
+        #   come before it there for the ovs of the other tests
+        import ryu.contrib  # for oslo.config
+        try:
+            from ryu.app import ryu2janus
+        except ImportError:
+            raise SkipTest('ryu2janus needs janus')
+        self.JanusForwarder = ryu2janus.JanusForwarder
+        self.requests = []
+        self.errors = []
+        self.forwarders = []
+
+    def tearDown(self):
+        for forwarder in self.forwarders:
+            gevent.killall(forwarder.threads)
+
+    def _forwarder(self, *args, **kwargs):
+        forwarder = self.JanusForwarder('127.0.0.1', 8090, *args, **kwargs)
+
+        def _connect():
+            error = self.errors.pop(0) if self.errors else None
+            return _Connection(self.requests, error)
+        forwarder._connect = _connect
+        self.forwarders.append(forwarder)
+        return forwarder
+
+    def test_drop(self):
+        forwarder = self._forwarder(workers=0, queue_size=2)
+        for i in range(5):
+            forwarder.send('POST', '/v1/network/packet', str(i))
+        eq_(forwarder.queue.qsize(), 2)
+        eq_(forwarder.dropped, 3)
+        eq_(forwarder.queue.get()[2], '0')
+
+    def test_batch(self):
+        forwarder = self._forwarder(batch_size=10)
+        forwarder.send('POST', '/a', '1')
+        forwarder.send('POST', '/a', '2')
+        forwarder.send('PUT', '/a', '3')
+        forwarder.send('POST', '/b', '4')
+        forwarder.send('POST', '/a', '5')
+        gevent.sleep(0.01)
+        eq_(self.requests, [('POST', '/a', '[1, 2]'),
+                            ('PUT', '/a', '3'),
+                            ('POST', '/b', '4'),
+                            ('POST', '/a', '5')])
+        eq_(forwarder.sent, 5)
+
+    def test_batch_size(self):
+        forwarder = self._forwarder(workers=0, batch_size=2)
+        for i in range(3):
+            forwarder.send('POST', '/a', str(i))
+        eq_(len(forwarder._get_batch()), 2)
+        eq_(len(forwarder._get_batch()), 1)
+
+    def test_failure(self):
+        def _join(bodies):
+            raise ValueError('bad event')
+
+        forwarder = self._forwarder(batch_size=10, join=_join)
+        self.errors = [socket.error('refused')]
+        forwarder.send('POST', '/a', '1')
+        gevent.sleep(0.01)
+        forwarder.send('POST', '/a', '2')
+        forwarder.send('POST', '/a', '3')
+        gevent.sleep(0.01)
+        forwarder.send('POST', '/b', '4')
+        gevent.sleep(0.01)
+        # the worker survives both failures
+        eq_(forwarder.failed, 3)
+        eq_(forwarder.sent, 1)
+        eq_(self.requests, [('POST', '/b', '4')])
+        ok_(not forwarder.threads[0].dead)
+
+    # A kept connection closed after the request was sent
+    def _kept_conn(self, error):
+        return _Connection(self.requests, [error])
+
+    def test_retry_stale(self):
+        forwarder = self._forwarder(workers=0)
+        for e in (httplib.BadStatusLine(''),
+                  socket.error(errno.ECONNRESET, 'reset'),
+                  socket.error(errno.EPIPE, 'broken pipe')):
+            conn = self._kept_conn(e)
+            new_conn = forwarder._request(conn, 'POST', '/a', '1', None)
+            ok_(conn.closed)
+            ok_(new_conn is not conn)
+            ok_(not new_conn.closed)
+        # sent on the kept connection, then again on a new one
+        eq_(len(self.requests), 6)
+
+    def test_no_retry(self):
+        forwarder = self._forwarder(workers=0)
+        for e in (socket.timeout('timed out'),
+                  socket.error(errno.ECONNREFUSED, 'refused'),
+                  httplib.IncompleteRead('')):
+            self.requests[:] = []
+            conn = self._kept_conn(e)
+            try:
+                forwarder._request(conn, 'POST', '/a', '1', None)
+            except type(e):
+                pass
+            else:
+                ok_(False, 'no error for %r' % e)
+            ok_(conn.closed)
+            # Janus may have taken the events, so they aren't sent again
+            eq_(self.requests, [('POST', '/a', '1')])
+
+    def test_no_retry_new_conn(self):
+        forwarder = self._forwarder(workers=0)
+        self.errors = [socket.error(errno.ECONNRESET, 'reset')]
+        assert_raises(socket.error, forwarder._request,
+                      None, 'POST', '/a', '1', None)
+        eq_(self.errors, [])
@@ -0,0 +1,316 @@
+# Copyright (C) 2013 Nippon Telegraph and Telephone Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+import json
+import unittest
+import logging
+from nose.tools import *
+
+import gevent
+from webob import Request
+
+import ryu.exception as ryu_exc
+from ryu.lib.xflow import sflow
+from ryu.ofproto import ofproto_v1_0, ofproto_v1_0_parser
+
+LOG = logging.getLogger('test_stats_aggregator')
+
+_MAC = '\x00' * 6
+
+
+class _Clock(object):
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+class _Datapath(object):
+    ofproto = ofproto_v1_0
+    ofproto_parser = ofproto_v1_0_parser
+
+    def __init__(self, id_):
+        self.id = id_
+        self.sent = []
+
+    def set_xid(self, msg):
+        msg.xid = len(self.sent) + 1
+
+    def send_msg(self, msg):
+        self.sent.append(msg)
+
+
+class _DPSet(object):
+    def __init__(self):
+        self.dps = {}
+        self.ports = {}
+
+    def add(self, dp, speeds):
+        self.dps[dp.id] = dp
+        for port_no, curr in speeds.items():
+            self.ports[(dp.id, port_no)] = ofproto_v1_0_parser.OFPPhyPort(
+                port_no, _MAC, 'eth%d' % port_no, 0, 0, curr, 0, 0, 0)
+
+    def get(self, dpid):
+        return self.dps.get(dpid)
+
+    def get_all(self):
+        return self.dps.items()
+
+    def get_port(self, dpid, port_no):
+        try:
+            return self.ports[(dpid, port_no)]
+        except KeyError:
+            raise ryu_exc.PortNotFound(dpid=dpid, port=port_no,
+                                       network_id=None)
+
+
+class _Stats(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class _Reply(object):
+    def __init__(self, dp, xid, body, flags=0):
+        self.datapath = dp
+        self.xid = xid
+        self.body = body
+        self.flags = flags
+
+
+class _Event(object):
+    def __init__(self, msg):
+        self.msg = msg
+
+
+def _port_stats(port_no, rx_bytes, tx_bytes):
+    return _Stats(port_no=port_no, rx_bytes=rx_bytes, tx_bytes=tx_bytes,
+                  rx_packets=rx_bytes / 100, tx_packets=tx_bytes / 100,
+                  rx_dropped=0, tx_dropped=0)
+
+
+def _flow_stats(in_port, byte_count):
+    match = ofproto_v1_0_parser.OFPMatch(
+        ofproto_v1_0.OFPFW_ALL & ~ofproto_v1_0.OFPFW_IN_PORT, in_port,
+        _MAC, _MAC, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+    actions = [ofproto_v1_0_parser.OFPActionOutput(in_port + 1)]
+    return _Stats(match=match, priority=10, cookie=0, actions=actions,
+                  byte_count=byte_count, packet_count=byte_count / 100)
+
+
+def _counters(if_index, speed, in_octets, out_octets):
+    return sflow.sFlowV5GenericInterfaceCounters(
+        if_index, 6, speed, 1, 1, 1, in_octets, 10, 1, 1, 2, 0, 0,
+        out_octets, 20, 1, 1, 3, 0, 0)
+
+
+class Test_StatsAggregator(unittest.TestCase):
+    """ Test case for stats_aggregator.StatsAggregator
+    """
+
+    def setUp(self):
+        # Imported here rather than at the top: this module is loaded
+        #   before nose puts ryu/lib on sys.path, and ryu.contrib has to
+        #   come before it there for the ovs of the other tests
+        import ryu.contrib  # for oslo.config
+        from oslo.config import cfg
+        from ryu.app import stats_aggregator
+        from ryu.app.wsgi import WSGIApplication
+        from ryu.controller import xflow_collector
+        self.cfg = cfg
+        self.mod = stats_aggregator
+        self.EventInterfaceCounters = xflow_collector.EventInterfaceCounters
+
+        self.time = stats_aggregator.time
+        self.clock = _Clock(100.0)
+        stats_aggregator.time = self.clock
+        cfg.CONF.set_override('stats_timeout', 0.05)
+
+        self.dpset = _DPSet()
+        self.dp = _Datapath(1)
+        self.dpset.add(self.dp, {1: ofproto_v1_0.OFPPF_1GB_FD,
+                                 2: ofproto_v1_0.OFPPF_10GB_FD})
+        self.wsgi = WSGIApplication()
+        self.app = stats_aggregator.StatsAggregator(dpset=self.dpset,
+                                                    wsgi=self.wsgi)
+        # the tests poll by themselves
+        self.app.poll_thread.kill()
+
+    def tearDown(self):
+        self.app.poll_thread.kill()
+        self.mod.time = self.time
+        for name in ('stats_timeout', 'stats_concurrency'):
+            self.cfg.CONF.clear_override(name)
+
+    def _reply(self, dp, req, body, flags=0):
+        handler = self.app.port_stats_reply_handler
+        if isinstance(req, ofproto_v1_0_parser.OFPFlowStatsRequest):
+            handler = self.app.flow_stats_reply_handler
+        handler(_Event(_Reply(dp, req.xid, body, flags)))
+
+    def _poll(self, now, ports, flows):
+        self.clock.now = now
+        thread = gevent.spawn(self.app._poll, self.dp)
+        gevent.sleep(0)
+        port_req, flow_req = self.dp.sent[-2:]
+        # a reply in two parts
+        self._reply(self.dp, port_req, ports[:1], self.mod._REPLY_MORE)
+        self._reply(self.dp, port_req, ports[1:])
+        self._reply(self.dp, flow_req, flows)
+        thread.join()
+
+    def _get(self, path):
+        res = Request.blank(path).get_response(self.wsgi)
+        if res.status_int != 200:
+            return res.status_int
+        return json.loads(res.body)
+
+    def _fill(self):
+        self._poll(100.0, [_port_stats(1, 0, 0), _port_stats(2, 0, 0)],
+                   [_flow_stats(1, 0), _flow_stats(2, 0)])
+        self._poll(110.0, [_port_stats(1, 20000, 10000),
+                           _port_stats(2, 0, 30000),
+                           _port_stats(ofproto_v1_0.OFPP_LOCAL, 0, 50000)],
+                   [_flow_stats(1, 5000), _flow_stats(2, 7000)])
+
+        counters = [_counters(5, 10 ** 8, 0, 0)]
+        self.clock.now = 100.0
+        self.app.interface_counters_handler(
+            self.EventInterfaceCounters('10.0.0.1', None, counters))
+        counters = [_counters(5, 10 ** 8, 10000, 20000)]
+        self.clock.now = 110.0
+        self.app.interface_counters_handler(
+            self.EventInterfaceCounters('10.0.0.1', None, counters))
+
+    def test_poll(self):
+        self._fill()
+        eq_(len(self.dp.sent), 4)
+        eq_(self.app.waiters, {})
+        # the local port is skipped
+        eq_(sorted(self.app.port_series), [(1, 1), (1, 2)])
+        series = self.app.port_series[(1, 1)]
+        eq_(len(series), 2)
+        eq_(series.rate('rx_bytes'), 2000)
+        eq_(series.rate('tx_packets'), 10)
+        eq_(len(self.app.flow_series[1]), 2)
+
+        # a flow gone is dropped
+        self._poll(120.0, [], [_flow_stats(2, 9000)])
+        eq_([flow['match']['in_port']
+             for flow, _series in self.app.flow_series[1].values()], [2])
+
+    def test_poll_timeout(self):
+        thread = gevent.spawn(self.app._poll, self.dp)
+        gevent.sleep(0)
+        # the requests are sent back to back
+        eq_(len(self.dp.sent), 2)
+        port_req = self.dp.sent[0]
+        self._reply(self.dp, port_req, [_port_stats(1, 0, 0)])
+        thread.join()
+        eq_(sorted(self.app.port_series), [(1, 1)])
+        eq_(self.app.flow_series, {})
+        eq_(self.app.waiters, {})
+
+    def test_poll_pool(self):
+        self.cfg.CONF.set_override('stats_concurrency', 2)
+        for dpid in (2, 3, 4):
+            self.dpset.add(_Datapath(dpid), {})
+        self.app.poll_thread = gevent.spawn(self.app._poll_loop)
+        gevent.sleep(0.01)
+        # nothing replies, so the others wait for the timeouts
+        eq_(sum(1 for dp in self.dpset.dps.values() if dp.sent), 2)
+        gevent.sleep(0.1)
+        eq_(sum(1 for dp in self.dpset.dps.values() if dp.sent), 4)
+
+    def test_dp_leave(self):
+        self._fill()
+        ev = _Event(None)
+        ev.dp = self.dp
+        ev.enter = True
+        self.app.dp_handler(ev)
+        eq_(len(self.app.port_series), 2)
+        ev.enter = False
+        self.app.dp_handler(ev)
+        eq_(self.app.port_series, {})
+        eq_(self.app.flow_series, {})
+        # the sFlow interfaces aren't of a datapath
+        eq_(len(self.app.sflow_series), 1)
+
+    def test_sflow(self):
+        self._fill()
+        series = self.app.sflow_series[('10.0.0.1', 5)]
+        eq_(series.last_time, 110.0)
+        eq_(series.latest(), {'rx_bytes': 10000, 'tx_bytes': 20000,
+                              'rx_packets': 12, 'tx_packets': 22,
+                              'rx_dropped': 2, 'tx_dropped': 3})
+        # the dpid of the agent is the key when it is known
+        self.app.interface_counters_handler(self.EventInterfaceCounters(
+            '10.0.0.2', 2, [_counters(1, 10 ** 9, 0, 0)]))
+        ok_((2, 1) in self.app.sflow_series)
+
+        rates = self._get('/stats/traffic/sflow')
+        eq_(len(rates), 2)
+        entry = [rate for rate in rates if rate['agent'] == '10.0.0.1'][0]
+        eq_(entry['if_index'], 5)
+        eq_(entry['rates']['tx_bytes'], 2000)
+        eq_(entry['speed'], 10 ** 8)
+        eq_(entry['tx_utilization'], 2000 * 8.0 / 10 ** 8)
+
+    def test_rest_ports(self):
+        self._fill()
+        rates = self._get('/stats/traffic/port/1')['1']
+        eq_(sorted(rates), ['1', '2'])
+        entry = rates['1']
+        eq_(entry['rates']['rx_bytes'], 2000)
+        eq_(entry['rates']['tx_bytes'], 1000)
+        eq_(entry['speed'], 10 ** 9)
+        eq_(entry['rx_utilization'], 2000 * 8.0 / 10 ** 9)
+        eq_(entry['samples'], 2)
+        eq_(rates['2']['speed'], 10 ** 10)
+        eq_(self._get('/stats/traffic/port/9'), 404)
+
+        entry = self._get('/stats/traffic/port/1/2')
+        eq_(entry['rates']['tx_bytes'], 3000)
+        eq_(len(entry['history']), 2)
+        eq_(self._get('/stats/traffic/port/1/7'), 404)
+
+    def test_rest_window(self):
+        self._fill()
+        self._poll(115.0, [_port_stats(1, 20000, 20000),
+                           _port_stats(2, 0, 30000)], [])
+        # the last two samples, or the samples of the window
+        entry = self._get('/stats/traffic/port/1/1')
+        eq_(entry['rates']['tx_bytes'], 2000)
+        entry = self._get('/stats/traffic/port/1/1?window=15')
+        eq_(entry['rates']['tx_bytes'], 20000 / 15.0)
+
+    def test_rest_top(self):
+        self._fill()
+        top = self._get('/stats/traffic/top?n=2')
+        eq_([(entry.get('port_no'), entry.get('if_index'))
+             for entry in top], [(2, None), (None, 5)])
+        top = self._get('/stats/traffic/top?n=1&by=rx_bytes')
+        eq_((top[0]['dpid'], top[0]['port_no']), (1, 1))
+        eq_(len(self._get('/stats/traffic/top')), 3)
+        eq_(self._get('/stats/traffic/top?by=bytes'), 400)
+
+        flows = self._get('/stats/traffic/flows/top?n=1')
+        eq_(len(flows), 1)
+        eq_(flows[0]['match']['in_port'], 2)
+        eq_(flows[0]['rates']['byte_count'], 700)
+        eq_(flows[0]['actions'], ['OUTPUT:3'])
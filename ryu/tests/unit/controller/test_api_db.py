@@ -0,0 +1,265 @@
+# Copyright (C) 2012, The SAVI Project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+import shutil
+import tempfile
+import unittest
+import logging
+from nose.tools import *
+from nose.plugins.skip import SkipTest
+
+import gevent
+
+import ryu.contrib  # for oslo.config
+from ryu.app.rest_nw_id import NW_ID_UNKNOWN
+from ryu.controller import api_db_store
+from ryu.controller import mac_to_network
+from ryu.controller import network
+from ryu.controller import port_bond
+from ryu.lib.mac import haddr_to_bin
+try:
+    from ryu.controller import api_db
+    from ryu.controller import flowvisor_cli
+except ImportError:
+    api_db = None   # needs gflags
+
+LOG = logging.getLogger('test_api_db')
+
+MAC1 = '00:00:00:00:00:01'
+MAC2 = '00:00:00:00:00:02'
+
+
+class _Store(object):
+    """A store which keeps the written batches, or fails."""
+    def __init__(self):
+        self.batches = []
+        self.errors = []
+        self.on_write = None
+
+    def write(self, batch):
+        if self.on_write is not None:
+            self.on_write()
+        if self.errors:
+            raise self.errors.pop(0)
+        self.batches.append(sorted(batch))
+
+    def close(self):
+        pass
+
+
+class Test_API_DB(unittest.TestCase):
+    """ Test case for the write behind journal of api_db.API_DB
+    """
+
+    def setUp(self):
+        if api_db is None:
+            raise SkipTest('api_db needs gflags')
+        self.path = tempfile.mkdtemp()
+        self.flags = {}
+        self._set_flags(api_db_store='log', api_db_path=self.path)
+        self.db = api_db.API_DB()
+        # _flush_loop is started by the tests which need it
+        self.db._flusher.kill()
+        self.db.store.close()
+        self.store = _Store()
+        self.db.store = self.store
+
+    def tearDown(self):
+        self.db._flusher.kill()
+        for name, value in self.flags.items():
+            setattr(api_db.FLAGS, name, value)
+        shutil.rmtree(self.path)
+
+    def _set_flags(self, **kwargs):
+        for name, value in kwargs.items():
+            self.flags.setdefault(name, getattr(api_db.FLAGS, name))
+            setattr(api_db.FLAGS, name, value)
+
+    def _written(self):
+        return sorted(row for batch in self.store.batches for row in batch)
+
+    def test_coalesce(self):
+        self.db.createNetwork('net1')
+        self.db.createPort('net1', '0001', 2)
+        self.db.addMAC('net1', MAC1)
+        self.db.delMAC(MAC1)
+        self.db.createBond('bond1', '1', 'net1')
+        self.db.addPort_bond('bond1', 2)
+        self.db.deletePort_bond('bond1', 2)
+        self.db.addMAC('net1', MAC2)
+        eq_(len(self.db.pending), 5)
+        self.db.flush()
+
+        # only the last change of a row is written
+        batch = [
+            (('bonds', 'bond1'), {'datapath_id': '1', 'network_id': 'net1'}),
+            (('macs', MAC1), None),
+            (('macs', MAC2), {'network_id': 'net1'}),
+            (('networks', 'net1'), {}),
+            (('ports', ('1', 2)), {'network_id': 'net1', 'bond_id': None})]
+        eq_(self.store.batches, [batch])
+        eq_(self.db.pending, {})
+
+    def test_batch_size(self):
+        self._set_flags(api_db_batch_size=2)
+        for i in range(5):
+            self.db.createNetwork('net%d' % i)
+        self.db.flush()
+        eq_([len(batch) for batch in self.store.batches], [2, 2, 1])
+        eq_(self._written(),
+            [(('networks', 'net%d' % i), {}) for i in range(5)])
+
+    def test_put_back(self):
+        # the batch is written in the hub, so that the rows can be changed
+        #   while it is written
+        self.db._writer = None
+        self.db.createNetwork('net1')
+        self.db.createPort('net1', '1', 2)
+
+        def _change():
+            self.store.on_write = None
+            self.db.updatePort('net2', '1', 2)
+        self.store.on_write = _change
+        self.store.errors = [IOError('database down')]
+        assert_raises(IOError, self.db.flush)
+
+        # the port is written as changed meanwhile, not as in the batch
+        port = {'network_id': 'net2', 'bond_id': None}
+        eq_(self.db.pending, {('networks', 'net1'): {},
+                              ('ports', ('1', 2)): port})
+        self.db.flush()
+        eq_(self._written(), [(('networks', 'net1'), {}),
+                              (('ports', ('1', 2)), port)])
+
+    def test_max_pending(self):
+        self._set_flags(api_db_max_pending=3)
+        self.db.createNetwork('net1')
+        self.db.createNetwork('net2')
+        eq_(self.store.batches, [])
+        # the third row is written before the API call returns
+        self.db.createNetwork('net3')
+        eq_(self.db.pending, {})
+        eq_(self._written(), [(('networks', 'net1'), {}),
+                              (('networks', 'net2'), {}),
+                              (('networks', 'net3'), {})])
+
+    def test_max_pending_down(self):
+        self._set_flags(api_db_max_pending=2)
+        self.store.errors = [IOError('database down')] * 2
+        self.db.createNetwork('net1')
+        # the API calls succeed as the mirror is changed
+        self.db.createNetwork('net2')
+        self.db.createNetwork('net3')
+        eq_(sorted(self.db.getNetworks()), ['net1', 'net2', 'net3'])
+        eq_(self.store.batches, [])
+        eq_(len(self.db.pending), 3)
+
+        # the database is back
+        self.db.createNetwork('net4')
+        eq_(self.db.pending, {})
+        eq_(len(self._written()), 4)
+
+    def test_flush_loop(self):
+        self._set_flags(api_db_flush_interval=0, api_db_retry_interval=0)
+        self.store.errors = [IOError('database down')]
+        self.db._flusher = gevent.spawn(self.db._flush_loop)
+        self.db.createNetwork('net1')
+        gevent.sleep(0.1)
+        # written on the retry
+        eq_(self._written(), [(('networks', 'net1'), {})])
+        ok_(not self.db._flusher.dead)
+
+        self.db.deleteNetwork('net1')
+        gevent.sleep(0.1)
+        eq_(self.store.batches[-1], [(('networks', 'net1'), None)])
+
+
+class Test_restore(unittest.TestCase):
+    """ Test case for api_db.API_DB.restore
+    """
+
+    def setUp(self):
+        if api_db is None:
+            raise SkipTest('api_db needs gflags')
+        self.path = tempfile.mkdtemp()
+        self.flags = {'api_db_store': api_db.FLAGS.api_db_store,
+                      'api_db_path': api_db.FLAGS.api_db_path}
+        api_db.FLAGS.api_db_store = 'log'
+        api_db.FLAGS.api_db_path = self.path
+        self.db = None
+
+    def tearDown(self):
+        if self.db is not None:
+            self.db.close()
+        for name, value in self.flags.items():
+            setattr(api_db.FLAGS, name, value)
+        shutil.rmtree(self.path)
+
+    def test_restore(self):
+        def _port(network_id, bond_id=None):
+            return {'network_id': network_id, 'bond_id': bond_id}
+
+        store = api_db_store.LogStore(self.path)
+        store.write([
+            (('networks', 'net1'), {}),
+            (('networks', 'net2'), {}),
+            (('ports', ('1', 1)), _port('net1', 'bond1')),
+            (('ports', ('1', 2)), _port('net1', 'bond1')),
+            (('ports', ('1', 3)), _port('net1')),
+            # dpid 0, without the leading zeros
+            (('ports', ('', 1)), _port('net2')),
+            (('ports', ('a', 4)), _port('net2')),
+            # not restored, as the network is gone
+            (('ports', ('a', 5)), _port('net3')),
+            (('macs', MAC1), {'network_id': 'net1'}),
+            (('macs', MAC2), {'network_id': 'net2'}),
+            (('bonds', 'bond1'), {'datapath_id': '1', 'network_id': 'net1'}),
+            (('flowspace', 7), {'datapath_id': '0x1L', 'port_num': 1,
+                                'mac_address': MAC1}),
+            (('flowspace', 8), {'datapath_id': '0xa', 'port_num': 4,
+                                'mac_address': MAC2}),
+            (('delegated_nets', 'net2'), {'slice': 'slice1'}),
+        ])
+        store.close()
+
+        self.db = api_db.API_DB()
+        nw = network.Network()
+        nw.send_event_to_observers = lambda ev: None
+        mac2net = mac_to_network.MacToNetwork(nw)
+        bonds = port_bond.PortBond(nw)
+        fv_cli = flowvisor_cli.FlowVisor_CLI()
+        self.db.restore(nw, mac2net, bonds, fv_cli)
+
+        eq_(sorted(nw.list_networks()), ['net1', 'net2'])
+        eq_(nw.get_network(1, 1), 'net1')
+        eq_(nw.get_network(1, 3), 'net1')
+        eq_(nw.get_network(0, 1), 'net2')
+        eq_(nw.get_network(10, 4), 'net2')
+        eq_(nw.dpids.get_network_safe(10, 5), NW_ID_UNKNOWN)
+
+        eq_(mac2net.get_network(haddr_to_bin(MAC1)), 'net1')
+        eq_(mac2net.get_network(haddr_to_bin(MAC2)), 'net2')
+
+        eq_(bonds.list_bonds(), ['bond1'])
+        eq_(bonds.bond2dpid['bond1'], 1)
+        eq_(bonds.bond2net['bond1'], 'net1')
+        eq_(sorted(bonds.ports_in_bond('bond1')), [1, 2])
+
+        eq_(fv_cli.getFlowSpaceIDs(dpid=1), [7])
+        eq_(fv_cli.flowspaces[7], (1, 1, haddr_to_bin(MAC1)))
+        eq_(fv_cli.flowspaces[8], (10, 4, haddr_to_bin(MAC2)))
+        eq_(fv_cli.getSliceName('net2'), 'slice1')
@@ -0,0 +1,95 @@
+# Copyright (C) 2013 Nippon Telegraph and Telephone Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+import os
+import shutil
+import tempfile
+import unittest
+import logging
+from nose.tools import *
+
+from ryu.controller import api_db_store
+
+LOG = logging.getLogger('test_api_db_store')
+
+
+class Test_LogStore(unittest.TestCase):
+    """ Test case for api_db_store.LogStore
+    """
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def _open(self, **kwargs):
+        return api_db_store.LogStore(self.path, **kwargs)
+
+    def _rows(self, store):
+        return sorted(store.load())
+
+    def test_write_load(self):
+        store = self._open()
+        store.write([(('networks', 'net1'), {}),
+                     (('ports', ('1', 2)), {'network_id': 'net1',
+                                            'bond_id': None})])
+        store.write([(('macs', '00:00:00:00:00:01'), {'network_id': 'net1'}),
+                     (('networks', 'net1'), None)])
+        store.close()
+
+        store = self._open()
+        eq_(self._rows(store),
+            [('macs', '00:00:00:00:00:01', {'network_id': 'net1'}),
+             ('ports', ('1', 2), {'network_id': 'net1', 'bond_id': None})])
+        store.close()
+
+    def test_torn_tail(self):
+        store = self._open(fsync=api_db_store.FSYNC_NEVER)
+        store.write([(('networks', 'net1'), {})])
+        store.close()
+        log_path = os.path.join(self.path, api_db_store.LogStore.LOG_FILE)
+        size = os.path.getsize(log_path)
+        with open(log_path, 'ab') as f:
+            f.write('[["networks", "net2"')
+
+        store = self._open()
+        eq_(self._rows(store), [('networks', 'net1', {})])
+        eq_(os.path.getsize(log_path), size)
+        store.write([(('networks', 'net3'), {})])
+        store.close()
+
+        store = self._open()
+        eq_(self._rows(store), [('networks', 'net1', {}),
+                                ('networks', 'net3', {})])
+        store.close()
+
+    def test_compact(self):
+        store = self._open(compact_size=256)
+        for i in range(20):
+            store.write([(('networks', 'net%d' % i), {})])
+            if i % 2:
+                store.write([(('networks', 'net%d' % (i - 1)), None)])
+        ok_(store.log_size < 256)
+        ok_(os.path.exists(store.snapshot_path))
+        store.close()
+
+        store = self._open()
+        eq_(self._rows(store),
+            [('networks', 'net%d' % i, {}) for i in sorted(
+                range(1, 20, 2), key=lambda i: 'net%d' % i)])
+        store.close()
@@ -0,0 +1,270 @@
+# Copyright (C) 2013 Nippon Telegraph and Telephone Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+import struct
+import unittest
+import logging
+from nose.tools import *
+
+import ryu.contrib  # for oslo.config
+from oslo.config import cfg
+from ryu.controller import dpset
+from ryu.controller import ofp_event
+from ryu.ofproto import ofproto_v1_0, ofproto_v1_0_parser
+from ryu.ofproto import ofproto_v1_2, ofproto_v1_2_parser
+from ryu.ofproto import ofproto_v1_3, ofproto_v1_3_parser
+
+LOG = logging.getLogger('test_dpset')
+
+
+def _port(port_no, name, state=0):
+    return ofproto_v1_0_parser.OFPPhyPort(port_no, '\x00' * 6,
+                                          name + '\x00' * (16 - len(name)),
+                                          0, state, 0, 0, 0, 0)
+
+
+class Test_PortTable(unittest.TestCase):
+    """ Test case for dpset.PortTable
+    """
+
+    def setUp(self):
+        self.ports = [
+            _port(1, 'eth1'),
+            _port(2, 'eth2', ofproto_v1_0.OFPPS_LINK_DOWN),
+            _port(ofproto_v1_0.OFPP_LOCAL, 'br0'),
+        ]
+        self.table = dpset.PortTable(ofproto_v1_0, self.ports)
+
+    def tearDown(self):
+        pass
+
+    def test_init(self):
+        eq_(0, self.table.version)
+        eq_(3, len(self.table))
+        eq_(self.ports[0], self.table[1])
+        ok_(2 in self.table)
+        eq_(None, self.table.get(3))
+
+    def test_views(self):
+        eq_(frozenset([1, ofproto_v1_0.OFPP_LOCAL]), self.table.live)
+        eq_(frozenset([2]), self.table.down)
+        eq_(frozenset([ofproto_v1_0.OFPP_LOCAL]), self.table.reserved)
+        eq_(frozenset([1, 2]), self.table.physical)
+        eq_(self.ports[2], self.table.by_name['br0'])
+        ok_(self.table.is_live(1))
+        ok_(not self.table.is_live(2))
+        ok_(not self.table.is_live(3))
+
+    def test_add(self):
+        port = _port(3, 'eth3')
+        table = self.table.add(port)
+        eq_(1, table.version)
+        eq_(port, table[3])
+        ok_(3 in table.physical)
+        # the original table isn't changed
+        ok_(3 not in self.table)
+        ok_(3 not in self.table.physical)
+
+    def test_remove(self):
+        table = self.table.remove(1)
+        eq_(1, table.version)
+        ok_(1 not in table)
+        ok_(1 not in table.live)
+        ok_(1 in self.table)
+
+    def test_modify(self):
+        table = self.table.modify(_port(2, 'eth2'))
+        ok_(table.is_live(2))
+        ok_(not self.table.is_live(2))
+
+    def test_update(self):
+        ports = [_port(3, 'eth3'), _port(4, 'eth4')]
+        table = dpset.PortTable(ofproto_v1_0).update(ports)
+        eq_(1, table.version)
+        eq_(frozenset([3, 4]), table.physical)
+        eq_(['eth3', 'eth4'], sorted(table.by_name))
+
+
+class _Datapath(object):
+    ofproto = ofproto_v1_0
+    ofproto_parser = ofproto_v1_0_parser
+
+    def __init__(self, id_, ports):
+        super(_Datapath, self).__init__()
+        self.id = id_
+        self.ports = dict((port.port_no, port) for port in ports)
+        self.sent = []
+
+    def set_xid(self, msg):
+        msg.xid = len(self.sent) + 1
+
+    def send_msg(self, msg):
+        msg.serialize()
+        self.sent.append(msg)
+
+
+def _aggregate_reply(dp, flow_count):
+    ofp = dp.ofproto
+    xid = dp.sent[-1].xid
+    body = struct.pack('!HH', ofp.OFPST_AGGREGATE, 0) + struct.pack(
+        ofp.OFP_AGGREGATE_STATS_REPLY_PACK_STR, 0, 0, flow_count)
+    msg_len = ofp.OFP_HEADER_SIZE + len(body)
+    buf = struct.pack(ofp.OFP_HEADER_PACK_STR, ofp.OFP_VERSION,
+                      ofp.OFPT_STATS_REPLY, msg_len, xid) + body
+    return ofp_event.ofp_msg_to_ev(dp.ofproto_parser.msg_parser(
+        dp, ofp.OFP_VERSION, ofp.OFPT_STATS_REPLY, msg_len, xid, buf))
+
+
+class Test_DPSet_resync(unittest.TestCase):
+    """ Test case for resync of dpset.DPSet
+    """
+
+    def setUp(self):
+        cfg.CONF.set_override('dpset_resync_grace_period', 60)
+        self.dpset = dpset.DPSet()
+        self.events = []
+        self.dpset.send_event_to_observers = self.events.append
+
+    def tearDown(self):
+        for cache in (self.dpset._resync_cache.values() +
+                      self.dpset._resync_check.values()):
+            cache.timer.kill(block=False)
+        cfg.CONF.clear_override('dpset_resync_grace_period')
+
+    def _reconnect(self, ports):
+        self.dpset.register(_Datapath(1, [_port(1, 'eth1'),
+                                          _port(2, 'eth2')]))
+        self.dpset.unregister(self.dpset.get(1))
+        # EventDP(leave) is deferred
+        eq_(1, len(self.events))
+        eq_(None, self.dpset.get(1))
+
+        dp = _Datapath(1, ports)
+        self.dpset.register(dp)
+        # nothing is told until the flow count comes
+        eq_(1, len(self.events))
+        eq_(1, len(dp.sent))
+        ok_(isinstance(dp.sent[0],
+                       ofproto_v1_0_parser.OFPAggregateStatsRequest))
+        return dp
+
+    def _check_start_over(self, dp):
+        eq_(3, len(self.events))
+        ev = self.events[1]
+        ok_(isinstance(ev, dpset.EventDP))
+        ok_(not ev.enter)
+        eq_(1, ev.generation)
+        eq_([1, 2], ev.port_table.keys())
+        ev = self.events[2]
+        ok_(isinstance(ev, dpset.EventDP))
+        ok_(ev.enter)
+        eq_(dp, ev.dp)
+        eq_(2, ev.generation)
+        eq_([3], ev.port_table.keys())
+        eq_({}, self.dpset._resync_check)
+
+    def test_enter(self):
+        dp = _Datapath(1, [_port(1, 'eth1')])
+        self.dpset.register(dp)
+        eq_(1, len(self.events))
+        ev = self.events[0]
+        ok_(isinstance(ev, dpset.EventDP))
+        ok_(ev.enter)
+        eq_(1, ev.generation)
+        eq_([1], ev.port_table.keys())
+
+    def test_resume(self):
+        ports = [_port(2, 'eth2', ofproto_v1_0.OFPPS_LINK_DOWN),
+                 _port(3, 'eth3')]
+        dp = self._reconnect(ports)
+        self.dpset.aggregate_stats_reply_handler(_aggregate_reply(dp, 5))
+        eq_(2, len(self.events))
+        ev = self.events[1]
+        ok_(isinstance(ev, dpset.EventDPResumed))
+        eq_(dp, ev.dp)
+        eq_(1, ev.generation)
+        eq_([ports[1]], ev.added)
+        eq_([1], [port.port_no for port in ev.deleted])
+        eq_([ports[0]], ev.modified)
+        eq_(ev.port_table, self.dpset.get_port_table(1))
+        eq_(1, self.dpset.get_generation(1))
+
+    def test_flows_lost(self):
+        # e.g. the switch restarted within the grace period
+        dp = self._reconnect([_port(3, 'eth3')])
+        self.dpset.aggregate_stats_reply_handler(_aggregate_reply(dp, 0))
+        self._check_start_over(dp)
+        eq_(2, self.dpset.get_generation(1))
+
+    def test_no_flow_count(self):
+        dp = self._reconnect([_port(3, 'eth3')])
+        cache = self.dpset._resync_check[1]
+        self.dpset._flow_check_expired(dp, cache)
+        self._check_start_over(dp)
+
+        # a late reply is ignored
+        self.dpset.aggregate_stats_reply_handler(_aggregate_reply(dp, 5))
+        eq_(3, len(self.events))
+
+    def test_disconnect_while_checking(self):
+        dp = self._reconnect([_port(3, 'eth3')])
+        self.dpset.unregister(dp)
+        eq_(1, len(self.events))
+        eq_({}, self.dpset._resync_check)
+
+        # the first connection is still the one kept
+        dp = _Datapath(1, [_port(1, 'eth1')])
+        self.dpset.register(dp)
+        self.dpset.aggregate_stats_reply_handler(_aggregate_reply(dp, 5))
+        eq_(2, len(self.events))
+        ev = self.events[1]
+        ok_(isinstance(ev, dpset.EventDPResumed))
+        eq_(1, ev.generation)
+        eq_([2], [port.port_no for port in ev.deleted])
+
+    def test_flow_count_request(self):
+        for ofp, parser in ((ofproto_v1_2, ofproto_v1_2_parser),
+                            (ofproto_v1_3, ofproto_v1_3_parser)):
+            dp = _Datapath(1, [])
+            dp.ofproto = ofp
+            dp.ofproto_parser = parser
+            req = dpset._flow_count_request(dp)
+            dp.set_xid(req)
+            req.serialize()
+            eq_(ofp.OFP_VERSION, req.version)
+        eq_(3, dpset._flow_count(
+            ofproto_v1_2_parser.OFPAggregateStatsReply(0, 0, 3)))
+        eq_(3, dpset._flow_count(
+            [ofproto_v1_3_parser.OFPAggregateStats(0, 0, 3)]))
+
+    def test_expired(self):
+        dp = _Datapath(1, [_port(1, 'eth1')])
+        self.dpset.register(dp)
+        self.dpset.unregister(dp)
+        cache = self.dpset._resync_cache[1]
+        self.dpset._resync_expired(1, cache)
+        eq_(2, len(self.events))
+        ev = self.events[1]
+        ok_(isinstance(ev, dpset.EventDP))
+        ok_(not ev.enter)
+        eq_([1], ev.port_table.keys())
+
+        self.dpset.register(_Datapath(1, [_port(1, 'eth1')]))
+        ev = self.events[2]
+        ok_(isinstance(ev, dpset.EventDP))
+        ok_(ev.enter)
+        eq_(2, ev.generation)
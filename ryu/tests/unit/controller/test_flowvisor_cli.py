@@ -0,0 +1,241 @@
+# Copyright (C) 2013 Nippon Telegraph and Telephone Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+import errno
+import httplib
+import socket
+import unittest
+import logging
+import xmlrpclib
+from nose.tools import *
+from nose.plugins.skip import SkipTest
+
+from ryu.exception import FlowVisorError
+try:
+    from ryu.controller import flowvisor_cli
+except ImportError:
+    flowvisor_cli = None    # needs gflags
+
+LOG = logging.getLogger('test_flowvisor_cli')
+
+
+class _Response(object):
+    def __init__(self, status=httplib.OK, data='', will_close=False):
+        self.status = status
+        self.data = data
+        self.will_close = will_close
+
+    def read(self):
+        return self.data
+
+
+class _Connection(object):
+    """A connection which fails or returns the given response."""
+    def __init__(self, result):
+        self.result = result
+        self.requests = 0
+        self.closed = False
+
+    def request(self, method, url, body, headers):
+        self.requests += 1
+
+    def getresponse(self):
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+    def close(self):
+        self.closed = True
+
+
+class Test_ConnectionPool(unittest.TestCase):
+    """ Test case for flowvisor_cli._ConnectionPool
+    """
+
+    def setUp(self):
+        if flowvisor_cli is None:
+            raise SkipTest('flowvisor_cli needs gflags')
+        self.pool = flowvisor_cli._ConnectionPool('localhost', 8080, 4, 1)
+        self.results = []
+        self.connected = []
+
+        def _connect():
+            self.connected.append(_Connection(self.results.pop(0)))
+            return self.connected[-1]
+        self.pool._connect = _connect
+
+    def _post(self):
+        return self.pool.post('/xmlrpc', '', {})
+
+    def test_keep_alive(self):
+        self.results = [_Response(data='a'), _Response(data='b',
+                                                       will_close=True)]
+        eq_(self._post(), (httplib.OK, 'a'))
+        eq_(len(self.pool.conns), 1)
+        eq_(self._post(), (httplib.OK, 'a'))
+        eq_(len(self.connected), 1)
+        eq_(self.connected[0].requests, 2)
+
+        self.pool.conns = []
+        eq_(self._post(), (httplib.OK, 'b'))
+        eq_(self.pool.conns, [])
+        ok_(self.connected[1].closed)
+
+    def test_retry_stale(self):
+        stale = _Connection(httplib.BadStatusLine("''"))
+        reset = _Connection(socket.error(errno.ECONNRESET, 'reset'))
+        self.pool.conns = [stale, reset]
+        self.results = [_Response(data='a')]
+        eq_(self._post(), (httplib.OK, 'a'))
+        ok_(stale.closed and reset.closed)
+        eq_(len(self.connected), 1)
+
+    def _check_no_retry(self, exc):
+        try:
+            self._post()
+        except exc:
+            pass
+        else:
+            ok_(False, 'no exception')
+        eq_(self.pool.conns, [])
+
+    def test_no_retry_timeout(self):
+        conn = _Connection(socket.timeout('timed out'))
+        self.pool.conns = [conn]
+        self.results = [_Response()]
+        self._check_no_retry(socket.timeout)
+        eq_(conn.requests, 1)
+        ok_(conn.closed)
+        eq_(self.connected, [])
+
+    def test_no_retry_new_connection(self):
+        self.results = [httplib.BadStatusLine("''"), _Response()]
+        self._check_no_retry(httplib.BadStatusLine)
+        eq_(len(self.connected), 1)
+        ok_(self.connected[0].closed)
+
+
+class _Pool(object):
+    def __init__(self, result):
+        self.result = result
+
+    def post(self, url, body, headers):
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+class Test_FlowVisor_CLI(unittest.TestCase):
+    """ Test case for flowvisor_cli.FlowVisor_CLI
+    """
+
+    def setUp(self):
+        if flowvisor_cli is None:
+            raise SkipTest('flowvisor_cli needs gflags')
+        self.fv = flowvisor_cli.FlowVisor_CLI.__new__(
+            flowvisor_cli.FlowVisor_CLI)
+        self.fv._headers = lambda: {}
+
+    def _call(self, result):
+        self.fv.pool = _Pool(result)
+        return self.fv.addFlowSpaces('slice1', [(1, 2, '00:00:00:00:00:01'),
+                                                (3, 4, '00:00:00:00:00:02')])
+
+    def test_result(self):
+        data = xmlrpclib.dumps((['7', '8'],), methodresponse=True)
+        eq_(self._call((httplib.OK, data)), [7, 8])
+
+    @raises(FlowVisorError)
+    def test_http_error(self):
+        self._call((httplib.INTERNAL_SERVER_ERROR, ''))
+
+    @raises(FlowVisorError)
+    def test_fault(self):
+        self._call((httplib.OK,
+                    xmlrpclib.dumps(xmlrpclib.Fault(1, 'bad flowspace'))))
+
+    @raises(FlowVisorError)
+    def test_socket_error(self):
+        self._call(socket.error(errno.ECONNREFUSED, 'refused'))
+
+    @raises(FlowVisorError)
+    def test_timeout(self):
+        self._call(socket.timeout('timed out'))
+
+
+class Test_FlowSpaceIDs(unittest.TestCase):
+    """ Test case for the flowspace ID indexes of flowvisor_cli.FlowVisor_CLI
+    """
+
+    mac1 = '00:00:00:00:00:01'
+    mac2 = '00:00:00:00:00:02'
+
+    def setUp(self):
+        if flowvisor_cli is None:
+            raise SkipTest('flowvisor_cli needs gflags')
+        self.fv = flowvisor_cli.FlowVisor_CLI()
+
+    def _check_indexes(self):
+        ids = set()
+        for index in (self.fv.dpid_index, self.fv.port_index,
+                      self.fv.mac_index):
+            for key_ids in index.values():
+                ok_(key_ids)
+                ids.update(key_ids)
+        eq_(ids, set(self.fv.flowspaces))
+        eq_(dict((v, k) for k, v in self.fv.flowspaces.items()),
+            self.fv.flowspace_ids)
+
+    def test_port_dpid_collision(self):
+        # the port and dpid of a flowspace mustn't match each other
+        self.fv.addFlowSpaceID(1, 2, self.mac1, 10)
+        self.fv.addFlowSpaceID(2, 1, self.mac2, 11)
+        eq_(self.fv.getFlowSpaceIDs(dpid=2), [11])
+        eq_(self.fv.getFlowSpaceIDs(port=2), [10])
+        eq_(self.fv.getFlowSpaceIDs(dpid=1, port=1), [])
+        eq_(self.fv.getFlowSpaceIDs(dpid=1, mac=self.mac1), [10])
+        eq_(self.fv.getFlowSpaceIDs(dpid=1, mac=self.mac2), [])
+        eq_(sorted(self.fv.getFlowSpaceIDs()), [10, 11])
+
+    def test_replace_stale_id(self):
+        self.fv.addFlowSpaceID(1, 2, self.mac1, 10)
+        self.fv.addFlowSpaceID(1, 2, self.mac1, 12)
+        eq_(self.fv.getFlowSpaceIDs(dpid=1), [12])
+        eq_(self.fv.flowspaces, {12: (1, 2, self.mac1)})
+        self._check_indexes()
+
+        # the ID reused for another tuple
+        self.fv.addFlowSpaceID(1, 3, self.mac2, 12)
+        eq_(self.fv.getFlowSpaceIDs(mac=self.mac1), [])
+        eq_(self.fv.getFlowSpaceIDs(dpid=1, port=3), [12])
+        self._check_indexes()
+
+    def test_del_by_dpid(self):
+        self.fv.addFlowSpaceID(1, 1, self.mac1, 10)
+        self.fv.addFlowSpaceID(1, 2, self.mac2, 11)
+        self.fv.addFlowSpaceID(2, 1, self.mac1, 12)
+        eq_(sorted(self.fv.delFlowSpaceIDs(dpid=1)), [10, 11])
+        eq_(self.fv.flowspaces, {12: (2, 1, self.mac1)})
+        eq_(self.fv.dpid_index, {2: set([12])})
+        eq_(self.fv.port_index, {(2, 1): set([12])})
+        eq_(self.fv.mac_index, {self.mac1: set([12])})
+        self._check_indexes()
+
+        eq_(self.fv.delFlowSpaceIDs(dpid=1), [])
+        self.fv.delFlowSpaceID(12)
+        eq_(self.fv.flowspace_ids, {})
+        eq_(self.fv.mac_index, {})
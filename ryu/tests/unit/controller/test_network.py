@@ -0,0 +1,290 @@
+# Copyright (C) 2013 Nippon Telegraph and Telephone Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+import imp
+import os
+import unittest
+import logging
+from nose.tools import *
+from nose.plugins.skip import SkipTest
+
+import ryu.contrib  # for oslo.config
+from oslo.config import cfg
+import ryu.app
+from ryu.app import simple_isolation
+from ryu.app.rest_nw_id import NW_ID_EXTERNAL
+from ryu.controller import network
+from ryu.controller import port_bond
+from ryu.ofproto import ofproto_v1_0, ofproto_v1_0_parser
+
+LOG = logging.getLogger('test_network')
+
+
+class Test_Network(unittest.TestCase):
+    """ Test case for network.Network port indexes
+    """
+
+    def setUp(self):
+        self.nw = network.Network()
+        self.nw.send_event_to_observers = lambda ev: None
+        for nw_id in ('net1', 'net2', NW_ID_EXTERNAL):
+            self.nw.create_network(nw_id)
+        for port_no in (1, 2, 3):
+            self.nw.create_port('net1', 1, port_no)
+        self.nw.create_port('net2', 1, 4)
+        self.nw.create_port(NW_ID_EXTERNAL, 1, 5)
+        self.nw.create_port('net1', 2, 1)
+
+    def test_index(self):
+        eq_(self.nw.get_network_ports(1, 'net1'), frozenset([1, 2, 3]))
+        eq_(self.nw.get_external_ports(1), frozenset([5]))
+        eq_(sorted(p.port_no for p in self.nw.get_ports(1, 'net1')),
+            [1, 2, 3])
+
+        self.nw.update_port('net2', 1, 3)
+        eq_(self.nw.get_network_ports(1, 'net1'), frozenset([1, 2]))
+        eq_(self.nw.get_network_ports(1, 'net2'), frozenset([3, 4]))
+
+        self.nw.remove_port('net2', 1, 4)
+        eq_(self.nw.get_network_ports(1, 'net2'), frozenset([3]))
+        self.nw.port_deleted(1, 3)
+        eq_(self.nw.get_network_ports(1, 'net2'), frozenset())
+
+    def test_filter_ports(self):
+        eq_(self.nw.filter_ports(1, 1, 'net1'), [2, 3])
+        eq_(self.nw.filter_ports(1, 1, 'net1', NW_ID_EXTERNAL), [2, 3, 5])
+        eq_(self.nw.filter_ports(1, 5, 'net2', NW_ID_EXTERNAL), [4])
+        eq_(self.nw.filter_ports(2, 1, 'net1'), [])
+
+        # cached until a port of the dpid changes
+        cache = self.nw.get_flood_cache(1)
+        ok_((1, 'net1', None) in cache)
+        self.nw.create_port('net1', 2, 2)
+        ok_(self.nw.get_flood_cache(1) is cache)
+        self.nw.create_port('net1', 1, 6)
+        ok_(self.nw.get_flood_cache(1) is not cache)
+        eq_(self.nw.filter_ports(1, 1, 'net1'), [2, 3, 6])
+
+    def test_bond(self):
+        bonds = port_bond.PortBond(self.nw)
+        cache = self.nw.get_flood_cache(1)
+        bond_id = bonds.create_bond(1, 'net1')
+        ok_(self.nw.get_flood_cache(1) is not cache)
+        cache = self.nw.get_flood_cache(1)
+        bonds.add_port(bond_id, 2)
+        ok_(self.nw.get_flood_cache(1) is not cache)
+
+
+class Test_PortBond(unittest.TestCase):
+    """ Test case for port_bond.PortBond port selection
+    """
+
+    def setUp(self):
+        self.bonds = port_bond.PortBond()
+        self.bond_id = self.bonds.create_bond(1)
+        for port_no in (1, 2, 3):
+            self.bonds.add_port(self.bond_id, port_no)
+        self.keys = [('\x00\x00\x00\x00\x00%s' % chr(i), '\xff' * 6)
+                     for i in range(256)]
+
+    def _count(self):
+        counts = {}
+        for key in self.keys:
+            port_no = self.bonds.get_out_port(self.bond_id, key)
+            counts[port_no] = counts.get(port_no, 0) + 1
+        return counts
+
+    def test_hash(self):
+        key = self.keys[0]
+        port_no = self.bonds.get_out_port(self.bond_id, key)
+        eq_(self.bonds.get_out_port(self.bond_id, key), port_no)
+        eq_(sorted(self._count().keys()), [1, 2, 3])
+
+        # only the flows of the removed port move
+        before = dict((key, self.bonds.get_out_port(self.bond_id, key))
+                      for key in self.keys)
+        self.bonds.del_port(self.bond_id, 2)
+        for key in self.keys:
+            if before[key] != 2:
+                eq_(self.bonds.get_out_port(self.bond_id, key), before[key])
+
+    def test_weight(self):
+        self.bonds.set_weight(self.bond_id, 1, 0)
+        self.bonds.set_weight(self.bond_id, 3, 4)
+        counts = self._count()
+        ok_(1 not in counts)
+        ok_(counts[3] > counts[2] * 2)
+
+        self.bonds.set_weight(self.bond_id, 2, 0)
+        self.bonds.set_weight(self.bond_id, 3, 0)
+        eq_(self.bonds.get_out_port(self.bond_id, self.keys[0]), None)
+
+    def test_flow_key(self):
+        eth = '\xff' * 6 + '\x00\x00\x00\x00\x00\x01'
+        udp = ('\x45\x00\x00\x1c\x00\x00\x00\x00\x40\x11\x00\x00'
+               '\x0a\x00\x00\x01\x0a\x00\x00\x02' '\x00\x44\x00\x43')
+        data = eth + '\x08\x00' + udp
+        eq_(port_bond.flow_key(data, 'l2'), (eth[6:], eth[:6]))
+        eq_(port_bond.flow_key(data, 'l3'),
+            (eth[6:], eth[:6], '\x0a\x00\x00\x01', '\x0a\x00\x00\x02'))
+        eq_(port_bond.flow_key(data, 'l4'),
+            (eth[6:], eth[:6], '\x0a\x00\x00\x01', '\x0a\x00\x00\x02',
+             17, 68, 67))
+        vlan = eth + '\x81\x00\x00\x0a\x08\x00' + udp
+        eq_(port_bond.flow_key(vlan, 'l4'), port_bond.flow_key(data, 'l4'))
+        eq_(port_bond.flow_key(eth + '\x08\x06' + '\x00' * 28, 'l4'),
+            (eth[6:], eth[:6]))
+
+
+class Test_EdgeIsolationFlood(unittest.TestCase):
+    """ Test case for the bond ports of the floods of tr-edge-isolation
+    """
+
+    def setUp(self):
+        try:
+            # the module name isn't a python identifier
+            mod = imp.load_source(
+                'tr_edge_isolation',
+                os.path.join(os.path.dirname(ryu.app.__file__),
+                             'tr-edge-isolation.py'))
+        except ImportError, e:
+            raise SkipTest(e)
+
+        self.nw = network.Network()
+        self.nw.send_event_to_observers = lambda ev: None
+        self.nw.create_network('net1')
+        for port_no in (1, 2, 3, 4):
+            self.nw.create_port('net1', 1, port_no)
+        self.bonds = port_bond.PortBond(self.nw)
+        bond_id = self.bonds.create_bond(1, 'net1')
+        self.bonds.add_port(bond_id, 2)
+        self.bonds.add_port(bond_id, 3)
+
+        self.app = mod.SimpleIsolation.__new__(mod.SimpleIsolation)
+        self.app.nw = self.nw
+        self.app.port_bond = self.bonds
+
+    def _bond_port(self, key):
+        out_ports = self.app._get_all_out_ports(1, 1, 'net1', key=key)
+        eq_(sorted(p for p in out_ports if p not in (2, 3)), [4])
+        bond_ports = [p for p in out_ports if p in (2, 3)]
+        eq_(len(bond_ports), 1)
+        return bond_ports[0]
+
+    def test_flow_key(self):
+        keys = [('\x00\x00\x00\x00\x00%s' % chr(i), '\xff' * 6)
+                for i in range(64)]
+        ports = [self._bond_port(key) for key in keys]
+        eq_(sorted(set(ports)), [2, 3])
+        # the flood set is cached, but not the bond port
+        eq_([self._bond_port(key) for key in keys], ports)
+
+    def test_no_flow_key(self):
+        # round-robin
+        eq_(sorted([self._bond_port(None), self._bond_port(None)]), [2, 3])
+
+
+class _Datapath(object):
+    ofproto = ofproto_v1_0
+    ofproto_parser = ofproto_v1_0_parser
+
+    def __init__(self, id_):
+        super(_Datapath, self).__init__()
+        self.id = id_
+        self.flow_mods = []
+
+    def send_flow_mod(self, rule, command, actions=None, **kwargs):
+        out_ports = None
+        if actions is not None:
+            out_ports = sorted(action.port for action in actions)
+        self.flow_mods.append((command, rule.flow.in_port, out_ports))
+
+
+class _DPSet(object):
+    def __init__(self, datapath):
+        self.datapath = datapath
+
+    def get(self, dpid):
+        if dpid == self.datapath.id:
+            return self.datapath
+        return None
+
+
+class Test_SimpleIsolationFlood(unittest.TestCase):
+    """ Test case for the proactive flood flows of simple_isolation
+    """
+
+    def setUp(self):
+        cfg.CONF.set_override('proactive_flood', True)
+
+        self.nw = network.Network()
+        self.nw.send_event_to_observers = lambda ev: None
+        self.nw.create_network('net1')
+        self.nw.create_network('net2')
+        self.nw.create_network(NW_ID_EXTERNAL)
+        for nw_id, port_no in (('net1', 1), ('net1', 2), ('net2', 3),
+                               (NW_ID_EXTERNAL, 4)):
+            self.nw.create_port(nw_id, 1, port_no)
+        self.datapath = _Datapath(1)
+
+        self.app = simple_isolation.SimpleIsolation.__new__(
+            simple_isolation.SimpleIsolation)
+        self.app.nw = self.nw
+        self.app.dpset = _DPSet(self.datapath)
+
+    def tearDown(self):
+        cfg.CONF.clear_override('proactive_flood')
+
+    def _port_event(self, nw_id, port_no, add_del):
+        self.app.network_port_handler(
+            network.EventNetworkPort(nw_id, 1, port_no, add_del))
+        flow_mods = self.datapath.flow_mods
+        self.datapath.flow_mods = []
+        return sorted(flow_mods)
+
+    def test_add_port(self):
+        self.app._program_flood_flows(self.datapath)
+        add = ofproto_v1_0.OFPFC_ADD
+        eq_(sorted(self.datapath.flow_mods),
+            [(add, 1, [2, 4]), (add, 2, [1, 4]), (add, 3, [4])])
+        self.datapath.flow_mods = []
+
+        # only the flows of net1 are reinstalled
+        self.nw.create_port('net1', 1, 5)
+        eq_(self._port_event('net1', 5, True),
+            [(add, 1, [2, 4, 5]), (add, 2, [1, 4, 5]), (add, 5, [1, 2, 4])])
+
+        # an external port is flooded to from all the networks
+        self.nw.create_port(NW_ID_EXTERNAL, 1, 6)
+        eq_(self._port_event(NW_ID_EXTERNAL, 6, True),
+            [(add, 1, [2, 4, 5, 6]), (add, 2, [1, 4, 5, 6]),
+             (add, 3, [4, 6]), (add, 5, [1, 2, 4, 6])])
+
+    def test_remove_port(self):
+        add = ofproto_v1_0.OFPFC_ADD
+        delete = ofproto_v1_0.OFPFC_DELETE_STRICT
+        self.nw.remove_port('net1', 1, 2)
+        eq_(self._port_event('net1', 2, False),
+            [(add, 1, [4]), (delete, 2, None)])
+
+        self.nw.remove_port('net2', 1, 3)
+        eq_(self._port_event('net2', 3, False), [(delete, 3, None)])
+
+    def test_disabled(self):
+        cfg.CONF.set_override('proactive_flood', False)
+        self.nw.create_port('net1', 1, 5)
+        eq_(self._port_event('net1', 5, True), [])
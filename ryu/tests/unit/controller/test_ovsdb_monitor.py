@@ -0,0 +1,131 @@
+# Copyright (C) 2013 Nippon Telegraph and Telephone Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+import unittest
+import logging
+import gevent
+from nose.tools import *
+
+import ryu.contrib  # for oslo.config and ovs
+from ryu.controller import ovsdb_monitor
+from oslo.config import cfg
+
+LOG = logging.getLogger('test_ovsdb_monitor')
+
+
+def _iface(name, ofport=[], external_ids=None):
+    return {'name': name, 'ofport': ofport, 'type': '',
+            'external_ids': external_ids or {}, 'options': {}}
+
+
+class Test_diff_ifaces(unittest.TestCase):
+    """ Test case for ovsdb_monitor.diff_ifaces
+    """
+
+    dpid = 1
+
+    def _diff(self, old, new):
+        events = ovsdb_monitor.diff_ifaces(self.dpid, old, new)
+        return sorted((ev.__class__.__name__, ev.iface['name'])
+                      for ev in events)
+
+    def test_no_change(self):
+        ifaces = {'eth0': _iface('eth0', 1)}
+        eq_(self._diff(ifaces, dict(ifaces)), [])
+
+    def test_add_delete(self):
+        old = {'eth0': _iface('eth0', 1)}
+        new = {'eth1': _iface('eth1')}
+        eq_(self._diff(old, new), [('EventInterfaceAdd', 'eth1'),
+                                   ('EventInterfaceDelete', 'eth0')])
+
+    def test_add_with_ofport(self):
+        new = {'eth0': _iface('eth0', 3)}
+        eq_(self._diff({}, new), [('EventInterfaceAdd', 'eth0'),
+                                  ('EventOFPortAssigned', 'eth0')])
+
+    def test_ofport_assigned(self):
+        old = {'eth0': _iface('eth0')}
+        for ofport in ([], -1):
+            new = {'eth0': _iface('eth0', ofport)}
+            eq_(self._diff(old, new), [])
+        new = {'eth0': _iface('eth0', 2)}
+        eq_(self._diff(old, new), [('EventOFPortAssigned', 'eth0')])
+
+    def test_external_ids_changed(self):
+        old = {'eth0': _iface('eth0', 1, {'iface-id': 'a'})}
+        new = {'eth0': _iface('eth0', 1, {'iface-id': 'b'})}
+        events = ovsdb_monitor.diff_ifaces(self.dpid, old, new)
+        eq_(len(events), 1)
+        ev = events[0]
+        ok_(isinstance(ev, ovsdb_monitor.EventExternalIdsChanged))
+        eq_(ev.dpid, self.dpid)
+        eq_(ev.old_external_ids, {'iface-id': 'a'})
+        eq_(ev.iface['external_ids'], {'iface-id': 'b'})
+
+    def test_external_ids_unassigned_ofport(self):
+        # reported by EventOFPortAssigned once the ofport is assigned
+        old = {'eth0': _iface('eth0', [], {'iface-id': 'a'})}
+        new = {'eth0': _iface('eth0', [], {'iface-id': 'b'})}
+        eq_(self._diff(old, new), [])
+        old = new
+        new = {'eth0': _iface('eth0', 3, {'iface-id': 'b'})}
+        eq_(self._diff(old, new), [('EventOFPortAssigned', 'eth0')])
+
+
+class _Idl(object):
+    closed = 0
+
+    def close(self):
+        self.closed += 1
+
+
+class _MonitorSession(ovsdb_monitor._MonitorSession):
+    def __init__(self, *args):
+        self.idls = []
+        super(_MonitorSession, self).__init__(*args)
+
+    def _create_idl(self):
+        self.idls.append(_Idl())
+        return self.idls[-1]
+
+    def _monitor(self, idl_):
+        if len(self.idls) == 1:
+            raise ValueError('broken update')
+        gevent.sleep(10)
+
+
+class Test_MonitorSession(unittest.TestCase):
+    """ Test case for ovsdb_monitor._MonitorSession
+    """
+
+    def setUp(self):
+        cfg.CONF.set_override('ovsdb_monitor_retry_interval', 0)
+
+    def tearDown(self):
+        cfg.CONF.clear_override('ovsdb_monitor_retry_interval')
+
+    def test_monitor_error(self):
+        session = _MonitorSession(None, 1, 'tcp:127.0.0.1:6632')
+        gevent.sleep(0.01)
+        try:
+            # the session reconnects instead of ending
+            eq_(len(session.idls), 2)
+            eq_(session.idls[0].closed, 1)
+            ok_(not session.thread.dead)
+        finally:
+            session.close()
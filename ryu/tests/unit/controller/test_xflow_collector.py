@@ -0,0 +1,51 @@
+# Copyright (C) 2013 Nippon Telegraph and Telephone Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+import unittest
+import logging
+from nose.tools import *
+
+import ryu.contrib  # for oslo.config
+from ryu.controller import xflow_collector
+
+LOG = logging.getLogger('test_xflow_collector')
+
+
+class Test_FlowTable(unittest.TestCase):
+    """ Test case for xflow_collector.FlowTable
+    """
+
+    def test_top_talkers(self):
+        table = xflow_collector.FlowTable()
+        table.add('10.0.0.1', (1, 1, 1, 2), (10, 11, 10, 10),
+                  (20, 20, 20, 20), (100, 300, 50, 1), (1, 3, 1, 1))
+        table.add('10.0.0.1', (1,), (12,), (20,), (10,), (2,), scale=2)
+        eq_(table.flows, 5)
+        eq_(table.top_talkers(2),
+            {('10.0.0.1', 1): [(11, 20, 300, 3), (10, 20, 150, 2)],
+             ('10.0.0.1', 2): [(10, 20, 1, 1)]})
+
+    def test_ipv4_addrs(self):
+        ip = '\x45' + '\x00' * 11 + '\x0a\x00\x00\x01\x0a\x00\x00\x02'
+        eth = '\x00' * 12
+        eq_(xflow_collector._ipv4_addrs(eth + '\x08\x00' + ip),
+            (0x0a000001, 0x0a000002))
+        eq_(xflow_collector._ipv4_addrs(eth + '\x81\x00\x00\x01\x08\x00' +
+                                        ip),
+            (0x0a000001, 0x0a000002))
+        eq_(xflow_collector._ipv4_addrs(eth + '\x08\x06' + ip), None)
+        eq_(xflow_collector._ipv4_addrs(eth + '\x08\x00' + ip[:10]), None)
@@ -0,0 +1,113 @@
+# Copyright (C) 2013 Nippon Telegraph and Telephone Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+import unittest
+import logging
+from nose.tools import *
+
+from ryu.lib import event_export
+from ryu.lib.mac import haddr_to_bin
+
+LOG = logging.getLogger('test_event_export')
+
+
+class Test_event_export(unittest.TestCase):
+    """ Test case for event_export
+    """
+
+    src = haddr_to_bin('00:00:00:00:00:01')
+    dst = haddr_to_bin('ff:ff:ff:ff:ff:ff')
+    arp = ('\x00\x01\x08\x00\x06\x04\x00\x01' + src + '\x0a\x00\x00\x01' +
+           '\x00' * 6 + '\x0a\x00\x00\x02')
+
+    def _records(self):
+        return [
+            event_export.encode_packet_in(
+                0x123456789, 7, 3, self.dst + self.src + '\x08\x06' +
+                self.arp + '\x00' * 18),
+            event_export.encode_packet_in(
+                1, 0xffffffff, 2, self.dst + self.src + '\x08\x00' +
+                '\x45' + '\x00' * 19),
+            event_export.encode_port_status(2, 1, 5),
+            event_export.encode_features_reply(3, [1, 2, 0xfffe]),
+        ]
+
+    def _check(self, events):
+        eq_(len(events), 4)
+        eq_(events[0]['event'], event_export.EVENT_PACKET_IN)
+        eq_(events[0]['datapath_id'], 0x123456789)
+        eq_(events[0]['buffer_id'], 7)
+        eq_(events[0]['in_port'], 3)
+        eq_(events[0]['dl_src'], self.src)
+        eq_(events[0]['dl_dst'], self.dst)
+        eq_(events[0]['eth_type'], 0x0806)
+        eq_(events[0]['arp_oper'], 1)
+        eq_(events[0]['arp_sha'], self.src)
+        eq_(events[0]['arp_tpa'], '\x0a\x00\x00\x02')
+        eq_(events[1]['eth_type'], 0x0800)
+        ok_('arp_oper' not in events[1])
+        eq_(events[2], {'event': event_export.EVENT_PORT_STATUS,
+                        'datapath_id': 2, 'reason': 1, 'port': 5})
+        eq_(events[3], {'event': event_export.EVENT_FEATURES_REPLY,
+                        'datapath_id': 3, 'ports': [1, 2, 0xfffe]})
+
+    def test_decode(self):
+        records = self._records()
+        # only the headers of the packet are kept
+        eq_(len(records[1]), 18 + 14)
+        self._check(event_export.decode(event_export.join(records)))
+
+    def test_stream(self):
+        buf = event_export.join(self._records())
+        decoder = event_export.Decoder()
+        events = []
+        for i in range(0, len(buf), 5):
+            events.extend(decoder.feed(buf[i:i + 5]))
+        self._check(events)
+        eq_(decoder.buf, '')
+
+    def test_short_packet(self):
+        record = event_export.encode_packet_in(1, 2, 3, '\x01' * 10)
+        eq_(len(record), 18 + 14)
+        events = event_export.decode(event_export.join(
+            [record, event_export.encode_port_status(1, 0, 5)]))
+        eq_(len(events), 2)
+        eq_(events[0]['dl_dst'], '\x01' * 6)
+        eq_(events[0]['dl_src'], '\x01' * 4 + '\x00' * 2)
+        eq_(events[0]['eth_type'], 0)
+        eq_(events[1]['port'], 5)
+
+    @raises(event_export.DecodeError)
+    def test_short_packet_in_record(self):
+        # the length field says 10 bytes of an Ethernet header
+        record = event_export.encode_packet_in(1, 2, 3, '\x00' * 14)
+        event_export.decode('\x00\x1c' + record[2:-4])
+
+    @raises(event_export.DecodeError)
+    def test_short_features_reply_record(self):
+        # 3 ports are claimed, 2 are there
+        record = event_export.encode_features_reply(1, [1, 2, 3])
+        event_export.decode('\x00\x12' + record[2:-2] +
+                            event_export.encode_port_status(1, 0, 5))
+
+    @raises(event_export.DecodeError)
+    def test_truncated(self):
+        event_export.decode(event_export.join(self._records())[:-1])
+
+    @raises(event_export.DecodeError)
+    def test_unknown_event(self):
+        event_export.decode('\x00\x10\x01\x63' + '\x00' * 12)
@@ -0,0 +1,323 @@
+# Copyright (C) 2013 Nippon Telegraph and Telephone Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+import unittest
+import logging
+import json
+import struct
+import gevent
+from nose.tools import *
+
+from ryu.exception import OFPStatsTimeout
+from ryu.lib import ofctl_utils
+from ryu.lib import ofctl_v1_0
+from ryu.lib import ofctl_v1_3
+from ryu.ofproto import ofproto_v1_0
+from ryu.ofproto import ofproto_v1_0_parser
+from ryu.ofproto import ofproto_v1_3
+from ryu.ofproto import ofproto_v1_3_parser
+
+LOG = logging.getLogger('test_ofctl')
+
+
+class _Datapath(object):
+    """
+    Answer a stats request with the raw reply given, parsed by the
+    parser of the version.
+    """
+    id = 1
+
+    def __init__(self, ofproto, ofproto_parser, reply_body=None):
+        self.ofproto = ofproto
+        self.ofproto_parser = ofproto_parser
+        self.reply_body = reply_body
+        self.waiters = {}
+        self.sent = []
+
+    def set_xid(self, msg):
+        msg.xid = len(self.sent) + 1
+
+    def send_msg(self, msg):
+        msg.serialize()
+        self.sent.append(msg)
+        if self.reply_body is None:
+            return
+        stats_type, = struct.unpack_from('!H', str(msg.buf),
+                                         self.ofproto.OFP_HEADER_SIZE)
+        buf = struct.pack(self.ofproto.OFP_MULTIPART_REPLY_PACK_STR,
+                          stats_type, 0) + self.reply_body
+        msg_len = self.ofproto.OFP_HEADER_SIZE + len(buf)
+        buf = struct.pack(self.ofproto.OFP_HEADER_PACK_STR,
+                          self.ofproto.OFP_VERSION,
+                          self.ofproto.OFPT_MULTIPART_REPLY,
+                          msg_len, msg.xid) + buf
+        reply = self.ofproto_parser.msg_parser(
+            self, self.ofproto.OFP_VERSION,
+            self.ofproto.OFPT_MULTIPART_REPLY, msg_len, msg.xid, buf)
+        lock, msgs = self.waiters[self.id][msg.xid]
+        msgs.append(reply)
+        lock.set()
+
+
+class _Msg(object):
+    def __init__(self, body):
+        self.body = body
+
+
+class _MultipartDatapath(object):
+    """
+    Answer a stats request with a reply of each of the bodies given,
+    one by one from another thread.
+    """
+    id = 1
+
+    def __init__(self, bodies, last=True):
+        self.bodies = bodies
+        self.last = last
+        self.waiters = {}
+
+    def set_xid(self, msg):
+        msg.xid = 1
+
+    def send_msg(self, msg):
+        gevent.spawn(self._reply, msg.xid)
+
+    def _reply(self, xid):
+        lock, msgs = self.waiters[self.id][xid]
+        for body in self.bodies:
+            gevent.sleep(0)
+            msgs.append(_Msg(body))
+        if self.last:
+            lock.set()
+
+
+class _Request(object):
+    xid = None
+
+
+class Test_ofctl_utils(unittest.TestCase):
+    """ Test case for ofctl_utils streaming
+    """
+
+    def test_iter_stats(self):
+        dp = _MultipartDatapath([[1, 2], [], [3]])
+        stats = ofctl_utils.iter_stats(dp, _Request(), dp.waiters)
+        eq_(dp.waiters, {})
+        eq_(list(stats), [1, 2, 3])
+        eq_(dp.waiters, {1: {}})
+
+    def test_iter_stats_timeout(self):
+        dp = _MultipartDatapath([[1], [2]], last=False)
+        stats = ofctl_utils.iter_stats(dp, _Request(), dp.waiters, 0.01)
+        eq_(stats.next(), 1)
+        eq_(stats.next(), 2)
+        assert_raises(OFPStatsTimeout, stats.next)
+        eq_(dp.waiters, {1: {}})
+
+    def test_iter_stats_no_reply(self):
+        dp = _MultipartDatapath([], last=False)
+        stats = ofctl_utils.iter_stats(dp, _Request(), dp.waiters, 0.01)
+        eq_(list(stats), [])
+        eq_(dp.waiters, {1: {}})
+
+    def test_iter_stats_close(self):
+        dp = _MultipartDatapath([[1, 2], [3]])
+        stats = ofctl_utils.iter_stats(dp, _Request(), dp.waiters)
+        eq_(stats.next(), 1)
+        stats.close()
+        eq_(dp.waiters, {1: {}})
+
+    def test_page(self):
+        entries = [5, 1, 4, 2, 3, 9, 7]
+        key = lambda entry: entry
+        eq_(list(ofctl_utils.page(entries, key)), entries)
+        eq_(list(ofctl_utils.page(entries, key, after=4)), [5, 9, 7])
+        eq_(list(ofctl_utils.page(entries, key, limit=3)), [1, 2, 3])
+        eq_(list(ofctl_utils.page(entries, key, 3, 3)), [4, 5, 7])
+        eq_(list(ofctl_utils.page(entries, key, 7, 3)), [9])
+        eq_(list(ofctl_utils.page(entries, key, 9, 3)), [])
+
+    def test_page_same_key(self):
+        entries = [(2, 'a'), (1, 'b'), (2, 'c'), (3, 'd'), (2, 'e')]
+        key = lambda entry: entry[0]
+        eq_(list(ofctl_utils.page(entries, key, limit=2)),
+            [(1, 'b'), (2, 'a'), (2, 'c'), (2, 'e')])
+        eq_(list(ofctl_utils.page(entries, key, 2, 2)), [(3, 'd')])
+
+    def test_iter_json(self):
+        obj = ofctl_utils.StreamedDict(
+            [(1, ofctl_utils.StreamedList(iter(range(100)))),
+             ('b', {'c': [1, None]}),
+             ('d', ofctl_utils.StreamedDict(iter([]))),
+             ('e', ofctl_utils.StreamedList([]))])
+        chunks = list(ofctl_utils.iter_json(obj, 16))
+        ok_(len(chunks) > 1)
+        eq_(json.loads(''.join(chunks)),
+            {'1': range(100), 'b': {'c': [1, None]}, 'd': {}, 'e': []})
+
+
+class Test_Converter(unittest.TestCase):
+    """ Test case for ofctl_utils.Converter
+    """
+
+    def test_convert(self):
+        calls = []
+        converter = ofctl_utils.Converter({
+            'a': lambda value, attrs, out: out.append(('a', value)),
+            'b': lambda value, attrs, out: out.append(('b', attrs['a']))})
+        converter({'a': 1, 'b': 2, 'c': 3}, calls)
+        eq_(sorted(calls), [('a', 1), ('b', 1)])
+        eq_(len(converter.cache), 1)
+        converter({'b': 5, 'a': 4, 'c': 6}, calls)
+        eq_(len(converter.cache), 1)
+        eq_(sorted(calls[2:]), [('a', 4), ('b', 4)])
+
+    def test_ipv4(self):
+        eq_(ofctl_utils.to_ipv4_masked('10.0.0.0/8'),
+            (0x0a000000, 0xff000000))
+        eq_(ofctl_utils.to_ipv4_masked('10.0.0.1'),
+            (0x0a000001, 0xffffffff))
+        eq_(ofctl_utils.ipv4_masked_to_str(0x0a000000, 0xff000000),
+            '10.0.0.0/8')
+        eq_(ofctl_utils.ipv4_masked_to_str(0x0a000001), '10.0.0.1')
+
+
+class Test_ofctl_v1_0(unittest.TestCase):
+    """ Test case for ofctl_v1_0
+    """
+
+    def test_to_match(self):
+        dp = _Datapath(ofproto_v1_0, ofproto_v1_0_parser)
+        match = ofctl_v1_0.to_match(dp, {'in_port': 1, 'dl_type': 0x800,
+                                         'nw_src': '10.0.0.0/8',
+                                         'tp_dst': 80})
+        ofp = ofproto_v1_0
+        wildcards = (ofp.OFPFW_ALL & ~ofp.OFPFW_IN_PORT & ~ofp.OFPFW_DL_TYPE &
+                     ~ofp.OFPFW_TP_DST & ~ofp.OFPFW_NW_SRC_MASK |
+                     24 << ofp.OFPFW_NW_SRC_SHIFT)
+        eq_(match.wildcards, wildcards)
+        eq_(match.in_port, 1)
+        eq_(match.dl_type, 0x800)
+        eq_(match.nw_src, 0x0a000000)
+        eq_(match.tp_dst, 80)
+        eq_(ofctl_v1_0.match_to_str(match)['nw_src'], '10.0.0.0/8')
+
+    def test_actions(self):
+        dp = _Datapath(ofproto_v1_0, ofproto_v1_0_parser)
+        actions = ofctl_v1_0.to_actions(dp, [
+            {'type': 'SET_VLAN_VID', 'vlan_vid': 3},
+            {'type': 'UNKNOWN'},
+            {'type': 'OUTPUT', 'port': 2}])
+        eq_(ofctl_v1_0.actions_to_str(actions),
+            ['SET_VLAN_VID:3', 'OUTPUT:2'])
+
+
+class Test_ofctl_v1_3(unittest.TestCase):
+    """ Test case for ofctl_v1_3
+    """
+
+    def test_flow_round_trip(self):
+        ofp = ofproto_v1_3
+        dp = _Datapath(ofp, ofproto_v1_3_parser)
+        attrs = {'in_port': 1, 'dl_type': 0x800, 'nw_src': '10.0.0.0/8',
+                 'nw_dst': '10.0.0.1', 'nw_proto': 17, 'tp_dst': 53,
+                 'dl_src': '00:11:22:33:44:55', 'metadata': '0x10/0xff'}
+        match = ofctl_v1_3.to_match(dp, attrs)
+        inst = ofctl_v1_3.to_actions(dp, [
+            {'type': 'OUTPUT', 'port': 2},
+            {'type': 'SET_FIELD', 'field': 'dl_dst',
+             'value': '00:00:00:00:00:01'},
+            {'type': 'GROUP', 'group_id': 3},
+            {'type': 'GOTO_TABLE', 'table_id': 2}])
+        flow_mod = dp.ofproto_parser.OFPFlowMod(
+            dp, 0, 0, 0, ofp.OFPFC_ADD, 0, 0, 10, ofp.OFP_NO_BUFFER,
+            ofp.OFPP_ANY, ofp.OFPG_ANY, 0, match, inst)
+        flow_mod.xid = 1
+        flow_mod.serialize()
+
+        # a flow stats entry of the match and the instructions
+        body = str(flow_mod.buf)[ofp.OFP_FLOW_MOD_SIZE - ofp.OFP_MATCH_SIZE:]
+        length = struct.calcsize(ofp.OFP_FLOW_STATS_0_PACK_STR) + len(body)
+        entry = struct.pack(ofp.OFP_FLOW_STATS_0_PACK_STR, length, 0, 1, 2,
+                            10, 0, 0, 0, 0, 5, 500) + body
+        dp.reply_body = entry
+        flows = ofctl_v1_3.get_flow_stats(dp, dp.waiters)['1']
+        eq_(len(flows), 1)
+        eq_(flows[0]['match'], attrs)
+        eq_(flows[0]['actions'],
+            ['OUTPUT:2', 'SET_FIELD:{dl_dst:00:00:00:00:00:01}', 'GROUP:3',
+             'GOTO_TABLE:2'])
+        eq_(flows[0]['byte_count'], 500)
+
+    def test_set_field_to_str(self):
+        p = ofproto_v1_3_parser
+        ofp = ofproto_v1_3
+        sha = '\x00\x11\x22\x33\x44\x55'
+        inst = [p.OFPInstructionActions(ofp.OFPIT_APPLY_ACTIONS, [
+            p.OFPActionSetField(p.OFPMatchField.make(ofp.OXM_OF_ARP_OP, 2)),
+            p.OFPActionSetField(p.OFPMatchField.make(ofp.OXM_OF_ARP_SHA,
+                                                     sha)),
+            p.OFPActionSetField(p.OFPMatchField.make(ofp.OXM_OF_IN_PORT,
+                                                     3))])]
+        eq_(ofctl_v1_3.actions_to_str(inst),
+            ['SET_FIELD:{0x%08x:2}' % ofp.OXM_OF_ARP_OP,
+             'SET_FIELD:{0x%08x:0x001122334455}' % ofp.OXM_OF_ARP_SHA,
+             'SET_FIELD:{in_port:3}'])
+
+    @raises(ValueError)
+    def test_set_field_unknown(self):
+        dp = _Datapath(ofproto_v1_3, ofproto_v1_3_parser)
+        ofctl_v1_3.to_actions(dp, [{'type': 'SET_FIELD', 'field': 'arp_op',
+                                    'value': 2}])
+
+    def test_group_stats(self):
+        ofp = ofproto_v1_3
+        bucket = struct.pack(ofp.OFP_BUCKET_COUNTER_PACK_STR, 1, 100)
+        body = ''
+        for group_id in (1, 2):
+            body += struct.pack(ofp.OFP_GROUP_STATS_PACK_STR,
+                                ofp.OFP_GROUP_STATS_SIZE + len(bucket),
+                                group_id, 1, 10, 1000, 3, 0) + bucket
+        dp = _Datapath(ofp, ofproto_v1_3_parser, body)
+        groups = ofctl_v1_3.get_group_stats(dp, dp.waiters)['1']
+        eq_([g['group_id'] for g in groups], [1, 2])
+        eq_(groups[0]['byte_count'], 1000)
+
+    def test_meter_stats(self):
+        ofp = ofproto_v1_3
+        band = struct.pack(ofp.OFP_METER_BAND_STATS_PACK_STR, 2, 200)
+        body = struct.pack(ofp.OFP_METER_STATS_PACK_STR, 5,
+                           ofp.OFP_METER_STATS_SIZE + len(band),
+                           1, 10, 1000, 3, 0) + band
+        dp = _Datapath(ofp, ofproto_v1_3_parser, body)
+        meters = ofctl_v1_3.get_meter_stats(dp, dp.waiters)['1']
+        eq_(len(meters), 1)
+        eq_(meters[0]['meter_id'], 5)
+        eq_(meters[0]['band_stats'],
+            [{'packet_band_count': 2, 'byte_band_count': 200}])
+
+    def test_flow_stats_request(self):
+        dp = _Datapath(ofproto_v1_3, ofproto_v1_3_parser, '')
+        stats = ofctl_v1_3.flow_stats_request(dp)
+        eq_(list(ofctl_utils.iter_stats(dp, stats, dp.waiters)), [])
+        eq_(len(dp.sent), 1)
+        eq_(dp.waiters, {1: {}})
+
+    def test_timeout(self):
+        dp = _Datapath(ofproto_v1_3, ofproto_v1_3_parser)
+        eq_(ofctl_v1_3.get_port_stats(dp, dp.waiters, 0.01), {'1': []})
+        eq_(dp.waiters, {1: {}})
@@ -0,0 +1,79 @@
+# Copyright (C) 2013 Nippon Telegraph and Telephone Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+import os
+import shutil
+import tempfile
+import unittest
+import logging
+from nose.tools import *
+
+from ryu.lib import ofp_capture
+
+LOG = logging.getLogger('test_ofp_capture')
+
+
+class Test_ofp_capture(unittest.TestCase):
+    """ Test case for ryu.lib.ofp_capture
+    """
+
+    records = [
+        (1.5, ofp_capture.RECV, '\x01\x00\x00\x08\x00\x00\x00\x01'),
+        (2.25, ofp_capture.SEND, '\x01\x05\x00\x08\x00\x00\x00\x02'),
+        (3.0, ofp_capture.RECV, '\x01\x06\x00\x0a\x00\x00\x00\x02ab'),
+    ]
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'test.ofcap')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _write(self, records):
+        writer = ofp_capture.CaptureWriter(self.path)
+        for timestamp, direction, buf in records:
+            writer.write(direction, bytearray(buf), timestamp)
+        writer.close()
+
+    def _read(self):
+        reader = ofp_capture.CaptureReader(self.path)
+        try:
+            return list(reader)
+        finally:
+            reader.close()
+
+    def test_write_read(self):
+        self._write(self.records)
+        eq_(self._read(), self.records)
+
+    def test_append(self):
+        self._write(self.records[:1])
+        self._write(self.records[1:])
+        eq_(self._read(), self.records)
+
+    def test_truncated(self):
+        self._write(self.records)
+        with open(self.path, 'r+b') as f:
+            f.truncate(os.path.getsize(self.path) - 1)
+        eq_(self._read(), self.records[:-1])
+
+    @raises(ValueError)
+    def test_not_capture(self):
+        with open(self.path, 'wb') as f:
+            f.write('\xd4\xc3\xb2\xa1' + '\x00' * 20)
+        ofp_capture.CaptureReader(self.path)
@@ -0,0 +1,129 @@
+# Copyright (C) 2013 Nippon Telegraph and Telephone Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+import unittest
+import logging
+from nose.tools import *
+
+import ryu.contrib  # for oslo.config and ovs
+from ryu.lib.ovs import bridge
+
+LOG = logging.getLogger('test_ovs_bridge')
+
+
+def _iface(name, ofport, type_='', external_ids=None, options=None):
+    return {'name': name, 'ofport': ofport, 'type': type_,
+            'external_ids': external_ids or {}, 'options': options or {}}
+
+
+class _VSCtl(object):
+    """Keeps the commands run, and answers list-ifaces-verbose."""
+    def __init__(self, ifaces):
+        self.ifaces = ifaces
+        self.runs = []
+
+    def run_command(self, commands, timeout=None, exception=None):
+        self.runs.append([(command.command, tuple(command.args))
+                          for command in commands])
+        for command in commands:
+            if command.command == 'list-ifaces-verbose':
+                command.result = self.ifaces
+
+
+class Test_OVSBridge(unittest.TestCase):
+    """ Test case for bridge.OVSBridge
+    """
+
+    ifaces = [
+        _iface('br0', 65534),
+        _iface('vif1', 1, external_ids={'iface-id': 'uuid1',
+                                        'attached-mac': 'fa:16:3e:00:00:01'}),
+        _iface('eth0', 2),
+        _iface('gre1', 3, 'gre', options={'local_ip': '10.0.0.1',
+                                          'remote_ip': '10.0.0.2'}),
+        # not assigned yet, or failed
+        _iface('new', []),
+        _iface('bad', -1),
+    ]
+
+    def setUp(self):
+        self.br = bridge.OVSBridge(1, 'tcp:127.0.0.1:6632')
+        self.br.br_name = 'br0'
+        self.vsctl = _VSCtl(self.ifaces)
+        self.br.vsctl = self.vsctl
+
+    def test_transaction(self):
+        with self.br.transaction():
+            self.br.set_db_attribute('Port', 'eth0', 'tag', 2)
+            with self.br.transaction():
+                self.br.del_port('gre1')
+            # the nested one doesn't commit
+            eq_(self.vsctl.runs, [])
+            self.br.add_gre_port('gre2', '10.0.0.1', '10.0.0.3')
+        eq_(len(self.vsctl.runs), 1)
+        eq_([command for command, _args in self.vsctl.runs[0]],
+            ['set', 'del-port', 'add-port', 'set'])
+
+        # out of a transaction, a command is run at once
+        self.br.del_port('gre2')
+        eq_(self.vsctl.runs[1], [('del-port', ('br0', 'gre2'))])
+
+    def test_transaction_query(self):
+        with self.br.transaction():
+            self.br.del_port('eth0')
+            # run at once, before the queued modification
+            eq_(len(self.br.get_ifaces()), len(self.ifaces))
+            eq_(len(self.vsctl.runs), 1)
+        eq_(self.vsctl.runs[1], [('del-port', ('br0', 'eth0'))])
+
+    def test_transaction_error(self):
+        try:
+            with self.br.transaction():
+                self.br.del_port('eth0')
+                raise ValueError('bad port')
+        except ValueError:
+            pass
+        # the queued commands are dropped
+        eq_(self.vsctl.runs, [])
+        self.br.del_port('eth1')
+        eq_(self.vsctl.runs, [[('del-port', ('br0', 'eth1'))]])
+
+    def test_get_ifaces(self):
+        eq_(self.br.get_ifaces(), self.ifaces)
+        eq_(self.br.get_ifaces('gre1'), self.ifaces)
+        eq_(self.vsctl.runs,
+            [[('list-ifaces-verbose', ('0000000000000001', ))],
+             [('list-ifaces-verbose', ('0000000000000001', 'gre1'))]])
+
+    def test_vif_ports(self):
+        ports = self.br.get_vif_ports()
+        eq_([(port.port_name, port.ofport, port.vif_id, port.vif_mac)
+             for port in ports],
+            [('vif1', 1, 'uuid1', 'fa:16:3e:00:00:01')])
+        ok_(ports[0].switch is self.br)
+
+    def test_external_ports(self):
+        eq_([(port.port_name, port.ofport)
+             for port in self.br.get_external_ports()],
+            [('eth0', 2)])
+
+    def test_tunnel_ports(self):
+        eq_(self.br.get_tunnel_ports(),
+            [bridge.TunnelPort('gre1', 3, 'gre', '10.0.0.1', '10.0.0.2')])
+        eq_(self.br.get_tunnel_ports('vxlan'), [])
+        # the only query run per listing
+        eq_(len(self.vsctl.runs), 2)
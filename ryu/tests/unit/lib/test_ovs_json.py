@@ -0,0 +1,71 @@
+# Copyright (C) 2013 Nippon Telegraph and Telephone Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+import unittest
+import logging
+from nose.tools import *
+
+import ryu.contrib  # for ovs
+import ovs.json
+
+LOG = logging.getLogger('test_ovs_json')
+
+
+def _parse(parser, s, chunk_size):
+    consumed = 0
+    while not parser.is_done() and consumed < len(s):
+        consumed += parser.feed(s[consumed:consumed + chunk_size])
+    return consumed, parser.finish()
+
+
+class Test_FastParser(unittest.TestCase):
+    """ Test case for ovs.json.FastParser
+    """
+
+    texts = [
+        '{"id":0,"result":{"Bridge":{"a":{"new":{"name":"br0"}}}}}',
+        ' [1, -2.5, true, false, null, "x", [], {}]',
+        '{"s":"quote\\" brace} bracket] \\\\","u":"\\u00e9"}',
+        '{"nested":[[[{"a":[1,2,{"b":"]"}]}]]]}',
+    ]
+
+    def test_same_as_parser(self):
+        for s in self.texts:
+            for chunk_size in (1, 2, 7, len(s)):
+                eq_(_parse(ovs.json.FastParser(), s, chunk_size),
+                    _parse(ovs.json.Parser(), s, chunk_size))
+
+    def test_stream(self):
+        s = '{"id":1} {"id":2}'
+        parser = ovs.json.FastParser()
+        consumed = parser.feed(s)
+        eq_(consumed, len('{"id":1}'))
+        ok_(parser.is_done())
+        eq_(parser.finish(), {'id': 1})
+
+        parser = ovs.json.FastParser()
+        eq_(_parse(parser, s[consumed:], 3), (9, {'id': 2}))
+
+    def test_error(self):
+        # the consumed length doesn't matter after an error
+        for s in ('{"a":1,}', '{"a":NaN}', '{"a":1', '"scalar"'):
+            eq_(_parse(ovs.json.FastParser(), s, len(s))[1],
+                _parse(ovs.json.Parser(), s, len(s))[1])
+
+    def test_to_string_fast(self):
+        obj = {u'method': u'transact', u'params': [u'Open_vSwitch', 1, None]}
+        eq_(ovs.json.from_string(ovs.json.to_string_fast(obj)), obj)
@@ -0,0 +1,115 @@
+# Copyright (C) 2013 Nippon Telegraph and Telephone Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+import logging
+from StringIO import StringIO
+from nose.tools import *
+
+from ryu.lib import pcap
+from ryu.lib.packet import ethernet
+
+LOG = logging.getLogger('test_pcap')
+
+
+class Test_pcap(unittest.TestCase):
+    """ Test case for ryu.lib.pcap
+    """
+
+    frame = ('\xff\xff\xff\xff\xff\xff' + '\x02\x00\x00\x00\x00\x01' +
+             '\x08\x06' + '\x00' * 28)
+    records = [
+        (1365000000.25, frame),
+        (1365000001.5, frame[:15]),
+        (1365000002.125, 'x' * 100),
+    ]
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'test.pcap')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _write(self, writer):
+        for timestamp, buf in self.records:
+            writer.write(buf, timestamp)
+        writer.close()
+
+    def _read(self, f=None):
+        reader = pcap.Reader(f or self.path)
+        try:
+            return reader.format, list(reader)
+        finally:
+            reader.close()
+
+    def test_pcap(self):
+        self._write(pcap.Writer(self.path))
+        eq_(self._read(), ('pcap', self.records))
+
+    def test_pcap_nsec(self):
+        self._write(pcap.Writer(self.path, nsec=True))
+        eq_(self._read(), ('pcap', self.records))
+
+    def test_pcapng(self):
+        self._write(pcap.NgWriter(self.path))
+        eq_(self._read(), ('pcapng', self.records))
+
+    def test_snaplen(self):
+        self._write(pcap.Writer(self.path, snaplen=16))
+        eq_(self._read()[1], [(timestamp, buf[:16])
+                              for timestamp, buf in self.records])
+
+    def test_big_endian(self):
+        buf = (struct.pack('>IHHiIII', pcap.PCAP_MAGIC, 2, 4, 0, 0, 65535,
+                           pcap.LINKTYPE_ETHERNET) +
+               struct.pack('>IIII', 1, 500000, 3, 3) + 'abc')
+        eq_(self._read(StringIO(buf)), ('pcap', [(1.5, 'abc')]))
+
+    def test_truncated(self):
+        self._write(pcap.Writer(self.path))
+        with open(self.path, 'r+b') as f:
+            f.truncate(os.path.getsize(self.path) - 1)
+        eq_(self._read()[1], self.records[:-1])
+
+    def test_buffered(self):
+        writer = pcap.Writer(self.path, buffer_size=1000, flush_interval=60)
+        writer.write(self.frame)
+        eq_(os.path.getsize(self.path), 0)
+        for _i in range(30):
+            writer.write(self.frame)
+        ok_(os.path.getsize(self.path) > 0)
+        writer.close()
+        eq_(len(self._read()[1]), 31)
+
+    def test_packets(self):
+        self._write(pcap.Writer(self.path))
+        reader = pcap.Reader(self.path)
+        timestamp, pkt = reader.packets().next()
+        reader.close()
+        eq_(timestamp, self.records[0][0])
+        eth = pkt.protocols[0]
+        ok_(isinstance(eth, ethernet.ethernet))
+        eq_(eth.ethertype, 0x0806)
+
+    @raises(ValueError)
+    def test_not_pcap(self):
+        pcap.Reader(StringIO('RYUOFCAP\x00\x00\x00\x01'))
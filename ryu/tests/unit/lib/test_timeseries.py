@@ -0,0 +1,64 @@
+# Copyright (C) 2013 Nippon Telegraph and Telephone Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+import unittest
+import logging
+from nose.tools import *
+
+from ryu.lib.timeseries import CounterSeries
+
+LOG = logging.getLogger('test_timeseries')
+
+
+class Test_CounterSeries(unittest.TestCase):
+    """ Test case for timeseries.CounterSeries
+    """
+
+    def test_empty(self):
+        series = CounterSeries(('bytes', 'packets'), 4)
+        eq_(len(series), 0)
+        eq_(series.latest(), None)
+        eq_(series.last_time, None)
+        eq_(series.rate('bytes'), None)
+        series.append(1.0, (100, 1))
+        eq_(series.rate('bytes'), None)
+
+    def test_ring(self):
+        series = CounterSeries(('bytes', 'packets'), 3)
+        for i in range(5):
+            series.append(float(i), (i * 100, i))
+        eq_(len(series), 3)
+        eq_(series.last_time, 4.0)
+        eq_(series.latest(), {'bytes': 400, 'packets': 4})
+        eq_([t for t, _values in series.samples()], [2.0, 3.0, 4.0])
+        eq_(series.samples()[0][1], {'bytes': 200, 'packets': 2})
+
+    def test_rate(self):
+        series = CounterSeries(('bytes',), 8)
+        for t, value in ((0, 0), (10, 1000), (20, 3000), (30, 6000)):
+            series.append(t, (value,))
+        eq_(series.rate('bytes'), 200)
+        # the last two samples
+        eq_(series.rate('bytes', 0), 300)
+        eq_(series.rate('bytes', 20), 250)
+
+    def test_rate_reset(self):
+        series = CounterSeries(('bytes',), 8)
+        for t, value in ((0, 5000), (10, 6000), (20, 500)):
+            series.append(t, (value,))
+        # 1000 bytes, then 500 bytes after the counter reset
+        eq_(series.rate('bytes'), 75)
@@ -0,0 +1,148 @@
+# Copyright (C) 2013 Nippon Telegraph and Telephone Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+import unittest
+import logging
+import gevent
+from nose.tools import *
+
+import ryu.contrib  # for ovs
+from ryu.lib.ovs import vsctl
+
+LOG = logging.getLogger('test_vsctl')
+
+REMOTE = 'tcp:127.0.0.1:6632'
+
+
+class _Transaction(object):
+    def __init__(self):
+        self.aborted = False
+
+    def abort(self):
+        self.aborted = True
+
+
+class _Idl(object):
+    """An IDL which is never connected."""
+    def __init__(self, remote, schema_helper):
+        self.remote = remote
+        self.txn = None
+        self.runs = 0
+        self.closed = False
+
+    def run(self):
+        self.runs += 1
+
+    def wait(self, poller):
+        # yield to the other greenlets instead of polling the remote
+        gevent.sleep(0.001)
+        poller.immediate_wake()
+
+    def close(self):
+        self.closed = True
+
+
+class _SchemaHelper(object):
+    def __init__(self, location, schema_json):
+        pass
+
+    def register_all(self):
+        pass
+
+
+class _idl(object):
+    Idl = _Idl
+    SchemaHelper = _SchemaHelper
+
+
+class Test_VSCtlIdlPool(unittest.TestCase):
+    """ Test case for vsctl.VSCtlIdlPool
+    """
+
+    def setUp(self):
+        self.idl = vsctl.idl
+        vsctl.idl = _idl
+        self.pool = vsctl.VSCtlIdlPool()
+
+    def tearDown(self):
+        self.pool.close()
+        vsctl.idl = self.idl
+
+    def _idl(self, remote=REMOTE):
+        with self.pool.session(remote, None) as idl_:
+            return idl_
+
+    def test_reuse(self):
+        idl_ = self._idl()
+        eq_(self._idl(), idl_)
+        other = self._idl('tcp:127.0.0.2:6632')
+        ok_(other is not idl_)
+        eq_(other.remote, 'tcp:127.0.0.2:6632')
+
+        # the replica is kept up to date in the background
+        runs = idl_.runs
+        gevent.sleep(0.01)
+        ok_(idl_.runs > runs)
+
+        self.pool.close()
+        ok_(idl_.closed)
+        ok_(other.closed)
+        ok_(self._idl() is not idl_)
+
+    def test_lock(self):
+        idl_ = self._idl()
+        order = []
+
+        def _use(name):
+            with self.pool.session(REMOTE, None):
+                order.append((name, 'enter'))
+                runs = idl_.runs
+                gevent.sleep(0.01)
+                # the background greenlet doesn't run the idl meanwhile
+                eq_(idl_.runs, runs)
+                order.append((name, 'exit'))
+
+        threads = [gevent.spawn(_use, name) for name in ('a', 'b')]
+        gevent.joinall(threads, raise_error=True)
+        eq_(order, [('a', 'enter'), ('a', 'exit'),
+                    ('b', 'enter'), ('b', 'exit')])
+
+    def test_error(self):
+        txn = _Transaction()
+        try:
+            with self.pool.session(REMOTE, None) as idl_:
+                idl_.txn = txn
+                vsctl.vsctl_fatal('bad command')
+        except Exception:
+            pass
+        ok_(txn.aborted)
+        # the session is kept
+        ok_(not idl_.closed)
+        eq_(self._idl(), idl_)
+
+    def test_reconnect(self):
+        try:
+            with self.pool.session(REMOTE, None) as idl_:
+                with gevent.Timeout(0.001):
+                    gevent.sleep(0.01)
+        except gevent.Timeout:
+            pass
+        # started over with a new session
+        ok_(idl_.closed)
+        new = self._idl()
+        ok_(new is not idl_)
+        ok_(not new.closed)
@@ -0,0 +1,131 @@
+# Copyright (C) 2013 Nippon Telegraph and Telephone Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+import struct
+import unittest
+import logging
+from nose.tools import *
+
+from ryu.lib.xflow import netflow
+from ryu.lib.xflow import sflow
+
+LOG = logging.getLogger('test_xflow')
+
+
+def _v5_record(i):
+    return struct.pack(netflow.NetFlowV5Flow._PACK_STR,
+                       0x0a000000 + i, 0x0a000100 + i, 0, i, i + 1,
+                       10 * i, 1000 * i, 1, 2, 1024 + i, 80, 0x12, 6, 0,
+                       0, 0, 24, 24)
+
+
+def _v9(flowsets):
+    buf = ''.join(struct.pack('!HH', flowset_id, len(body) + 4) + body
+                  for flowset_id, body in flowsets)
+    return struct.pack('!HHIIII', 9, len(flowsets), 0, 0, 1, 7) + buf
+
+
+class Test_NetFlowV5(unittest.TestCase):
+    """ Test case for NetFlowV5.parse_columns
+    """
+
+    def test_same_as_parser(self):
+        buf = (struct.pack(netflow.NetFlowV5._PACK_STR, 5, 3, 0, 0, 0, 1,
+                           0, 0, 0) +
+               ''.join(_v5_record(i) for i in range(3)))
+        msg = netflow.NetFlowV5.parser(buf)
+        header, columns = netflow.NetFlowV5.parse_columns(buf)
+        eq_(header.count, 3)
+        eq_(header.flows, None)
+        for field in netflow.NetFlowV5Flow._FIELDS:
+            eq_(columns[field],
+                tuple(getattr(f, field) for f in msg.flows))
+
+    def test_count_beyond_buffer(self):
+        buf = (struct.pack(netflow.NetFlowV5._PACK_STR, 5, 30, 0, 0, 0, 1,
+                           0, 0, 0) + _v5_record(1))
+        _header, columns = netflow.NetFlowV5.parse_columns(buf)
+        eq_(columns['srcaddr'], (0x0a000001,))
+
+
+class Test_NetFlowV9(unittest.TestCase):
+    """ Test case for NetFlowV9
+    """
+
+    template = struct.pack('!HHHHHHHHHH', 256, 4, 8, 4, 12, 4, 1, 4, 2, 4)
+
+    def _data(self, n):
+        # padded to 4 bytes
+        return ''.join(struct.pack('!IIII', 0x0a000000 + i, 0x0a000100 + i,
+                                   100 * i, i) for i in range(n)) + '\0' * 4
+
+    def test_template_and_data(self):
+        templates = {}
+        msg = netflow.NetFlow.parser(_v9([(0, self.template)]))
+        eq_(msg.templates[0].template_id, 256)
+
+        msg = netflow.NetFlowV9.parser(
+            _v9([(0, self.template), (256, self._data(3))]), templates)
+        eq_(templates.keys(), [256])
+        eq_(msg.source_id, 7)
+        eq_(len(msg.flowsets), 1)
+        flowset = msg.flowsets[0]
+        eq_(flowset.count, 3)
+        eq_(flowset.columns['ipv4_src_addr'],
+            (0x0a000000, 0x0a000001, 0x0a000002))
+        eq_(flowset.columns['in_bytes'], (0, 100, 200))
+
+        # the template is remembered
+        msg = netflow.NetFlowV9.parser(_v9([(256, self._data(1))]),
+                                       templates)
+        eq_(msg.flowsets[0].columns['in_pkts'], (0,))
+
+    def test_unknown_template(self):
+        msg = netflow.NetFlowV9.parser(_v9([(300, self._data(1))]))
+        eq_(msg.flowsets, [])
+        eq_(msg.unknown_template_ids, [300])
+
+
+class Test_sFlowV5(unittest.TestCase):
+    """ Test case for sFlowV5.parse_flow_columns
+    """
+
+    def _flow_sample(self, input_if, header):
+        raw = struct.pack('!iIII', 1, 1500, 4, len(header)) + header
+        switch = struct.pack('!IIII', 1, 0, 1, 0)
+        records = (struct.pack('!II', 1001, len(switch)) + switch +
+                   struct.pack('!II', 1, len(raw)) + raw)
+        body = struct.pack('!IIIIIIII', 1, 3, 512, 0, 0, input_if, 2,
+                           2) + records
+        return struct.pack('!II', 1, len(body)) + body
+
+    def test_parse_flow_columns(self):
+        header = 'h' * 16
+        counter = struct.pack('!III', 1, 3, 0)
+        buf = (struct.pack('!iiIIIII', 5, 1, 0x0a000001, 0, 1, 100, 3) +
+               self._flow_sample(5, header) +
+               struct.pack('!II', 2, len(counter)) + counter +
+               self._flow_sample(6, header))
+        msg, columns = sflow.sFlowV5.parse_flow_columns(buf)
+        eq_(msg.agent_address, 0x0a000001)
+        eq_(len(msg.samples), 1)
+        eq_(msg.samples[0].sample_format, 2)
+        eq_(columns['input_if'], [5, 6])
+        eq_(columns['sampling_rate'], [512, 512])
+        eq_(columns['frame_length'], [1500, 1500])
+        eq_(columns['source_id_index'], [3, 3])
+        eq_(columns['header'], [header, header])
@@ -20,6 +20,8 @@ import logging
 from nose.tools import *
 from ryu.ofproto.ofproto_v1_0_parser import *
 from ryu.ofproto import ofproto_v1_0_parser
+from ryu.ofproto import ether
+from ryu.ofproto import inet
 
 
 LOG = logging.getLogger('test_ofproto_v10')
@@ -5979,3 +5981,37 @@ class TestOFPVendorStatsRequest(unittest.TestCase):
 
         # specific_data
         eq_(self.specific_data, res[7])
+
+
+class TestMFField(unittest.TestCase):
+    """ Test case for nx_match.MFField
+    """
+
+    def _fields(self, rule):
+        buf = bytearray()
+        length = nx_match.serialize_nxm_match(rule, buf, 0)
+        fields = {}
+        offset = 0
+        while offset < length:
+            field = nx_match.MFField.parser(buf, offset)
+            fields[field.nxm_header] = field
+            offset += field.length
+        return fields
+
+    def _test_parser(self, nw_proto, tp_src_header):
+        rule = nx_match.ClsRule()
+        rule.set_dl_type(ether.ETH_TYPE_IP)
+        rule.set_nw_proto(nw_proto)
+        rule.set_tp_src(8080)
+        fields = self._fields(rule)
+
+        eq_(fields[ofproto_v1_0.NXM_OF_IP_PROTO].value, nw_proto)
+        eq_(fields[ofproto_v1_0.NXM_OF_IP_PROTO].length, 5)
+        eq_(fields[tp_src_header].value, 8080)
+        eq_(fields[tp_src_header].length, 6)
+
+    def test_parser_tcp(self):
+        self._test_parser(inet.IPPROTO_TCP, ofproto_v1_0.NXM_OF_TCP_SRC)
+
+    def test_parser_udp(self):
+        self._test_parser(inet.IPPROTO_UDP, ofproto_v1_0.NXM_OF_UDP_SRC)
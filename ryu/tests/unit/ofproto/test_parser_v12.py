@@ -6066,6 +6066,7 @@ class TestOFPGroupFeaturesStats(unittest.TestCase):
         eq_(capabilities, res.capabilities)
         eq_(tuple(max_groups), res.max_groups)
         eq_(tuple(actions), res.actions)
+        eq_(ofproto_v1_2.OFP_GROUP_FEATURES_STATS_SIZE, res.length)
 
     def test_parser_mid(self):
         self._test_parser(self.types, self.capabilities,
@@ -0,0 +1,263 @@
+# Copyright (C) 2013 Nippon Telegraph and Telephone Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+import unittest
+import logging
+from struct import *
+from nose.tools import *
+from ryu.ofproto.ofproto_v1_3_parser import *
+from ryu.ofproto import ofproto_v1_3_parser
+
+LOG = logging.getLogger('test_ofproto_v13')
+
+
+class _Datapath(object):
+    ofproto = ofproto_v1_3
+    ofproto_parser = ofproto_v1_3_parser
+
+
+def _parse(msg_type, body, xid=1):
+    msg_len = ofproto_v1_3.OFP_HEADER_SIZE + len(body)
+    buf = pack(ofproto_v1_3.OFP_HEADER_PACK_STR, ofproto_v1_3.OFP_VERSION,
+               msg_type, msg_len, xid) + body
+    return msg_parser(_Datapath, ofproto_v1_3.OFP_VERSION, msg_type,
+                      msg_len, xid, buf)
+
+
+def _parse_multipart(stats_type, body, flags=0):
+    body = pack(ofproto_v1_3.OFP_MULTIPART_REPLY_PACK_STR,
+                stats_type, flags) + body
+    return _parse(ofproto_v1_3.OFPT_MULTIPART_REPLY, body)
+
+
+def _serialize(msg):
+    msg.set_xid(1)
+    msg.serialize()
+    return msg.buf
+
+
+def _bucket():
+    actions = [OFPActionOutput(3, 128), OFPActionDecNwTtl()]
+    bucket = OFPBucket(0, 10, 3, ofproto_v1_3.OFPG_ANY, actions)
+    buf = bytearray()
+    bucket.serialize(buf, 0)
+    return str(buf)
+
+
+class TestOFPExperimenter(unittest.TestCase):
+    """ Test case for ofproto_v1_3_parser.OFPExperimenter
+    """
+
+    def test_serialize_parser(self):
+        c = OFPExperimenter(_Datapath, 0x2320, 7)
+        buf = _serialize(c)
+        eq_(len(buf), ofproto_v1_3.OFP_EXPERIMENTER_HEADER_SIZE)
+
+        res = _parse(ofproto_v1_3.OFPT_EXPERIMENTER,
+                     str(buf[ofproto_v1_3.OFP_HEADER_SIZE:]))
+        ok_(isinstance(res, OFPExperimenter))
+        eq_(res.experimenter, 0x2320)
+        eq_(res.exp_type, 7)
+
+
+class TestOFPPortStatus(unittest.TestCase):
+    """ Test case for ofproto_v1_3_parser.OFPPortStatus
+    """
+
+    def test_parser(self):
+        body = pack(ofproto_v1_3.OFP_PORT_STATUS_PACK_STR,
+                    ofproto_v1_3.OFPPR_MODIFY, 2, '\x00\x01\x02\x03\x04\x05',
+                    'eth2', ofproto_v1_3.OFPPC_PORT_DOWN,
+                    ofproto_v1_3.OFPPS_LINK_DOWN, 0, 0, 0, 0, 1000000, 0)
+        res = _parse(ofproto_v1_3.OFPT_PORT_STATUS, body)
+        eq_(res.reason, ofproto_v1_3.OFPPR_MODIFY)
+        eq_(res.desc.port_no, 2)
+        eq_(res.desc.name, 'eth2' + '\x00' * 12)
+        eq_(res.desc.state, ofproto_v1_3.OFPPS_LINK_DOWN)
+        eq_(res.desc.curr_speed, 1000000)
+
+
+class TestHeaderOnlyActions(unittest.TestCase):
+    """ Test case for the actions of ofproto_v1_3_parser without a body
+    """
+
+    def test_serialize_parser(self):
+        for cls in (OFPActionDecMplsTtl, OFPActionDecNwTtl,
+                    OFPActionCopyTtlOut, OFPActionCopyTtlIn,
+                    OFPActionPopVlan):
+            buf = bytearray()
+            cls().serialize(buf, 0)
+            eq_(len(buf), ofproto_v1_3.OFP_ACTION_HEADER_SIZE)
+            # the buffer is only read
+            orig = str(buf)
+            res = OFPAction.parser(buf, 0)
+            ok_(isinstance(res, cls))
+            eq_(res.len, ofproto_v1_3.OFP_ACTION_HEADER_SIZE)
+            eq_(str(buf), orig)
+
+
+class TestOFPBucket(unittest.TestCase):
+    """ Test case for ofproto_v1_3_parser.OFPBucket
+    """
+
+    def test_serialize_parser(self):
+        buf = _bucket()
+        res = OFPBucket.parser(buf, 0)
+        eq_(res.len, len(buf))
+        eq_(res.weight, 10)
+        eq_(res.watch_port, 3)
+        eq_(res.watch_group, ofproto_v1_3.OFPG_ANY)
+        eq_([a.__class__ for a in res.actions],
+            [OFPActionOutput, OFPActionDecNwTtl])
+        eq_(res.actions[0].port, 3)
+        eq_(res.actions[0].max_len, 128)
+
+
+class TestOFPGroupDescStatsReply(unittest.TestCase):
+    """ Test case for ofproto_v1_3_parser.OFPGroupDescStatsReply
+    """
+
+    def test_parser(self):
+        buckets = _bucket() * 2
+        length = ofproto_v1_3.OFP_GROUP_DESC_STATS_SIZE + len(buckets)
+        body = pack(ofproto_v1_3.OFP_GROUP_DESC_STATS_PACK_STR, length,
+                    ofproto_v1_3.OFPGT_SELECT, 5) + buckets
+        res = _parse_multipart(ofproto_v1_3.OFPMP_GROUP_DESC, body * 2)
+        eq_(res.type, ofproto_v1_3.OFPMP_GROUP_DESC)
+        eq_(len(res.body), 2)
+        stats = res.body[1]
+        eq_(stats.length, length)
+        eq_(stats.type, ofproto_v1_3.OFPGT_SELECT)
+        eq_(stats.group_id, 5)
+        eq_([bucket.weight for bucket in stats.bucket], [10, 10])
+
+
+class TestOFPGroupFeaturesStatsReply(unittest.TestCase):
+    """ Test case for ofproto_v1_3_parser.OFPGroupFeaturesStatsReply
+    """
+
+    def test_parser(self):
+        body = pack(ofproto_v1_3.OFP_GROUP_FEATURES_PACK_STR,
+                    1 << ofproto_v1_3.OFPGT_ALL,
+                    ofproto_v1_3.OFPGFC_CHAINING, 1, 2, 3, 4, 5, 6, 7, 8)
+        res = _parse_multipart(ofproto_v1_3.OFPMP_GROUP_FEATURES, body)
+        stats = res.body[0]
+        eq_(stats.types, 1 << ofproto_v1_3.OFPGT_ALL)
+        eq_(stats.capabilities, ofproto_v1_3.OFPGFC_CHAINING)
+        eq_(stats.max_groups, [1, 2, 3, 4])
+        eq_(stats.actions, [5, 6, 7, 8])
+        eq_(stats.length, ofproto_v1_3.OFP_GROUP_FEATURES_SIZE)
+
+    def test_request(self):
+        buf = _serialize(OFPGroupFeaturesStatsRequest(_Datapath, 0, None))
+        eq_(unpack_from(ofproto_v1_3.OFP_MULTIPART_REQUEST_PACK_STR, buf,
+                        ofproto_v1_3.OFP_HEADER_SIZE),
+            (ofproto_v1_3.OFPMP_GROUP_FEATURES, 0))
+
+
+class TestOFPAggregateStatsRequest(unittest.TestCase):
+    """ Test case for ofproto_v1_3_parser.OFPAggregateStatsRequest
+    """
+
+    def test_serialize(self):
+        match = OFPMatch()
+        match.set_in_port(1)
+        c = OFPAggregateStatsRequest(_Datapath, 0, 3, ofproto_v1_3.OFPP_ANY,
+                                     ofproto_v1_3.OFPG_ANY, 0x10, 0xff,
+                                     match)
+        buf = _serialize(c)
+        eq_(unpack_from(ofproto_v1_3.OFP_MULTIPART_REQUEST_PACK_STR, buf,
+                        ofproto_v1_3.OFP_HEADER_SIZE),
+            (ofproto_v1_3.OFPMP_AGGREGATE, 0))
+        eq_(unpack_from('!B3xII4xQQ', buf,
+                        ofproto_v1_3.OFP_MULTIPART_REQUEST_SIZE),
+            (3, ofproto_v1_3.OFPP_ANY, ofproto_v1_3.OFPG_ANY, 0x10, 0xff))
+
+
+class TestOFPTableFeaturesStatsReply(unittest.TestCase):
+    """ Test case for ofproto_v1_3_parser.OFPTableFeaturesStatsReply
+    """
+
+    def test_parser(self):
+        body = pack(ofproto_v1_3.OFP_TABLE_FEATURES_PACK_STR,
+                    ofproto_v1_3.OFP_TABLE_FEATURES_SIZE, 2, 'acl',
+                    0xff, 0xf0, 0, 1000)
+        res = _parse_multipart(ofproto_v1_3.OFPMP_TABLE_FEATURES, body)
+        stats = res.body[0]
+        eq_(stats.table_id, 2)
+        eq_(stats.name, 'acl' + '\x00' * 29)
+        eq_(stats.metadata_match, 0xff)
+        eq_(stats.metadata_write, 0xf0)
+        eq_(stats.max_entries, 1000)
+        eq_(stats.properties, [])
+
+
+class TestOFPQueueGetConfigReply(unittest.TestCase):
+    """ Test case for ofproto_v1_3_parser.OFPQueueGetConfigReply
+    """
+
+    def _queue(self, queue_id, min_rate, max_rate):
+        prop_len = ofproto_v1_3.OFP_QUEUE_PROP_MIN_RATE_SIZE
+        props = pack(ofproto_v1_3.OFP_QUEUE_PROP_HEADER_PACK_STR,
+                     ofproto_v1_3.OFPQT_MIN_RATE, prop_len) + \
+            pack(ofproto_v1_3.OFP_QUEUE_PROP_MIN_RATE_PACK_STR, min_rate) + \
+            pack(ofproto_v1_3.OFP_QUEUE_PROP_HEADER_PACK_STR,
+                 ofproto_v1_3.OFPQT_MAX_RATE, prop_len) + \
+            pack(ofproto_v1_3.OFP_QUEUE_PROP_MAX_RATE_PACK_STR, max_rate)
+        return pack(ofproto_v1_3.OFP_PACKET_QUEUE_PACK_STR, queue_id, 2,
+                    ofproto_v1_3.OFP_PACKET_QUEUE_SIZE + len(props)) + props
+
+    def test_parser(self):
+        body = pack(ofproto_v1_3.OFP_QUEUE_GET_CONFIG_REPLY_PACK_STR, 2) + \
+            self._queue(1, 100, 200) + self._queue(2, 300, 400)
+        res = _parse(ofproto_v1_3.OFPT_QUEUE_GET_CONFIG_REPLY, body)
+        eq_(res.port, 2)
+        eq_([queue.queue_id for queue in res.queues], [1, 2])
+        queue = res.queues[1]
+        eq_(queue.port, 2)
+        eq_([prop.__class__ for prop in queue.properties],
+            [OFPQueuePropMinRate, OFPQueuePropMaxRate])
+        eq_([prop.rate for prop in queue.properties], [300, 400])
+
+
+class TestOFPRoleReply(unittest.TestCase):
+    """ Test case for ofproto_v1_3_parser.OFPRoleReply
+    """
+
+    def test_parser(self):
+        body = pack(ofproto_v1_3.OFP_ROLE_REQUEST_PACK_STR,
+                    ofproto_v1_3.OFPCR_ROLE_MASTER, 0x123456789)
+        res = _parse(ofproto_v1_3.OFPT_ROLE_REPLY, body)
+        ok_(isinstance(res, OFPRoleReply))
+        eq_(res.role, ofproto_v1_3.OFPCR_ROLE_MASTER)
+        eq_(res.generation_id, 0x123456789)
+
+
+class TestOFPAsyncConfig(unittest.TestCase):
+    """ Test case for ofproto_v1_3_parser.OFPGetAsyncReply and OFPSetAsync
+    """
+
+    def test_parser(self):
+        body = pack(ofproto_v1_3.OFP_ASYNC_CONFIG_PACK_STR, 1, 2, 3, 4, 5, 6)
+        for msg_type, cls in (
+                (ofproto_v1_3.OFPT_GET_ASYNC_REPLY, OFPGetAsyncReply),
+                (ofproto_v1_3.OFPT_SET_ASYNC, OFPSetAsync)):
+            res = _parse(msg_type, body)
+            ok_(isinstance(res, cls))
+            eq_(res.packet_in_mask, [1, 2])
+            eq_(res.port_status_mask, [3, 4])
+            eq_(res.flow_removed_mask, [5, 6])